@@ -0,0 +1,36 @@
+"""Add a database sequence for activity log sequence numbers
+
+Revision ID: a1d7e3c90b42
+Revises: 613d902d8d6a
+Create Date: 2026-10-16 09:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'a1d7e3c90b42'
+down_revision = '613d902d8d6a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Audit records are numbered from a sequence instead of MAX(sequence_number) + 1
+    op.execute("CREATE SEQUENCE IF NOT EXISTS activity_log_sequence_number_seq")
+    op.execute("""
+        SELECT setval(
+            'activity_log_sequence_number_seq',
+            COALESCE((SELECT MAX(sequence_number) FROM activity_log), 0) + 1,
+            false
+        )
+    """)
+    op.execute(
+        "ALTER TABLE activity_log ALTER COLUMN sequence_number "
+        "SET DEFAULT nextval('activity_log_sequence_number_seq')"
+    )
+
+
+def downgrade():
+    op.execute("ALTER TABLE activity_log ALTER COLUMN sequence_number DROP DEFAULT")
+    op.execute("DROP SEQUENCE IF EXISTS activity_log_sequence_number_seq")
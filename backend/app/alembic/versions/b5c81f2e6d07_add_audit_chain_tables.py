@@ -0,0 +1,66 @@
+"""Add audit chain head and verification checkpoint
+
+Revision ID: b5c81f2e6d07
+Revises: a1d7e3c90b42
+Create Date: 2026-10-16 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5c81f2e6d07'
+down_revision = 'a1d7e3c90b42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('audit_chain_head',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('last_sequence', sa.BigInteger(), nullable=False),
+        sa.Column('last_checksum', sqlmodel.sql.sqltypes.AutoString(length=64), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('audit_chain_checkpoint',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('verified_sequence', sa.BigInteger(), nullable=False),
+        sa.Column('verified_checksum', sqlmodel.sql.sqltypes.AutoString(length=64), nullable=True),
+        sa.Column('verified_at', sa.DateTime(), nullable=True),
+        sa.Column('broken_sequence', sa.BigInteger(), nullable=True),
+        sa.Column('broken_reason', sa.Text(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+    # The chain starts after the records already there; they predate checksums and count as verified
+    op.execute("""
+        INSERT INTO audit_chain_head (id, last_sequence, last_checksum)
+        SELECT 1, COALESCE(MAX(sequence_number), 0), NULL FROM activity_log
+    """)
+    op.execute("""
+        INSERT INTO audit_chain_checkpoint (id, verified_sequence, verified_checksum, verified_at)
+        SELECT 1, COALESCE(MAX(sequence_number), 0), NULL, now() FROM activity_log
+    """)
+
+    # Sequence numbers now come from the chain head, which gives numbers back on rollback
+    op.execute("ALTER TABLE activity_log ALTER COLUMN sequence_number DROP DEFAULT")
+    op.execute("DROP SEQUENCE IF EXISTS activity_log_sequence_number_seq")
+
+
+def downgrade():
+    op.execute("CREATE SEQUENCE IF NOT EXISTS activity_log_sequence_number_seq")
+    op.execute("""
+        SELECT setval(
+            'activity_log_sequence_number_seq',
+            COALESCE((SELECT MAX(sequence_number) FROM activity_log), 0) + 1,
+            false
+        )
+    """)
+    op.execute(
+        "ALTER TABLE activity_log ALTER COLUMN sequence_number "
+        "SET DEFAULT nextval('activity_log_sequence_number_seq')"
+    )
+    op.drop_table('audit_chain_checkpoint')
+    op.drop_table('audit_chain_head')
@@ -0,0 +1,104 @@
+"""Partition activity_log by month with composite filter indexes
+
+Revision ID: c4e92a7d1f38
+Revises: b5c81f2e6d07
+Create Date: 2026-10-16 16:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4e92a7d1f38'
+down_revision = 'b5c81f2e6d07'
+branch_labels = None
+depends_on = None
+
+FOREIGN_KEYS = (
+    ('user_id', '"user"(id)'),
+    ('study_id', 'study(id)'),
+    ('org_id', 'organization(id)'),
+)
+
+INDEXES = (
+    ('ix_activity_log_timestamp_id', 'timestamp, id'),
+    ('ix_activity_log_org_timestamp', 'org_id, timestamp, id'),
+    ('ix_activity_log_user_timestamp', 'user_id, timestamp, id'),
+    ('ix_activity_log_study_timestamp', 'study_id, timestamp, id'),
+    ('ix_activity_log_action_timestamp', 'action, timestamp, id'),
+    ('ix_activity_log_resource_timestamp', 'resource_type, resource_id, timestamp'),
+    ('ix_activity_log_sequence_number', 'sequence_number'),
+)
+
+OLD_INDEXES = (
+    ('idx_activity_org_study', 'org_id, study_id'),
+    ('idx_activity_resource', 'resource_type, resource_id'),
+    ('idx_activity_timestamp_user', 'timestamp, user_id'),
+    ('ix_activity_log_action', 'action'),
+    ('ix_activity_log_org_id', 'org_id'),
+    ('ix_activity_log_resource_id', 'resource_id'),
+    ('ix_activity_log_resource_type', 'resource_type'),
+    ('ix_activity_log_sequence_number', 'sequence_number'),
+    ('ix_activity_log_study_id', 'study_id'),
+    ('ix_activity_log_timestamp', 'timestamp'),
+    ('ix_activity_log_user_id', 'user_id'),
+)
+
+
+def _add_foreign_keys():
+    for column, target in FOREIGN_KEYS:
+        op.execute(f"ALTER TABLE activity_log ADD FOREIGN KEY ({column}) REFERENCES {target}")
+
+
+def upgrade():
+    # Partitioning needs the partition key in the primary key, so the table is
+    # rebuilt as (id, timestamp) and its rows copied across month by month
+    op.execute("LOCK TABLE activity_log IN EXCLUSIVE MODE")
+    op.execute("ALTER TABLE activity_log RENAME TO activity_log_unpartitioned")
+    op.execute("ALTER TABLE activity_log_unpartitioned RENAME CONSTRAINT activity_log_pkey TO activity_log_unpartitioned_pkey")
+    op.execute("""
+        CREATE TABLE activity_log (LIKE activity_log_unpartitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS)
+        PARTITION BY RANGE (timestamp)
+    """)
+    op.execute("ALTER TABLE activity_log ADD PRIMARY KEY (id, timestamp)")
+    _add_foreign_keys()
+
+    # One partition per month from the oldest record to three months ahead;
+    # the daily partition task keeps the months ahead topped up from here
+    op.execute("""
+        DO $$
+        DECLARE
+            month date := date_trunc('month', COALESCE((SELECT MIN(timestamp) FROM activity_log_unpartitioned), now()));
+        BEGIN
+            WHILE month <= date_trunc('month', now()) + interval '3 months' LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF activity_log FOR VALUES FROM (%L) TO (%L)',
+                    'activity_log_' || to_char(month, 'YYYY_MM'), month, month + interval '1 month'
+                );
+                month := month + interval '1 month';
+            END LOOP;
+        END $$;
+    """)
+    op.execute("CREATE TABLE activity_log_default PARTITION OF activity_log DEFAULT")
+
+    op.execute("INSERT INTO activity_log SELECT * FROM activity_log_unpartitioned")
+    op.execute("DROP TABLE activity_log_unpartitioned")
+
+    # Indexes on the parent are created on every partition, present and future
+    for name, columns in INDEXES:
+        op.execute(f"CREATE INDEX {name} ON activity_log ({columns})")
+
+
+def downgrade():
+    op.execute("LOCK TABLE activity_log IN EXCLUSIVE MODE")
+    op.execute("ALTER TABLE activity_log RENAME TO activity_log_partitioned")
+    for name, _ in INDEXES:
+        op.execute(f"ALTER INDEX {name} RENAME TO {name}_partitioned")
+    op.execute("ALTER TABLE activity_log_partitioned RENAME CONSTRAINT activity_log_pkey TO activity_log_partitioned_pkey")
+    op.execute("CREATE TABLE activity_log (LIKE activity_log_partitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+    op.execute("ALTER TABLE activity_log ADD PRIMARY KEY (id)")
+    _add_foreign_keys()
+    op.execute("INSERT INTO activity_log SELECT * FROM activity_log_partitioned")
+    op.execute("DROP TABLE activity_log_partitioned CASCADE")
+    for name, columns in OLD_INDEXES:
+        op.execute(f"CREATE INDEX {name} ON activity_log ({columns})")
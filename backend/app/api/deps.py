@@ -1,19 +1,24 @@
+import asyncio
 from collections.abc import Generator
 from typing import Annotated, Optional
 
-import jwt
 import redis.asyncio as redis
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
-from jwt.exceptions import InvalidTokenError
-from pydantic import ValidationError
 from sqlmodel import Session
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core import security
 from app.core.config import settings
 from app.core.db import engine, async_engine
-from app.models import TokenPayload, User, Study
+from app.core.principal_cache import (
+    attach_principal,
+    decode_token_subject,
+    get_principal_cache,
+    load_principal,
+    principal_user,
+    request_token_subject,
+)
+from app.models import User, Study
 
 reusable_oauth2 = OAuth2PasswordBearer(
     tokenUrl=f"{settings.API_V1_STR}/login/access-token"
@@ -29,23 +34,21 @@ SessionDep = Annotated[Session, Depends(get_db)]
 TokenDep = Annotated[str, Depends(reusable_oauth2)]
 
 
-def get_current_user(session: SessionDep, token: TokenDep) -> User:
-    try:
-        payload = jwt.decode(
-            token, settings.SECRET_KEY, algorithms=[security.ALGORITHM]
-        )
-        token_data = TokenPayload(**payload)
-    except (InvalidTokenError, ValidationError):
+def get_current_user(request: Request, session: SessionDep, token: TokenDep) -> User:
+    subject = request_token_subject(request, token)
+    if subject is None:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Could not validate credentials",
         )
-    user = session.get(User, token_data.sub)
-    if not user:
+    principal = get_principal_cache().get_principal(session, subject)
+    if not principal:
         raise HTTPException(status_code=404, detail="User not found")
-    if not user.is_active:
+    if not principal["is_active"]:
         raise HTTPException(status_code=400, detail="Inactive user")
-    return user
+    # A detached copy for middleware that runs after the session is gone
+    request.state.current_user = principal_user(principal)
+    return attach_principal(session, principal)
 
 
 CurrentUser = Annotated[User, Depends(get_current_user)]
@@ -56,15 +59,11 @@ async def get_current_user_ws(token: str, db: Session) -> Optional[User]:
     Get current user from WebSocket token.
     Used for WebSocket authentication where Depends() doesn't work.
     """
-    try:
-        payload = jwt.decode(
-            token, settings.SECRET_KEY, algorithms=[security.ALGORITHM]
-        )
-        token_data = TokenPayload(**payload)
-    except (InvalidTokenError, ValidationError):
+    subject = decode_token_subject(token)
+    if subject is None:
         return None
     
-    user = db.get(User, token_data.sub)
+    user = get_principal_cache().get_user(db, subject)
     if not user or not user.is_active:
         return None
     
@@ -105,20 +104,24 @@ async def get_current_active_user(
     token: str = Depends(reusable_oauth2)
 ) -> User:
     """Get current active user for async endpoints"""
-    try:
-        payload = jwt.decode(
-            token, settings.SECRET_KEY, algorithms=[security.ALGORITHM]
-        )
-        token_data = TokenPayload(**payload)
-    except (InvalidTokenError, ValidationError):
+    subject = decode_token_subject(token)
+    if subject is None:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Could not validate credentials",
         )
     
-    user = await db.get(User, token_data.sub)
-    if not user:
+    cache = get_principal_cache()
+    principal = cache.peek(subject)
+    if principal is None:
+        # The cache's Redis calls block, so they run off the event loop
+        principal, version = await asyncio.to_thread(cache.fetch, subject)
+        if principal is None:
+            principal = await db.run_sync(lambda session: load_principal(session, subject))
+            if principal is not None:
+                await asyncio.to_thread(cache.store, subject, version, principal)
+    if not principal:
         raise HTTPException(status_code=404, detail="User not found")
-    if not user.is_active:
+    if not principal["is_active"]:
         raise HTTPException(status_code=400, detail="Inactive user")
-    return user
+    return await db.run_sync(lambda session: attach_principal(session, principal))
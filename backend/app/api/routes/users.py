@@ -26,6 +26,7 @@ from app.models import (
 )
 from app.utils import generate_new_account_email, send_email
 from app.services.email.email_service import email_service
+from app.services.audit_log_writer import get_audit_log_writer
 from app.models.organization import Organization
 import asyncio
 
@@ -87,8 +88,7 @@ def create_user(*, session: SessionDep, user_in: UserCreate, current_user: Curre
     """
     Create new user.
     """
-    from app.models.activity_log import ActivityLog, ActivityAction
-    from datetime import datetime
+    from app.models.activity_log import ActivityAction
     
     user = crud.get_user_by_email(session=session, email=user_in.email)
     if user:
@@ -99,30 +99,19 @@ def create_user(*, session: SessionDep, user_in: UserCreate, current_user: Curre
 
     user = crud.create_user(session=session, user_create=user_in)
     
-    # Log user creation with proper sequence number for 21 CFR Part 11
-    # Get the next sequence number
-    from sqlmodel import select, func
-    
-    max_seq_statement = select(func.coalesce(func.max(ActivityLog.sequence_number), 0))
-    max_seq = session.exec(max_seq_statement).one()
-    next_seq = max_seq + 1
-    
-    activity_log = ActivityLog(
+    # Log user creation for 21 CFR Part 11; the audit writer assigns the sequence number
+    get_audit_log_writer().record(
+        user_id=current_user.id,
         action=ActivityAction.CREATE,
         resource_type="user",
         resource_id=str(user.id),
-        user_id=current_user.id,
         details={
             "created_user_email": user.email,
             "created_user_role": user.role,
             "created_by": current_user.email
         },
-        timestamp=datetime.utcnow(),
-        sequence_number=next_seq,
         org_id=user.org_id if user.org_id else None
     )
-    session.add(activity_log)
-    session.commit()
     
     # Send email using new email system
     if user_in.email and user_in.password:
@@ -203,8 +192,7 @@ def update_password_me(
     """
     Update own password.
     """
-    from app.models.activity_log import ActivityLog, ActivityAction
-    from datetime import datetime
+    from app.models.activity_log import ActivityAction
     
     if not verify_password(body.current_password, current_user.hashed_password):
         raise HTTPException(status_code=400, detail="Incorrect password")
@@ -216,17 +204,17 @@ def update_password_me(
     current_user.hashed_password = hashed_password
     session.add(current_user)
     
+    session.commit()
+    
     # Log password change
-    activity_log = ActivityLog(
+    get_audit_log_writer().record(
+        user_id=current_user.id,
         action=ActivityAction.PASSWORD_CHANGED,
         resource_type="user",
         resource_id=str(current_user.id),
-        user_id=current_user.id,
         details={"email": current_user.email},
-        timestamp=datetime.utcnow()
+        org_id=current_user.org_id
     )
-    session.add(activity_log)
-    session.commit()
     
     return Message(message="Password updated successfully")
 
@@ -302,8 +290,7 @@ def update_user(
     """
     Update a user.
     """
-    from app.models.activity_log import ActivityLog, ActivityAction
-    from datetime import datetime
+    from app.models.activity_log import ActivityAction
 
     db_user = session.get(User, user_id)
     if not db_user:
@@ -325,21 +312,19 @@ def update_user(
     
     # Log user update
     new_values = {"email": db_user.email, "role": db_user.role, "is_active": db_user.is_active}
-    activity_log = ActivityLog(
+    get_audit_log_writer().record(
+        user_id=current_user.id,
         action=ActivityAction.UPDATE,
         resource_type="user",
         resource_id=str(user_id),
-        user_id=current_user.id,
         old_value=old_values,
         new_value=new_values,
         details={
             "updated_by": current_user.email,
             "updated_user": db_user.email
         },
-        timestamp=datetime.utcnow()
+        org_id=db_user.org_id
     )
-    session.add(activity_log)
-    session.commit()
     
     return db_user
 
@@ -351,8 +336,7 @@ def delete_user(
     """
     Delete a user.
     """
-    from app.models.activity_log import ActivityLog, ActivityAction
-    from datetime import datetime
+    from app.models.activity_log import ActivityAction
     
     user = session.get(User, user_id)
     if not user:
@@ -368,20 +352,18 @@ def delete_user(
     statement = delete(Item).where(col(Item.owner_id) == user_id)
     session.exec(statement)  # type: ignore
     session.delete(user)
+    session.commit()
     
     # Log user deletion
-    activity_log = ActivityLog(
+    get_audit_log_writer().record(
+        user_id=current_user.id,
         action=ActivityAction.DELETE,
         resource_type="user",
         resource_id=str(user_id),
-        user_id=current_user.id,
         details={
             "deleted_by": current_user.email,
             "deleted_user": deleted_user_info
-        },
-        timestamp=datetime.utcnow()
+        }
     )
-    session.add(activity_log)
-    session.commit()
     
     return Message(message="User deleted successfully")
@@ -1,21 +1,30 @@
 # ABOUTME: API endpoints for audit trail management and retrieval
 # ABOUTME: Handles 21 CFR Part 11 compliant audit logging, search, and reporting
 
+import asyncio
 from typing import List, Dict, Any, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlmodel import Session, select
 from datetime import datetime, timedelta
+from urllib.parse import urlencode
 import uuid
 
 from app.api.deps import get_db, get_current_user
+from app.core.db import engine
+from app.crud.activity_log import encode_cursor, get_activity_logs
 from app.models import User, Study, Organization
 from app.core.permissions import Permission, require_permission
+from app.services.audit.audit_service import AuditService
+from app.services.audit_chain import AuditChainVerifier
+from app.services.audit_log_writer import get_audit_log_writer
 
 router = APIRouter()
 
 
 @router.get("/", response_model=List[Dict[str, Any]])
 async def get_audit_logs(
+    response: Response,
     start_date: Optional[datetime] = Query(None, description="Start date for filtering"),
     end_date: Optional[datetime] = Query(None, description="End date for filtering"),
     user_id: Optional[uuid.UUID] = Query(None, description="Filter by user"),
@@ -25,72 +34,54 @@ async def get_audit_logs(
     resource_id: Optional[str] = Query(None, description="Filter by resource ID"),
     limit: int = Query(100, ge=1, le=1000),
     offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page; replaces offset"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ) -> Any:
     """
     Get audit trail logs with filtering and pagination.
-    """
-    from app.models.activity_log import ActivityLog
-    from sqlalchemy.orm import selectinload
-    from sqlalchemy import and_, or_, desc
-    
-    # Build query
-    query = select(ActivityLog).options(selectinload(ActivityLog.user))
-    
-    # Apply filters
-    conditions = []
     
+    A full page sets the X-Next-Cursor header; pass it back as cursor for
+    the next page, which costs the same however deep it is.
+    """
     # For non-superusers, only show logs from their organization
+    org_id = None
     if not current_user.is_superuser and current_user.org_id:
-        conditions.append(ActivityLog.org_id == current_user.org_id)
-    
-    if start_date:
-        conditions.append(ActivityLog.timestamp >= start_date)
-    
-    if end_date:
-        conditions.append(ActivityLog.timestamp <= end_date)
-    
-    if user_id:
-        conditions.append(ActivityLog.user_id == user_id)
-    
-    if study_id:
-        conditions.append(ActivityLog.study_id == study_id)
-    
-    if action_type:
-        conditions.append(ActivityLog.action == action_type)
-    
-    if resource_type:
-        conditions.append(ActivityLog.resource_type == resource_type)
+        org_id = current_user.org_id
     
-    if resource_id:
-        conditions.append(ActivityLog.resource_id == resource_id)
-    
-    if conditions:
-        query = query.where(and_(*conditions))
-    
-    # Order by timestamp descending
-    query = query.order_by(desc(ActivityLog.timestamp))
+    try:
+        logs = get_activity_logs(
+            db,
+            org_id=org_id,
+            user_id=user_id,
+            study_id=study_id,
+            action=action_type,
+            resource_type=resource_type,
+            resource_id=resource_id,
+            start_date=start_date,
+            end_date=end_date,
+            skip=offset,
+            limit=limit,
+            cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    # Apply pagination
-    query = query.offset(offset).limit(limit)
+    if len(logs) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(logs[-1].timestamp, logs[-1].id)
     
-    # Execute query
-    logs = db.exec(query).all()
+    # Get user emails for the page in one query
+    user_ids = {log.user_id for log in logs}
+    emails = dict(db.exec(select(User.id, User.email).where(User.id.in_(user_ids))).all()) if user_ids else {}
     
     # Format response
     audit_logs = []
     for log in logs:
-        # Get user email
-        user_email = None
-        if log.user:
-            user_email = log.user.email
-        
         audit_logs.append({
             "id": str(log.id),
             "created_at": log.timestamp.isoformat() if log.timestamp else None,
             "user_id": str(log.user_id) if log.user_id else None,
-            "user_email": user_email,
+            "user_email": emails.get(log.user_id),
             "action": log.action,
             "resource_type": log.resource_type,
             "resource_id": log.resource_id,
@@ -104,6 +95,39 @@ async def get_audit_logs(
     return audit_logs
 
 
+@router.get("/pipeline", response_model=Dict[str, Any])
+async def get_audit_pipeline_stats(
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    Get queue depth, spill state and write counters of the audit log writer.
+    """
+    if not current_user.is_superuser:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    
+    return get_audit_log_writer().get_stats()
+
+
+@router.post("/verify", response_model=Dict[str, Any])
+async def verify_audit_chain(
+    max_records: Optional[int] = Query(None, ge=1, description="Stop after this many records"),
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    Verify the audit trail hash chain from the last checkpoint.
+    """
+    if not current_user.is_superuser:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    
+    return await asyncio.to_thread(AuditChainVerifier().verify, max_records)
+
+
 @router.get("/summary", response_model=Dict[str, Any])
 async def get_audit_summary(
     period: str = Query("last_30_days", description="Time period for summary"),
@@ -327,12 +351,49 @@ async def generate_compliance_report(
             "suspicious_activities": 0
         }
     
-    report["download_url"] = f"/api/v1/audit-trail/compliance-report/{report['report_id']}/download"
+    export_params = {"start_date": start_date.isoformat(), "end_date": end_date.isoformat()}
+    if study_id:
+        export_params["study_id"] = str(study_id)
+    report["download_url"] = f"/api/v1/audit-trail/compliance-report/export?{urlencode(export_params)}"
     report["expires_at"] = (datetime.utcnow() + timedelta(days=7)).isoformat()
     
     return report
 
 
+@router.get("/compliance-report/export")
+async def export_compliance_report(
+    start_date: datetime = Query(..., description="Report start date"),
+    end_date: datetime = Query(..., description="Report end date"),
+    study_id: Optional[uuid.UUID] = Query(None, description="Filter by study"),
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    Stream the audit records of a period as CSV, oldest first.
+    """
+    org_id = None
+    if not current_user.is_superuser:
+        if not current_user.org_id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Not enough permissions"
+            )
+        org_id = current_user.org_id
+    
+    def rows():
+        # The request's session is closed before the body is sent, so the export opens its own
+        with Session(engine) as session:
+            yield from AuditService(session).iter_compliance_csv(
+                start_date, end_date, org_id=org_id, study_id=study_id
+            )
+    
+    filename = f"audit_trail_{start_date:%Y%m%d}_{end_date:%Y%m%d}.csv"
+    return StreamingResponse(
+        rows(),
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
 @router.get("/search", response_model=Dict[str, Any])
 async def search_audit_logs(
     query: str = Query(..., description="Search query"),
@@ -20,7 +20,9 @@ from app.models import (
 )
 from app.core.permissions import Permission, require_permission
 from app.services.file_conversion_service import FileConversionService
+from app.services.ingest_manifest import IngestManifest
 from app.core.config import settings
+from app.core.cache import bump_study_generation
 
 logger = logging.getLogger(__name__)
 
@@ -234,9 +236,13 @@ async def delete_upload(
         logger.error(f"Failed to delete files for upload {upload_id}: {str(e)}")
     
     # Delete database record
+    was_active = upload.is_active_version
     db.delete(upload)
     db.commit()
     
+    if was_active:
+        bump_study_generation(upload.study_id)
+    
     return {"message": "Upload deleted successfully"}
 
 
@@ -294,12 +300,17 @@ async def process_upload(upload_id: uuid.UUID, db: Session):
         # Initialize conversion service
         conversion_service = FileConversionService()
         
+        # Unchanged datasets from earlier uploads of this study are reused
+        study = db.get(Study, upload.study_id)
+        manifest = IngestManifest.for_study(study.org_id, upload.study_id) if study else None
+        
         # Process the file
         result = await conversion_service.process_upload(
             upload_id=upload.id,
             file_path=upload.raw_path,
             output_path=upload.processed_path,
-            file_format=upload.file_format
+            file_format=upload.file_format,
+            manifest=manifest
         )
         
         # Update upload record with results
@@ -313,6 +324,11 @@ async def process_upload(upload_id: uuid.UUID, db: Session):
             upload.files_extracted = result.files_extracted
             upload.total_rows = result.total_rows
             upload.total_columns = result.total_columns
+            upload.upload_metadata = {
+                **(upload.upload_metadata or {}),
+                "datasets_converted": result.datasets_converted,
+                "datasets_reused": result.datasets_reused
+            }
         else:
             upload.error_message = result.error_message
         
@@ -321,6 +337,9 @@ async def process_upload(upload_id: uuid.UUID, db: Session):
         db.add(upload)
         db.commit()
         
+        if result.success and upload.is_active_version:
+            bump_study_generation(upload.study_id)
+        
         logger.info(f"Upload {upload_id} processing completed with status: {upload.status}")
         
     except Exception as e:
@@ -392,6 +411,8 @@ async def activate_upload_version(
     db.add(upload)
     db.commit()
     
+    bump_study_generation(study_id)
+    
     return Message(message=f"Version {upload.version_number} activated successfully")
 
 
@@ -11,6 +11,10 @@ import random
 from app.api.deps import get_db, get_current_user
 from app.models import User
 from app.core.permissions import Permission, require_permission
+from app.core.principal_cache import get_principal_cache
+from app.services.rbac.effective_permissions import get_permission_cache
+from app.services.duckdb_catalog import get_duckdb_pool
+from app.services.widget_engines.result_cache import get_widget_result_cache
 
 router = APIRouter()
 
@@ -271,6 +275,34 @@ async def get_resource_usage_metrics(
     return usage
 
 
+@router.get("/query-engine", response_model=Dict[str, Any])
+async def get_query_engine_metrics(
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    Get DuckDB connection pool, study catalog and widget result cache metrics.
+    """
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "duckdb": get_duckdb_pool().get_stats(),
+        "widget_results": get_widget_result_cache().get_stats()
+    }
+
+
+@router.get("/auth-cache", response_model=Dict[str, Any])
+async def get_auth_cache_metrics(
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    Get hit rates of the cached principals and permission sets behind request authorization.
+    """
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "principals": get_principal_cache().get_stats(),
+        "permissions": get_permission_cache().get_stats()
+    }
+
+
 @router.post("/optimize", response_model=Dict[str, Any])
 async def run_performance_optimization(
     optimization_config: Optional[Dict[str, Any]] = None,
@@ -15,6 +15,7 @@ from app.models.rbac import (
     Permission, Role, RolePermission, UserRole,
     PermissionPreset, PermissionAuditLog
 )
+from app.services.audit_log_writer import get_audit_log_writer
 from app.services.rbac.permission_service import PermissionService
 
 router = APIRouter()
@@ -254,7 +255,7 @@ def grant_permission(
     current_user: User = Depends(get_current_active_superuser)
 ):
     """Grant a specific permission to a role"""
-    from app.models.activity_log import ActivityLog, ActivityAction
+    from app.models.activity_log import ActivityAction
     
     service = PermissionService(db)
     
@@ -270,20 +271,18 @@ def grant_permission(
         role = db.get(Role, role_id)
         
         # Log permission grant
-        activity_log = ActivityLog(
-            action="grant",
+        get_audit_log_writer().record(
+            user_id=current_user.id,
+            action=ActivityAction.UPDATE,
             resource_type="permission",
             resource_id=str(role_permission.id),
-            user_id=current_user.id,
             details={
+                "operation": "grant",
                 "permission": request.permission_name,
                 "role": role.name if role else str(role_id),
                 "granted_by": current_user.email
-            },
-            timestamp=datetime.utcnow()
+            }
         )
-        db.add(activity_log)
-        db.commit()
         
         return {
             "message": f"Permission '{request.permission_name}' granted successfully",
@@ -306,7 +305,7 @@ def revoke_permission(
     current_user: User = Depends(get_current_active_superuser)
 ):
     """Revoke a specific permission from a role"""
-    from app.models.activity_log import ActivityLog, ActivityAction
+    from app.models.activity_log import ActivityAction
     
     service = PermissionService(db)
     
@@ -321,20 +320,18 @@ def revoke_permission(
     
     if success:
         # Log permission revoke
-        activity_log = ActivityLog(
-            action="revoke",
+        get_audit_log_writer().record(
+            user_id=current_user.id,
+            action=ActivityAction.UPDATE,
             resource_type="permission",
             resource_id=str(role_id),
-            user_id=current_user.id,
             details={
+                "operation": "revoke",
                 "permission": permission_name,
                 "role": role.name if role else str(role_id),
                 "revoked_by": current_user.email
-            },
-            timestamp=datetime.utcnow()
+            }
         )
-        db.add(activity_log)
-        db.commit()
         
         return {"message": f"Permission '{permission_name}' revoked successfully"}
     else:
@@ -352,7 +349,7 @@ def assign_role_to_user(
     current_user: User = Depends(get_current_user)
 ):
     """Assign a role to a user"""
-    from app.models.activity_log import ActivityLog, ActivityAction
+    from app.models.activity_log import ActivityAction
     
     service = PermissionService(db)
     
@@ -377,22 +374,20 @@ def assign_role_to_user(
         assigned_user = db.get(User, assignment.user_id)
         
         # Log role assignment
-        activity_log = ActivityLog(
-            action="grant",
+        get_audit_log_writer().record(
+            user_id=current_user.id,
+            action=ActivityAction.UPDATE,
             resource_type="role",
             resource_id=str(assignment.user_id),
-            user_id=current_user.id,
             details={
+                "operation": "grant",
                 "role": assignment.role_name,
                 "assigned_to": assigned_user.email if assigned_user else str(assignment.user_id),
                 "assigned_by": current_user.email,
                 "organization_id": str(assignment.organization_id) if assignment.organization_id else None,
                 "study_id": str(assignment.study_id) if assignment.study_id else None
-            },
-            timestamp=datetime.utcnow()
+            }
         )
-        db.add(activity_log)
-        db.commit()
         
         return {
             "message": f"Role '{assignment.role_name}' assigned successfully",
@@ -1,8 +1,10 @@
 # ABOUTME: Runtime dashboard endpoints for end users to access dashboard configurations and widget data
 # ABOUTME: Provides study-specific dashboard access with permission checks and data loading
 
+import json
 from typing import List, Dict, Any, Optional
 from fastapi import APIRouter, Depends, HTTPException, status, Query, Body
+from fastapi.responses import StreamingResponse
 from sqlmodel import Session, select
 from datetime import datetime
 from uuid import UUID
@@ -14,12 +16,14 @@ from app.models import (
     Study,
     StudyDashboard,
     DashboardTemplate,
-    DashboardWidget,
-    MenuTemplate
+    MenuTemplate,
+    WidgetDefinition
 )
 from app.core.permissions import Permission, has_permission
 from app.crud import dashboard as crud_dashboard
 from app.crud import menu as crud_menu
+from app.services.widget_batch_executor import BatchWidget, WidgetBatchExecutor
+from app.services.widget_data_executor_real import WidgetDataResponse as ExecutorResponse
 
 router = APIRouter()
 
@@ -37,13 +41,13 @@ class StudyDashboardResponse(BaseModel):
 
 
 class WidgetDataRequest(BaseModel):
-    widget_ids: List[UUID] = Field(..., description="List of widget IDs to load data for")
+    widget_ids: List[str] = Field(..., description="List of widget instance IDs to load data for")
     time_range: Optional[str] = Field(None, description="Time range filter (e.g., '1w', '1m', '3m')")
     filters: Optional[Dict[str, Any]] = Field(None, description="Additional filters to apply")
 
 
 class WidgetDataResponse(BaseModel):
-    widget_id: UUID
+    widget_id: str
     data: Dict[str, Any]
     metadata: Optional[Dict[str, Any]] = None
     last_updated: datetime
@@ -235,124 +239,40 @@ async def get_study_dashboard(
 async def get_widget_data(
     study_id: UUID,
     request: WidgetDataRequest,
+    stream: bool = Query(False, description="Stream results as NDJSON as each widget completes"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ) -> Any:
     """
     Load data for multiple widgets in a batch.
     
-    This endpoint loads actual data for widgets based on their configurations
-    and the study's available datasets.
+    Widgets are resolved from the study's dashboard template in one pass,
+    widgets reading the same dataset share a single scan of it, and
+    independent datasets are processed concurrently. With stream=true each
+    widget's result is written as one NDJSON line as soon as it is ready.
     """
     # Check study access
     study = check_study_access(db, study_id, current_user, Permission.VIEW_DATA)
     
-    # TODO: Import the widget_data CRUD module once created
-    # from app.crud import widget_data as crud_widget_data
+    widgets, errors = load_batch_widgets(db, study, request.widget_ids)
+    executor = WidgetBatchExecutor(db, study)
     
-    widget_responses = []
-    errors = []
+    if stream:
+        async def ndjson_lines():
+            for error in errors:
+                yield json.dumps({"widget_id": error["widget_id"], "data": {}, "error": error["error"]}) + "\n"
+            async for result in executor.execute_as_completed(widgets):
+                response = to_widget_data_response(result, study_id, request)
+                yield response.model_dump_json() + "\n"
+        
+        return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
     
-    for widget_id in request.widget_ids:
-        try:
-            # Get widget configuration
-            widget = db.get(DashboardWidget, widget_id)
-            if not widget:
-                errors.append({
-                    "widget_id": str(widget_id),
-                    "error": "Widget not found"
-                })
-                continue
-            
-            # TODO: Load actual data using widget_data CRUD
-            # For now, return mock data based on widget type
-            widget_def = widget.widget_definition
-            
-            # Generate mock data based on widget category
-            mock_data = {}
-            if widget_def.category == "metrics":
-                mock_data = {
-                    "value": 342,
-                    "previous_value": 298,
-                    "change": 44,
-                    "change_percent": 14.77,
-                    "trend": "up",
-                    "calculation": widget.instance_config.get("calculation", "count"),
-                    "dataset": widget.instance_config.get("dataset", "ADSL"),
-                    "field": widget.instance_config.get("field", "USUBJID")
-                }
-            elif widget_def.category == "charts":
-                mock_data = {
-                    "labels": ["Week 1", "Week 2", "Week 3", "Week 4"],
-                    "datasets": [
-                        {
-                            "label": "Treatment A",
-                            "data": [25, 45, 78, 95],
-                            "borderColor": "#3b82f6",
-                            "backgroundColor": "rgba(59, 130, 246, 0.1)"
-                        },
-                        {
-                            "label": "Treatment B",
-                            "data": [22, 41, 73, 89],
-                            "borderColor": "#ef4444",
-                            "backgroundColor": "rgba(239, 68, 68, 0.1)"
-                        }
-                    ],
-                    "xAxis": widget.instance_config.get("xAxis", "Time"),
-                    "yAxis": widget.instance_config.get("yAxis", "Count")
-                }
-            elif widget_def.category == "tables":
-                mock_data = {
-                    "headers": ["Subject ID", "Site", "Status", "Enrollment Date"],
-                    "rows": [
-                        ["001-001", "Site 01", "Active", "2024-01-15"],
-                        ["001-002", "Site 01", "Active", "2024-01-16"],
-                        ["002-001", "Site 02", "Completed", "2024-01-10"],
-                        ["002-002", "Site 02", "Active", "2024-01-12"],
-                        ["003-001", "Site 03", "Screening", "2024-01-18"]
-                    ],
-                    "total_count": 150,
-                    "page": 1,
-                    "page_size": 5
-                }
-            
-            # Apply time range filter if provided
-            if request.time_range:
-                mock_data["time_range"] = request.time_range
-            
-            # Apply additional filters if provided
-            if request.filters:
-                mock_data["applied_filters"] = request.filters
-            
-            widget_response = WidgetDataResponse(
-                widget_id=widget_id,
-                data=mock_data,
-                metadata={
-                    "widget_type": widget_def.code,
-                    "widget_name": widget_def.name,
-                    "study_id": str(study_id),
-                    "time_range": request.time_range
-                },
-                last_updated=datetime.utcnow()
-            )
-            
-            widget_responses.append(widget_response)
-            
-        except Exception as e:
-            errors.append({
-                "widget_id": str(widget_id),
-                "error": str(e)
-            })
-            
-            # Still create a response with error
-            widget_responses.append(
-                WidgetDataResponse(
-                    widget_id=widget_id,
-                    data={},
-                    last_updated=datetime.utcnow(),
-                    error=str(e)
-                )
-            )
+    widget_responses = []
+    for result in await executor.execute(widgets):
+        response = to_widget_data_response(result, study_id, request)
+        if response.error:
+            errors.append({"widget_id": response.widget_id, "error": response.error})
+        widget_responses.append(response)
     
     return BatchWidgetDataResponse(
         widgets=widget_responses,
@@ -360,6 +280,102 @@ async def get_widget_data(
     )
 
 
+def load_batch_widgets(
+    db: Session,
+    study: Study,
+    widget_ids: List[str]
+) -> tuple[List[BatchWidget], List[Dict[str, str]]]:
+    """
+    Resolve requested widget instances from the study's dashboard template.
+    
+    Issues one query for the template and one for all referenced widget
+    definitions, regardless of how many widgets are requested.
+    """
+    from app.api.v1.endpoints.studies import process_widget_for_runtime
+    
+    errors = []
+    template = db.get(DashboardTemplate, study.dashboard_template_id) if study.dashboard_template_id else None
+    if not template:
+        return [], [{"widget_id": widget_id, "error": "Widget not found"} for widget_id in widget_ids]
+    
+    template_structure = template.template_structure or {}
+    menu_config = template_structure.get("menu_structure", template_structure.get("menu", {}))
+    field_mappings = study.field_mappings or {}
+    widget_overrides = (study.template_overrides or {}).get("widget_overrides", {})
+    
+    # Index every widget instance in the template by its ID
+    instances: Dict[str, Any] = {}
+    
+    def collect(items: List[Dict[str, Any]]) -> None:
+        for item in items:
+            if item.get("type") in ["dashboard", "dashboard_page"]:
+                dashboard_config = item.get("dashboard", {"widgets": item.get("widgets", [])})
+                for widget in dashboard_config.get("widgets", []):
+                    runtime_widget = process_widget_for_runtime(widget, field_mappings, widget_overrides)
+                    instances[runtime_widget.instance_config["id"]] = runtime_widget
+            if "children" in item:
+                collect(item["children"])
+    
+    collect(menu_config.get("items", []))
+    
+    requested = []
+    for widget_id in widget_ids:
+        if widget_id in instances:
+            requested.append(instances[widget_id])
+        else:
+            errors.append({"widget_id": widget_id, "error": "Widget not found"})
+    
+    # Load all widget definitions in one query
+    codes = {widget.widget_code for widget in requested}
+    definitions = {
+        definition.code: definition
+        for definition in db.exec(
+            select(WidgetDefinition).where(WidgetDefinition.code.in_(codes))
+        ).all()
+    } if codes else {}
+    
+    widgets = []
+    for widget in requested:
+        widget_id = widget.instance_config["id"]
+        definition = definitions.get(widget.widget_code)
+        if not definition:
+            errors.append({"widget_id": widget_id, "error": "Widget definition not found"})
+            continue
+        widgets.append(BatchWidget(widget_id=widget_id, widget_def=definition, config=widget.instance_config))
+    
+    return widgets, errors
+
+
+def to_widget_data_response(
+    result: ExecutorResponse,
+    study_id: UUID,
+    request: WidgetDataRequest
+) -> WidgetDataResponse:
+    """Convert an executor result into the runtime response model"""
+    data = result.data if isinstance(result.data, dict) else {}
+    
+    # Apply time range filter if provided
+    if request.time_range:
+        data["time_range"] = request.time_range
+    
+    # Apply additional filters if provided
+    if request.filters:
+        data["applied_filters"] = request.filters
+    
+    return WidgetDataResponse(
+        widget_id=result.widget_id,
+        data=data,
+        metadata={
+            **result.metadata,
+            "study_id": str(study_id),
+            "time_range": request.time_range,
+            "execution_time_ms": result.execution_time_ms
+        },
+        last_updated=datetime.utcnow(),
+        error=result.error
+    )
+
+
 @router.get("/{study_id}/dashboard-config")
 async def get_study_dashboard_config(
     study_id: UUID,
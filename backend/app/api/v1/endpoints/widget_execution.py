@@ -1,8 +1,8 @@
 # ABOUTME: API endpoints for widget execution and data retrieval
-# ABOUTME: Handles widget engine instantiation, query execution, and result caching
+# ABOUTME: Handles widget engine instantiation, shared-scan query execution, and result caching
 
-from typing import Any, Dict, List, Optional
-from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime, timedelta
 from uuid import UUID
 
 from fastapi import APIRouter, Depends, HTTPException, Query, Body
@@ -12,6 +12,7 @@ from pydantic import BaseModel
 from app.api import deps
 from app.models import User, WidgetDefinition, Study, WidgetDataMapping
 from app.core.config import settings
+from app.services.parquet_query_engine import ParquetQueryEngine
 from app.services.widget_engines.kpi_metric_card import KPIMetricCardEngine
 from app.services.widget_engines.time_series_chart import TimeSeriesChartEngine
 from app.services.widget_engines.distribution_chart import DistributionChartEngine
@@ -38,6 +39,15 @@ class WidgetDataResponse(BaseModel):
     execution_time_ms: int
     cached: bool
     cache_expires_at: Optional[datetime] = None
+    error: Optional[str] = None
+
+
+class WidgetBatchExecutionRequest(BaseModel):
+    """Request model for executing several widgets of one study"""
+    study_id: UUID
+    widget_ids: List[UUID]
+    filters: Optional[Dict[str, Any]] = {}
+    force_refresh: bool = False
 
 
 class WidgetValidationRequest(BaseModel):
@@ -74,35 +84,10 @@ def get_widget_engine(widget_type: str, widget_id: UUID, study_id: UUID, mapping
     )
 
 
-@router.post("/execute", response_model=WidgetDataResponse)
-def execute_widget(
-    *,
-    db: Session = Depends(deps.get_db),
-    request: WidgetExecutionRequest,
-    current_user: User = Depends(deps.get_current_active_user)
-) -> Any:
-    """
-    Execute a widget and return its data.
-    
-    This endpoint:
-    1. Validates user access to the widget and study
-    2. Retrieves the widget configuration and data mapping
-    3. Instantiates the appropriate widget engine
-    4. Executes the query (with caching if not force_refresh)
-    5. Returns the formatted widget data
-    """
-    
-    # Get widget
-    widget = db.exec(
-        select(WidgetDefinition).where(WidgetDefinition.id == request.widget_id)
-    ).first()
-    
-    if not widget:
-        raise HTTPException(status_code=404, detail="Widget not found")
-    
-    # Get study and verify access
+def get_accessible_study(db: Session, study_id: UUID, current_user: User) -> Study:
+    """Load a study, checking the user belongs to its organization"""
     study = db.exec(
-        select(Study).where(Study.id == request.study_id)
+        select(Study).where(Study.id == study_id)
     ).first()
     
     if not study:
@@ -113,11 +98,29 @@ def execute_widget(
         if study.org_id != current_user.org_id:
             raise HTTPException(status_code=403, detail="Access denied to this study")
     
+    return study
+
+
+def get_mapped_widget_engine(
+    db: Session,
+    study: Study,
+    widget_id: UUID,
+    filters: Optional[Dict[str, Any]] = None,
+    parameters: Optional[Dict[str, Any]] = None
+) -> Tuple[WidgetDefinition, Any]:
+    """Widget definition and its engine for the study's data mapping, with request filters applied"""
+    widget = db.exec(
+        select(WidgetDefinition).where(WidgetDefinition.id == widget_id)
+    ).first()
+    
+    if not widget:
+        raise HTTPException(status_code=404, detail="Widget not found")
+    
     # Get data mapping for this widget and study
     data_mapping = db.exec(
         select(WidgetDataMapping).where(
-            WidgetDataMapping.widget_definition_id == request.widget_id,
-            WidgetDataMapping.study_id == request.study_id
+            WidgetDataMapping.widget_definition_id == widget_id,
+            WidgetDataMapping.study_id == study.id
         )
     ).first()
     
@@ -129,13 +132,13 @@ def execute_widget(
     
     # Merge mapping config with request parameters
     mapping_config = data_mapping.field_mappings.copy()
-    if request.parameters:
-        mapping_config.update(request.parameters)
+    if parameters:
+        mapping_config.update(parameters)
     
     # Get appropriate widget engine
     try:
         engine = get_widget_engine(
-            widget_type=widget.type,
+            widget_type=widget.code,
             widget_id=widget.id,
             study_id=study.id,
             mapping_config=mapping_config
@@ -144,84 +147,138 @@ def execute_widget(
         raise HTTPException(status_code=400, detail=str(e))
     
     # Add filters from request
-    if request.filters:
-        for field, conditions in request.filters.items():
-            if isinstance(conditions, dict):
-                for operator, value in conditions.items():
-                    engine.add_filter(field, operator, value)
-            else:
-                # Simple equality filter
-                engine.add_filter(field, "equals", conditions)
-    
-    # Check cache unless force refresh
-    cached_data = None
-    cache_expires_at = None
-    
-    # TODO: Implement caching with QueryCache model
-    # if not request.force_refresh:
-    #     cached_data = engine.check_cache(db)
-    #     if cached_data:
-    #         # Get cache expiry
-    #         cache_key = engine.get_cache_key()
-    #         cache_entry = db.exec(
-    #             select(QueryCache).where(QueryCache.cache_key == cache_key)
-    #         ).first()
-    #         if cache_entry:
-    #             cache_expires_at = cache_entry.expires_at
-    
-    if cached_data:
-        # Return cached data
-        return WidgetDataResponse(
-            widget_type=widget.type,
-            data=cached_data,
-            metadata={
-                "widget_id": str(widget.id),
-                "study_id": str(study.id),
-                "from_cache": True
-            },
-            execution_time_ms=0,
-            cached=True,
-            cache_expires_at=cache_expires_at
-        )
+    for field, conditions in (filters or {}).items():
+        if isinstance(conditions, dict):
+            for operator, value in conditions.items():
+                engine.add_filter(field, operator, value)
+        else:
+            # Simple equality filter
+            engine.add_filter(field, "equals", conditions)
+    
+    return widget, engine
+
+
+def execute_widget_engines(
+    db: Session,
+    study: Study,
+    widgets: List[Tuple[WidgetDefinition, Any]],
+    force_refresh: bool = False
+) -> List[WidgetDataResponse]:
+    """
+    Execute widgets, serving cached results where possible
     
-    # Execute query
-    try:
-        start_time = datetime.utcnow()
-        
-        # For real implementation, this would execute against actual database
-        # For now, return mock data based on widget type
-        mock_data = generate_mock_data(widget.widget_type, mapping_config)
-        transformed_data = engine.transform_results(mock_data)
-        
-        execution_time_ms = int((datetime.utcnow() - start_time).total_seconds() * 1000)
-        
-        # TODO: Save to cache
-        # engine.save_to_cache(db, transformed_data, execution_time_ms)
-        
-        # TODO: Get cache expiry
-        # cache_key = engine.get_cache_key()
-        # cache_entry = db.exec(
-        #     select(QueryCache).where(QueryCache.cache_key == cache_key)
-        # ).first()
-        # if cache_entry:
-        #     cache_expires_at = cache_entry.expires_at
+    Widgets that miss the cache run together through the scan planner, so
+    widgets over the same dataset and filters share one scan, and concurrent
+    requests needing the same scan wait for one execution of it.
+    """
+    responses: Dict[str, WidgetDataResponse] = {}
+    pending = []
+    
+    for widget, engine in widgets:
+        cache_entry = None if force_refresh else engine.check_cache(db)
+        if cache_entry:
+            responses[str(widget.id)] = WidgetDataResponse(
+                widget_type=widget.code,
+                data=cache_entry["data"],
+                metadata={
+                    "widget_id": str(widget.id),
+                    "study_id": str(study.id),
+                    "from_cache": True
+                },
+                execution_time_ms=0,
+                cached=True,
+                cache_expires_at=datetime.fromisoformat(cache_entry["expires_at"])
+            )
+        else:
+            pending.append((widget, engine))
+    
+    if pending:
+        try:
+            results = ParquetQueryEngine(db).execute_widget_engines(
+                study, [engine for _, engine in pending], force_refresh
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=404, detail=f"{e} for this study")
         
-        return WidgetDataResponse(
-            widget_type=widget.type,
-            data=transformed_data,
-            metadata={
+        for widget, engine in pending:
+            result = results[str(engine.widget_id)]
+            metadata = {
                 "widget_id": str(widget.id),
                 "study_id": str(study.id),
                 "from_cache": False,
-                "query_executed": True
-            },
-            execution_time_ms=execution_time_ms,
-            cached=False,
-            cache_expires_at=cache_expires_at
-        )
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Widget execution failed: {str(e)}")
+                "query_executed": True,
+                "shared_scan_size": result["shared_scan_size"]
+            }
+            if result.get("error"):
+                responses[str(widget.id)] = WidgetDataResponse(
+                    widget_type=widget.code,
+                    data={},
+                    metadata=metadata,
+                    execution_time_ms=result["execution_time_ms"],
+                    cached=False,
+                    error=result["error"]
+                )
+                continue
+            
+            engine.save_to_cache(db, result["data"], result["execution_time_ms"])
+            responses[str(widget.id)] = WidgetDataResponse(
+                widget_type=widget.code,
+                data=result["data"],
+                metadata=metadata,
+                execution_time_ms=result["execution_time_ms"],
+                cached=False,
+                cache_expires_at=datetime.utcnow() + timedelta(seconds=engine.cache_ttl)
+            )
+    
+    return [responses[str(widget.id)] for widget, _ in widgets]
+
+
+@router.post("/execute", response_model=WidgetDataResponse)
+def execute_widget(
+    *,
+    db: Session = Depends(deps.get_db),
+    request: WidgetExecutionRequest,
+    current_user: User = Depends(deps.get_current_active_user)
+) -> Any:
+    """
+    Execute a widget and return its data.
+    
+    This endpoint:
+    1. Validates user access to the widget and study
+    2. Retrieves the widget configuration and data mapping
+    3. Instantiates the appropriate widget engine
+    4. Executes the query over the study's datasets (with caching if not force_refresh)
+    5. Returns the formatted widget data
+    """
+    study = get_accessible_study(db, request.study_id, current_user)
+    mapped = get_mapped_widget_engine(db, study, request.widget_id, request.filters, request.parameters)
+    
+    response = execute_widget_engines(db, study, [mapped], request.force_refresh)[0]
+    if response.error:
+        raise HTTPException(status_code=500, detail=f"Widget execution failed: {response.error}")
+    return response
+
+
+@router.post("/execute-batch", response_model=List[WidgetDataResponse])
+def execute_widget_batch(
+    *,
+    db: Session = Depends(deps.get_db),
+    request: WidgetBatchExecutionRequest,
+    current_user: User = Depends(deps.get_current_active_user)
+) -> Any:
+    """
+    Execute several widgets of one study and return their data in request order.
+    
+    Widgets aggregating the same dataset under the same filters are computed
+    in a single scan. A widget whose query fails gets a response with its
+    error instead of failing the batch.
+    """
+    study = get_accessible_study(db, request.study_id, current_user)
+    widgets = [
+        get_mapped_widget_engine(db, study, widget_id, request.filters)
+        for widget_id in request.widget_ids
+    ]
+    return execute_widget_engines(db, study, widgets, request.force_refresh)
 
 
 @router.post("/validate", response_model=WidgetValidationResponse)
@@ -387,44 +444,3 @@ def clear_widget_cache(
         "study_id": str(study_id),
         "widget_id": str(widget_id) if widget_id else None
     }
-
-
-def generate_mock_data(widget_type: str, mapping_config: Dict) -> List[Dict]:
-    """Generate mock data for testing widgets"""
-    
-    if widget_type == "kpi_metric_card":
-        return [{"value": 156, "group_name": "Active"}]
-    
-    elif widget_type == "time_series_chart":
-        return [
-            {"period": "2024-01", "value": 45, "series": "Treatment"},
-            {"period": "2024-02", "value": 52, "series": "Treatment"},
-            {"period": "2024-03", "value": 58, "series": "Treatment"},
-            {"period": "2024-01", "value": 38, "series": "Control"},
-            {"period": "2024-02", "value": 41, "series": "Control"},
-            {"period": "2024-03", "value": 43, "series": "Control"}
-        ]
-    
-    elif widget_type == "distribution_chart":
-        return [
-            {"category": "Site A", "value": 45},
-            {"category": "Site B", "value": 38},
-            {"category": "Site C", "value": 52},
-            {"category": "Site D", "value": 31}
-        ]
-    
-    elif widget_type == "data_table":
-        return [
-            {"row_id": "S001", "subject_id": "S001", "visit_date": "2024-01-15", "status": "Active"},
-            {"row_id": "S002", "subject_id": "S002", "visit_date": "2024-01-18", "status": "Active"},
-            {"row_id": "S003", "subject_id": "S003", "visit_date": "2024-01-22", "status": "Completed"}
-        ]
-    
-    elif widget_type == "subject_timeline":
-        return [
-            {"subject_id": "S001", "event_date": "2024-01-01", "event_type": "Screening", "event_category": "Visit"},
-            {"subject_id": "S001", "event_date": "2024-01-15", "event_type": "Baseline", "event_category": "Visit"},
-            {"subject_id": "S001", "event_date": "2024-02-15", "event_type": "Follow-up", "event_category": "Visit"}
-        ]
-    
-    return []
\ No newline at end of file
@@ -525,4 +525,8 @@ async def get_filter_metrics(
         limit=limit
     )
     
-    return {"metrics": metrics}
\ No newline at end of file
+    return {
+        "metrics": metrics,
+        "filter_cache": executor.get_cache_metrics(),
+        "metrics_writer": executor.metrics_writer.get_stats()
+    }
\ No newline at end of file
@@ -18,6 +18,7 @@ from app.models.data_mapping import (
 )
 from app.models import Study, WidgetDefinition, DataSourceUpload
 from app.clinical_modules.utils.folder_structure import get_study_data_path
+from app.services.dataset_statistics import get_statistics
 import logging
 
 logger = logging.getLogger(__name__)
@@ -69,33 +70,28 @@ class MappingService:
                     parquet_file = data_path / file_info['parquet_path'].split('/')[-1]
                     
                     if parquet_file.exists():
-                        # Read schema
-                        df = pd.read_parquet(parquet_file, engine='pyarrow')
+                        # Column statistics come from the sidecar written at conversion
+                        statistics = get_statistics(parquet_file)
                         
                         schema = {
                             'columns': {},
-                            'row_count': len(df),
+                            'row_count': statistics['row_count'],
                             'last_updated': upload.upload_timestamp.isoformat(),
                             'upload_id': str(upload.id)
                         }
                         
                         # Analyze columns
-                        for col in df.columns:
+                        for col, details in statistics['columns'].items():
                             col_info = {
-                                'type': self._infer_data_type(df[col]),
-                                'nullable': df[col].isnull().any(),
-                                'unique_count': df[col].nunique(),
-                                'sample_values': df[col].dropna().head(5).tolist()
+                                'type': self._profile_data_type(details['type']),
+                                'nullable': details['null_count'] > 0,
+                                'unique_count': details['unique_count'],
+                                'sample_values': self._sample_values(col, details, statistics['sample_data'])
                             }
                             
                             # Add statistics for numeric columns
-                            if col_info['type'] == 'number':
-                                col_info['stats'] = {
-                                    'min': float(df[col].min()),
-                                    'max': float(df[col].max()),
-                                    'mean': float(df[col].mean()),
-                                    'std': float(df[col].std())
-                                }
+                            if col_info['type'] == 'number' and 'stats' in details:
+                                col_info['stats'] = details['stats']
                             
                             schema['columns'][col] = col_info
                         
@@ -217,6 +213,18 @@ class MappingService:
         
         return best_match if best_score > 0.3 else None
     
+    @staticmethod
+    def _profile_data_type(profile_type: str) -> str:
+        """Map a column profile's type onto the types used for mapping"""
+        return {'integer': 'number', 'numeric': 'number'}.get(profile_type, profile_type)
+    
+    @staticmethod
+    def _sample_values(column: str, details: Dict[str, Any], sample_data: List[Dict[str, Any]]) -> List[Any]:
+        """Up to five example values, most frequent first"""
+        if details.get('top_values'):
+            return [entry['value'] for entry in details['top_values'][:5]]
+        return [row[column] for row in sample_data if row.get(column) not in (None, '')][:5]
+    
     def _infer_data_type(self, series: pd.Series) -> str:
         """Infer data type from pandas series"""
         # Remove nulls for type checking
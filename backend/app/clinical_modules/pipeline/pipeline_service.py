@@ -142,9 +142,7 @@ class PipelineService:
         if script_type == TransformationType.PYTHON_SCRIPT:
             return self.script_executor.validator.validate(script_content)
         elif script_type == TransformationType.SQL_QUERY:
-            # Basic SQL validation
-            # TODO: Implement SQL validation
-            return True, []
+            return self.script_executor.sql_validator.validate(script_content)
         else:
             return False, ["Unsupported script type"]
     
@@ -360,6 +358,15 @@ class PipelineExecutor:
                 
                 metadata = {'filters_applied': len(conditions)}
                 
+            elif step_config['type'] == TransformationType.SQL_QUERY:
+                # The step's input is the table "df", as it is for Python scripts
+                output_data = self.script_executor.execute_sql_transform(
+                    step_config.get('script_content', ''),
+                    {'df': input_data},
+                    resource_limits=step_config.get('resource_limits')
+                )
+                metadata = {'output_columns': len(output_data.columns)}
+                
             else:
                 raise ValueError(f"Unsupported step type: {step_config['type']}")
             
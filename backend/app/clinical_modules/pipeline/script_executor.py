@@ -5,12 +5,17 @@ import ast
 import hashlib
 import pandas as pd
 import numpy as np
+import pyarrow as pa
 import re
 import json
 import io
+import os
 import sys
+import tempfile
+import threading
 import traceback
-from typing import Dict, Any, List, Optional, Tuple
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple, Union
 from datetime import datetime
 from contextlib import contextmanager
 import resource
@@ -19,6 +24,11 @@ import multiprocessing
 from functools import wraps
 import builtins
 
+import duckdb
+
+from app.core.config import settings
+from app.services.streaming_converter import ConversionStats, StreamingParquetConverter
+
 # Allowed built-in functions in the sandbox
 SAFE_BUILTINS = {
     'abs', 'all', 'any', 'ascii', 'bin', 'bool', 'chr', 'dict', 
@@ -39,6 +49,12 @@ SAFE_MODULES = {
     'math': ['ceil', 'floor', 'sqrt', 'log', 'exp', 'sin', 'cos', 'tan'],
 }
 
+# Statement types a SQL transformation may run; file access, extensions and settings are refused
+SQL_ALLOWED_STATEMENTS = {'SELECT', 'CREATE', 'INSERT', 'UPDATE', 'DELETE', 'DROP'}
+
+# Rows per Arrow batch when streaming a SQL result to parquet
+SQL_BATCH_ROWS = 100000
+
 class SecurityError(Exception):
     """Raised when script violates security constraints"""
     pass
@@ -89,6 +105,32 @@ class ScriptValidator:
         
         return len(errors) == 0, errors
 
+class SQLValidator:
+    """Validates SQL transformation scripts for DuckDB"""
+    
+    def validate(self, script: str) -> Tuple[bool, List[str]]:
+        """
+        Validate a script: any number of statements ending in a query
+        Returns: (is_valid, list_of_errors)
+        """
+        try:
+            statements = duckdb.connect().extract_statements(script)
+        except duckdb.Error as e:
+            return False, [f"Syntax error: {str(e)}"]
+        
+        if not statements:
+            return False, ["Script contains no statements"]
+        
+        errors = [
+            f"Statement {idx + 1}: {statement.type.name} statements are not allowed"
+            for idx, statement in enumerate(statements)
+            if statement.type.name not in SQL_ALLOWED_STATEMENTS
+        ]
+        if statements[-1].type.name != 'SELECT':
+            errors.append("The last statement must be a query producing the output dataset")
+        
+        return len(errors) == 0, errors
+
 class SandboxedEnvironment:
     """Creates a sandboxed execution environment"""
     
@@ -158,6 +200,7 @@ class TransformationScriptExecutor:
     
     def __init__(self):
         self.validator = ScriptValidator()
+        self.sql_validator = SQLValidator()
         self.sandbox = SandboxedEnvironment()
     
     def execute_script(self, script: str, input_data: pd.DataFrame, 
@@ -259,26 +302,125 @@ class TransformationScriptExecutor:
         """Generate SHA256 hash of script for integrity checking"""
         return hashlib.sha256(script.encode()).hexdigest()
     
-    def execute_sql_transform(self, sql_query: str, datasets: Dict[str, pd.DataFrame]) -> pd.DataFrame:
+    @contextmanager
+    def sql_session(self, datasets: Dict[str, Union[str, Path, pd.DataFrame]],
+                    resource_limits: Dict[str, Any] = None):
+        """
+        DuckDB connection with the datasets as views and nothing else reachable
+        
+        Parquet datasets are read in place; the connection may read only those
+        files and spill only to its own temp directory, with memory, threads
+        and wall time capped and the configuration locked against the script.
+        """
+        limits = {**self.sandbox.resource_limits, **(resource_limits or {})}
+        memory_mb = limits['max_memory_mb']
+        threads = limits.get('max_threads', settings.DUCKDB_THREADS)
+        
+        with tempfile.TemporaryDirectory(prefix="sql_spill_") as spill_dir:
+            con = duckdb.connect(config={'threads': threads, 'memory_limit': f"{memory_mb}MB"})
+            timer = threading.Timer(limits['max_execution_time_seconds'], con.interrupt)
+            try:
+                allowed_paths = []
+                for name, source in datasets.items():
+                    if isinstance(source, pd.DataFrame):
+                        con.register(name, source)
+                        continue
+                    path = str(Path(source).resolve())
+                    escaped_path = path.replace("'", "''")
+                    con.execute(f'CREATE VIEW "{name}" AS SELECT * FROM read_parquet(\'{escaped_path}\')')
+                    allowed_paths.append(path)
+                
+                con.execute("SET temp_directory = ?", [spill_dir])
+                con.execute("SET allowed_directories = ?", [[spill_dir + os.sep]])
+                con.execute("SET allowed_paths = ?", [allowed_paths])
+                con.execute("SET enable_external_access = false")
+                con.execute("SET lock_configuration = true")
+                
+                timer.start()
+                yield con
+            except duckdb.InterruptException:
+                raise ResourceLimitError("SQL execution timeout")
+            finally:
+                timer.cancel()
+                con.close()
+    
+    def run_sql_script(self, con: duckdb.DuckDBPyConnection, sql_script: str) -> str:
+        """Run every statement but the last and return the last, the query producing the output"""
+        is_valid, errors = self.sql_validator.validate(sql_script)
+        if not is_valid:
+            raise SecurityError(f"SQL validation failed: {'; '.join(errors)}")
+        
+        statements = con.extract_statements(sql_script)
+        for statement in statements[:-1]:
+            con.execute(statement.query)
+        return statements[-1].query
+    
+    def execute_sql_to_parquet(self, sql_script: str, datasets: Dict[str, Union[str, Path]],
+                               output_path: Union[str, Path], dataset_name: Optional[str] = None,
+                               resource_limits: Dict[str, Any] = None) -> Tuple[ConversionStats, Dict[str, Any]]:
         """
-        Execute SQL transformation using pandas
+        Run a SQL transformation over parquet datasets and write its result to parquet
+        
+        The result is streamed from DuckDB as Arrow batches into the shared
+        streaming writer, so it never becomes a DataFrame and is laid out and
+        profiled like every other dataset.
         
         Args:
-            sql_query: SQL query to execute
-            datasets: Dictionary of dataset name -> DataFrame
+            sql_script: Statements ending in the query that produces the dataset
+            datasets: Dataset name -> parquet path, visible to the script as views
+            output_path: Parquet file to write
+            dataset_name: Name used to pick sort keys; defaults to the file name
+            resource_limits: max_memory_mb, max_threads and max_execution_time_seconds
             
         Returns:
-            Result DataFrame
+            Tuple of (conversion_stats, execution_metadata)
+        """
+        limits = {**self.sandbox.resource_limits, **(resource_limits or {})}
+        start_time = datetime.utcnow()
+        execution_metadata = {'start_time': start_time.isoformat(), 'input_datasets': sorted(datasets)}
+        
+        try:
+            with self.sql_session(datasets, limits) as con:
+                query = self.run_sql_script(con, sql_script)
+                reader = con.execute(query).to_arrow_reader(SQL_BATCH_ROWS)
+                converter = StreamingParquetConverter(memory_limit_mb=limits['max_memory_mb'])
+                stats = converter.write_tables(
+                    output_path, (pa.Table.from_batches([batch]) for batch in reader), dataset=dataset_name
+                )
+        except Exception as e:
+            execution_metadata.update({
+                'error': str(e),
+                'error_type': 'resource_limit' if isinstance(e, ResourceLimitError) else type(e).__name__,
+                'success': False
+            })
+            raise
+        
+        end_time = datetime.utcnow()
+        execution_metadata.update({
+            'end_time': end_time.isoformat(),
+            'duration_seconds': (end_time - start_time).total_seconds(),
+            'output_rows': stats.rows,
+            'output_columns': stats.columns,
+            'success': True
+        })
+        return stats, execution_metadata
+    
+    def execute_sql_transform(self, sql_query: str, datasets: Dict[str, Union[pd.DataFrame, str, Path]],
+                              resource_limits: Dict[str, Any] = None) -> pd.DataFrame:
         """
-        # Register datasets as temporary tables
-        for name, df in datasets.items():
-            # Use pandasql or duckdb for SQL execution
-            # For now, return a placeholder
-            pass
+        Execute SQL transformation using DuckDB
         
-        # This would use a SQL engine like DuckDB or pandasql
-        # Placeholder implementation
-        return list(datasets.values())[0] if datasets else pd.DataFrame()
+        Args:
+            sql_query: Statements ending in the query that produces the result
+            datasets: Dictionary of dataset name -> DataFrame or parquet path
+            resource_limits: Resource limits for execution
+            
+        Returns:
+            Result DataFrame
+        """
+        with self.sql_session(datasets, resource_limits) as con:
+            query = self.run_sql_script(con, sql_query)
+            return con.execute(query).df()
 
 # Example transformation scripts
 EXAMPLE_SCRIPTS = {
@@ -88,4 +88,36 @@ def validate_timestamp_format(timestamp: str) -> bool:
     """
     import re
     pattern = re.compile(r'^[0-9]{8}_[0-9]{6}$')
-    return bool(pattern.match(timestamp))
\ No newline at end of file
+    return bool(pattern.match(timestamp))
+
+def get_ingest_manifest_path(
+    org_id: uuid.UUID,
+    study_id: uuid.UUID
+) -> Path:
+    """
+    Get the path of a study's ingestion manifest, shared by all its extracts.
+    
+    Args:
+        org_id: Organization ID
+        study_id: Study ID
+    
+    Returns:
+        Path object for the manifest file
+    """
+    return Path("/data/studies") / str(org_id) / str(study_id) / "ingest_manifest.json"
+
+def get_pipeline_state_path(
+    org_id: uuid.UUID,
+    study_id: uuid.UUID
+) -> Path:
+    """
+    Get the path of a study's pipeline run state, used to skip unchanged pipelines.
+    
+    Args:
+        org_id: Organization ID
+        study_id: Study ID
+    
+    Returns:
+        Path object for the state file
+    """
+    return Path("/data/studies") / str(org_id) / str(study_id) / "derived_data" / "pipeline_state.json"
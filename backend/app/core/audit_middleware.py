@@ -4,18 +4,10 @@
 import json
 import time
 from typing import Callable, Dict, Any
-from datetime import datetime
 from fastapi import Request, Response
 from fastapi.routing import APIRoute
-from sqlalchemy.orm import Session
-from app.core.db import engine
-from app.models.activity_log import ActivityLog
-from app.models.user import User
-from app.core import security
-from app.core.config import settings
-from app.models.token import TokenPayload
-import jwt
-from pydantic import ValidationError
+from app.core.principal_cache import request_token_subject
+from app.services.audit_log_writer import get_audit_log_writer
 import logging
 
 logger = logging.getLogger(__name__)
@@ -34,7 +26,7 @@ EXCLUDED_PATHS = {
 
 # Map HTTP methods to audit actions
 METHOD_TO_ACTION = {
-    "GET": "VIEW",
+    "GET": "READ",
     "POST": "CREATE",
     "PUT": "UPDATE",
     "PATCH": "UPDATE",
@@ -99,7 +91,12 @@ def get_resource_id(path: str, method: str, response_body: Any) -> str:
 
 
 class AuditMiddleware:
-    """Middleware to log all API requests for audit trail"""
+    """
+    Middleware to log all API requests for audit trail.
+
+    Records are handed to the audit log writer, which numbers and stores
+    them in batches, so requests never wait on the audit table.
+    """
     
     async def __call__(self, request: Request, call_next: Callable) -> Response:
         # Skip excluded paths
@@ -112,29 +109,8 @@ class AuditMiddleware:
         
         start_time = time.time()
         
-        # Get user info from token
-        user_id = None
-        user_email = None
-        
-        try:
-            auth_header = request.headers.get("Authorization", "")
-            if auth_header.startswith("Bearer "):
-                token = auth_header[7:]
-                try:
-                    payload = jwt.decode(
-                        token, settings.SECRET_KEY, algorithms=[security.ALGORITHM]
-                    )
-                    token_data = TokenPayload(**payload)
-                    user_id = token_data.sub
-                    # Get user email from database
-                    with Session(engine) as db:
-                        user = db.query(User).filter(User.id == user_id).first()
-                        if user:
-                            user_email = user.email
-                except (jwt.InvalidTokenError, ValidationError):
-                    pass
-        except Exception as e:
-            logger.debug(f"Could not extract user from token: {e}")
+        # Get user info from token; decoded once and shared with the auth dependencies
+        user_id = request_token_subject(request)
         
         # Capture request details
         request_body = None
@@ -161,8 +137,8 @@ class AuditMiddleware:
         response_body = None
         response_status = response.status_code
         
-        # Only log successful requests and auth failures
-        if (200 <= response_status < 300) or (response_status == 401 and "/login" in request.url.path):
+        # Only log successful requests and auth failures; the audit table needs a user
+        if user_id and ((200 <= response_status < 300) or (response_status == 401 and "/login" in request.url.path)):
             try:
                 # Get response body for POST requests to capture created resource ID
                 if request.method == "POST" and response_status < 300:
@@ -207,32 +183,18 @@ class AuditMiddleware:
                     elif isinstance(request_body, str) and "password" not in request_body.lower():
                         details["request_body"] = request_body[:500]  # Limit size
                 
-                # Log to database
-                with Session(engine) as db:
-                    try:
-                        # Get next sequence number
-                        last_log = db.query(ActivityLog).order_by(ActivityLog.sequence_number.desc()).first()
-                        next_sequence = (last_log.sequence_number + 1) if last_log else 1
-                        
-                        audit_log = ActivityLog(
-                            user_id=user_id,
-                            user_email=user_email or "anonymous",
-                            action=action,
-                            resource_type=resource_type,
-                            resource_id=resource_id or None,
-                            timestamp=datetime.utcnow(),
-                            ip_address=request.client.host if request.client else None,
-                            user_agent=request.headers.get("user-agent"),
-                            details=details,
-                            sequence_number=next_sequence
-                        )
-                        db.add(audit_log)
-                        db.commit()
-                        logger.debug(f"Audit log created: {action} on {resource_type}")
-                    except Exception as e:
-                        logger.error(f"Failed to create audit log: {e}")
-                        db.rollback()
-                        
+                # Queue for the audit log writer
+                get_audit_log_writer().record(
+                    user_id=user_id,
+                    action=action,
+                    resource_type=resource_type,
+                    resource_id=resource_id or None,
+                    details=details,
+                    ip_address=request.client.host if request.client else None,
+                    user_agent=request.headers.get("user-agent")
+                )
+                logger.debug(f"Audit log queued: {action} on {resource_type}")
+                
             except Exception as e:
                 logger.error(f"Error in audit middleware: {e}")
         
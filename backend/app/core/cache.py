@@ -16,12 +16,28 @@ from app.core.config import settings
 logger = logging.getLogger(__name__)
 
 
+def study_generation_key(study_id: str) -> str:
+    """Redis key (without prefix) of a study's cache generation counter"""
+    return f"generation:study:{study_id}"
+
+
+def user_generation_key(user_id: str) -> str:
+    """Redis key (without prefix) of a user's principal version counter"""
+    return f"generation:user:{user_id}"
+
+
+# Redis key (without prefix) of the counter bumped when any role's permissions change
+RBAC_GENERATION_KEY = "generation:rbac"
+
+
 class CacheManager:
     """Manages Redis cache for the application"""
     
     def __init__(self):
         """Initialize Redis connection"""
         self.redis_client: Optional[Redis] = None
+        # Fallback generations when Redis is unavailable (single process only)
+        self._local_generations: Dict[str, int] = {}
         self.connect()
     
     def connect(self):
@@ -166,16 +182,61 @@ class CacheManager:
         pattern = f"{namespace}:*"
         return self.delete_pattern(pattern)
     
-    def invalidate_study(self, study_id: str) -> int:
-        """Invalidate all cache entries for a study"""
-        count = 0
-        namespaces = ['widget', 'query', 'dataset', 'mapping']
+    def _get_generation(self, name: str) -> int:
+        if not self.is_connected():
+            return self._local_generations.get(name, 0)
+        
+        try:
+            value = self.redis_client.get(f"{settings.CACHE_PREFIX}:{name}")
+            return int(value) if value else 0
+        except RedisError as e:
+            logger.error(f"Cache generation get error: {e}")
+            return self._local_generations.get(name, 0)
+    
+    def _bump_generation(self, name: str) -> int:
+        if self.is_connected():
+            try:
+                return int(self.redis_client.incr(f"{settings.CACHE_PREFIX}:{name}"))
+            except RedisError as e:
+                logger.error(f"Cache generation bump error: {e}")
         
-        for ns in namespaces:
-            pattern = f"{ns}:*{study_id}*"
-            count += self.delete_pattern(pattern)
+        generation = self._local_generations.get(name, 0) + 1
+        self._local_generations[name] = generation
+        return generation
+    
+    def get_study_generation(self, study_id: str) -> int:
+        """Get the study's cache generation (embedded in all study cache keys)"""
+        return self._get_generation(study_generation_key(study_id))
+    
+    def bump_study_generation(self, study_id: str) -> int:
+        """Atomically advance the study's cache generation"""
+        return self._bump_generation(study_generation_key(study_id))
+    
+    def get_user_generation(self, user_id: str) -> int:
+        """Get the user's principal version (embedded in cached principal keys)"""
+        return self._get_generation(user_generation_key(user_id))
+    
+    def bump_user_generation(self, user_id: str) -> int:
+        """Atomically advance the user's principal version"""
+        return self._bump_generation(user_generation_key(user_id))
+    
+    def get_rbac_generation(self) -> int:
+        """Get the version of role permissions (embedded in cached permission set keys)"""
+        return self._get_generation(RBAC_GENERATION_KEY)
+    
+    def bump_rbac_generation(self) -> int:
+        """Atomically advance the version of role permissions"""
+        return self._bump_generation(RBAC_GENERATION_KEY)
+    
+    def invalidate_study(self, study_id: str) -> int:
+        """
+        Invalidate all cache entries for a study.
         
-        return count
+        Bumps the study generation instead of deleting keys: entries written
+        under older generations are never read again and expire via their TTL.
+        Returns the new generation.
+        """
+        return self.bump_study_generation(study_id)
     
     def invalidate_widget(self, widget_id: str) -> int:
         """Invalidate all cache entries for a widget"""
@@ -278,6 +339,10 @@ class WidgetCache:
         self.cache = cache_manager
         self.namespace = "widget"
     
+    def _identifier(self, widget_id: str, study_id: str, config_hash: str) -> str:
+        generation = self.cache.get_study_generation(study_id)
+        return f"{study_id}:g{generation}:{widget_id}:{config_hash}"
+    
     def get_widget_data(
         self, 
         widget_id: str, 
@@ -285,7 +350,7 @@ class WidgetCache:
         config_hash: str
     ) -> Optional[Dict]:
         """Get cached widget data"""
-        identifier = f"{study_id}:{widget_id}:{config_hash}"
+        identifier = self._identifier(widget_id, study_id, config_hash)
         return self.cache.get(self.namespace, identifier)
     
     def set_widget_data(
@@ -297,7 +362,7 @@ class WidgetCache:
         ttl: int = 3600
     ) -> bool:
         """Cache widget data"""
-        identifier = f"{study_id}:{widget_id}:{config_hash}"
+        identifier = self._identifier(widget_id, study_id, config_hash)
         return self.cache.set(self.namespace, identifier, data, ttl)
     
     def invalidate_widget(self, widget_id: str) -> int:
@@ -323,7 +388,7 @@ class QueryCache:
         study_id: str
     ) -> Optional[List[Dict]]:
         """Get cached query result"""
-        identifier = f"{study_id}:{query_hash}"
+        identifier = f"{study_id}:g{self.cache.get_study_generation(study_id)}:{query_hash}"
         return self.cache.get(self.namespace, identifier)
     
     def set_query_result(
@@ -334,7 +399,7 @@ class QueryCache:
         ttl: int = 1800
     ) -> bool:
         """Cache query result"""
-        identifier = f"{study_id}:{query_hash}"
+        identifier = f"{study_id}:g{self.cache.get_study_generation(study_id)}:{query_hash}"
         return self.cache.set(self.namespace, identifier, result, ttl)
     
     def get_query_hash(self, query: str, params: Optional[Dict] = None) -> str:
@@ -350,4 +415,14 @@ class QueryCache:
 # Global cache instance
 cache_manager = CacheManager()
 widget_cache = WidgetCache(cache_manager)
-query_cache = QueryCache(cache_manager)
\ No newline at end of file
+query_cache = QueryCache(cache_manager)
+
+
+def bump_study_generation(study_id: str) -> int:
+    """Invalidate every cached result for a study after its data changed"""
+    generation = cache_manager.bump_study_generation(str(study_id))
+    logger.info(f"Study {study_id} cache generation is now {generation}")
+    # Imported lazily so the core cache module does not pull in the widget engines
+    from app.services.widget_engines.result_cache import get_widget_result_cache
+    get_widget_result_cache().invalidate_study(study_id)
+    return generation
\ No newline at end of file
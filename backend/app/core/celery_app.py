@@ -13,6 +13,7 @@ celery_app = Celery(
         "app.clinical_modules.data_sources.tasks",
         "app.clinical_modules.exports.tasks",
         "app.tasks.study_initialization",
+        "app.tasks.audit_chain",
         "app.worker.email_tasks",
     ]
 )
@@ -59,6 +60,14 @@ celery_app.conf.beat_schedule = {
         "task": "app.clinical_modules.exports.tasks.generate_scheduled_reports",
         "schedule": 600.0,  # Every 10 minutes
     },
+    "verify-audit-chain": {
+        "task": "app.tasks.audit_chain.verify_audit_chain",
+        "schedule": 3600.0,  # Every hour
+    },
+    "ensure-activity-log-partitions": {
+        "task": "app.tasks.audit_chain.ensure_activity_log_partitions",
+        "schedule": 86400.0,  # Daily
+    },
     # Email tasks
     "process-email-queue": {
         "task": "process_email_queue",
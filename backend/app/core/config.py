@@ -80,6 +80,39 @@ class Settings(BaseSettings):
     API_RATE_LIMIT: int = 100
     API_RATE_LIMIT_PERIOD: int = 60
     DASHBOARD_CACHE_TTL: int = 300
+    DUCKDB_POOL_SIZE: int = 8
+    DUCKDB_MEMORY_LIMIT: str = "4GB"
+    DUCKDB_THREADS: int = 4
+    DUCKDB_SCHEMA_DROP_GRACE_SECONDS: float = 60.0  # how long a replaced catalog stays queryable
+    WIDGET_BATCH_MAX_CONCURRENCY: int = 4
+    WIDGET_RESULT_CACHE_MAX_ENTRIES: int = 1024
+    WIDGET_RESULT_CACHE_VERSION_TTL: float = 5.0  # seconds a study's data version and generation are reused
+    FILTER_CACHE_MAX_ENTRIES: int = 512
+    SUBQUERY_CACHE_MAX_ENTRIES: int = 128
+    PRINCIPAL_CACHE_MAX_ENTRIES: int = 2048
+    PRINCIPAL_CACHE_LOCAL_TTL: float = 10.0  # seconds a process trusts its copy without asking Redis
+    PRINCIPAL_CACHE_TTL: int = 60
+    PERMISSION_CACHE_MAX_ENTRIES: int = 4096
+    PERMISSION_CACHE_LOCAL_TTL: float = 10.0
+    PERMISSION_CACHE_TTL: int = 300
+    FILTER_METRICS_BUFFER_SIZE: int = 10000
+    FILTER_METRICS_BATCH_SIZE: int = 500
+    FILTER_METRICS_FLUSH_INTERVAL: float = 5.0
+    CONVERSION_MEMORY_LIMIT_MB: int = 512
+    CONVERSION_ROW_GROUP_SIZE: int = 100000
+    INGEST_MAX_WORKERS: int = 0  # 0 = one per CPU core
+    PARQUET_DICTIONARY_MAX_RATIO: float = 0.2
+    PARQUET_BLOOM_FILTER_COLUMNS: list[str] = ["USUBJID"]
+    PARQUET_SORT_KEYS: dict[str, list[str]] = {}  # per dataset, e.g. {"adlb": ["PARAMCD", "USUBJID"]}
+    PIPELINE_MAX_CONCURRENCY: int = 4
+    SANDBOX_POOL_SIZE: int = 2
+    AUDIT_LOG_QUEUE_SIZE: int = 10000
+    AUDIT_LOG_BATCH_SIZE: int = 500
+    AUDIT_LOG_FLUSH_INTERVAL: float = 1.0
+    AUDIT_LOG_SPILL_PATH: str = "/data/audit/audit_spill.jsonl"
+    AUDIT_CHAIN_VERIFY_BATCH_SIZE: int = 5000
+    ACTIVITY_LOG_PARTITION_MONTHS_AHEAD: int = 3
+    AUDIT_EXPORT_BATCH_SIZE: int = 2000
     
     # Redis Settings
     REDIS_URL: str = "redis://localhost:6379/0"
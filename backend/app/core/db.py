@@ -4,6 +4,8 @@ from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
 from app import crud
 from app.core.config import settings
 from app.models import User, UserCreate
+# Registers the session hooks that retire cached principals when users change, in every process
+from app.core import principal_cache  # noqa: F401
 
 engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI))
 
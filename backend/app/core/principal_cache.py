@@ -0,0 +1,215 @@
+# ABOUTME: Short-lived cache of authenticated principals (in-process LRU in front of Redis)
+# ABOUTME: Keyed by user id and principal version; committing a change to a user or their roles bumps the version
+
+import copy
+import logging
+import threading
+import uuid
+from itertools import chain
+from typing import Any, Dict, Optional, Set, Tuple, Union
+
+import jwt
+from jwt.exceptions import InvalidTokenError
+from pydantic import ValidationError
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session as OrmSession, make_transient_to_detached
+from sqlalchemy.orm.util import identity_key
+from sqlmodel import Session
+from starlette.requests import Request
+
+from app.core import security
+from app.core.config import settings
+from app.core.tiered_cache import TieredCache, shared_redis_cache
+from app.models.rbac import UserRole
+from app.models.token import TokenPayload
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+REDIS_NAMESPACE = "principal"
+
+# Loaded on first access instead, so password hashes never leave the database
+UNCACHED_COLUMNS = {"hashed_password"}
+
+
+class PrincipalCache(TieredCache):
+    """
+    Authenticated users cached for a few seconds per process and a minute in Redis.
+
+    Redis entries are keyed by user id and the user's principal version, so
+    bumping the version (invalidate) retires every copy at once. Local copies
+    are trusted for local_ttl seconds without asking Redis, which bounds how
+    long another process can act on a user that was just deactivated.
+    """
+
+    def __init__(
+        self,
+        redis_cache: Optional[Any] = None,
+        max_entries: int = settings.PRINCIPAL_CACHE_MAX_ENTRIES,
+        local_ttl: float = settings.PRINCIPAL_CACHE_LOCAL_TTL,
+        ttl: int = settings.PRINCIPAL_CACHE_TTL
+    ):
+        super().__init__(REDIS_NAMESPACE, redis_cache, max_entries)
+        self.local_ttl = local_ttl
+        self.ttl = ttl
+
+    def get_principal(self, session: Session, user_id: Union[str, uuid.UUID]) -> Optional[Dict[str, Any]]:
+        """Column values of a user, read from the database only on a cache miss; treat as read-only"""
+        key = str(uuid.UUID(str(user_id)))
+        data = self.peek(key)
+        if data is not None:
+            return data
+
+        data, version = self.fetch(key)
+        if data is not None:
+            return data
+
+        data = load_principal(session, key)
+        if data is not None:
+            self.store(key, version, data)
+        return data
+
+    def peek(self, user_id: Union[str, uuid.UUID]) -> Optional[Dict[str, Any]]:
+        """Principal from the in-process tier; never blocks on I/O"""
+        return self.get_local(str(user_id))
+
+    def fetch(self, user_id: Union[str, uuid.UUID]) -> Tuple[Optional[Dict[str, Any]], Optional[int]]:
+        """
+        Principal from Redis, and the version to store a database read under.
+
+        Makes blocking Redis calls, so async callers run it in a thread.
+        """
+        key = str(user_id)
+        # Read before the user is loaded, so a change committed meanwhile retires what gets stored
+        version = self.read_version(key, lambda redis_cache: redis_cache.get_user_generation(key))
+        if version is not None:
+            data = self.get_redis(f"{key}:{version}")
+            if data is not None:
+                self.set_local(key, data, self.local_ttl)
+                return data, version
+        self.record("misses")
+        return None, version
+
+    def store(self, user_id: Union[str, uuid.UUID], version: Optional[int], data: Dict[str, Any]):
+        """Cache a principal read from the database under the version fetch() returned"""
+        key = str(user_id)
+        self.set_local(key, data, self.local_ttl)
+        if version is not None:
+            self.set_redis(f"{key}:{version}", data, self.ttl)
+
+    def get_user(self, session: Session, user_id: Union[str, uuid.UUID]) -> Optional[User]:
+        """The user attached to session, read from the database only on a cache miss"""
+        data = self.get_principal(session, user_id)
+        return None if data is None else attach_principal(session, data)
+
+    def invalidate(self, user_id: Union[str, uuid.UUID]) -> Optional[int]:
+        """Retire every cached copy of a user; returns the new principal version"""
+        key = str(user_id)
+        self.drop_local(key)
+        self.record("invalidations")
+        return self.bump_version(key, lambda redis_cache: redis_cache.bump_user_generation(key))
+
+
+def principal_user(data: Dict[str, Any]) -> User:
+    """A detached User built from cached principal data, safe to use after any session closes"""
+    return User(**copy.deepcopy(data))
+
+
+def attach_principal(session: Session, data: Dict[str, Any]) -> User:
+    """
+    User for cached principal data, attached to session without a query.
+
+    A fresh instance per call: callers may change it and commit it like any
+    loaded user. Columns that are not cached load on first access.
+    """
+    attached = session.identity_map.get(identity_key(User, data["id"]))
+    if attached is not None:
+        return attached
+    user = principal_user(data)
+    make_transient_to_detached(user)
+    session.add(user)
+    return user
+
+
+def decode_token_subject(token: str) -> Optional[str]:
+    """User id an access token was issued to, or None if the token is invalid"""
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[security.ALGORITHM])
+        return str(uuid.UUID(TokenPayload(**payload).sub))
+    except (InvalidTokenError, ValidationError, ValueError, TypeError):
+        return None
+
+
+def request_token_subject(request: Request, token: Optional[str] = None) -> Optional[str]:
+    """
+    Subject of the request's bearer token, decoded once per request.
+
+    The result is kept on request.state, which middleware and dependencies
+    share, so the token is verified once however many of them ask.
+    """
+    if token is None:
+        scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            return None
+    cached = getattr(request.state, "token_subject", None)
+    if cached is not None and cached[0] == token:
+        return cached[1]
+    subject = decode_token_subject(token)
+    request.state.token_subject = (token, subject)
+    return subject
+
+
+def load_principal(session: Session, user_id: Union[str, uuid.UUID]) -> Optional[Dict[str, Any]]:
+    """Column values of a user read from the database, or None if there is no such user"""
+    user = session.get(User, uuid.UUID(str(user_id)))
+    return None if user is None else _principal_data(user)
+
+
+def _principal_data(user: User) -> Dict[str, Any]:
+    return {
+        column.key: copy.deepcopy(getattr(user, column.key))
+        for column in inspect(User).column_attrs
+        if column.key not in UNCACHED_COLUMNS
+    }
+
+
+_principal_cache: Optional[PrincipalCache] = None
+_principal_cache_lock = threading.Lock()
+
+
+def get_principal_cache() -> PrincipalCache:
+    """Get the process-wide principal cache, creating it on first use"""
+    global _principal_cache
+    if _principal_cache is None:
+        with _principal_cache_lock:
+            if _principal_cache is None:
+                _principal_cache = PrincipalCache(shared_redis_cache())
+    return _principal_cache
+
+
+_PENDING = "principal_invalidations"
+
+
+@event.listens_for(OrmSession, "after_flush")
+def _collect_changed_principals(session: OrmSession, _flush_context: Any):
+    pending: Set[Any] = session.info.setdefault(_PENDING, set())
+    for obj in chain(session.dirty, session.deleted):
+        if isinstance(obj, User):
+            pending.add(obj.id)
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, UserRole):
+            pending.add(obj.user_id)
+
+
+@event.listens_for(OrmSession, "after_commit")
+def _invalidate_changed_principals(session: OrmSession):
+    pending = session.info.pop(_PENDING, None)
+    if pending:
+        cache = get_principal_cache()
+        for user_id in pending:
+            cache.invalidate(user_id)
+
+
+@event.listens_for(OrmSession, "after_rollback")
+def _discard_changed_principals(session: OrmSession):
+    session.info.pop(_PENDING, None)
@@ -0,0 +1,160 @@
+# ABOUTME: Base for caches that keep a bounded in-process LRU in front of a versioned Redis namespace
+# ABOUTME: Shared by the principal, effective permission and widget result caches
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def shared_redis_cache() -> Optional[Any]:
+    """The process-wide CacheManager when caching is enabled, else None"""
+    if not settings.CACHE_ENABLED:
+        return None
+    # Imported lazily: creating the global manager connects to Redis
+    from app.core.cache import cache_manager
+    return cache_manager
+
+
+class TieredCache:
+    """
+    Values cached in a bounded in-process LRU in front of a Redis namespace.
+
+    Each local entry has its own expiry. Subclasses put versions in their
+    Redis keys (see read_version), so bumping a version retires every
+    process's copy at once. Without Redis, versions are counted in this
+    process. Redis failures are logged and treated as misses.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        redis_cache: Optional[Any],
+        max_entries: int,
+        extra_stats: Iterable[str] = ()
+    ):
+        self.namespace = namespace
+        self.redis_cache = redis_cache
+        self.max_entries = max_entries
+        self._local: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._local_versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._stats = dict.fromkeys(
+            ("local_hits", "redis_hits", "misses", "invalidations", "evictions", *extra_stats), 0
+        )
+
+    def get_local(self, key: str) -> Optional[Any]:
+        """Value from the in-process tier, or None"""
+        with self._lock:
+            value = self._get_local_locked(key)
+            if value is not None:
+                self._stats["local_hits"] += 1
+            return value
+
+    def set_local(self, key: str, value: Any, ttl: float):
+        """Keep value in this process for ttl seconds, evicting the least recently used entries"""
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._local[key] = (time.monotonic() + ttl, value)
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_entries:
+                self._local.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def drop_local(self, key: str):
+        """Forget one entry of the in-process tier"""
+        with self._lock:
+            self._local.pop(key, None)
+
+    def drop_local_prefix(self, prefix: str):
+        """Forget every in-process entry whose key starts with prefix"""
+        with self._lock:
+            for key in [key for key in self._local if key.startswith(prefix)]:
+                del self._local[key]
+
+    def clear_local(self):
+        """Drop every entry from the in-process tier"""
+        with self._lock:
+            self._local.clear()
+
+    def get_redis(self, redis_key: str) -> Optional[Any]:
+        """Value from Redis, or None without Redis or when the read fails"""
+        if self.redis_cache is None:
+            return None
+        try:
+            value = self.redis_cache.get(self.namespace, redis_key)
+        except Exception as e:
+            logger.warning(f"Failed to read {self.namespace} {redis_key} from Redis: {e}")
+            return None
+        if value is not None:
+            self.record("redis_hits")
+        return value
+
+    def set_redis(self, redis_key: str, value: Any, ttl: int):
+        """Store value in Redis for ttl seconds, if there is a Redis tier"""
+        if self.redis_cache is None:
+            return
+        try:
+            self.redis_cache.set(self.namespace, redis_key, value, ttl)
+        except Exception as e:
+            logger.warning(f"Failed to write {self.namespace} {redis_key} to Redis: {e}")
+
+    def read_version(self, name: str, read: Callable[[Any], int]) -> Optional[int]:
+        """
+        Current version of name, for scoping Redis keys.
+
+        read(redis_cache) with Redis, the process-local count without it, or
+        None if Redis can't be read, in which case skip the Redis tier.
+        """
+        if self.redis_cache is None:
+            with self._lock:
+                return self._local_versions.get(name, 0)
+        try:
+            return read(self.redis_cache)
+        except Exception as e:
+            logger.warning(f"Failed to read {self.namespace} version {name}: {e}")
+            return None
+
+    def bump_version(self, name: str, bump: Callable[[Any], int]) -> Optional[int]:
+        """Advance the version of name with bump(redis_cache), or locally without Redis"""
+        if self.redis_cache is None:
+            with self._lock:
+                version = self._local_versions[name] = self._local_versions.get(name, 0) + 1
+                return version
+        try:
+            return bump(self.redis_cache)
+        except Exception as e:
+            logger.warning(f"Failed to bump {self.namespace} version {name}: {e}")
+            return None
+
+    def record(self, counter: str):
+        """Count an event in get_stats()"""
+        with self._lock:
+            self._stats[counter] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for both tiers"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["local_entries"] = len(self._local)
+        lookups = stats["local_hits"] + stats["redis_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["local_hits"] + stats["redis_hits"]) / lookups * 100, 2) if lookups else 0.0
+        stats["max_entries"] = self.max_entries
+        return stats
+
+    def _get_local_locked(self, key: str) -> Optional[Any]:
+        item = self._local.get(key)
+        if item is None:
+            return None
+        expires, value = item
+        if expires <= time.monotonic():
+            del self._local[key]
+            return None
+        self._local.move_to_end(key)
+        return value
@@ -1,13 +1,15 @@
 # ABOUTME: CRUD operations for ActivityLog model
 # ABOUTME: Handles audit trail and activity logging for compliance
 
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Iterator, Tuple
 from datetime import datetime
 from sqlmodel import Session, select
-from sqlalchemy import and_, or_
+from sqlalchemy import and_, or_, tuple_
+import base64
 import uuid
 
 from app.models import ActivityLog, ActivityLogCreate, User
+from app.services.audit_log_writer import get_audit_log_writer
 
 
 def create_activity_log(
@@ -21,63 +23,84 @@ def create_activity_log(
     user_agent: Optional[str] = None,
     study_id: Optional[uuid.UUID] = None
 ) -> ActivityLog:
-    """Create an activity log entry"""
-    # Get the next sequence number
-    from sqlalchemy import func
-    max_seq = db.query(func.max(ActivityLog.sequence_number)).scalar() or 0
-    
-    # Create activity log entry
-    now = datetime.utcnow()
-    log_data = {
-        "org_id": user.org_id,
-        "user_id": user.id,
-        "action": action,
-        "resource_type": resource_type,
-        "details": details or {},
-        "timestamp": now,
-        "system_timestamp": now,
-        "sequence_number": max_seq + 1
-    }
-    
-    # Add optional fields
-    if resource_id:
-        log_data["resource_id"] = resource_id
-    if ip_address:
-        log_data["ip_address"] = ip_address
-    if user_agent:
-        log_data["user_agent"] = user_agent
-    if study_id:
-        log_data["study_id"] = study_id
-    
-    activity = ActivityLog(**log_data)
-    db.add(activity)
-    db.commit()
-    db.refresh(activity)
-    return activity
+    """
+    Queue an activity log entry for the audit log writer.
 
+    The record is written, and given its sequence number, in the writer's
+    next batch; the returned entry is not attached to the session.
 
-def get_activity_logs(
-    db: Session,
+    db is unused: the writer commits through its own session. The parameter
+    stays so existing callers keep working.
+    """
+    record = get_audit_log_writer().record(
+        user_id=user.id,
+        action=action,
+        resource_type=resource_type,
+        resource_id=resource_id,
+        details=details,
+        ip_address=ip_address,
+        user_agent=user_agent,
+        study_id=study_id,
+        org_id=user.org_id
+    )
+    return ActivityLog(
+        id=uuid.UUID(record["id"]),
+        org_id=user.org_id,
+        user_id=user.id,
+        action=record["action"],
+        resource_type=resource_type,
+        resource_id=record["resource_id"],
+        details=record["details"],
+        timestamp=datetime.fromisoformat(record["timestamp"]),
+        system_timestamp=datetime.fromisoformat(record["system_timestamp"]),
+        ip_address=ip_address,
+        user_agent=record["user_agent"],
+        study_id=study_id
+    )
+
+
+def encode_cursor(timestamp: datetime, log_id: uuid.UUID) -> str:
+    """Opaque cursor pointing just past the given (timestamp, id)"""
+    return base64.urlsafe_b64encode(f"{timestamp.isoformat()}|{log_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+    """Inverse of encode_cursor; raises ValueError for a malformed cursor"""
+    try:
+        timestamp, log_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(timestamp), uuid.UUID(log_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def activity_log_conditions(
     org_id: Optional[uuid.UUID] = None,
     user_id: Optional[uuid.UUID] = None,
+    study_id: Optional[uuid.UUID] = None,
     action: Optional[str] = None,
     resource_type: Optional[str] = None,
     resource_id: Optional[str] = None,
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
-    skip: int = 0,
-    limit: int = 100
-) -> List[ActivityLog]:
-    """Get activity logs with filtering"""
-    query = select(ActivityLog)
-    
+    actions: Optional[List[str]] = None
+) -> list:
+    """
+    Filter conditions for activity log queries.
+
+    A date range lets PostgreSQL skip monthly partitions outside it; the
+    other filters match the leading column of a (column, timestamp, id) index.
+    """
     conditions = []
     if org_id:
         conditions.append(ActivityLog.org_id == org_id)
     if user_id:
         conditions.append(ActivityLog.user_id == user_id)
+    if study_id:
+        conditions.append(ActivityLog.study_id == study_id)
     if action:
         conditions.append(ActivityLog.action == action)
+    if actions is not None:
+        conditions.append(ActivityLog.action.in_(actions))
     if resource_type:
         conditions.append(ActivityLog.resource_type == resource_type)
     if resource_id:
@@ -86,12 +109,84 @@ def get_activity_logs(
         conditions.append(ActivityLog.timestamp >= start_date)
     if end_date:
         conditions.append(ActivityLog.timestamp <= end_date)
+    return conditions
+
+
+def get_activity_logs(
+    db: Session,
+    org_id: Optional[uuid.UUID] = None,
+    user_id: Optional[uuid.UUID] = None,
+    action: Optional[str] = None,
+    resource_type: Optional[str] = None,
+    resource_id: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    skip: int = 0,
+    limit: int = 100,
+    study_id: Optional[uuid.UUID] = None,
+    cursor: Optional[str] = None,
+    actions: Optional[List[str]] = None
+) -> List[ActivityLog]:
+    """
+    Get activity logs with filtering, newest first.
+
+    Pass the cursor of the last log of a page (encode_cursor) to get the
+    next one; it seeks on (timestamp, id) instead of counting past skipped
+    rows, so deep pages cost the same as the first. skip is ignored with a cursor.
+    """
+    conditions = activity_log_conditions(
+        org_id=org_id,
+        user_id=user_id,
+        study_id=study_id,
+        action=action,
+        resource_type=resource_type,
+        resource_id=resource_id,
+        start_date=start_date,
+        end_date=end_date,
+        actions=actions
+    )
+    if cursor:
+        conditions.append(tuple_(ActivityLog.timestamp, ActivityLog.id) < tuple_(*decode_cursor(cursor)))
     
+    query = select(ActivityLog)
     if conditions:
         query = query.where(and_(*conditions))
     
-    query = query.order_by(ActivityLog.timestamp.desc()).offset(skip).limit(limit)
-    return list(db.exec(query).all())
+    query = query.order_by(ActivityLog.timestamp.desc(), ActivityLog.id.desc())
+    if not cursor:
+        query = query.offset(skip)
+    return list(db.exec(query.limit(limit)).all())
+
+
+def iter_activity_log_rows(
+    db: Session,
+    batch_size: int = 1000,
+    **filters: Any
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Yield matching activity log rows oldest first, a batch at a time.
+
+    Rows are plain mappings rather than ORM objects and each batch is a
+    keyset query, so an export of any size holds one batch in memory.
+    """
+    conditions = activity_log_conditions(**filters)
+    after: Optional[Tuple[datetime, uuid.UUID]] = None
+    while True:
+        batch_conditions = list(conditions)
+        if after:
+            batch_conditions.append(tuple_(ActivityLog.timestamp, ActivityLog.id) > tuple_(*after))
+        query = select(ActivityLog.__table__)
+        if batch_conditions:
+            query = query.where(and_(*batch_conditions))
+        rows = db.execute(
+            query.order_by(ActivityLog.timestamp, ActivityLog.id).limit(batch_size)
+        ).mappings().all()
+        if not rows:
+            return
+        yield [dict(row) for row in rows]
+        if len(rows) < batch_size:
+            return
+        after = (rows[-1]["timestamp"], rows[-1]["id"])
 
 
 def get_user_activities(
@@ -7,6 +7,10 @@ from starlette.middleware.cors import CORSMiddleware
 from app.api.main import api_router
 from app.core.config import settings
 from app.core.audit_middleware import AuditMiddleware
+from app.services.audit_log_writer import get_audit_log_writer
+from app.services.filter_metrics_writer import get_filter_metrics_writer
+from app.services.sandbox_pool import shutdown_sandbox_pool
+from app.services.zip_ingestion import shutdown_ingest_pool
 
 logger = logging.getLogger(__name__)
 
@@ -34,6 +38,8 @@ if settings.all_cors_origins:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        # Browsers hide response headers from scripts unless they are listed here
+        expose_headers=["X-Next-Cursor"],
     )
     logger.info(f"CORS middleware configured with origins: {settings.all_cors_origins}")
     
@@ -44,3 +50,33 @@ if settings.all_cors_origins:
     logger.info("Audit middleware temporarily disabled for debugging")
 
 app.include_router(api_router, prefix=settings.API_V1_STR)
+
+
+@app.on_event("startup")
+async def start_filter_metrics_writer():
+    await get_filter_metrics_writer().start()
+
+
+@app.on_event("shutdown")
+async def stop_filter_metrics_writer():
+    await get_filter_metrics_writer().stop()
+
+
+@app.on_event("startup")
+async def start_audit_log_writer():
+    await get_audit_log_writer().start()
+
+
+@app.on_event("shutdown")
+async def stop_audit_log_writer():
+    await get_audit_log_writer().stop()
+
+
+@app.on_event("shutdown")
+def stop_ingest_pool():
+    shutdown_ingest_pool()
+
+
+@app.on_event("shutdown")
+def stop_sandbox_pool():
+    shutdown_sandbox_pool()
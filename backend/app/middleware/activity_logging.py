@@ -4,14 +4,16 @@
 from fastapi import Request, Response
 from fastapi.responses import JSONResponse
 from starlette.middleware.base import BaseHTTPMiddleware
-from sqlmodel import Session
 import json
+import logging
 import time
 from typing import Callable
 
-from app.core.db import engine
 from app.api.deps import get_current_user
-from app.crud import activity_log as crud_activity
+from app.core.audit_middleware import METHOD_TO_ACTION
+from app.services.audit_log_writer import get_audit_log_writer
+
+logger = logging.getLogger(__name__)
 
 
 class ActivityLoggingMiddleware(BaseHTTPMiddleware):
@@ -69,11 +71,10 @@ class ActivityLoggingMiddleware(BaseHTTPMiddleware):
         # Log activity if we have a user
         if user and response.status_code < 400:
             try:
-                # Determine action and resource from path
+                # Determine resource from path
                 path_parts = request.url.path.strip("/").split("/")
                 resource_type = None
                 resource_id = None
-                action = request.method.lower()
                 
                 # Parse common patterns
                 if len(path_parts) >= 3:
@@ -81,39 +82,26 @@ class ActivityLoggingMiddleware(BaseHTTPMiddleware):
                     if len(path_parts) >= 4:
                         resource_id = path_parts[3]
                 
-                # Map HTTP methods to actions
-                action_map = {
-                    "POST": "create",
-                    "PUT": "update",
-                    "PATCH": "update",
-                    "DELETE": "delete"
-                }
-                
-                if resource_type:
-                    action = f"{action_map.get(request.method, request.method.lower())}_{resource_type.rstrip('s')}"
-                
-                # Create activity log
-                with Session(engine) as db:
-                    crud_activity.create_activity_log(
-                        db,
-                        user=user,
-                        action=action,
-                        resource_type=resource_type or "api",
-                        resource_id=resource_id,
-                        details={
-                            "method": request.method,
-                            "path": request.url.path,
-                            "duration_ms": round(duration * 1000, 2),
-                            "status_code": response.status_code,
-                            "query_params": dict(request.query_params) if request.query_params else None,
-                        },
-                        ip_address=request.client.host if request.client else None,
-                        user_agent=request.headers.get("user-agent"),
-                        success=response.status_code < 400
-                    )
+                # Queue for the audit log writer; nothing is written on the request path
+                get_audit_log_writer().record(
+                    user_id=user.id,
+                    action=METHOD_TO_ACTION[request.method],
+                    resource_type=resource_type or "api",
+                    resource_id=resource_id,
+                    details={
+                        "method": request.method,
+                        "path": request.url.path,
+                        "duration_ms": round(duration * 1000, 2),
+                        "status_code": response.status_code,
+                        "query_params": dict(request.query_params) if request.query_params else None,
+                    },
+                    ip_address=request.client.host if request.client else None,
+                    user_agent=request.headers.get("user-agent"),
+                    org_id=user.org_id
+                )
             except Exception as e:
                 # Don't let logging errors break the application
-                print(f"Error logging activity: {e}")
+                logger.error(f"Error logging activity: {e}")
         
         return response
 
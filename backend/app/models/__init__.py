@@ -5,7 +5,7 @@ from sqlmodel import SQLModel
 from .user import User, UserBase, UserCreate, UserUpdate, UserRegister, UserPublic, UsersPublic, UserUpdateMe, UpdatePassword
 from .organization import Organization, OrganizationCreate, OrganizationUpdate, OrganizationPublic
 from .study import Study, StudyCreate, StudyUpdate, StudyPublic, StudyStatus, StudyPhase
-from .activity_log import ActivityLog, ActivityLogCreate, ActivityLogPublic
+from .activity_log import ActivityLog, ActivityLogCreate, ActivityLogPublic, AuditChainHead, AuditChainCheckpoint
 from .data_source import DataSource, DataSourceCreate, DataSourceUpdate, DataSourceConfig, DataSourceType, DataSourceStatus
 from .data_source_upload import DataSourceUpload, DataSourceUploadCreate, DataSourceUploadUpdate, DataSourceUploadPublic, DataSourceUploadsPublic, UploadStatus, FileFormat, ParquetFileInfo
 from .item import Item, ItemBase, ItemCreate, ItemUpdate, ItemPublic, ItemsPublic, Message
@@ -39,7 +39,7 @@ __all__ = [
     # Study models
     "Study", "StudyCreate", "StudyUpdate", "StudyPublic", "StudyStatus", "StudyPhase",
     # Activity logging
-    "ActivityLog", "ActivityLogCreate", "ActivityLogPublic",
+    "ActivityLog", "ActivityLogCreate", "ActivityLogPublic", "AuditChainHead", "AuditChainCheckpoint",
     # Data sources
     "DataSource", "DataSourceCreate", "DataSourceUpdate", "DataSourceConfig", "DataSourceType", "DataSourceStatus",
     # Data source uploads
@@ -64,16 +64,16 @@ class ActivityAction(str, Enum):
 
 class ActivityLogBase(SQLModel):
     # Who
-    user_id: uuid.UUID = Field(foreign_key="user.id", index=True)
+    user_id: uuid.UUID = Field(foreign_key="user.id")
     
     # What
-    action: ActivityAction = Field(index=True)
-    resource_type: str = Field(max_length=50, index=True)  # study, user, pipeline, etc.
-    resource_id: Optional[str] = Field(default=None, max_length=100, index=True)
+    action: ActivityAction = Field()
+    resource_type: str = Field(max_length=50)  # study, user, pipeline, etc.
+    resource_id: Optional[str] = Field(default=None, max_length=100)
     
     # When - using both for 21 CFR Part 11 compliance
     timestamp: datetime = Field(
-        sa_column=Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+        sa_column=Column(DateTime, default=datetime.utcnow, nullable=False)
     )
     
     # Where
@@ -84,8 +84,8 @@ class ActivityLogBase(SQLModel):
     details: Dict[str, Any] = Field(default_factory=dict, sa_column=Column(JSON))
     
     # Optional study context
-    study_id: Optional[uuid.UUID] = Field(default=None, foreign_key="study.id", index=True)
-    org_id: Optional[uuid.UUID] = Field(default=None, foreign_key="organization.id", index=True)
+    study_id: Optional[uuid.UUID] = Field(default=None, foreign_key="study.id")
+    org_id: Optional[uuid.UUID] = Field(default=None, foreign_key="organization.id")
 
 
 class ActivityLogCreate(ActivityLogBase):
@@ -94,10 +94,16 @@ class ActivityLogCreate(ActivityLogBase):
 
 class ActivityLog(ActivityLogBase, table=True):
     __tablename__ = "activity_log"
+    # In PostgreSQL the table is range partitioned by month on timestamp, with
+    # primary key (id, timestamp); see migration c4e92a7d1f38. Each filter column
+    # leads an index ending in (timestamp, id), the order audit queries page in.
     __table_args__ = (
-        Index("idx_activity_timestamp_user", "timestamp", "user_id"),
-        Index("idx_activity_resource", "resource_type", "resource_id"),
-        Index("idx_activity_org_study", "org_id", "study_id"),
+        Index("ix_activity_log_timestamp_id", "timestamp", "id"),
+        Index("ix_activity_log_org_timestamp", "org_id", "timestamp", "id"),
+        Index("ix_activity_log_user_timestamp", "user_id", "timestamp", "id"),
+        Index("ix_activity_log_study_timestamp", "study_id", "timestamp", "id"),
+        Index("ix_activity_log_action_timestamp", "action", "timestamp", "id"),
+        Index("ix_activity_log_resource_timestamp", "resource_type", "resource_id", "timestamp"),
     )
     
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
@@ -110,8 +116,8 @@ class ActivityLog(ActivityLogBase, table=True):
         sa_column=Column(BigInteger, nullable=False, index=True)
     )
     
-    # Audit trail integrity
-    checksum: Optional[str] = Field(default=None, max_length=64)  # SHA-256 hash
+    # Audit trail integrity: SHA-256 over the record and the previous record's checksum
+    checksum: Optional[str] = Field(default=None, max_length=64)
     
     # For tracking data changes
     old_value: Optional[Dict[str, Any]] = Field(default=None, sa_column=Column(JSON))
@@ -130,6 +136,28 @@ class ActivityLog(ActivityLogBase, table=True):
         arbitrary_types_allowed = True
 
 
+class AuditChainHead(SQLModel, table=True):
+    """Last sequence number and checksum of the audit chain; its one row is locked to append"""
+    __tablename__ = "audit_chain_head"
+    
+    id: int = Field(default=1, primary_key=True)
+    last_sequence: int = Field(default=0, sa_column=Column(BigInteger, nullable=False))
+    last_checksum: Optional[str] = Field(default=None, max_length=64)
+
+
+class AuditChainCheckpoint(SQLModel, table=True):
+    """How far the audit chain has been verified, so verification resumes instead of rescanning"""
+    __tablename__ = "audit_chain_checkpoint"
+    
+    id: int = Field(default=1, primary_key=True)
+    verified_sequence: int = Field(default=0, sa_column=Column(BigInteger, nullable=False))
+    verified_checksum: Optional[str] = Field(default=None, max_length=64)
+    verified_at: Optional[datetime] = Field(default=None, sa_column=Column(DateTime))
+    # First record that failed verification, if any
+    broken_sequence: Optional[int] = Field(default=None, sa_column=Column(BigInteger))
+    broken_reason: Optional[str] = Field(default=None, sa_column=Column(Text))
+
+
 class ActivityLogPublic(SQLModel):
     id: uuid.UUID
     user_id: uuid.UUID
@@ -0,0 +1,90 @@
+# ABOUTME: Monthly range partitions of the activity log table
+# ABOUTME: Creates next months' partitions ahead of time so new audit records never land in the default partition
+
+import logging
+from datetime import date, datetime
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlmodel import Session
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = "activity_log"
+DEFAULT_PARTITION = "activity_log_default"
+
+
+def partition_name(month: date) -> str:
+    """Name of the partition holding the given month"""
+    return f"{PARENT_TABLE}_{month:%Y_%m}"
+
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_months(today: Optional[date] = None, months_ahead: int = 3) -> List[date]:
+    """First day of the current month and of each of the next months_ahead months"""
+    today = today or datetime.utcnow().date()
+    current = date(today.year, today.month, 1)
+    return [_add_months(current, i) for i in range(months_ahead + 1)]
+
+
+def is_partitioned(session: Session) -> bool:
+    """Whether activity_log is a partitioned PostgreSQL table"""
+    if session.get_bind().dialect.name != "postgresql":
+        return False
+    return session.execute(
+        text(
+            "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+            "WHERE c.relname = :name AND pg_table_is_visible(c.oid)"
+        ),
+        {"name": PARENT_TABLE}
+    ).first() is not None
+
+
+def ensure_activity_log_partitions(
+    session: Session,
+    months_ahead: int = settings.ACTIVITY_LOG_PARTITION_MONTHS_AHEAD,
+    today: Optional[date] = None
+) -> List[str]:
+    """
+    Create any missing partitions from the current month to months_ahead months out.
+
+    Returns the partitions created. A no-op unless activity_log is partitioned.
+    A month whose rows already went to the default partition is skipped and
+    logged: PostgreSQL won't create a partition that would orphan them.
+    """
+    if not is_partitioned(session):
+        return []
+
+    existing = set(session.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = :name"
+        ),
+        {"name": PARENT_TABLE}
+    ).scalars())
+
+    created = []
+    for month in partition_months(today, months_ahead):
+        name = partition_name(month)
+        if name in existing:
+            continue
+        try:
+            # Names and bounds are generated here, never taken from input
+            session.execute(text(
+                f'CREATE TABLE "{name}" PARTITION OF {PARENT_TABLE} '
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_add_months(month, 1).isoformat()}')"
+            ))
+            session.commit()
+            created.append(name)
+            logger.info(f"Created activity log partition {name}")
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Could not create activity log partition {name}: {e}")
+    return created
@@ -1,35 +1,309 @@
 # ABOUTME: Advanced filter executor with support for date ranges, subqueries, and complex conditions
 # ABOUTME: Extends base executor with optimized handling of grouped conditions and relative dates
 
+import re
 import time
 import logging
-from typing import Dict, List, Optional, Any, Union
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Any, Tuple, Union
 from pathlib import Path
 import pyarrow.parquet as pq
 import pyarrow.compute as pc
-import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
 
+import pyarrow as pa
+
+from app.core.config import settings
 from app.models import Study
+from app.services.duckdb_catalog import get_duckdb_pool
 from app.services.filter_executor import FilterExecutor
+from app.services.filter_compiler import ArrowUnsupportedError, FilterCompiler, FilterCompileError
 from app.services.advanced_filter_parser import (
-    AdvancedFilterParser, DateRangeNode, SubqueryNode, GroupNode,
-    ASTNode, ColumnNode, LiteralNode, BinaryOpNode, UnaryOpNode,
-    InNode, BetweenNode, LikeNode, IsNullNode, TokenType
+    AdvancedFilterParser, DateRangeNode, SubqueryNode, GroupNode
 )
+from app.services.filter_parser import ASTNode, TokenType
 
 logger = logging.getLogger(__name__)
 
 
+SUBQUERY_PATTERN = re.compile(
+    r'^\s*SELECT\s+(?:DISTINCT\s+)?(\w+)\s+FROM\s+(\w+)(?:\s+WHERE\s+(.+?))?\s*$',
+    re.IGNORECASE | re.DOTALL
+)
+
+
+class SubqueryResultCache:
+    """
+    Bounded LRU of subquery key sets.
+    
+    Keys include the referenced file's size and mtime, so a new data
+    version is a miss rather than a stale hit.
+    """
+    
+    def __init__(self, max_entries: int = settings.SUBQUERY_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple, pa.Array]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+    
+    def get_or_load(self, key: Tuple, load) -> pa.Array:
+        with self._lock:
+            values = self._entries.get(key)
+            if values is not None:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return values
+            self._stats["misses"] += 1
+        
+        values = load()
+        
+        with self._lock:
+            self._entries[key] = values
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+        return values
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        stats["max_entries"] = self.max_entries
+        return stats
+
+
+_subquery_cache: Optional[SubqueryResultCache] = None
+_subquery_cache_lock = threading.Lock()
+
+
+def get_subquery_cache() -> SubqueryResultCache:
+    """Get the process-wide subquery result cache, creating it on first use"""
+    global _subquery_cache
+    if _subquery_cache is None:
+        with _subquery_cache_lock:
+            if _subquery_cache is None:
+                _subquery_cache = SubqueryResultCache()
+    return _subquery_cache
+
+
+class SubqueryResolver:
+    """
+    Plans and evaluates the subqueries of one filter execution.
+    
+    "col IN (SELECT key FROM TABLE WHERE cond)" becomes a DuckDB scan of the
+    referenced Parquet file that reads only the key and condition columns.
+    The inner condition goes through the same parser and compiler as the
+    outer filter. Key sets are cached in the SubqueryResultCache.
+    """
+    
+    def __init__(
+        self,
+        executor: "AdvancedFilterExecutor",
+        dataset_dir: Optional[Path] = None,
+        context_datasets: Optional[Dict[str, Path]] = None
+    ):
+        self.executor = executor
+        self.dataset_dir = dataset_dir
+        self.context_datasets = context_datasets or {}
+    
+    def plan(self, node: SubqueryNode) -> Tuple[Optional[Path], str, Optional[str]]:
+        """(dataset path or None if missing, selected column, compiled WHERE clause)"""
+        match = SUBQUERY_PATTERN.match(node.query)
+        if not match:
+            raise ValueError(f"Invalid subquery: {node.query}")
+        select_column, from_table, where_condition = match.groups()
+        
+        where_sql = None
+        if where_condition:
+            compiled = self.executor.parse_filter(where_condition)
+            if not compiled.is_valid:
+                raise ValueError(f"Invalid subquery condition: {compiled.error}")
+            where_sql = compiled.to_sql(self.executor.compiler)
+        
+        dataset_path = self._resolve_dataset(from_table, node.dataset)
+        if not dataset_path.exists():
+            logger.warning(f"Subquery dataset not found: {dataset_path}")
+            dataset_path = None
+        return dataset_path, select_column, where_sql
+    
+    def source_sql(self, node: SubqueryNode) -> Optional[str]:
+        """SELECT statement for the subquery, or None if its dataset is missing"""
+        dataset_path, select_column, where_sql = self.plan(node)
+        if dataset_path is None:
+            return None
+        return self._select_sql(dataset_path, select_column, where_sql)
+    
+    def values(self, node: SubqueryNode) -> pa.Array:
+        """Distinct values the subquery selects"""
+        dataset_path, select_column, where_sql = self.plan(node)
+        if dataset_path is None:
+            return pa.array([])
+        stat = dataset_path.stat()
+        key = (str(dataset_path), stat.st_mtime_ns, stat.st_size, select_column, where_sql)
+        
+        def load() -> pa.Array:
+            sql = self._select_sql(dataset_path, select_column, where_sql, distinct=True)
+            with get_duckdb_pool().connection() as conn:
+                rows = conn.execute(sql).fetchall()
+            return pa.array([row[0] for row in rows])
+        
+        return self.executor.subquery_cache.get_or_load(key, load)
+    
+    def _select_sql(
+        self,
+        dataset_path: Path,
+        select_column: str,
+        where_sql: Optional[str],
+        distinct: bool = False
+    ) -> str:
+        compiler = self.executor.compiler
+        sql = (
+            f"SELECT {'DISTINCT ' if distinct else ''}{compiler.quote_identifier(select_column)} "
+            f"FROM read_parquet({compiler.sql_literal(str(dataset_path))})"
+        )
+        if where_sql:
+            sql += f" WHERE {where_sql}"
+        return sql
+    
+    def _resolve_dataset(self, table: str, dataset: Optional[str]) -> Path:
+        if table in self.context_datasets:
+            return Path(self.context_datasets[table])
+        for name, path in self.context_datasets.items():
+            if name.lower() == table.lower():
+                return Path(path)
+        if dataset:
+            return Path(f"/data/{dataset}/{table}.parquet")
+        if self.dataset_dir is not None:
+            # Study datasets are stored side by side
+            for name in (table, table.lower(), table.upper()):
+                candidate = self.dataset_dir / f"{name}.parquet"
+                if candidate.exists():
+                    return candidate
+            return self.dataset_dir / f"{table}.parquet"
+        raise ValueError(f"Cannot determine path for dataset: {table}")
+
+
+class AdvancedFilterCompiler(FilterCompiler):
+    """Filter compiler that also handles date ranges, condition groups and subqueries"""
+    
+    def __init__(self, subqueries: Optional[SubqueryResolver] = None):
+        # Advanced filters have always matched LIKE case-insensitively
+        super().__init__(like_ignore_case=True)
+        self.subqueries = subqueries
+    
+    def to_arrow(self, node: ASTNode, schema: Optional[pa.Schema] = None):
+        if isinstance(node, DateRangeNode):
+            value_type = self._field_type(node.column.name, schema)
+            if value_type is None or not (pa.types.is_timestamp(value_type) or pa.types.is_date(value_type)):
+                # Text dates need parsing, which DuckDB's TRY_CAST handles
+                raise ArrowUnsupportedError(f"Date range on non-temporal column '{node.column.name}'")
+            start_date, end_date = node.to_absolute_range()
+            field = self.to_arrow(node.column, schema)
+            return (
+                (field >= self._arrow_literal(start_date, node.column.name, schema))
+                & (field <= self._arrow_literal(end_date, node.column.name, schema))
+            )
+        
+        elif isinstance(node, GroupNode):
+            return self._combine(node, [self.to_arrow(c, schema) for c in node.conditions], arrow=True)
+        
+        elif isinstance(node, SubqueryNode):
+            return self._subquery_to_arrow(node, schema)
+        
+        return super().to_arrow(node, schema)
+    
+    def to_sql(self, node: ASTNode) -> str:
+        if isinstance(node, DateRangeNode):
+            start_date, end_date = node.to_absolute_range()
+            return (
+                f"(TRY_CAST({self.to_sql(node.column)} AS TIMESTAMP) BETWEEN "
+                f"TIMESTAMP '{start_date.isoformat(sep=' ')}' AND TIMESTAMP '{end_date.isoformat(sep=' ')}')"
+            )
+        
+        elif isinstance(node, GroupNode):
+            return self._combine(node, [self.to_sql(c) for c in node.conditions], arrow=False)
+        
+        elif isinstance(node, SubqueryNode):
+            return self._subquery_to_sql(node)
+        
+        return super().to_sql(node)
+    
+    def _subquery_to_arrow(self, node: SubqueryNode, schema: Optional[pa.Schema]):
+        """Semi-/anti-join against the subquery's cached key set"""
+        if self.subqueries is None:
+            raise FilterCompileError("Subqueries need a SubqueryResolver")
+        values = self.subqueries.values(node)
+        operator = " ".join(node.operator.upper().split())
+        if operator == "EXISTS":
+            return pc.scalar(len(values) > 0)
+        if operator == "NOT EXISTS":
+            return pc.scalar(len(values) == 0)
+        
+        field = self.to_arrow(node.column, schema)
+        has_null = values.null_count > 0
+        values = values.drop_null()
+        value_type = self._field_type(node.column.name, schema)
+        if value_type is not None and values.type != value_type:
+            try:
+                values = values.cast(value_type)
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError) as e:
+                raise ArrowUnsupportedError(f"Cannot compare column '{node.column.name}' with subquery values: {e}")
+        
+        if operator == "IN":
+            return field.isin(values)
+        elif operator == "NOT IN":
+            if has_null:
+                # x NOT IN (..., NULL) is never true in SQL
+                return pc.scalar(False)
+            return ~field.isin(values) & field.is_valid()
+        raise FilterCompileError(f"Unsupported subquery operator: {operator}")
+    
+    def _subquery_to_sql(self, node: SubqueryNode) -> str:
+        """Subquery inlined so DuckDB plans it as a semi-/anti-join"""
+        if self.subqueries is None:
+            raise FilterCompileError("Subqueries need a SubqueryResolver")
+        source = self.subqueries.source_sql(node)
+        operator = " ".join(node.operator.upper().split())
+        if operator in ("EXISTS", "NOT EXISTS"):
+            if source is None:
+                return "TRUE" if operator == "NOT EXISTS" else "FALSE"
+            return f"({operator} ({source}))"
+        
+        column = self.to_sql(node.column)
+        if source is None:
+            # Subquery over a missing dataset selects nothing
+            return "FALSE" if operator == "IN" else f"({column} IS NOT NULL)"
+        if operator not in ("IN", "NOT IN"):
+            raise FilterCompileError(f"Unsupported subquery operator: {operator}")
+        return f"({column} {operator} ({source}))"
+    
+    def _combine(self, node: GroupNode, parts: List[Any], arrow: bool):
+        if node.operator not in (TokenType.AND, TokenType.OR):
+            raise FilterCompileError(f"Unsupported group operator: {node.operator}")
+        if not parts:
+            return pc.scalar(True) if arrow else "TRUE"
+        if not arrow:
+            return "(" + f" {node.operator.value} ".join(parts) + ")"
+        result = parts[0]
+        for part in parts[1:]:
+            result = result & part if node.operator == TokenType.AND else result | part
+        return result
+
+
 class AdvancedFilterExecutor(FilterExecutor):
     """Enhanced filter executor with advanced features"""
     
     def __init__(self, db: Session):
         super().__init__(db)
         self.parser = AdvancedFilterParser()
-        self.subquery_cache = {}  # Cache subquery results
+        self.compiler = AdvancedFilterCompiler()
+        self.subquery_cache = get_subquery_cache()
     
     def execute_filter(
         self,
@@ -60,36 +334,25 @@ class AdvancedFilterExecutor(FilterExecutor):
         
         try:
             # Parse with advanced parser
-            parse_result = self.parser.parse(filter_expression)
-            if not parse_result["is_valid"]:
-                raise ValueError(f"Invalid filter expression: {parse_result['error']}")
+            compiled = self.parse_filter(filter_expression)
+            if not compiled.is_valid:
+                raise ValueError(f"Invalid filter expression: {compiled.error}")
+            parse_result = compiled.parse_result
             
             # Read the primary dataset
             dataset_path = Path(dataset_path)
             if not dataset_path.exists():
                 raise FileNotFoundError(f"Dataset not found: {dataset_path}")
             
-            # Determine columns to read
-            filter_columns = parse_result["columns"]
-            if columns:
-                read_columns = list(set(columns + filter_columns))
-            else:
-                read_columns = None
-            
-            # Read data
-            df = pd.read_parquet(dataset_path, columns=read_columns)
-            original_count = len(df)
-            
-            # Apply the filter with advanced features
-            if parse_result["ast"]:
-                mask = self._evaluate_advanced_ast(
-                    parse_result["ast"], 
-                    df, 
-                    context_datasets
+            # The whole filter, subqueries included, is evaluated inside the scan
+            compiler = self.compiler
+            if parse_result.get("has_subqueries", False):
+                compiler = AdvancedFilterCompiler(
+                    SubqueryResolver(self, dataset_path.parent, context_datasets)
                 )
-                filtered_df = df[mask]
-            else:
-                filtered_df = df
+            read = self.read_dataset(dataset_path, compiled, columns, compiler=compiler)
+            filtered_df = read.data
+            original_count = read.rows_total
             
             # Track metrics
             execution_time_ms = (time.time() - start_time) * 1000
@@ -102,7 +365,8 @@ class AdvancedFilterExecutor(FilterExecutor):
                 "filter_applied": filter_expression,
                 "filter_efficiency": (1 - len(filtered_df) / original_count) * 100 if original_count > 0 else 0,
                 "has_date_ranges": parse_result.get("has_date_ranges", False),
-                "has_subqueries": parse_result.get("has_subqueries", False)
+                "has_subqueries": parse_result.get("has_subqueries", False),
+                "io": read.io
             }
             
             # Log metrics if tracking
@@ -115,260 +379,6 @@ class AdvancedFilterExecutor(FilterExecutor):
             self.logger.error(f"Filter execution failed: {str(e)}")
             raise
     
-    def _evaluate_advanced_ast(
-        self, 
-        node: ASTNode, 
-        df: pd.DataFrame,
-        context_datasets: Optional[Dict[str, Path]] = None
-    ) -> pd.Series:
-        """
-        Evaluate AST with support for advanced node types
-        """
-        # Handle date range nodes
-        if isinstance(node, DateRangeNode):
-            return self._evaluate_date_range(node, df)
-        
-        # Handle subquery nodes
-        elif isinstance(node, SubqueryNode):
-            return self._evaluate_subquery(node, df, context_datasets)
-        
-        # Handle group nodes
-        elif isinstance(node, GroupNode):
-            return self._evaluate_group(node, df, context_datasets)
-        
-        # Handle standard nodes using base implementation
-        else:
-            return self._evaluate_ast(node, df)
-    
-    def _evaluate_date_range(self, node: DateRangeNode, df: pd.DataFrame) -> pd.Series:
-        """
-        Evaluate date range filter
-        """
-        column_name = node.column.name
-        
-        if column_name not in df.columns:
-            raise ValueError(f"Column '{column_name}' not found in dataset")
-        
-        # Get absolute date range
-        start_date, end_date = node.to_absolute_range()
-        
-        # Convert column to datetime if needed
-        col_data = pd.to_datetime(df[column_name], errors='coerce')
-        
-        # Apply range filter
-        mask = (col_data >= start_date) & (col_data <= end_date)
-        
-        self.logger.debug(f"Date range filter: {column_name} from {start_date} to {end_date}")
-        
-        return mask
-    
-    def _evaluate_subquery(
-        self, 
-        node: SubqueryNode, 
-        df: pd.DataFrame,
-        context_datasets: Optional[Dict[str, Path]] = None
-    ) -> pd.Series:
-        """
-        Evaluate subquery filter
-        """
-        column_name = node.column.name
-        
-        if column_name not in df.columns:
-            raise ValueError(f"Column '{column_name}' not found in dataset")
-        
-        # Check cache first
-        cache_key = f"{node.query}_{node.dataset}"
-        if cache_key in self.subquery_cache:
-            subquery_result = self.subquery_cache[cache_key]
-        else:
-            # Execute subquery
-            subquery_result = self._execute_subquery(node.query, node.dataset, context_datasets)
-            self.subquery_cache[cache_key] = subquery_result
-        
-        # Apply the operator
-        if node.operator == "IN":
-            mask = df[column_name].isin(subquery_result)
-        elif node.operator == "NOT IN":
-            mask = ~df[column_name].isin(subquery_result)
-        elif node.operator == "EXISTS":
-            # For EXISTS, just check if subquery returns any results
-            mask = pd.Series([len(subquery_result) > 0] * len(df), index=df.index)
-        elif node.operator == "NOT EXISTS":
-            mask = pd.Series([len(subquery_result) == 0] * len(df), index=df.index)
-        else:
-            raise ValueError(f"Unsupported subquery operator: {node.operator}")
-        
-        return mask
-    
-    def _execute_subquery(
-        self, 
-        query: str, 
-        dataset: Optional[str],
-        context_datasets: Optional[Dict[str, Path]] = None
-    ) -> List[Any]:
-        """
-        Execute a subquery on a dataset
-        
-        Note: This is a simplified implementation. In production,
-        you would use a proper SQL engine or query parser.
-        """
-        # Parse the subquery (simplified - extracts SELECT column and WHERE condition)
-        import re
-        
-        # Extract components
-        select_match = re.search(r'SELECT\s+(\w+)', query, re.IGNORECASE)
-        from_match = re.search(r'FROM\s+(\w+)', query, re.IGNORECASE)
-        where_match = re.search(r'WHERE\s+(.+)$', query, re.IGNORECASE)
-        
-        if not select_match or not from_match:
-            raise ValueError(f"Invalid subquery: {query}")
-        
-        select_column = select_match.group(1)
-        from_table = from_match.group(1)
-        where_condition = where_match.group(1) if where_match else None
-        
-        # Determine dataset path
-        if context_datasets and from_table in context_datasets:
-            dataset_path = context_datasets[from_table]
-        elif dataset:
-            # Use provided dataset name
-            dataset_path = Path(f"/data/{dataset}/{from_table}.parquet")
-        else:
-            raise ValueError(f"Cannot determine path for dataset: {from_table}")
-        
-        # Read the dataset
-        if not dataset_path.exists():
-            self.logger.warning(f"Subquery dataset not found: {dataset_path}")
-            return []
-        
-        subquery_df = pd.read_parquet(dataset_path)
-        
-        # Apply WHERE condition if present
-        if where_condition:
-            # Parse and apply the WHERE condition
-            # This is simplified - in production, use proper SQL parser
-            try:
-                filtered_df = subquery_df.query(where_condition)
-            except:
-                # Fallback to simple equality check
-                parts = where_condition.split('=')
-                if len(parts) == 2:
-                    col = parts[0].strip()
-                    val = parts[1].strip().strip("'\"")
-                    filtered_df = subquery_df[subquery_df[col] == val]
-                else:
-                    filtered_df = subquery_df
-        else:
-            filtered_df = subquery_df
-        
-        # Return unique values from the selected column
-        if select_column in filtered_df.columns:
-            return filtered_df[select_column].unique().tolist()
-        else:
-            return []
-    
-    def _evaluate_group(
-        self, 
-        node: GroupNode, 
-        df: pd.DataFrame,
-        context_datasets: Optional[Dict[str, Path]] = None
-    ) -> pd.Series:
-        """
-        Evaluate grouped conditions
-        """
-        if not node.conditions:
-            return pd.Series([True] * len(df), index=df.index)
-        
-        # Evaluate each condition
-        condition_masks = [
-            self._evaluate_advanced_ast(cond, df, context_datasets)
-            for cond in node.conditions
-        ]
-        
-        # Combine based on operator
-        if node.operator == TokenType.AND:
-            # All conditions must be true
-            result = condition_masks[0]
-            for mask in condition_masks[1:]:
-                result = result & mask
-        elif node.operator == TokenType.OR:
-            # At least one condition must be true
-            result = condition_masks[0]
-            for mask in condition_masks[1:]:
-                result = result | mask
-        else:
-            raise ValueError(f"Unsupported group operator: {node.operator}")
-        
-        return result
-    
-    def _evaluate_ast(self, node: ASTNode, df: pd.DataFrame) -> pd.Series:
-        """
-        Extended AST evaluation for standard nodes
-        """
-        if isinstance(node, ColumnNode):
-            if node.name not in df.columns:
-                raise ValueError(f"Column '{node.name}' not found in dataset")
-            return df[node.name]
-        
-        elif isinstance(node, LiteralNode):
-            return pd.Series([node.value] * len(df), index=df.index)
-        
-        elif isinstance(node, BinaryOpNode):
-            left = self._evaluate_advanced_ast(node.left, df, None)
-            right = self._evaluate_advanced_ast(node.right, df, None)
-            
-            # Handle comparison operators
-            if node.operator == TokenType.EQ:
-                return left == right
-            elif node.operator == TokenType.NEQ:
-                return left != right
-            elif node.operator == TokenType.LT:
-                return left < right
-            elif node.operator == TokenType.LTE:
-                return left <= right
-            elif node.operator == TokenType.GT:
-                return left > right
-            elif node.operator == TokenType.GTE:
-                return left >= right
-            elif node.operator == TokenType.AND:
-                return left & right
-            elif node.operator == TokenType.OR:
-                return left | right
-            else:
-                raise ValueError(f"Unsupported operator: {node.operator}")
-        
-        elif isinstance(node, UnaryOpNode):
-            operand = self._evaluate_advanced_ast(node.operand, df, None)
-            if node.operator == TokenType.NOT:
-                return ~operand
-            else:
-                raise ValueError(f"Unsupported unary operator: {node.operator}")
-        
-        elif isinstance(node, InNode):
-            column_data = df[node.column.name]
-            values = [v.value for v in node.values]
-            mask = column_data.isin(values)
-            return ~mask if node.negate else mask
-        
-        elif isinstance(node, BetweenNode):
-            column_data = df[node.column.name]
-            return (column_data >= node.lower.value) & (column_data <= node.upper.value)
-        
-        elif isinstance(node, LikeNode):
-            column_data = df[node.column.name].astype(str)
-            # Convert SQL LIKE pattern to regex
-            pattern = node.pattern.replace('%', '.*').replace('_', '.')
-            mask = column_data.str.match(pattern, case=False)
-            return ~mask if node.negate else mask
-        
-        elif isinstance(node, IsNullNode):
-            column_data = df[node.column.name]
-            mask = column_data.isna()
-            return ~mask if node.negate else mask
-        
-        else:
-            raise ValueError(f"Unsupported node type: {type(node)}")
-    
     def _log_metrics(self, study_id: str, widget_id: str, result: Dict[str, Any]):
         """
         Log filter execution metrics for monitoring
@@ -379,6 +389,14 @@ class AdvancedFilterExecutor(FilterExecutor):
             f"Efficiency: {result['filter_efficiency']:.1f}%, "
             f"Time: {result['execution_time_ms']:.2f}ms"
         )
+        self._track_execution_metrics(
+            study_id=study_id,
+            widget_id=widget_id,
+            filter_expression=result["filter_applied"],
+            execution_time_ms=result["execution_time_ms"],
+            rows_before=result["original_count"],
+            rows_after=result["row_count"]
+        )
     
     def optimize_filter(self, filter_expression: str) -> str:
         """
@@ -390,9 +408,9 @@ class AdvancedFilterExecutor(FilterExecutor):
         - Convert LIKE to equality when possible
         """
         # Parse the expression
-        parse_result = self.parser.parse(filter_expression)
+        compiled = self.parse_filter(filter_expression)
         
-        if not parse_result["is_valid"]:
+        if not compiled.is_valid:
             return filter_expression
         
         # TODO: Implement optimization rules
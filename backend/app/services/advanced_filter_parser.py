@@ -8,7 +8,7 @@ import re
 import logging
 from .filter_parser import (
     FilterParser, ASTNode, ColumnNode, LiteralNode, 
-    BinaryOpNode, TokenType, Parser, Lexer
+    BinaryOpNode, UnaryOpNode, TokenType, Parser, Lexer
 )
 
 logger = logging.getLogger(__name__)
@@ -0,0 +1,148 @@
+# ABOUTME: Hash chain over the audit trail and its incremental verification
+# ABOUTME: Each record's checksum covers its content and the previous checksum; verification resumes from a checkpoint
+
+import hashlib
+import json
+import logging
+import uuid
+from datetime import datetime
+from enum import Enum
+from typing import Any, Callable, Dict, Mapping, Optional
+
+from sqlalchemy import select
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.models.activity_log import ActivityLog, AuditChainCheckpoint, AuditChainHead
+
+logger = logging.getLogger(__name__)
+
+# Previous checksum of the first chained record
+GENESIS_CHECKSUM = "0" * 64
+
+# Columns covered by a record's checksum
+CHAINED_FIELDS = (
+    "sequence_number", "id", "user_id", "org_id", "study_id", "action", "resource_type", "resource_id",
+    "details", "ip_address", "user_agent", "timestamp", "system_timestamp", "old_value", "new_value", "reason",
+)
+
+
+def _canonical(value: Any) -> Any:
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+
+def record_checksum(record: Mapping[str, Any], previous: Optional[str]) -> str:
+    """SHA-256 of a record's chained fields and the checksum before it, as stored or as read back"""
+    payload = {field: _canonical(record.get(field)) for field in CHAINED_FIELDS}
+    payload["previous"] = previous or GENESIS_CHECKSUM
+    return hashlib.sha256(
+        json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str).encode()
+    ).hexdigest()
+
+
+def _default_session_factory() -> Session:
+    # Imported lazily: app.core.db creates the engine at import time
+    from app.core.db import engine
+    return Session(engine)
+
+
+class AuditChainVerifier:
+    """
+    Verifies the audit chain from where the last run stopped.
+
+    Records are read in sequence order, a batch at a time, checking each
+    sequence number follows the one before and each checksum matches the
+    record and its predecessor. The checkpoint is saved after every batch.
+    A break is recorded on the checkpoint and verification stops there.
+    """
+
+    def __init__(
+        self,
+        session_factory: Optional[Callable[[], Session]] = None,
+        batch_size: int = settings.AUDIT_CHAIN_VERIFY_BATCH_SIZE
+    ):
+        self.session_factory = session_factory or _default_session_factory
+        self.batch_size = batch_size
+
+    def verify(self, max_rows: Optional[int] = None) -> Dict[str, Any]:
+        """Verify up to max_rows records past the checkpoint; returns the checkpoint state"""
+        session = self.session_factory()
+        try:
+            checkpoint = session.get(AuditChainCheckpoint, 1) or AuditChainCheckpoint(id=1)
+            if checkpoint.broken_sequence is not None:
+                return self._summary(checkpoint, 0, None)
+            # Read before the records, so everything up to it is already visible
+            head = session.get(AuditChainHead, 1)
+            head_sequence = head.last_sequence if head else 0
+
+            last_sequence = checkpoint.verified_sequence
+            last_checksum = checkpoint.verified_checksum
+            checked = 0
+            while max_rows is None or checked < max_rows:
+                limit = self.batch_size if max_rows is None else min(self.batch_size, max_rows - checked)
+                # Each batch starts from the last verified record, so a copy of it can't slip in unseen
+                anchor = 1 if last_sequence else 0
+                rows = session.execute(
+                    select(ActivityLog.__table__)
+                    .where(ActivityLog.sequence_number >= max(last_sequence, 1))
+                    .order_by(ActivityLog.sequence_number)
+                    .limit(limit + anchor)
+                ).mappings().all()
+                problem = None
+                if anchor and not (
+                    rows and rows[0]["sequence_number"] == last_sequence and rows[0]["checksum"] == last_checksum
+                ):
+                    problem = (last_sequence, f"verified record {last_sequence} is missing or was changed")
+                for row in rows[anchor:]:
+                    if problem:
+                        break
+                    if row["sequence_number"] != last_sequence + 1:
+                        problem = (
+                            row["sequence_number"],
+                            f"expected sequence {last_sequence + 1}, found {row['sequence_number']}"
+                        )
+                    elif row["checksum"] != record_checksum(row, last_checksum):
+                        problem = (row["sequence_number"], "checksum does not match the record")
+                    else:
+                        last_sequence, last_checksum = row["sequence_number"], row["checksum"]
+                        checked += 1
+                finished = len(rows) - anchor < limit
+                if not problem and finished and last_sequence < head_sequence:
+                    problem = (
+                        last_sequence + 1,
+                        f"records after {last_sequence} are missing; the chain head is at {head_sequence}"
+                    )
+
+                if problem:
+                    checkpoint.broken_sequence, checkpoint.broken_reason = problem
+                checkpoint.verified_sequence = last_sequence
+                checkpoint.verified_checksum = last_checksum
+                checkpoint.verified_at = datetime.utcnow()
+                session.add(checkpoint)
+                session.commit()
+                if problem:
+                    logger.error(f"Audit chain broken at sequence {problem[0]}: {problem[1]}")
+                    break
+                if finished:
+                    break
+            return self._summary(checkpoint, checked, head_sequence)
+        finally:
+            session.close()
+
+    @staticmethod
+    def _summary(checkpoint: AuditChainCheckpoint, checked: int, head_sequence: Optional[int]) -> Dict[str, Any]:
+        return {
+            "status": "broken" if checkpoint.broken_sequence is not None else "verified",
+            "verified_sequence": checkpoint.verified_sequence,
+            "head_sequence": head_sequence,
+            "records_checked": checked,
+            "verified_at": checkpoint.verified_at.isoformat() if checkpoint.verified_at else None,
+            "broken_sequence": checkpoint.broken_sequence,
+            "broken_reason": checkpoint.broken_reason,
+        }
@@ -0,0 +1,430 @@
+# ABOUTME: Queues audit trail records in memory and writes them to activity_log in batches
+# ABOUTME: Records are numbered and hash-chained at write time; records that can't be written yet spill to disk
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple, Union
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.models.activity_log import ActivityAction, ActivityLog, AuditChainHead
+from app.services.audit_chain import record_checksum
+
+logger = logging.getLogger(__name__)
+
+def _default_session_factory() -> Session:
+    # Imported lazily: app.core.db creates the engine at import time
+    from app.core.db import engine
+    return Session(engine)
+
+
+def _to_uuid(value: Optional[str]) -> Optional[uuid.UUID]:
+    return uuid.UUID(value) if value else None
+
+
+@contextmanager
+def _file_lock(path: Path) -> Iterator[None]:
+    """Exclusive lock held against every process and thread that locks the same path"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        yield
+
+
+class AuditLogWriter:
+    """
+    Bounded queue of audit records written to the database in batches.
+
+    record() validates a record and queues it; a background task numbers and
+    hash-chains records in queue order and inserts each batch in one statement.
+    Audit records are never dropped: when the queue is full or the database
+    can't take a batch, records are appended to a spill file (fsynced) and
+    written from there, oldest first, once the database catches up. Records
+    the database rejects outright are set aside in a rejected file.
+
+    Every worker process shares the spill files. Appending to the spill file
+    takes one file lock and replaying takes another, so no process renames or
+    removes a file another is still writing or replaying. record() never
+    touches the disk itself: a background thread does the appending.
+    """
+
+    def __init__(
+        self,
+        session_factory: Optional[Callable[[], Session]] = None,
+        capacity: int = settings.AUDIT_LOG_QUEUE_SIZE,
+        batch_size: int = settings.AUDIT_LOG_BATCH_SIZE,
+        spill_path: Union[str, Path] = settings.AUDIT_LOG_SPILL_PATH
+    ):
+        self.session_factory = session_factory or _default_session_factory
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.spill_path = Path(spill_path)
+        # Spilled records being written back; always older than the spill file
+        self.replay_path = self.spill_path.with_name(f"{self.spill_path.name}.replay")
+        self.rejected_path = self.spill_path.with_name(f"{self.spill_path.name}.rejected")
+        self.spill_lock_path = self.spill_path.with_name(f"{self.spill_path.name}.lock")
+        self.replay_lock_path = self.spill_path.with_name(f"{self.replay_path.name}.lock")
+        self._queue: Deque[Dict[str, Any]] = deque()
+        # Records bound for the spill file that the spill thread hasn't appended yet
+        self._overflow: List[Dict[str, Any]] = []
+        self._spill_wanted = threading.Event()
+        self._spill_thread: Optional[threading.Thread] = None
+        # While set, new records go to the spill file so they stay behind the ones already there
+        self._spilling = self.spill_path.exists() or self.replay_path.exists()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.is_running = False
+        self._stats = {
+            "recorded": 0, "written": 0, "spilled": 0, "rejected": 0,
+            "failed_batches": 0, "flushes": 0, "last_flush_ms": 0.0
+        }
+
+    def record(
+        self,
+        user_id: Union[uuid.UUID, str],
+        action: Union[ActivityAction, str],
+        resource_type: str,
+        resource_id: Optional[str] = None,
+        details: Optional[Dict[str, Any]] = None,
+        ip_address: Optional[str] = None,
+        user_agent: Optional[str] = None,
+        study_id: Optional[Union[uuid.UUID, str]] = None,
+        org_id: Optional[Union[uuid.UUID, str]] = None,
+        timestamp: Optional[datetime] = None,
+        old_value: Optional[Dict[str, Any]] = None,
+        new_value: Optional[Dict[str, Any]] = None,
+        reason: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Queue one audit record; raises ValueError for records the table can't hold"""
+        if user_id is None:
+            raise ValueError("Audit records need a user")
+        now = datetime.utcnow()
+        row = {
+            "id": str(uuid.uuid4()),
+            "user_id": str(user_id),
+            "org_id": str(org_id) if org_id else None,
+            "study_id": str(study_id) if study_id else None,
+            "action": ActivityAction(action).value,
+            "resource_type": resource_type,
+            "resource_id": str(resource_id) if resource_id else None,
+            # Round-tripped so the queued record is exactly what a spill file would hold
+            "details": json.loads(json.dumps(details or {}, default=str)),
+            "old_value": json.loads(json.dumps(old_value, default=str)),
+            "new_value": json.loads(json.dumps(new_value, default=str)),
+            "reason": reason,
+            "ip_address": ip_address,
+            "user_agent": user_agent[:500] if user_agent else None,
+            "timestamp": (timestamp or now).isoformat(),
+            "system_timestamp": now.isoformat(),
+        }
+        with self._lock:
+            self._stats["recorded"] += 1
+            if self._spilling or len(self._queue) >= self.capacity:
+                # What's queued spills too, so records reach the database in order
+                self._stats["spilled"] += len(self._queue) + 1
+                self._overflow.extend(self._queue)
+                self._overflow.append(row)
+                self._queue.clear()
+                self._spilling = True
+                self._spill_wanted.set()
+            else:
+                self._queue.append(row)
+        return row
+
+    def flush(self) -> int:
+        """Write spilled records, then everything queued; returns the number of records written"""
+        started = time.perf_counter()
+        written = 0
+        # One flusher at a time so sequence numbers follow record order, and
+        # one replaying process so a replay file is never swapped out mid-replay
+        with self._flush_lock, _file_lock(self.replay_lock_path):
+            # Records awaiting the spill file go to disk even if the database is still down
+            with _file_lock(self.spill_lock_path):
+                self._spill_overflow()
+            while True:
+                if self.replay_path.exists():
+                    replayed = self._replay()
+                    if replayed is None:
+                        return written
+                    written += replayed
+                with _file_lock(self.spill_lock_path):
+                    self._spill_overflow()
+                    if self.spill_path.exists():
+                        os.replace(self.spill_path, self.replay_path)
+                        continue
+                    with self._lock:
+                        if self._overflow:
+                            continue
+                        self._spilling = False
+                break
+
+            while True:
+                with self._lock:
+                    batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+                if not batch:
+                    break
+                count, remaining = self._write(batch)
+                written += count
+                if remaining:
+                    # Keep the failed records and everything after them on disk until the database is back
+                    self._append(self.replay_path, remaining)
+                    with self._lock:
+                        self._stats["spilled"] += len(remaining) + len(self._queue)
+                        # Whatever is queued is older than anything awaiting the spill file
+                        self._overflow[:0] = self._queue
+                        self._queue.clear()
+                        self._spilling = True
+                    self._spill_wanted.set()
+                    break
+
+        with self._lock:
+            self._stats["flushes"] += 1
+            self._stats["last_flush_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        return written
+
+    def _spill_overflow(self) -> int:
+        """Append records awaiting the spill file to it; the caller holds the spill lock"""
+        with self._lock:
+            rows, self._overflow = self._overflow, []
+        if not rows:
+            return 0
+        try:
+            self._append(self.spill_path, rows)
+        except BaseException:
+            with self._lock:
+                self._overflow[:0] = rows
+            raise
+        return len(rows)
+
+    def _spill_loop(self):
+        """Append overflowing records to the spill file as they arrive, off the request path"""
+        while self.is_running:
+            self._spill_wanted.wait()
+            self._spill_wanted.clear()
+            try:
+                with _file_lock(self.spill_lock_path):
+                    self._spill_overflow()
+            except Exception as e:
+                logger.error(f"Failed to spill audit records to {self.spill_path}: {e}")
+
+    def _replay(self) -> Optional[int]:
+        """Write the replay file in batches; None if the database failed part way"""
+        with open(self.replay_path) as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        written = 0
+        for start in range(0, len(rows), self.batch_size):
+            count, remaining = self._write(rows[start:start + self.batch_size], skip_existing=True)
+            written += count
+            if remaining:
+                tmp_path = self.replay_path.with_name(f".{self.replay_path.name}.tmp")
+                tmp_path.unlink(missing_ok=True)
+                self._append(tmp_path, remaining + rows[start + self.batch_size:])
+                os.replace(tmp_path, self.replay_path)
+                return None
+        self.replay_path.unlink()
+        return written
+
+    def _write(
+        self,
+        batch: List[Dict[str, Any]],
+        skip_existing: bool = False
+    ) -> Tuple[int, List[Dict[str, Any]]]:
+        """Insert a batch in one transaction; returns how many were written and the records still to be written"""
+        session = self.session_factory()
+        try:
+            if skip_existing:
+                # A replay interrupted after a commit must not insert those records twice;
+                # the timestamp bound keeps the lookup to the partitions they can be in
+                existing = set(session.execute(
+                    select(ActivityLog.id).where(
+                        ActivityLog.id.in_([_to_uuid(row["id"]) for row in batch]),
+                        ActivityLog.timestamp >= min(datetime.fromisoformat(row["timestamp"]) for row in batch)
+                    )
+                ).scalars())
+                batch = [row for row in batch if _to_uuid(row["id"]) not in existing]
+                if not batch:
+                    return 0, []
+            self._insert(session, batch)
+            session.commit()
+        except (IntegrityError, DataError) as e:
+            session.rollback()
+            logger.warning(f"Audit batch of {len(batch)} rejected, writing records one at a time: {e}")
+            return self._write_each(batch)
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Failed to write {len(batch)} audit records: {e}")
+            with self._lock:
+                self._stats["failed_batches"] += 1
+            return 0, batch
+        finally:
+            session.close()
+        with self._lock:
+            self._stats["written"] += len(batch)
+        return len(batch), []
+
+    def _write_each(self, batch: List[Dict[str, Any]]) -> Tuple[int, List[Dict[str, Any]]]:
+        """Write records singly so one the database rejects doesn't hold up the others"""
+        written = 0
+        for i, row in enumerate(batch):
+            session = self.session_factory()
+            try:
+                self._insert(session, [row])
+                session.commit()
+            except (IntegrityError, DataError) as e:
+                session.rollback()
+                logger.error(f"Audit record {row['id']} rejected by the database: {e}")
+                with _file_lock(self.spill_lock_path):
+                    self._append(self.rejected_path, [{**row, "error": str(e)}])
+                with self._lock:
+                    self._stats["rejected"] += 1
+                continue
+            except Exception as e:
+                session.rollback()
+                logger.error(f"Failed to write audit record {row['id']}: {e}")
+                with self._lock:
+                    self._stats["failed_batches"] += 1
+                return written, batch[i:]
+            finally:
+                session.close()
+            written += 1
+            with self._lock:
+                self._stats["written"] += 1
+        return written, []
+
+    def _insert(self, session: Session, batch: List[Dict[str, Any]]):
+        """Number and chain a batch after the chain head, and move the head past it"""
+        head = self._chain_head(session)
+        rows = []
+        for row in batch:
+            row = {
+                **row,
+                "id": _to_uuid(row["id"]),
+                "user_id": _to_uuid(row["user_id"]),
+                "org_id": _to_uuid(row["org_id"]),
+                "study_id": _to_uuid(row["study_id"]),
+                "action": ActivityAction(row["action"]),
+                "timestamp": datetime.fromisoformat(row["timestamp"]),
+                "system_timestamp": datetime.fromisoformat(row["system_timestamp"]),
+                "sequence_number": head.last_sequence + 1,
+            }
+            row["checksum"] = record_checksum(row, head.last_checksum)
+            head.last_sequence, head.last_checksum = row["sequence_number"], row["checksum"]
+            rows.append(row)
+        session.add(head)
+        session.execute(insert(ActivityLog.__table__), rows)
+
+    @staticmethod
+    def _chain_head(session: Session) -> AuditChainHead:
+        """
+        The chain head, locked until the transaction ends.
+
+        Writers append one at a time, so sequence numbers have no gaps: a
+        batch that rolls back gives its numbers back.
+        """
+        lock_head = select(AuditChainHead).where(AuditChainHead.id == 1).with_for_update()
+        head = session.execute(lock_head).scalar_one_or_none()
+        if head is None:
+            # A database the migration didn't seed: start after any records already there
+            last = session.execute(select(func.coalesce(func.max(ActivityLog.sequence_number), 0))).scalar()
+            head = AuditChainHead(id=1, last_sequence=last)
+            session.add(head)
+            try:
+                session.flush()
+            except IntegrityError:
+                # Another writer created it first
+                session.rollback()
+                head = session.execute(lock_head).scalar_one()
+        return head
+
+    @staticmethod
+    def _append(path: Path, rows: List[Dict[str, Any]]):
+        """Append records to a spill file and make sure they reached the disk"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "a") as f:
+            f.writelines(json.dumps(row) + "\n" for row in rows)
+            f.flush()
+            os.fsync(f.fileno())
+
+    async def start(self, interval: float = settings.AUDIT_LOG_FLUSH_INTERVAL):
+        """Start the background flush task and spill thread"""
+        if self.is_running:
+            return
+        self.is_running = True
+        self._spill_thread = threading.Thread(target=self._spill_loop, name="audit-spill", daemon=True)
+        self._spill_thread.start()
+        self._task = asyncio.create_task(self._flush_loop(interval))
+
+    async def stop(self):
+        """Stop the background task and write what's queued; what can't be written stays on disk"""
+        self.is_running = False
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._spill_thread:
+            self._spill_wanted.set()
+            await asyncio.to_thread(self._spill_thread.join)
+            self._spill_thread = None
+        await asyncio.to_thread(self.flush)
+
+    async def _flush_loop(self, interval: float):
+        while self.is_running:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception as e:
+                logger.error(f"Error flushing audit records: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Queue depth, spill state and write counters"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["queued"] = len(self._queue)
+            stats["awaiting_spill"] = len(self._overflow)
+            stats["spilling"] = self._spilling
+            oldest = self._queue[0]["system_timestamp"] if self._queue else None
+        stats["capacity"] = self.capacity
+        stats["queue_utilization"] = round(stats["queued"] / self.capacity, 4) if self.capacity else 0
+        stats["oldest_queued_seconds"] = (
+            round((datetime.utcnow() - datetime.fromisoformat(oldest)).total_seconds(), 3) if oldest else 0
+        )
+        stats["spill_bytes"] = sum(
+            path.stat().st_size for path in (self.spill_path, self.replay_path) if path.exists()
+        )
+        return stats
+
+
+_audit_log_writer: Optional[AuditLogWriter] = None
+_audit_log_writer_lock = threading.Lock()
+
+
+def get_audit_log_writer() -> AuditLogWriter:
+    """Get the process-wide audit log writer, creating it on first use"""
+    global _audit_log_writer
+    if _audit_log_writer is None:
+        with _audit_log_writer_lock:
+            if _audit_log_writer is None:
+                _audit_log_writer = AuditLogWriter()
+    return _audit_log_writer
@@ -6,14 +6,11 @@ import shutil
 import hashlib
 import pandas as pd
 import pyarrow as pa
-import pyarrow.parquet as pq
 from pathlib import Path
 from typing import Optional, Dict, Any, List, Tuple
 from datetime import datetime
 import uuid
 import json
-import zipfile
-import tempfile
 from fastapi import UploadFile, HTTPException
 from sqlmodel import Session, select
 
@@ -27,6 +24,11 @@ from app.models.data_source_upload import (
 from app.models.study import Study
 from app.core.config import settings
 from app.core.logging import logger
+from app.core.cache import bump_study_generation
+from app.services.dataset_statistics import write_statistics
+from app.services.parquet_writer import get_write_profile
+from app.services.type_normalizer import DatasetProfile
+from app.services.zip_ingestion import ZipIngestor
 
 class DataUploadService:
     """Service for handling data uploads and conversions"""
@@ -146,6 +148,9 @@ class DataUploadService:
             self.db.add(upload)
             self.db.commit()
             
+            if upload.is_active_version:
+                bump_study_generation(upload.study_id)
+            
         except Exception as e:
             logger.error(f"Processing failed for upload {upload.id}: {str(e)}")
             upload.status = UploadStatus.FAILED
@@ -163,9 +168,6 @@ class DataUploadService:
         df = self._read_file(raw_path, upload.file_format)
         
         if df is not None:
-            # Profile data
-            profile = self._profile_dataframe(df)
-            
             # Convert to Parquet
             parquet_path = self.base_parquet_path / str(upload.study_id) / f"v{upload.version_number}"
             parquet_path.mkdir(parents=True, exist_ok=True)
@@ -173,9 +175,12 @@ class DataUploadService:
             dataset_name = raw_path.stem
             parquet_file = parquet_path / f"{dataset_name}.parquet"
             
-            # Write Parquet with compression
+            # Write Parquet sorted and encoded for pruning
             table = pa.Table.from_pandas(df)
-            pq.write_table(table, parquet_file, compression='snappy')
+            get_write_profile().write_table(table, parquet_file, dataset_name)
+            
+            # Profile the table in one pass and keep it beside the dataset
+            statistics = write_statistics(parquet_file, DatasetProfile.of(table))
             
             # Create info object
             parquet_info = ParquetFileInfo(
@@ -192,56 +197,46 @@ class DataUploadService:
             parquet_info_list.append(parquet_info)
             
             # Store profile in upload metadata
-            upload.upload_metadata = {"data_profile": profile}
+            upload.upload_metadata = {"data_profile": statistics}
         
         return parquet_info_list
     
     async def _process_zip_file(self, upload: DataSourceUpload) -> List[ParquetFileInfo]:
-        """Process a ZIP file containing multiple datasets"""
+        """Process a ZIP file containing multiple datasets, converting them in parallel"""
         
         zip_path = Path(upload.raw_path)
         parquet_info_list = []
+        parquet_path = self.base_parquet_path / str(upload.study_id) / f"v{upload.version_number}"
         
-        with tempfile.TemporaryDirectory() as temp_dir:
-            temp_path = Path(temp_dir)
+        # Members are streamed out of the archive by the ingestion pool
+        results = await ZipIngestor().convert(zip_path, parquet_path)
+        
+        for result in results:
+            if result.error:
+                logger.error(f"Failed to convert {result.member}: {result.error}")
+                continue
+            if not result.success:
+                continue
             
-            # Extract ZIP
-            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                zip_ref.extractall(temp_path)
+            parquet_file = Path(result.parquet_path)
+            parquet_info = ParquetFileInfo(
+                dataset_name=result.dataset_name,
+                file_path=str(parquet_file),
+                row_count=result.stats.rows,
+                column_count=result.stats.columns,
+                columns=[{"name": field.name, "type": str(field.type)} for field in result.stats.schema],
+                file_size_mb=parquet_file.stat().st_size / (1024 * 1024),
+                compression="snappy",
+                created_at=datetime.utcnow()
+            )
             
-            # Process each file
-            for file_path in temp_path.rglob('*'):
-                if file_path.is_file():
-                    file_format = self._detect_file_format(file_path.name)
-                    
-                    if file_format and file_format != FileFormat.ZIP:
-                        df = self._read_file(file_path, file_format)
-                        
-                        if df is not None:
-                            # Convert to Parquet
-                            parquet_path = self.base_parquet_path / str(upload.study_id) / f"v{upload.version_number}"
-                            parquet_path.mkdir(parents=True, exist_ok=True)
-                            
-                            dataset_name = file_path.stem
-                            parquet_file = parquet_path / f"{dataset_name}.parquet"
-                            
-                            # Write Parquet
-                            table = pa.Table.from_pandas(df)
-                            pq.write_table(table, parquet_file, compression='snappy')
-                            
-                            # Create info object
-                            parquet_info = ParquetFileInfo(
-                                dataset_name=dataset_name,
-                                file_path=str(parquet_file),
-                                row_count=len(df),
-                                column_count=len(df.columns),
-                                columns=[{"name": col, "type": str(df[col].dtype)} for col in df.columns],
-                                file_size_mb=parquet_file.stat().st_size / (1024 * 1024),
-                                compression="snappy",
-                                created_at=datetime.utcnow()
-                            )
-                            
-                            parquet_info_list.append(parquet_info)
+            parquet_info_list.append(parquet_info)
+        
+        # Per-dataset timing for the upload record
+        upload.upload_metadata = {
+            **(upload.upload_metadata or {}),
+            "ingestion": [result.timing() for result in results]
+        }
         
         return parquet_info_list
     
@@ -274,43 +269,6 @@ class DataUploadService:
             logger.error(f"Failed to read file {file_path}: {str(e)}")
             return None
     
-    def _profile_dataframe(self, df: pd.DataFrame) -> Dict[str, Any]:
-        """Generate data profile for DataFrame"""
-        
-        profile = {
-            "shape": {"rows": len(df), "columns": len(df.columns)},
-            "columns": {},
-            "memory_usage_mb": df.memory_usage(deep=True).sum() / (1024 * 1024)
-        }
-        
-        for col in df.columns:
-            col_profile = {
-                "dtype": str(df[col].dtype),
-                "null_count": df[col].isnull().sum(),
-                "null_percentage": (df[col].isnull().sum() / len(df)) * 100,
-                "unique_count": df[col].nunique(),
-                "unique_percentage": (df[col].nunique() / len(df)) * 100
-            }
-            
-            # Add statistics for numeric columns
-            if pd.api.types.is_numeric_dtype(df[col]):
-                col_profile.update({
-                    "min": float(df[col].min()),
-                    "max": float(df[col].max()),
-                    "mean": float(df[col].mean()),
-                    "median": float(df[col].median()),
-                    "std": float(df[col].std())
-                })
-            
-            # Sample values for categorical columns
-            if pd.api.types.is_object_dtype(df[col]):
-                top_values = df[col].value_counts().head(10).to_dict()
-                col_profile["top_values"] = {str(k): v for k, v in top_values.items()}
-            
-            profile["columns"][col] = col_profile
-        
-        return profile
-    
     def _detect_file_format(self, filename: str) -> Optional[FileFormat]:
         """Detect file format from filename"""
         
@@ -12,6 +12,8 @@ from fastapi import HTTPException
 
 from app.models.data_source_upload import DataSourceUpload, UploadStatus
 from app.core.logging import logger
+from app.core.cache import bump_study_generation
+from app.services.duckdb_catalog import get_duckdb_pool
 
 class VersioningService:
     """Service for managing data versions"""
@@ -71,6 +73,11 @@ class VersioningService:
             )
         
         self.db.commit()
+        
+        # Widget queries must re-register views and stop serving cached
+        # results for the previously active data
+        get_duckdb_pool().invalidate_study(study_id)
+        bump_study_generation(study_id)
         return True
     
     def create_version_tag(
@@ -334,6 +341,9 @@ class VersioningService:
         self.db.commit()
         self.db.refresh(new_upload)
         
+        get_duckdb_pool().invalidate_study(study_id)
+        bump_study_generation(study_id)
+        
         return new_upload
     
     def _get_next_version(self, study_id: str) -> int:
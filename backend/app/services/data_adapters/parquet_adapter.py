@@ -7,6 +7,7 @@ import pyarrow.parquet as pq
 from pathlib import Path
 import logging
 
+from app.services.dataset_statistics import read_statistics
 from .base import FileBasedAdapter
 
 logger = logging.getLogger(__name__)
@@ -98,9 +99,10 @@ class ParquetAdapter(FileBasedAdapter):
                 
                 # Build column info
                 columns = []
+                statistics = read_statistics(file_path)
                 for i, field in enumerate(arrow_schema):
                     # Get column statistics if available
-                    col_stats = self._get_column_stats(parquet_file, i)
+                    col_stats = self._get_column_stats(parquet_file, i, statistics)
                     
                     columns.append({
                         "name": field.name,
@@ -183,8 +185,9 @@ class ParquetAdapter(FileBasedAdapter):
             # Build column info
             columns = []
             arrow_schema = parquet_file.schema_arrow
+            statistics = read_statistics(file_path)
             for i, field in enumerate(arrow_schema):
-                col_stats = self._get_column_stats(parquet_file, i)
+                col_stats = self._get_column_stats(parquet_file, i, statistics)
                 columns.append({
                     "name": field.name,
                     "type": self._map_arrow_type_to_generic(field.type),
@@ -207,10 +210,28 @@ class ParquetAdapter(FileBasedAdapter):
             logger.error(f"Error previewing Parquet file {table_or_file}: {str(e)}")
             raise
     
-    def _get_column_stats(self, parquet_file: pq.ParquetFile, column_index: int) -> Dict[str, Any]:
-        """Extract column statistics from parquet metadata."""
+    def _get_column_stats(
+        self,
+        parquet_file: pq.ParquetFile,
+        column_index: int,
+        statistics: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Extract column statistics from the dataset's statistics sidecar, or else parquet metadata."""
         stats = {}
         
+        name = parquet_file.schema_arrow.field(column_index).name
+        if statistics and name in statistics["columns"]:
+            # The sidecar covers the whole file, not only its first row group
+            column = statistics["columns"][name]
+            stats['null_count'] = column['null_count']
+            stats['distinct_count'] = column['unique_count']
+            if 'stats' in column:
+                stats['min_value'] = column['stats']['min']
+                stats['max_value'] = column['stats']['max']
+            if 'top_values' in column:
+                stats['top_values'] = column['top_values']
+            return stats
+        
         try:
             # Get statistics from first row group
             if parquet_file.metadata.num_row_groups > 0:
@@ -0,0 +1,209 @@
+# ABOUTME: Central Parquet reader with column projection, row-group pruning and I/O accounting
+# ABOUTME: Reads only the columns and row groups a request needs and reports the bytes scanned
+
+import logging
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Union
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from app.services.duckdb_catalog import get_duckdb_pool
+from app.services.filter_cache import CompiledFilter
+from app.services.filter_compiler import ArrowUnsupportedError, FilterCompiler
+
+logger = logging.getLogger(__name__)
+
+ARROW_ERRORS = (ArrowUnsupportedError, pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError)
+
+
+def required_columns(*column_groups: Optional[Iterable[str]]) -> List[str]:
+    """Union of the columns a widget needs (value, group-by, filter...), in first-seen order"""
+    seen: Dict[str, None] = {}
+    for group in column_groups:
+        for column in group or []:
+            if column:
+                seen.setdefault(column, None)
+    return list(seen)
+
+
+def check_filter_columns(compiled: Optional[CompiledFilter], schema: pa.Schema):
+    """Raise ValueError if the filter references columns the schema lacks"""
+    if compiled is None or compiled.ast is None:
+        return
+    missing = sorted(c for c in compiled.columns if schema.get_field_index(c) < 0)
+    if missing:
+        raise ValueError(f"Invalid filter expression: unknown column(s) {', '.join(missing)}")
+
+
+@dataclass
+class DatasetRead:
+    """Result of one dataset read plus what it cost"""
+    data: pd.DataFrame
+    columns: List[str]
+    rows_total: int
+    row_groups_read: int
+    row_groups_total: int
+    bytes_read: int
+    bytes_total: int
+    engine: str = "arrow"
+    elapsed_ms: float = 0.0
+
+    @property
+    def io(self) -> Dict[str, int]:
+        """I/O counters for response metadata"""
+        return {
+            "bytes_read": self.bytes_read,
+            "bytes_total": self.bytes_total,
+            "row_groups_read": self.row_groups_read,
+            "row_groups_total": self.row_groups_total,
+        }
+
+
+class DatasetReader:
+    """
+    Reads Parquet datasets for widgets and filters.
+
+    Only the projected columns are returned and only the filter and projected
+    columns are decoded. Row groups whose statistics can't match the filter
+    are skipped. bytes_read is the compressed size of the column chunks
+    scanned, taken from the file metadata.
+    """
+
+    def __init__(self, compiler: Optional[FilterCompiler] = None):
+        self.compiler = compiler or FilterCompiler()
+
+    def read(
+        self,
+        dataset_path: Union[str, Path],
+        columns: Optional[List[str]] = None,
+        compiled: Optional[CompiledFilter] = None,
+        compiler: Optional[FilterCompiler] = None
+    ) -> DatasetRead:
+        """
+        Read a dataset with an optional filter applied during the scan
+
+        columns=None reads every column; columns=[] reads none, which is
+        enough to count rows. Projected columns missing from the file are
+        skipped. A filter on a column the file lacks raises ValueError;
+        filters Arrow can't evaluate run in DuckDB instead.
+        """
+        start_time = time.time()
+        compiler = compiler or self.compiler
+        dataset = ds.dataset(str(dataset_path), format="parquet")
+        check_filter_columns(compiled, dataset.schema)
+        metadata = pq.ParquetFile(dataset_path).metadata
+
+        if columns is not None:
+            missing = [c for c in columns if dataset.schema.get_field_index(c) < 0]
+            if missing:
+                logger.debug(f"Skipping columns not in {dataset_path}: {missing}")
+            columns = [c for c in columns if c not in missing]
+        projected = columns if columns is not None else dataset.schema.names
+        ast = compiled.ast if compiled is not None else None
+        scanned = set(projected) | set(compiled.columns if ast is not None else [])
+        all_row_groups = list(range(metadata.num_row_groups))
+
+        if ast is None:
+            table = dataset.to_table(columns=columns)
+            result = self._result(table.to_pandas(), projected, metadata, all_row_groups, scanned, "arrow")
+        else:
+            try:
+                expression = compiled.to_arrow(compiler, dataset.schema)
+                fragments = [
+                    row_group
+                    for fragment in dataset.get_fragments()
+                    for row_group in fragment.split_by_row_group(expression, schema=dataset.schema)
+                ]
+                row_groups = [rg.id for fragment in fragments for rg in fragment.row_groups]
+                pruned = ds.FileSystemDataset(fragments, dataset.schema, dataset.format, dataset.filesystem)
+                table = pruned.to_table(columns=columns, filter=expression)
+                result = self._result(table.to_pandas(), projected, metadata, row_groups, scanned, "arrow")
+            except ARROW_ERRORS as e:
+                logger.info(f"Arrow pushdown not possible, filtering in DuckDB: {e}")
+                df = self._read_duckdb(dataset_path, compiled.to_sql(compiler), columns)
+                # DuckDB prunes on its own; count every row group as scanned
+                result = self._result(df, projected, metadata, all_row_groups, scanned, "duckdb")
+
+        result.elapsed_ms = (time.time() - start_time) * 1000
+        return result
+
+    def filter_frame(
+        self,
+        df: pd.DataFrame,
+        compiled: Optional[CompiledFilter],
+        compiler: Optional[FilterCompiler] = None
+    ) -> pd.DataFrame:
+        """
+        Filter a DataFrame already in memory exactly as read() filters a scan
+
+        The frame goes through Arrow, so NaN and None are nulls and LIKE,
+        != and NOT IN follow SQL semantics, with the same DuckDB fallback.
+        The returned frame has a fresh index.
+        """
+        if compiled is None or compiled.ast is None:
+            return df
+        compiler = compiler or self.compiler
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        check_filter_columns(compiled, table.schema)
+        try:
+            return table.filter(compiled.to_arrow(compiler, table.schema)).to_pandas()
+        except ARROW_ERRORS as e:
+            logger.info(f"Arrow filter not possible, filtering in DuckDB: {e}")
+            name = f"frame_{uuid.uuid4().hex}"
+            with get_duckdb_pool().connection() as conn:
+                conn.register(name, table)
+                try:
+                    return conn.execute(f"SELECT * FROM {name} WHERE {compiled.to_sql(compiler)}").df()
+                finally:
+                    conn.unregister(name)
+
+    def _read_duckdb(self, dataset_path: Union[str, Path], where_sql: str, columns: Optional[List[str]]) -> pd.DataFrame:
+        if columns is None:
+            select = "*"
+        elif columns:
+            select = ", ".join(self.compiler.quote_identifier(c) for c in columns)
+        else:
+            # No columns wanted, but the row count still matters
+            select = "1 AS __row"
+        source = self.compiler.sql_literal(str(dataset_path))
+        with get_duckdb_pool().connection() as conn:
+            df = conn.execute(f"SELECT {select} FROM read_parquet({source}) WHERE {where_sql}").df()
+        if columns == []:
+            df = df.drop(columns=["__row"])
+        return df
+
+    @staticmethod
+    def _result(
+        df: pd.DataFrame,
+        projected: List[str],
+        metadata: pq.FileMetaData,
+        row_groups: Iterable[int],
+        scanned: Set[str],
+        engine: str
+    ) -> DatasetRead:
+        row_groups = set(row_groups)
+        bytes_read = bytes_total = 0
+        for i in range(metadata.num_row_groups):
+            row_group = metadata.row_group(i)
+            for j in range(row_group.num_columns):
+                chunk = row_group.column(j)
+                size = chunk.total_compressed_size
+                bytes_total += size
+                if i in row_groups and chunk.path_in_schema.split(".")[0] in scanned:
+                    bytes_read += size
+        return DatasetRead(
+            data=df,
+            columns=list(projected),
+            rows_total=metadata.num_rows,
+            row_groups_read=len(row_groups),
+            row_groups_total=metadata.num_row_groups,
+            bytes_read=bytes_read,
+            bytes_total=bytes_total,
+            engine=engine,
+        )
@@ -0,0 +1,96 @@
+# ABOUTME: Per-dataset statistics sidecars written once during conversion
+# ABOUTME: Stores the column profile beside each parquet file, keyed by the data version it describes
+
+import json
+import logging
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from app.services.type_normalizer import DatasetProfile
+
+logger = logging.getLogger(__name__)
+
+STATISTICS_SUFFIX = ".stats.json"
+
+# Rows per batch when a dataset without a sidecar has to be profiled after the fact
+BACKFILL_BATCH_ROWS = 100000
+
+
+def statistics_path(parquet_path: Union[str, Path]) -> Path:
+    """Sidecar path for a dataset: adsl.parquet -> adsl.stats.json"""
+    parquet_path = Path(parquet_path)
+    return parquet_path.with_name(f"{parquet_path.stem}{STATISTICS_SUFFIX}")
+
+
+def data_version(parquet_path: Union[str, Path]) -> str:
+    """
+    Identity of a dataset's contents.
+
+    Writers replace files rather than rewriting them, and reused datasets are
+    hard-linked, so size and modification time change exactly when the data does.
+    """
+    stat = os.stat(parquet_path)
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+
+def write_statistics(parquet_path: Union[str, Path], profile: DatasetProfile) -> Dict[str, Any]:
+    """
+    Write the sidecar for a dataset from the profile taken while writing it.
+
+    Returns the statistics; failing to save them is logged, since readers can
+    always profile the dataset again.
+    """
+    parquet_path = Path(parquet_path)
+    statistics = {
+        "version": 1,
+        "dataset": parquet_path.stem,
+        "data_version": data_version(parquet_path),
+        "generated_at": datetime.utcnow().isoformat(),
+        "row_count": profile.rows,
+        "column_count": len(profile.columns),
+        "columns": profile.column_details(),
+        "sample_data": profile.sample,
+    }
+    path = statistics_path(parquet_path)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    try:
+        with open(tmp_path, "w") as f:
+            json.dump(statistics, f, default=str)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Failed to write statistics for {parquet_path}: {e}")
+        tmp_path.unlink(missing_ok=True)
+    return statistics
+
+
+def read_statistics(parquet_path: Union[str, Path]) -> Optional[Dict[str, Any]]:
+    """The dataset's sidecar, if there is one and it describes the current data"""
+    try:
+        with open(statistics_path(parquet_path)) as f:
+            statistics = json.load(f)
+        if statistics.get("data_version") == data_version(parquet_path):
+            return statistics
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable statistics for {parquet_path}: {e}")
+    return None
+
+
+def get_statistics(parquet_path: Union[str, Path]) -> Dict[str, Any]:
+    """Statistics for a dataset, profiling it once and saving the sidecar if it has none"""
+    statistics = read_statistics(parquet_path)
+    if statistics is not None:
+        return statistics
+
+    profile = DatasetProfile()
+    for batch in pq.ParquetFile(parquet_path).iter_batches(batch_size=BACKFILL_BATCH_ROWS):
+        profile.observe(pa.Table.from_batches([batch]))
+    if profile.schema is None:
+        profile.observe(pq.read_schema(parquet_path).empty_table())
+    return write_statistics(parquet_path, profile)
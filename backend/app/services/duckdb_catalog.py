@@ -0,0 +1,297 @@
+# ABOUTME: Process-wide DuckDB connection pool with a per-study catalog of Parquet views
+# ABOUTME: Views are registered once per data version and shared by every widget query
+
+import duckdb
+import itertools
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Any, Iterator, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class StudyCatalog:
+    """Views registered for one study's Parquet directory"""
+    study_id: str
+    schema: str
+    parquet_dir: Path
+    fingerprint: Tuple
+    tables: Dict[str, str] = field(default_factory=dict)
+
+
+class DuckDBConnectionPool:
+    """Thread-safe pool of DuckDB cursors over one shared in-memory database.
+
+    Every cursor sees the same catalog, so views registered by one request are
+    reused by all later requests in the process. Each study gets its own schema
+    so datasets with the same name (DM, AE, ...) never collide across studies.
+
+    A schema replaced by a rebuild is retired rather than dropped: it goes
+    once no connection is using it and drop_grace_seconds have passed, so
+    callers still holding the previous catalog can finish their queries.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = settings.DUCKDB_POOL_SIZE,
+        memory_limit: str = settings.DUCKDB_MEMORY_LIMIT,
+        threads: int = settings.DUCKDB_THREADS,
+        drop_grace_seconds: float = settings.DUCKDB_SCHEMA_DROP_GRACE_SECONDS,
+    ):
+        self.pool_size = pool_size
+        self.drop_grace_seconds = drop_grace_seconds
+        self._database = duckdb.connect(':memory:')
+        self._database.execute(f"SET memory_limit='{memory_limit}'")
+        self._database.execute(f"SET threads={int(threads)}")
+        self._database.execute("SET enable_progress_bar=false")
+
+        self._idle: "queue.LifoQueue[duckdb.DuckDBPyConnection]" = queue.LifoQueue()
+        self._created = 0
+        self._pool_lock = threading.Lock()
+
+        self._catalogs: Dict[str, StudyCatalog] = {}
+        self._catalog_lock = threading.Lock()
+        self._study_locks: Dict[str, threading.Lock] = {}
+        self._generations = itertools.count(1)
+        # Connections checked out per schema, and retired schemas with when they were retired
+        self._schema_users: Dict[str, int] = {}
+        self._retired: Dict[str, float] = {}
+
+        self._stats = {
+            "catalog_hits": 0,
+            "catalog_misses": 0,
+            "catalog_rebuilds": 0,
+            "catalog_invalidations": 0,
+            "views_registered": 0,
+            "schemas_dropped": 0,
+            "connections_created": 0,
+            "connection_waits": 0,
+        }
+        self._stats_lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Connections
+    # ------------------------------------------------------------------
+
+    def _acquire(self) -> duckdb.DuckDBPyConnection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._pool_lock:
+            if self._created < self.pool_size:
+                self._created += 1
+                self._incr("connections_created")
+                return self._database.cursor()
+
+        # Pool exhausted - wait for a connection to be released
+        self._incr("connection_waits")
+        return self._idle.get()
+
+    def _release(self, conn: duckdb.DuckDBPyConnection) -> None:
+        try:
+            conn.execute("USE memory.main")
+        except Exception as e:
+            logger.warning(f"Discarding DuckDB connection after reset failure: {e}")
+            with self._pool_lock:
+                self._created -= 1
+            return
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self, schema: Optional[str] = None) -> Iterator[duckdb.DuckDBPyConnection]:
+        """Check out a pooled connection, optionally scoped to a study schema"""
+        if schema:
+            with self._catalog_lock:
+                self._schema_users[schema] = self._schema_users.get(schema, 0) + 1
+        conn = self._acquire()
+        try:
+            if schema:
+                conn.execute(f"USE memory.{schema}")
+            yield conn
+        finally:
+            self._release(conn)
+            if schema:
+                with self._catalog_lock:
+                    self._schema_users[schema] -= 1
+                    if not self._schema_users[schema]:
+                        del self._schema_users[schema]
+                self._drop_retired()
+
+    # ------------------------------------------------------------------
+    # Study catalog
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def schema_name(study_id: Any) -> str:
+        """DuckDB schema holding the views for a study"""
+        return "study_" + re.sub(r"[^0-9a-zA-Z]", "_", str(study_id)).lower()
+
+    @staticmethod
+    def _fingerprint(parquet_dir: Path) -> Tuple:
+        """Cheap identity of a data version: directory plus file names, sizes and mtimes"""
+        entries = []
+        with os.scandir(parquet_dir) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith(".parquet"):
+                    stat = entry.stat()
+                    entries.append((entry.name, stat.st_size, stat.st_mtime_ns))
+        return (str(parquet_dir), tuple(sorted(entries)))
+
+    def _study_lock(self, key: str) -> threading.Lock:
+        with self._catalog_lock:
+            lock = self._study_locks.get(key)
+            if lock is None:
+                lock = self._study_locks[key] = threading.Lock()
+            return lock
+
+    def get_catalog(self, study_id: Any, parquet_dir: Path) -> Optional[StudyCatalog]:
+        """Return the study's registered views, building them on first use or
+        when the Parquet directory has changed since the last build."""
+        key = str(study_id)
+        parquet_dir = Path(parquet_dir)
+
+        if not parquet_dir.exists():
+            logger.warning(f"Parquet directory not found: {parquet_dir}")
+            return None
+
+        fingerprint = self._fingerprint(parquet_dir)
+        catalog = self._catalogs.get(key)
+        if catalog is not None and catalog.fingerprint == fingerprint:
+            self._incr("catalog_hits")
+            return catalog
+
+        with self._study_lock(key):
+            # Another thread may have built it while we waited
+            catalog = self._catalogs.get(key)
+            if catalog is not None and catalog.fingerprint == fingerprint:
+                self._incr("catalog_hits")
+                return catalog
+
+            self._incr("catalog_misses")
+            if catalog is not None:
+                self._incr("catalog_rebuilds")
+
+            previous = catalog
+            catalog = self._build_catalog(key, parquet_dir, fingerprint)
+            self._catalogs[key] = catalog
+
+        if previous is not None:
+            self._retire_schema(previous.schema)
+        return catalog
+
+    def _build_catalog(self, study_id: str, parquet_dir: Path, fingerprint: Tuple) -> StudyCatalog:
+        # Each build gets a fresh schema so queries still running against the
+        # previous data version are never pointed at half-registered views
+        schema = f"{self.schema_name(study_id)}_g{next(self._generations)}"
+        catalog = StudyCatalog(
+            study_id=study_id,
+            schema=schema,
+            parquet_dir=parquet_dir,
+            fingerprint=fingerprint,
+        )
+
+        with self.connection() as conn:
+            conn.execute(f"CREATE SCHEMA {schema}")
+
+            for name, _, _ in fingerprint[1]:
+                parquet_file = parquet_dir / name
+                table_name = parquet_file.stem
+                try:
+                    conn.execute(f"""
+                        CREATE OR REPLACE VIEW {schema}.{table_name} AS
+                        SELECT * FROM read_parquet('{parquet_file}')
+                    """)
+                    catalog.tables[table_name] = str(parquet_file)
+                    self._incr("views_registered")
+                except Exception as e:
+                    logger.error(f"Failed to register {parquet_file}: {str(e)}")
+
+        logger.info(
+            f"Registered {len(catalog.tables)} datasets for study {study_id} from {parquet_dir}"
+        )
+        return catalog
+
+    def _retire_schema(self, schema: str) -> None:
+        with self._catalog_lock:
+            self._retired[schema] = time.monotonic()
+        self._drop_retired()
+
+    def _drop_retired(self) -> None:
+        """Drop retired schemas that are past their grace period and no longer in use"""
+        if not self._retired:
+            return
+        cutoff = time.monotonic() - self.drop_grace_seconds
+        with self._catalog_lock:
+            droppable = [
+                schema for schema, retired_at in self._retired.items()
+                if retired_at <= cutoff and schema not in self._schema_users
+            ]
+            for schema in droppable:
+                del self._retired[schema]
+        for schema in droppable:
+            self._drop_schema(schema)
+
+    def _drop_schema(self, schema: str) -> None:
+        try:
+            with self.connection() as conn:
+                conn.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+            self._incr("schemas_dropped")
+        except Exception as e:
+            logger.warning(f"Failed to drop DuckDB schema {schema}: {e}")
+
+    def invalidate_study(self, study_id: Any) -> bool:
+        """Forget a study's catalog so the next query rebuilds it"""
+        key = str(study_id)
+        with self._study_lock(key):
+            catalog = self._catalogs.pop(key, None)
+        if catalog is None:
+            return False
+        self._retire_schema(catalog.schema)
+        self._incr("catalog_invalidations")
+        return True
+
+    # ------------------------------------------------------------------
+    # Metrics
+    # ------------------------------------------------------------------
+
+    def _incr(self, name: str, amount: int = 1) -> None:
+        with self._stats_lock:
+            self._stats[name] += amount
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Catalog and pool metrics"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats["catalog_hits"] + stats["catalog_misses"]
+        stats["catalog_hit_rate"] = round(stats["catalog_hits"] / lookups * 100, 2) if lookups else 0.0
+        stats["studies_cached"] = len(self._catalogs)
+        stats["schemas_retired"] = len(self._retired)
+        stats["pool_size"] = self.pool_size
+        stats["connections_idle"] = self._idle.qsize()
+        return stats
+
+
+_pool: Optional[DuckDBConnectionPool] = None
+_pool_init_lock = threading.Lock()
+
+
+def get_duckdb_pool() -> DuckDBConnectionPool:
+    """Get the process-wide DuckDB pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_init_lock:
+            if _pool is None:
+                _pool = DuckDBConnectionPool()
+    return _pool
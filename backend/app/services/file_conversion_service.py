@@ -5,15 +5,20 @@ import os
 import zipfile
 import shutil
 import json
+import time
 
 try:
     import pandas as pd
     import pyarrow as pa
     import pyarrow.parquet as pq
+    from app.services.streaming_converter import ConversionStats, StreamingParquetConverter
+    from app.services.type_normalizer import TypeNormalizer
+    from app.services.zip_ingestion import ZipIngestor
 except ImportError:
     pd = None
     pa = None
     pq = None
+    StreamingParquetConverter = None
 
 try:
     import pyreadstat
@@ -34,6 +39,7 @@ from app.clinical_modules.utils.folder_structure import (
     ensure_folder_exists,
     get_timestamp_folder
 )
+from app.services.ingest_manifest import IngestManifest, file_sha256, link_dataset
 
 logger = logging.getLogger(__name__)
 
@@ -47,6 +53,10 @@ class ConversionResult:
     total_columns: int
     error_message: Optional[str] = None
     warnings: Optional[List[str]] = None
+    rows_per_second: Optional[float] = None
+    peak_rss_mb: Optional[float] = None
+    datasets_converted: int = 0
+    datasets_reused: int = 0
 
 
 class FileConversionService:
@@ -60,31 +70,45 @@ class FileConversionService:
         '.xls': 'read_excel'
     }
     
+    # Formats converted chunk by chunk instead of through a DataFrame
+    STREAMING_FORMATS = {'.csv', '.sas7bdat', '.xpt'}
+    
+    # Ingest manifest profiles: the two pipelines clean column names differently
+    UPLOAD_PROFILE = 'upload'
+    STUDY_PROFILE = 'study'
+    
     def __init__(self):
         self.warnings = []
+        self.streaming = StreamingParquetConverter() if StreamingParquetConverter else None
+        self.conversion_stats: Dict[str, ConversionStats] = {}
     
     async def process_upload(
         self,
         upload_id: str,
         file_path: str,
         output_path: str,
-        file_format: str
+        file_format: str,
+        manifest: Optional[IngestManifest] = None
     ) -> ConversionResult:
         """
         Process an uploaded file and convert to parquet.
+        
+        With a manifest, files whose content was converted before are
+        linked to the existing parquet file instead of converted again.
         """
         self.warnings = []
-        files_extracted = []
-        total_rows = 0
-        total_columns = 0
         
         try:
             # Handle ZIP files
             if file_format.lower() == 'zip':
-                return await self._process_zip_file(file_path, output_path)
+                result = await self._process_zip_file(file_path, output_path, manifest)
             else:
                 # Process single file
-                return await self._process_single_file(file_path, output_path, file_format)
+                result = await self._process_single_file(file_path, output_path, file_format, manifest)
+            
+            if manifest is not None and result.success:
+                manifest.save()
+            return result
                 
         except Exception as e:
             logger.error(f"Failed to process upload {upload_id}: {str(e)}")
@@ -97,72 +121,96 @@ class FileConversionService:
                 warnings=self.warnings
             )
     
-    async def _process_zip_file(self, zip_path: str, output_path: str) -> ConversionResult:
-        """Extract and process files from a ZIP archive."""
+    async def _process_zip_file(
+        self,
+        zip_path: str,
+        output_path: str,
+        manifest: Optional[IngestManifest] = None
+    ) -> ConversionResult:
+        """Convert the files in a ZIP archive concurrently, reading them straight from the archive."""
         files_extracted = []
         total_rows = 0
         total_columns = 0
+        peak_rss_mb = 0.0
+        reused = 0
         
         try:
             with zipfile.ZipFile(zip_path, 'r') as zip_file:
-                # Extract all files
-                extract_path = Path(output_path).parent / "extracted"
-                extract_path.mkdir(exist_ok=True)
-                zip_file.extractall(extract_path)
-                
-                # Process each file
+                sizes = {info.filename: info.file_size for info in zip_file.infolist()}
                 for file_name in zip_file.namelist():
-                    if file_name.endswith('/'):  # Skip directories
-                        continue
-                    
-                    file_path = extract_path / file_name
-                    file_extension = Path(file_name).suffix.lower()
-                    
-                    if file_extension in self.SUPPORTED_FORMATS:
-                        try:
-                            # Convert to parquet
-                            dataset_name = Path(file_name).stem
-                            parquet_path = Path(output_path) / f"{dataset_name}.parquet"
-                            
-                            df = await self._read_file(str(file_path), file_extension)
-                            
-                            if df is not None and not df.empty:
-                                # Save as parquet
-                                await self._save_parquet(df, str(parquet_path))
-                                
-                                # Collect metadata
-                                file_info = {
-                                    "name": file_name,
-                                    "dataset_name": dataset_name,
-                                    "format": file_extension[1:],
-                                    "size_mb": file_path.stat().st_size / (1024 * 1024),
-                                    "rows": len(df),
-                                    "columns": len(df.columns),
-                                    "column_info": self._get_column_info(df),
-                                    "parquet_path": str(parquet_path)
-                                }
-                                
-                                files_extracted.append(file_info)
-                                total_rows += len(df)
-                                total_columns = max(total_columns, len(df.columns))
-                            else:
-                                self.warnings.append(f"File {file_name} is empty or could not be read")
-                                
-                        except Exception as e:
-                            self.warnings.append(f"Failed to process {file_name}: {str(e)}")
-                    else:
+                    if not file_name.endswith('/') and Path(file_name).suffix.lower() not in self.SUPPORTED_FORMATS:
                         self.warnings.append(f"Unsupported file format: {file_name}")
+            
+            start_time = time.perf_counter()
+            results = await ZipIngestor().convert(
+                zip_path,
+                output_path,
+                rename=self._clean_column_name,
+                infer_dates=True,
+                extensions=self.SUPPORTED_FORMATS,
+                reuse=manifest.known(self.UPLOAD_PROFILE) if manifest is not None else None
+            )
+            elapsed_seconds = time.perf_counter() - start_time
+            
+            for result in results:
+                if result.error:
+                    self.warnings.append(f"Failed to process {result.member}: {result.error}")
+                    continue
+                if not result.success:
+                    Path(result.parquet_path).unlink(missing_ok=True)
+                    self.warnings.append(f"File {result.member} is empty or could not be read")
+                    continue
+                
+                stats = result.stats
+                self.conversion_stats[result.parquet_path] = stats
+                self.warnings.extend(stats.warnings)
+                
+                entry = None
+                if manifest is not None and result.reused:
+                    entry = manifest.lookup(result.content_hash, self.UPLOAD_PROFILE)
+                if entry is not None:
+                    column_info = entry["column_info"]
+                    reused += 1
+                else:
+                    column_info = (
+                        stats.profile.column_info() if stats.profile is not None
+                        else self._get_parquet_column_info(Path(result.parquet_path), stats.schema)
+                    )
+                    if manifest is not None:
+                        manifest.record(
+                            result.content_hash, self.UPLOAD_PROFILE, result.parquet_path,
+                            rows=stats.rows, columns=stats.columns, column_info=column_info
+                        )
                 
-                # Clean up extracted files
-                import shutil
-                shutil.rmtree(extract_path)
+                # Collect metadata
+                file_info = {
+                    "name": result.member,
+                    "dataset_name": result.dataset_name,
+                    "format": Path(result.member).suffix.lower()[1:],
+                    "size_mb": sizes[result.member] / (1024 * 1024),
+                    "rows": stats.rows,
+                    "columns": stats.columns,
+                    "column_info": column_info,
+                    "parquet_path": result.parquet_path,
+                    "conversion": stats.to_dict(),
+                    "reused": entry is not None
+                }
                 
+                files_extracted.append(file_info)
+                total_rows += stats.rows
+                total_columns = max(total_columns, stats.columns)
+                peak_rss_mb = max(peak_rss_mb, stats.peak_rss_mb)
+            
             return ConversionResult(
                 success=True,
                 files_extracted=files_extracted,
                 total_rows=total_rows,
                 total_columns=total_columns,
-                warnings=self.warnings if self.warnings else None
+                warnings=self.warnings if self.warnings else None,
+                rows_per_second=round(total_rows / elapsed_seconds, 1) if elapsed_seconds else None,
+                peak_rss_mb=peak_rss_mb or None,
+                datasets_converted=len(files_extracted) - reused,
+                datasets_reused=reused
             )
             
         except Exception as e:
@@ -179,7 +227,8 @@ class FileConversionService:
         self, 
         file_path: str, 
         output_path: str, 
-        file_format: str
+        file_format: str,
+        manifest: Optional[IngestManifest] = None
     ) -> ConversionResult:
         """Process a single data file."""
         try:
@@ -193,22 +242,38 @@ class FileConversionService:
                     error_message=f"Unsupported file format: {file_format}"
                 )
             
-            # Read the file
-            df = await self._read_file(file_path, file_extension)
-            
-            if df is None or df.empty:
-                return ConversionResult(
-                    success=False,
-                    files_extracted=[],
-                    total_rows=0,
-                    total_columns=0,
-                    error_message="File is empty or could not be read"
-                )
-            
-            # Save as parquet
             dataset_name = Path(file_path).stem
             parquet_path = Path(output_path) / f"{dataset_name}.parquet"
-            await self._save_parquet(df, str(parquet_path))
+            
+            # Reuse the dataset if this exact content was converted before
+            entry = None
+            if manifest is not None:
+                loop = asyncio.get_event_loop()
+                content_hash = await loop.run_in_executor(None, file_sha256, file_path)
+                entry = manifest.lookup(content_hash, self.UPLOAD_PROFILE)
+            
+            if entry is not None:
+                link_dataset(entry["parquet_path"], parquet_path)
+                column_info = entry["column_info"]
+                stats = ConversionStats(rows=entry["rows"], columns=entry["columns"])
+            else:
+                # Convert the file
+                converted = await self._convert_file(Path(file_path), parquet_path, file_extension)
+                
+                if converted is None:
+                    return ConversionResult(
+                        success=False,
+                        files_extracted=[],
+                        total_rows=0,
+                        total_columns=0,
+                        error_message="File is empty or could not be read"
+                    )
+                column_info, stats = converted
+                if manifest is not None:
+                    manifest.record(
+                        content_hash, self.UPLOAD_PROFILE, parquet_path,
+                        rows=stats.rows, columns=stats.columns, column_info=column_info
+                    )
             
             # Collect metadata
             file_info = {
@@ -216,18 +281,24 @@ class FileConversionService:
                 "dataset_name": dataset_name,
                 "format": file_format,
                 "size_mb": Path(file_path).stat().st_size / (1024 * 1024),
-                "rows": len(df),
-                "columns": len(df.columns),
-                "column_info": self._get_column_info(df),
-                "parquet_path": str(parquet_path)
+                "rows": stats.rows,
+                "columns": stats.columns,
+                "column_info": column_info,
+                "parquet_path": str(parquet_path),
+                "conversion": stats.to_dict(),
+                "reused": entry is not None
             }
             
             return ConversionResult(
                 success=True,
                 files_extracted=[file_info],
-                total_rows=len(df),
-                total_columns=len(df.columns),
-                warnings=self.warnings if self.warnings else None
+                total_rows=stats.rows,
+                total_columns=stats.columns,
+                warnings=self.warnings if self.warnings else None,
+                rows_per_second=stats.rows_per_second if entry is None else None,
+                peak_rss_mb=stats.peak_rss_mb if entry is None else None,
+                datasets_converted=int(entry is None),
+                datasets_reused=int(entry is not None)
             )
             
         except Exception as e:
@@ -240,6 +311,66 @@ class FileConversionService:
                 warnings=self.warnings
             )
     
+    async def _convert_file(
+        self,
+        file_path: Path,
+        parquet_path: Path,
+        file_extension: str
+    ) -> Optional[Tuple[List[Dict[str, Any]], ConversionStats]]:
+        """Convert one file to parquet; returns column info and stats, or None if empty or unreadable."""
+        loop = asyncio.get_event_loop()
+        
+        if file_extension in self.STREAMING_FORMATS and self.streaming is not None:
+            try:
+                stats, _ = await loop.run_in_executor(
+                    None,
+                    lambda: self._stream_file(file_path, parquet_path, self._clean_column_name, infer_dates=True)
+                )
+            except Exception as e:
+                logger.error(f"Failed to read file {file_path}: {str(e)}")
+                return None
+            if not stats.rows:
+                parquet_path.unlink(missing_ok=True)
+                return None
+            return stats.profile.column_info(), stats
+        
+        start_time = time.perf_counter()
+        df = await self._read_file(str(file_path), file_extension)
+        if df is None or df.empty:
+            return None
+        # Dates are typed and the schema profiled as the file is written
+        stats = await loop.run_in_executor(
+            None,
+            lambda: self.streaming.write_tables(
+                parquet_path, iter([pa.Table.from_pandas(df)]), normalizer=TypeNormalizer(parse_dates=True)
+            )
+        )
+        stats.elapsed_seconds = time.perf_counter() - start_time
+        return stats.profile.column_info(), stats
+    
+    def _stream_file(
+        self,
+        file_path: Path,
+        parquet_path: Path,
+        rename: Callable[[str], str],
+        infer_dates: bool = False
+    ) -> Tuple[ConversionStats, Any]:
+        """Stream a CSV/SAS/XPT file into parquet; returns the stats and any SAS metadata."""
+        extension = file_path.suffix.lower()
+        if extension == '.csv':
+            stats, meta = self.streaming.convert_csv(file_path, parquet_path, rename=rename, infer_dates=infer_dates), None
+        else:
+            file_format = 'sas7bdat' if extension == '.sas7bdat' else 'xpt'
+            stats, meta = self.streaming.convert_sas(file_path, parquet_path, file_format=file_format, rename=rename)
+        
+        self.conversion_stats[str(parquet_path)] = stats
+        self.warnings.extend(stats.warnings)
+        logger.info(
+            f"Converted {file_path.name}: {stats.rows} rows in {stats.chunks} chunks, "
+            f"{stats.rows_per_second} rows/s, peak RSS {stats.peak_rss_mb} MB"
+        )
+        return stats, meta
+    
     async def _read_file(self, file_path: str, file_extension: str) -> Optional[pd.DataFrame]:
         """Read a file into a pandas DataFrame."""
         try:
@@ -271,9 +402,6 @@ class FileConversionService:
             # Clean column names
             df.columns = [self._clean_column_name(col) for col in df.columns]
             
-            # Convert date columns
-            df = self._convert_date_columns(df)
-            
             return df
             
         except UnicodeDecodeError:
@@ -295,30 +423,8 @@ class FileConversionService:
             logger.error(f"Failed to read file {file_path}: {str(e)}")
             return None
     
-    async def _save_parquet(self, df: pd.DataFrame, output_path: str):
-        """Save DataFrame as parquet file."""
-        try:
-            # Convert to pyarrow table
-            table = pa.Table.from_pandas(df)
-            
-            # Write parquet file with compression
-            loop = asyncio.get_event_loop()
-            await loop.run_in_executor(
-                None,
-                lambda: pq.write_table(
-                    table, 
-                    output_path,
-                    compression='snappy',
-                    use_dictionary=True,
-                    row_group_size=50000
-                )
-            )
-            
-        except Exception as e:
-            logger.error(f"Failed to save parquet file: {str(e)}")
-            raise
-    
-    def _clean_column_name(self, col_name: str) -> str:
+    @staticmethod
+    def _clean_column_name(col_name: str) -> str:
         """Clean column name for parquet compatibility."""
         # Remove special characters and spaces
         import re
@@ -326,74 +432,71 @@ class FileConversionService:
         cleaned = cleaned.strip().replace(' ', '_')
         return cleaned if cleaned else f"column_{hash(col_name)}"
     
-    def _convert_date_columns(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Attempt to convert date columns to datetime."""
-        for col in df.columns:
-            if df[col].dtype == 'object':
-                # Try to convert to datetime
-                try:
-                    # Check if it looks like a date
-                    sample = df[col].dropna().head(10)
-                    if sample.empty:
-                        continue
-                    
-                    # Common date patterns
-                    date_patterns = ['%Y-%m-%d', '%d/%m/%Y', '%m/%d/%Y', '%Y%m%d']
-                    
-                    for pattern in date_patterns:
-                        try:
-                            df[col] = pd.to_datetime(df[col], format=pattern, errors='coerce')
-                            if df[col].notna().sum() > len(df) * 0.5:  # If more than 50% converted successfully
-                                break
-                        except:
-                            continue
-                            
-                except Exception:
-                    pass
+    def _get_parquet_column_info(self, parquet_path: Path, schema: pa.Schema) -> List[Dict[str, Any]]:
+        """Get column information from a written parquet file's schema and statistics."""
+        metadata = pq.ParquetFile(parquet_path).metadata
+        null_counts: List[Optional[int]] = [0] * len(schema)
+        for i in range(metadata.num_row_groups):
+            row_group = metadata.row_group(i)
+            for j in range(row_group.num_columns):
+                statistics = row_group.column(j).statistics
+                if statistics is None or not statistics.has_null_count or null_counts[j] is None:
+                    null_counts[j] = None
+                else:
+                    null_counts[j] += statistics.null_count
         
-        return df
-    
-    def _get_column_info(self, df: pd.DataFrame) -> List[Dict[str, str]]:
-        """Get column information from DataFrame."""
         columns = []
-        for col in df.columns:
-            dtype = str(df[col].dtype)
-            
-            # Simplify dtype names
-            if 'int' in dtype:
+        for field, null_count in zip(schema, null_counts):
+            if pa.types.is_integer(field.type):
                 dtype_simple = 'integer'
-            elif 'float' in dtype:
+            elif pa.types.is_floating(field.type):
                 dtype_simple = 'numeric'
-            elif 'datetime' in dtype:
+            elif pa.types.is_temporal(field.type):
                 dtype_simple = 'datetime'
-            elif 'bool' in dtype:
+            elif pa.types.is_boolean(field.type):
                 dtype_simple = 'boolean'
             else:
                 dtype_simple = 'string'
             
             columns.append({
-                "name": col,
+                "name": field.name,
                 "type": dtype_simple,
-                "nullable": df[col].isna().any()
+                "nullable": null_count is None or null_count > 0
             })
         
         return columns
     
+    def _conversion_summary(self, parquet_path: Path) -> Dict[str, Any]:
+        """Throughput and memory figures for a streamed conversion, if there was one."""
+        stats = self.conversion_stats.get(str(parquet_path))
+        if stats is None:
+            return {}
+        return {
+            "rows": stats.rows,
+            "rows_per_second": stats.rows_per_second,
+            "peak_rss_mb": stats.peak_rss_mb
+        }
+    
     async def convert_study_files(
         self,
         org_id: uuid.UUID,
         study_id: uuid.UUID,
         files: List[Dict[str, Any]],
-        progress_callback: Optional[Callable[[int, Optional[str]], Awaitable[None]]] = None
+        progress_callback: Optional[Callable[[int, Optional[str]], Awaitable[None]]] = None,
+        manifest: Optional[IngestManifest] = None
     ) -> Dict[str, Any]:
         """
         Convert multiple study files to parquet with progress tracking
         
+        Files whose content matches an earlier extract are linked to that
+        extract's parquet file and schema instead of being converted again.
+        
         Args:
             org_id: Organization ID
             study_id: The study ID
             files: List of file information dictionaries
             progress_callback: Async callback for progress updates
+            manifest: Ingest manifest to consult; defaults to the study's
             
         Returns:
             Comprehensive results including datasets, converted files, and folder information
@@ -420,6 +523,9 @@ class FileConversionService:
             target_path = get_study_data_path(org_id, study_id, results["timestamp"])
             ensure_folder_exists(target_path)
         
+        if manifest is None:
+            manifest = IngestManifest.for_study(org_id, study_id)
+        
         # Track progress
         total_steps = len(files) * 3  # Extract, convert, schema for each file
         current_step = 0
@@ -448,36 +554,39 @@ class FileConversionService:
                     for extracted_file in extracted_files:
                         if extracted_file.suffix.lower() in self.SUPPORTED_FORMATS:
                             await update_progress(f"Converting {extracted_file.name} to parquet...")
-                            parquet_path = await self._convert_to_parquet_v2(extracted_file, target_path)
+                            parquet_path, schema_info, reused = await self._convert_or_reuse_v2(
+                                extracted_file, target_path, manifest, update_progress
+                            )
                             
                             if parquet_path:
-                                await update_progress(f"Extracting schema from {parquet_path.name}...")
-                                schema_info = await self._extract_parquet_schema_v2(parquet_path)
                                 dataset_name = parquet_path.stem.lower()
                                 results["datasets"][dataset_name] = schema_info
                                 results["converted_files"].append({
                                     "original": str(extracted_file),
                                     "parquet": str(parquet_path),
-                                    "dataset": dataset_name
+                                    "dataset": dataset_name,
+                                    "reused": reused,
+                                    **self._conversion_summary(parquet_path)
                                 })
                 else:
                     # Step 2: Convert to parquet
                     await update_progress(f"Converting {file_info['name']} to parquet...")
                     
                     # Files are already in the correct location (uploaded to source_data folder)
-                    # Just convert them in place
-                    parquet_path = await self._convert_to_parquet_v2(file_path, file_path.parent)
+                    # Just convert them in place; step 3 (schema) happens inside
+                    parquet_path, schema_info, reused = await self._convert_or_reuse_v2(
+                        file_path, file_path.parent, manifest, update_progress
+                    )
                     
                     if parquet_path:
-                        # Step 3: Extract schema
-                        await update_progress(f"Extracting schema from {parquet_path.name}...")
-                        schema_info = await self._extract_parquet_schema_v2(parquet_path)
                         dataset_name = parquet_path.stem.lower()
                         results["datasets"][dataset_name] = schema_info
                         results["converted_files"].append({
                             "original": str(file_path),
                             "parquet": str(parquet_path),
-                            "dataset": dataset_name
+                            "dataset": dataset_name,
+                            "reused": reused,
+                            **self._conversion_summary(parquet_path)
                         })
                         
             except Exception as e:
@@ -488,11 +597,16 @@ class FileConversionService:
         if progress_callback:
             await progress_callback(100, "Processing complete")
         
+        manifest.save()
+        reused_count = sum(1 for f in results["converted_files"] if f["reused"])
+        
         # Add summary statistics
         results["summary"] = {
             "total_files_uploaded": len(files),
             "total_datasets_created": len(results["datasets"]),
             "total_files_converted": len(results["converted_files"]),
+            "datasets_converted": len(results["converted_files"]) - reused_count,
+            "datasets_reused": reused_count,
             "data_folder": str(target_path),
             "has_errors": len(results["errors"]) > 0
         }
@@ -503,6 +617,41 @@ class FileConversionService:
         
         return results
     
+    async def _convert_or_reuse_v2(
+        self,
+        file_path: Path,
+        target_dir: Path,
+        manifest: IngestManifest,
+        update_progress: Callable[[str], Awaitable[None]]
+    ) -> Tuple[Optional[Path], Dict[str, Any], bool]:
+        """Convert a file and extract its schema, or link both from the manifest if the content is unchanged"""
+        loop = asyncio.get_event_loop()
+        content_hash = await loop.run_in_executor(None, file_sha256, file_path)
+        entry = manifest.lookup(content_hash, self.STUDY_PROFILE)
+        parquet_path = target_dir / f"{file_path.stem}.parquet"
+        
+        if entry is not None:
+            await update_progress(f"Reusing unchanged {parquet_path.name}...")
+            link_dataset(entry["parquet_path"], parquet_path)
+            if entry.get("metadata_path") and Path(entry["metadata_path"]).exists():
+                link_dataset(entry["metadata_path"], target_dir / f"{file_path.stem}_metadata.json")
+            schema_info = {**entry["schema"], "file_name": parquet_path.name, "file_path": str(parquet_path)}
+            return parquet_path, schema_info, True
+        
+        parquet_path = await self._convert_to_parquet_v2(file_path, target_dir)
+        if not parquet_path:
+            return None, {}, False
+        
+        schema_info = self._schema_info_v2(parquet_path)
+        if "error" not in schema_info:
+            meta_path = target_dir / f"{file_path.stem}_metadata.json"
+            manifest.record(
+                content_hash, self.STUDY_PROFILE, parquet_path,
+                schema=schema_info,
+                metadata_path=str(meta_path) if meta_path.exists() else None
+            )
+        return parquet_path, schema_info, False
+    
     async def _extract_zip_file_v2(self, zip_path: Path, target_dir: Path) -> List[Path]:
         """Extract ZIP file and return list of extracted files"""
         extracted_files = []
@@ -568,35 +717,19 @@ class FileConversionService:
             return None
     
     async def _convert_csv_to_parquet_v2(self, file_path: Path, target_dir: Path) -> Optional[Path]:
-        """Convert CSV to parquet"""
-        if pd is None:
-            logger.error("pandas not available for CSV conversion")
+        """Convert CSV to parquet, streaming it in blocks"""
+        if self.streaming is None:
+            logger.error("pyarrow not available for CSV conversion")
             return None
         
         try:
             loop = asyncio.get_event_loop()
-            
-            # Read CSV with proper handling
-            df = await loop.run_in_executor(
-                None,
-                lambda: pd.read_csv(
-                    file_path,
-                    encoding='utf-8',
-                    encoding_errors='replace',
-                    low_memory=False,
-                    na_values=['', 'NA', 'N/A', 'null', 'NULL', '.', ' ']
-                )
-            )
-            
-            # Clean column names
-            df.columns = [col.strip().upper() for col in df.columns]
-            
-            # Save as parquet
             parquet_path = target_dir / f"{file_path.stem}.parquet"
             
+            # Column names are cleaned as each block is written
             await loop.run_in_executor(
                 None,
-                lambda: df.to_parquet(parquet_path, engine='pyarrow', compression='snappy')
+                lambda: self._stream_file(file_path, parquet_path, lambda col: col.strip().upper())
             )
             
             return parquet_path
@@ -623,13 +756,14 @@ class FileConversionService:
             # Clean column names
             df.columns = [col.strip().upper() for col in df.columns]
             
-            # Save as parquet
+            # Save as parquet, replacing any file linked from an earlier extract
             parquet_path = target_dir / f"{file_path.stem}.parquet"
             
-            await loop.run_in_executor(
+            stats = await loop.run_in_executor(
                 None,
-                lambda: df.to_parquet(parquet_path, engine='pyarrow', compression='snappy')
+                lambda: self.streaming.write_tables(parquet_path, iter([pa.Table.from_pandas(df)]))
             )
+            self.conversion_stats[str(parquet_path)] = stats
             
             return parquet_path
             
@@ -638,29 +772,18 @@ class FileConversionService:
             return None
     
     async def _convert_sas_to_parquet_v2(self, file_path: Path, target_dir: Path) -> Optional[Path]:
-        """Convert SAS7BDAT to parquet"""
-        if pyreadstat is None:
+        """Convert SAS7BDAT to parquet, streaming it in chunks"""
+        if pyreadstat is None or self.streaming is None:
             logger.error("pyreadstat not available for SAS conversion")
             return None
         
         try:
             loop = asyncio.get_event_loop()
-            
-            # Read SAS file
-            df, meta = await loop.run_in_executor(
-                None,
-                lambda: pyreadstat.read_sas7bdat(str(file_path))
-            )
-            
-            # Clean column names
-            df.columns = [col.strip().upper() for col in df.columns]
-            
-            # Save as parquet
             parquet_path = target_dir / f"{file_path.stem}.parquet"
             
-            await loop.run_in_executor(
+            _, meta = await loop.run_in_executor(
                 None,
-                lambda: df.to_parquet(parquet_path, engine='pyarrow', compression='snappy')
+                lambda: self._stream_file(file_path, parquet_path, lambda col: col.strip().upper())
             )
             
             # Save metadata
@@ -671,6 +794,7 @@ class FileConversionService:
                 "file_encoding": meta.file_encoding if hasattr(meta, 'file_encoding') else None,
                 "original_format": "sas7bdat"
             }
+            meta_path.unlink(missing_ok=True)
             with open(meta_path, 'w') as f:
                 json.dump(metadata, f, indent=2)
             
@@ -681,29 +805,18 @@ class FileConversionService:
             return None
     
     async def _convert_xpt_to_parquet_v2(self, file_path: Path, target_dir: Path) -> Optional[Path]:
-        """Convert XPT to parquet"""
-        if pyreadstat is None:
+        """Convert XPT to parquet, streaming it in chunks"""
+        if pyreadstat is None or self.streaming is None:
             logger.error("pyreadstat not available for XPT conversion")
             return None
         
         try:
             loop = asyncio.get_event_loop()
-            
-            # Read XPT file
-            df, meta = await loop.run_in_executor(
-                None,
-                lambda: pyreadstat.read_xport(str(file_path))
-            )
-            
-            # Clean column names
-            df.columns = [col.strip().upper() for col in df.columns]
-            
-            # Save as parquet
             parquet_path = target_dir / f"{file_path.stem}.parquet"
             
-            await loop.run_in_executor(
+            _, meta = await loop.run_in_executor(
                 None,
-                lambda: df.to_parquet(parquet_path, engine='pyarrow', compression='snappy')
+                lambda: self._stream_file(file_path, parquet_path, lambda col: col.strip().upper())
             )
             
             # Save metadata
@@ -712,6 +825,7 @@ class FileConversionService:
                 "column_labels": dict(zip(meta.column_names, meta.column_labels)) if hasattr(meta, 'column_labels') and meta.column_labels else {},
                 "original_format": "xpt"
             }
+            meta_path.unlink(missing_ok=True)
             with open(meta_path, 'w') as f:
                 json.dump(metadata, f, indent=2)
             
@@ -721,111 +835,42 @@ class FileConversionService:
             logger.error(f"Error converting XPT to parquet: {str(e)}")
             return None
     
-    async def _extract_parquet_schema_v2(self, parquet_path: Path) -> Dict[str, Any]:
-        """Extract schema information from parquet file"""
-        if pq is None or pd is None:
-            logger.error("pyarrow/pandas not available for parquet schema extraction")
-            return {}
-        
-        try:
-            loop = asyncio.get_event_loop()
-            
-            # Read parquet file
-            def read_parquet_schema():
-                parquet_file = pq.ParquetFile(parquet_path)
-                metadata = parquet_file.metadata
-                schema = parquet_file.schema
-                
-                # Get first few rows for sampling
-                table = parquet_file.read(columns=None, use_threads=True)
-                df = table.to_pandas()
-                
-                return metadata, schema, df
-            
-            metadata, schema, df = await loop.run_in_executor(None, read_parquet_schema)
-            
-            # Build schema info
-            schema_info = {
-                "file_name": parquet_path.name,
-                "file_path": str(parquet_path),
-                "row_count": metadata.num_rows,
-                "column_count": len(schema),
-                "file_size_mb": round(parquet_path.stat().st_size / (1024 * 1024), 2),
-                "columns": {},
-                "sample_data": []
-            }
-            
-            # Extract column information
-            for field in schema:
-                col_name = field.name
-                
-                # Get pandas dtype for better type mapping
-                pandas_dtype = str(df[col_name].dtype)
-                
-                # Map to our standard types
-                if 'int' in pandas_dtype or 'float' in pandas_dtype:
-                    data_type = 'number'
-                elif 'bool' in pandas_dtype:
-                    data_type = 'boolean'
-                elif 'datetime' in pandas_dtype:
-                    data_type = 'datetime'
-                else:
-                    data_type = 'string'
-                
-                # Get column statistics
-                col_info = {
-                    "type": data_type,
-                    "parquet_type": str(field.physical_type) if hasattr(field, 'physical_type') else str(field),
-                    "pandas_dtype": pandas_dtype,
-                    "nullable": True,  # Parquet field doesn't have nullable attribute
-                    "null_count": int(df[col_name].isnull().sum()),
-                    "unique_count": int(df[col_name].nunique())
-                }
-                
-                # Add sample values for categorical columns
-                if col_info["unique_count"] <= 20:
-                    unique_values = df[col_name].dropna().unique().tolist()
-                    # Convert to string to handle datetime/Timestamp objects
-                    col_info["unique_values"] = []
-                    for v in unique_values[:20]:
-                        if pd.api.types.is_datetime64_any_dtype(type(v)):
-                            col_info["unique_values"].append(str(v))
-                        elif hasattr(v, 'isoformat'):  # Handle datetime objects
-                            col_info["unique_values"].append(v.isoformat())
-                        else:
-                            col_info["unique_values"].append(str(v))
-                
-                # Add statistics for numeric columns
-                if data_type == 'number':
-                    col_info["stats"] = {
-                        "min": float(df[col_name].min()) if not pd.isna(df[col_name].min()) else None,
-                        "max": float(df[col_name].max()) if not pd.isna(df[col_name].max()) else None,
-                        "mean": float(df[col_name].mean()) if not pd.isna(df[col_name].mean()) else None,
-                        "std": float(df[col_name].std()) if not pd.isna(df[col_name].std()) else None
-                    }
-                
-                schema_info["columns"][col_name] = col_info
-            
-            # Add sample rows (first 5)
-            sample_df = df.head(5).fillna('')
-            # Convert datetime columns to strings for JSON serialization
-            for col in sample_df.columns:
-                if pd.api.types.is_datetime64_any_dtype(sample_df[col]):
-                    sample_df[col] = sample_df[col].astype(str)
-            schema_info["sample_data"] = sample_df.to_dict('records')
-            
-            # Check for metadata file
-            meta_path = parquet_path.parent / f"{parquet_path.stem}_metadata.json"
-            if meta_path.exists():
-                with open(meta_path, 'r') as f:
-                    schema_info["original_metadata"] = json.load(f)
-            
-            return schema_info
-            
-        except Exception as e:
-            logger.error(f"Error extracting parquet schema: {str(e)}")
+    def _schema_info_v2(self, parquet_path: Path) -> Dict[str, Any]:
+        """Schema information for a converted file, from the profile built while it was written"""
+        stats = self.conversion_stats.get(str(parquet_path))
+        if stats is None or stats.profile is None:
             return {
                 "file_name": parquet_path.name,
                 "file_path": str(parquet_path),
-                "error": str(e)
-            }
\ No newline at end of file
+                "error": "No conversion profile for this file"
+            }
+        
+        profile = stats.profile
+        physical_types = {column.name: column.physical_type for column in pq.ParquetFile(parquet_path).schema}
+        schema_info = {
+            "file_name": parquet_path.name,
+            "file_path": str(parquet_path),
+            "row_count": profile.rows,
+            "column_count": len(profile.columns),
+            "file_size_mb": round(parquet_path.stat().st_size / (1024 * 1024), 2),
+            "columns": {},
+            "sample_data": profile.sample
+        }
+        
+        for col_name, details in profile.column_details().items():
+            field = profile.schema.field(col_name)
+            col_info = {
+                **details,
+                "type": 'number' if details["type"] in ('integer', 'numeric') else details["type"],
+                "parquet_type": physical_types.get(col_name),
+                "pandas_dtype": str(pa.schema([field]).empty_table().to_pandas().dtypes.iloc[0])
+            }
+            schema_info["columns"][col_name] = col_info
+        
+        # Check for metadata file
+        meta_path = parquet_path.parent / f"{parquet_path.stem}_metadata.json"
+        if meta_path.exists():
+            with open(meta_path, 'r') as f:
+                schema_info["original_metadata"] = json.load(f)
+        
+        return schema_info
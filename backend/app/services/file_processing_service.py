@@ -18,6 +18,10 @@ import json
 import logging
 from datetime import datetime
 
+import pyarrow as pa
+
+from app.services.type_normalizer import DatasetProfile
+
 logger = logging.getLogger(__name__)
 
 
@@ -254,53 +258,24 @@ class FileProcessingService:
         }
     
     def _extract_dataframe_schema(self, df: pd.DataFrame, file_path: Path) -> Dict[str, Any]:
-        """Extract schema information from a pandas DataFrame"""
+        """Extract schema information from a pandas DataFrame, profiling all columns in one pass"""
+        profile = DatasetProfile.of(self._to_arrow(df))
         schema = {
             "file_name": file_path.name,
             "file_path": str(file_path),
-            "row_count": len(df),
-            "column_count": len(df.columns),
+            "row_count": profile.rows,
+            "column_count": len(profile.columns),
             "columns": {},
             "sample_data": []
         }
         
-        # Extract column information
-        for col in df.columns:
-            dtype = str(df[col].dtype)
-            
-            # Map pandas dtypes to our data types
-            if dtype.startswith('int') or dtype.startswith('float'):
-                data_type = 'number'
-            elif dtype == 'bool':
-                data_type = 'boolean'
-            elif 'datetime' in dtype:
-                data_type = 'datetime'
-            else:
-                data_type = 'string'
-            
-            # Get column statistics
-            col_info = {
-                "type": data_type,
-                "nullable": df[col].isnull().any(),
-                "unique_count": df[col].nunique(),
-                "null_count": df[col].isnull().sum(),
-                "pandas_dtype": dtype
+        # Extract column information, with our data type names
+        for col, details in profile.column_details().items():
+            schema["columns"][col] = {
+                **details,
+                "type": {'integer': 'number', 'numeric': 'number'}.get(details["type"], details["type"]),
+                "pandas_dtype": str(df[col].dtype)
             }
-            
-            # Add sample values for categorical columns
-            if col_info["unique_count"] <= 20:
-                col_info["unique_values"] = df[col].dropna().unique().tolist()[:20]
-            
-            # Add basic statistics for numeric columns
-            if data_type == 'number':
-                col_info["stats"] = {
-                    "min": float(df[col].min()) if not pd.isna(df[col].min()) else None,
-                    "max": float(df[col].max()) if not pd.isna(df[col].max()) else None,
-                    "mean": float(df[col].mean()) if not pd.isna(df[col].mean()) else None,
-                    "std": float(df[col].std()) if not pd.isna(df[col].std()) else None
-                }
-            
-            schema["columns"][col] = col_info
         
         # Add sample rows (first 5)
         sample_rows = df.head(5).fillna('').to_dict('records')
@@ -308,6 +283,17 @@ class FileProcessingService:
         
         return schema
     
+    @staticmethod
+    def _to_arrow(df: pd.DataFrame) -> pa.Table:
+        """Arrow table of a sample; object columns mixing types are profiled as text"""
+        try:
+            return pa.Table.from_pandas(df, preserve_index=False)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            text = df.copy()
+            for col in text.select_dtypes(include="object").columns:
+                text[col] = text[col].map(lambda v: None if v is None or v != v else str(v))
+            return pa.Table.from_pandas(text, preserve_index=False)
+    
     def generate_mapping_suggestions(
         self,
         template_requirements: List[Dict[str, Any]],
@@ -0,0 +1,134 @@
+# ABOUTME: Process-wide LRU of parsed and compiled widget filter expressions
+# ABOUTME: Shared by FilterExecutor and AdvancedFilterExecutor so static filters are parsed once
+
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from app.core.config import settings
+from app.services.filter_compiler import FilterCompiler, FilterCompileError
+from app.services.filter_parser import ASTNode
+
+logger = logging.getLogger(__name__)
+
+
+class CompiledFilter:
+    """
+    A parsed filter plus its compiled forms.
+
+    The Arrow expression is cached per dataset schema, since literals are
+    cast to the column types. Filters with relative date ranges resolve
+    "now" at compile time, and subqueries depend on other datasets, so
+    their compiled forms are never cached.
+    """
+
+    def __init__(self, expression: str, parse_result: Dict[str, Any]):
+        self.expression = expression
+        self.parse_result = parse_result
+        self.volatile = bool(parse_result.get("has_date_ranges") or parse_result.get("has_subqueries"))
+        self._arrow: Dict[pa.Schema, Any] = {}
+        self._sql: Optional[str] = None
+
+    @property
+    def is_valid(self) -> bool:
+        return self.parse_result["is_valid"]
+
+    @property
+    def error(self) -> Optional[str]:
+        return self.parse_result.get("error")
+
+    @property
+    def ast(self) -> Optional[ASTNode]:
+        return self.parse_result.get("ast")
+
+    @property
+    def columns(self) -> List[str]:
+        return self.parse_result.get("columns") or []
+
+    def to_arrow(self, compiler: FilterCompiler, schema: pa.Schema) -> pc.Expression:
+        """Arrow expression for a dataset schema; compile errors are cached too"""
+        compiled = self._arrow.get(schema)
+        if compiled is None:
+            try:
+                compiled = compiler.to_arrow(self.ast, schema)
+            except FilterCompileError as e:
+                compiled = e
+            if not self.volatile:
+                self._arrow[schema] = compiled
+        if isinstance(compiled, FilterCompileError):
+            raise compiled
+        return compiled
+
+    def to_sql(self, compiler: FilterCompiler) -> str:
+        """DuckDB WHERE clause"""
+        if self._sql is not None:
+            return self._sql
+        sql = compiler.to_sql(self.ast)
+        if not self.volatile:
+            self._sql = sql
+        return sql
+
+
+class CompiledFilterCache:
+    """Bounded LRU of CompiledFilter keyed by parser and expression text"""
+
+    def __init__(self, max_entries: int = settings.FILTER_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], CompiledFilter]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, parser: Any, expression: str) -> CompiledFilter:
+        """Cached CompiledFilter for expression, parsing it on a miss"""
+        key = (type(parser).__name__, expression)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return entry
+            self._stats["misses"] += 1
+
+        # Parse outside the lock; a racing parse of the same text is harmless
+        entry = CompiledFilter(expression, parser.parse(expression))
+
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+        return entry
+
+    def clear(self):
+        """Drop every cached filter"""
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups * 100, 2) if lookups else 0.0
+        stats["max_entries"] = self.max_entries
+        return stats
+
+
+_filter_cache: Optional[CompiledFilterCache] = None
+_filter_cache_lock = threading.Lock()
+
+
+def get_filter_cache() -> CompiledFilterCache:
+    """Get the process-wide compiled filter cache, creating it on first use"""
+    global _filter_cache
+    if _filter_cache is None:
+        with _filter_cache_lock:
+            if _filter_cache is None:
+                _filter_cache = CompiledFilterCache()
+    return _filter_cache
@@ -0,0 +1,202 @@
+# ABOUTME: Compiles filter ASTs into PyArrow dataset expressions and DuckDB SQL
+# ABOUTME: Lets filters run inside the Parquet scan so unmatched rows are never materialized
+
+import logging
+from typing import Any, Callable, Dict, Optional
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from app.services.filter_parser import (
+    ASTNode, ColumnNode, LiteralNode,
+    BinaryOpNode, UnaryOpNode, InNode, BetweenNode,
+    LikeNode, IsNullNode, TokenType
+)
+
+logger = logging.getLogger(__name__)
+
+
+class FilterCompileError(ValueError):
+    """Raised when an AST node cannot be compiled for the target engine"""
+
+
+class ArrowUnsupportedError(FilterCompileError):
+    """Raised for valid filters Arrow can't evaluate but DuckDB can"""
+
+
+ARROW_COMPARISONS: Dict[TokenType, Callable[[pc.Expression, pc.Expression], pc.Expression]] = {
+    TokenType.EQ: lambda left, right: left == right,
+    TokenType.NEQ: lambda left, right: left != right,
+    TokenType.LT: lambda left, right: left < right,
+    TokenType.LTE: lambda left, right: left <= right,
+    TokenType.GT: lambda left, right: left > right,
+    TokenType.GTE: lambda left, right: left >= right,
+}
+
+SQL_OPERATORS = {
+    TokenType.AND: "AND",
+    TokenType.OR: "OR",
+    TokenType.EQ: "=",
+    TokenType.NEQ: "!=",
+    TokenType.LT: "<",
+    TokenType.LTE: "<=",
+    TokenType.GT: ">",
+    TokenType.GTE: ">=",
+}
+
+
+class FilterCompiler:
+    """
+    Compiles FilterParser ASTs for execution inside a Parquet scan.
+
+    Both targets follow SQL semantics: comparisons against NULL are unknown
+    and the row is dropped. Literals compared with a column are cast to the
+    column's type when a schema is given, so row-group statistics can be used
+    for pruning.
+    """
+
+    def __init__(self, like_ignore_case: bool = False):
+        self.like_ignore_case = like_ignore_case
+
+    # ------------------------------------------------------------------
+    # PyArrow
+    # ------------------------------------------------------------------
+
+    def to_arrow(self, node: ASTNode, schema: Optional[pa.Schema] = None) -> pc.Expression:
+        """Compile an AST into a pyarrow.compute.Expression"""
+        if isinstance(node, ColumnNode):
+            self._check_column(node.name, schema)
+            return pc.field(node.name)
+
+        elif isinstance(node, LiteralNode):
+            return pc.scalar(node.value)
+
+        elif isinstance(node, BinaryOpNode):
+            if node.operator == TokenType.AND:
+                return self.to_arrow(node.left, schema) & self.to_arrow(node.right, schema)
+            elif node.operator == TokenType.OR:
+                return self.to_arrow(node.left, schema) | self.to_arrow(node.right, schema)
+            elif node.operator in ARROW_COMPARISONS:
+                left = self._arrow_operand(node.left, node.right, schema)
+                right = self._arrow_operand(node.right, node.left, schema)
+                return ARROW_COMPARISONS[node.operator](left, right)
+            raise FilterCompileError(f"Unsupported operator: {node.operator}")
+
+        elif isinstance(node, UnaryOpNode):
+            if node.operator == TokenType.NOT:
+                return ~self.to_arrow(node.operand, schema)
+            raise FilterCompileError(f"Unsupported unary operator: {node.operator}")
+
+        elif isinstance(node, InNode):
+            field = self.to_arrow(node.column, schema)
+            values = [v.value for v in node.values if v.value is not None]
+            value_type = self._field_type(node.column.name, schema)
+            value_set = pa.array(values, type=value_type) if value_type is not None else pa.array(values)
+            matches = field.isin(value_set)
+            if node.negate:
+                # NOT IN never matches NULL, as in SQL
+                return ~matches & field.is_valid()
+            return matches
+
+        elif isinstance(node, BetweenNode):
+            field = self.to_arrow(node.column, schema)
+            lower = self._arrow_literal(node.lower.value, node.column.name, schema)
+            upper = self._arrow_literal(node.upper.value, node.column.name, schema)
+            return (field >= lower) & (field <= upper)
+
+        elif isinstance(node, LikeNode):
+            field = self.to_arrow(node.column, schema)
+            matches = pc.match_like(field, node.pattern, ignore_case=self.like_ignore_case)
+            return ~matches if node.negate else matches
+
+        elif isinstance(node, IsNullNode):
+            field = self.to_arrow(node.column, schema)
+            return field.is_valid() if node.negate else field.is_null()
+
+        raise FilterCompileError(f"Unsupported node type: {type(node).__name__}")
+
+    def _arrow_operand(self, node: ASTNode, other: ASTNode, schema: Optional[pa.Schema]) -> pc.Expression:
+        if isinstance(node, LiteralNode) and isinstance(other, ColumnNode):
+            return self._arrow_literal(node.value, other.name, schema)
+        return self.to_arrow(node, schema)
+
+    def _arrow_literal(self, value: Any, column: str, schema: Optional[pa.Schema]) -> pc.Expression:
+        """Scalar for value, cast to the type of the column it is compared with"""
+        value_type = self._field_type(column, schema)
+        if value_type is None:
+            return pc.scalar(value)
+        try:
+            return pc.scalar(pa.scalar(value).cast(value_type))
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError) as e:
+            raise ArrowUnsupportedError(f"Cannot compare column '{column}' ({value_type}) with {value!r}: {e}")
+
+    def _field_type(self, column: str, schema: Optional[pa.Schema]) -> Optional[pa.DataType]:
+        if schema is None:
+            return None
+        self._check_column(column, schema)
+        value_type = schema.field(column).type
+        if pa.types.is_dictionary(value_type):
+            value_type = value_type.value_type
+        return value_type
+
+    def _check_column(self, column: str, schema: Optional[pa.Schema]):
+        if schema is not None and schema.get_field_index(column) < 0:
+            raise FilterCompileError(f"Column '{column}' not found in dataset")
+
+    # ------------------------------------------------------------------
+    # DuckDB SQL
+    # ------------------------------------------------------------------
+
+    def to_sql(self, node: ASTNode) -> str:
+        """Compile an AST into a DuckDB SQL boolean expression"""
+        if isinstance(node, ColumnNode):
+            return self.quote_identifier(node.name)
+
+        elif isinstance(node, LiteralNode):
+            return self.sql_literal(node.value)
+
+        elif isinstance(node, BinaryOpNode):
+            if node.operator not in SQL_OPERATORS:
+                raise FilterCompileError(f"Unsupported operator: {node.operator}")
+            return f"({self.to_sql(node.left)} {SQL_OPERATORS[node.operator]} {self.to_sql(node.right)})"
+
+        elif isinstance(node, UnaryOpNode):
+            if node.operator == TokenType.NOT:
+                return f"(NOT {self.to_sql(node.operand)})"
+            raise FilterCompileError(f"Unsupported unary operator: {node.operator}")
+
+        elif isinstance(node, InNode):
+            values = ", ".join(self.sql_literal(v.value) for v in node.values)
+            operator = "NOT IN" if node.negate else "IN"
+            return f"({self.to_sql(node.column)} {operator} ({values}))"
+
+        elif isinstance(node, BetweenNode):
+            return (
+                f"({self.to_sql(node.column)} BETWEEN "
+                f"{self.sql_literal(node.lower.value)} AND {self.sql_literal(node.upper.value)})"
+            )
+
+        elif isinstance(node, LikeNode):
+            operator = "ILIKE" if self.like_ignore_case else "LIKE"
+            if node.negate:
+                operator = f"NOT {operator}"
+            return f"({self.to_sql(node.column)} {operator} {self.sql_literal(node.pattern)})"
+
+        elif isinstance(node, IsNullNode):
+            return f"({self.to_sql(node.column)} IS {'NOT ' if node.negate else ''}NULL)"
+
+        raise FilterCompileError(f"Unsupported node type: {type(node).__name__}")
+
+    @staticmethod
+    def quote_identifier(name: str) -> str:
+        return '"' + name.replace('"', '""') + '"'
+
+    @staticmethod
+    def sql_literal(value: Any) -> str:
+        if value is None:
+            return "NULL"
+        if isinstance(value, bool):
+            return "TRUE" if value else "FALSE"
+        if isinstance(value, (int, float)):
+            return repr(value)
+        return "'" + str(value).replace("'", "''") + "'"
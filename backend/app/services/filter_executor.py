@@ -5,18 +5,15 @@ import time
 import logging
 from typing import Dict, List, Optional, Any, Union
 from pathlib import Path
-import pyarrow.parquet as pq
-import pyarrow.compute as pc
 import pandas as pd
-from datetime import datetime
 from sqlalchemy.orm import Session
 
 from app.models import Study
-from app.services.filter_parser import (
-    FilterParser, ASTNode, ColumnNode, LiteralNode,
-    BinaryOpNode, UnaryOpNode, InNode, BetweenNode,
-    LikeNode, IsNullNode, TokenType
-)
+from app.services.dataset_reader import DatasetRead, DatasetReader
+from app.services.filter_cache import CompiledFilter, get_filter_cache
+from app.services.filter_metrics_writer import get_filter_metrics_writer
+from app.services.filter_compiler import FilterCompiler
+from app.services.filter_parser import FilterParser
 
 logger = logging.getLogger(__name__)
 
@@ -24,11 +21,20 @@ logger = logging.getLogger(__name__)
 class FilterExecutor:
     """Executes filter expressions on Parquet datasets"""
     
-    def __init__(self, db: Session):
+    def __init__(self, db: Optional[Session]):
+        # Only get_execution_metrics queries the database
         self.db = db
         self.parser = FilterParser()
+        self.compiler = FilterCompiler()
+        self.reader = DatasetReader(self.compiler)
+        self.filter_cache = get_filter_cache()
+        self.metrics_writer = get_filter_metrics_writer()
         self.logger = logger
     
+    def parse_filter(self, filter_expression: str) -> CompiledFilter:
+        """Parsed and compiled filter, shared across executors through the filter cache"""
+        return self.filter_cache.get(self.parser, filter_expression)
+    
     def execute_filter(
         self,
         study_id: str,
@@ -61,46 +67,18 @@ class FilterExecutor:
         
         try:
             # Parse the filter expression
-            parse_result = self.parser.parse(filter_expression)
-            if not parse_result["is_valid"]:
-                raise ValueError(f"Invalid filter expression: {parse_result['error']}")
+            compiled = self.parse_filter(filter_expression)
+            if not compiled.is_valid:
+                raise ValueError(f"Invalid filter expression: {compiled.error}")
             
-            # Read the Parquet file
             dataset_path = Path(dataset_path)
             if not dataset_path.exists():
                 raise FileNotFoundError(f"Dataset not found: {dataset_path}")
             
-            # Determine columns to read
-            filter_columns = parse_result["columns"]
-            if columns:
-                # Include both requested columns and filter columns
-                read_columns = list(set(columns + filter_columns))
-            else:
-                read_columns = None  # Read all columns
-            
-            # Read data with PyArrow for better performance
-            df = pd.read_parquet(dataset_path, columns=read_columns)
-            original_count = len(df)
-            
-            # Apply the filter
-            if parse_result["ast"]:
-                # Convert AST to pandas query
-                pandas_query = self._ast_to_pandas_query(parse_result["ast"])
-                
-                # Special case: handle "1=1" or "True" which means no filtering
-                if pandas_query in ["True", "1 == 1", "(1) == (1)"]:
-                    filtered_df = df
-                else:
-                    # Execute the query
-                    try:
-                        filtered_df = df.query(pandas_query)
-                    except Exception as e:
-                        # Fallback to manual filtering if query fails
-                        self.logger.warning(f"Pandas query failed, using manual filtering: {e}")
-                        mask = self._evaluate_ast(parse_result["ast"], df)
-                        filtered_df = df[mask]
-            else:
-                filtered_df = df
+            # Filter inside the Parquet scan; only matching rows are materialized
+            read = self.read_dataset(dataset_path, compiled, columns)
+            filtered_df = read.data
+            original_count = read.rows_total
             
             filtered_count = len(filtered_df)
             
@@ -124,7 +102,8 @@ class FilterExecutor:
                 "original_count": original_count,
                 "execution_time_ms": execution_time_ms,
                 "filter_applied": filter_expression,
-                "reduction_percentage": round((1 - filtered_count/original_count) * 100, 2) if original_count > 0 else 0
+                "reduction_percentage": round((1 - filtered_count/original_count) * 100, 2) if original_count > 0 else 0,
+                "io": read.io
             }
             
         except Exception as e:
@@ -140,6 +119,34 @@ class FilterExecutor:
                 "error": str(e)
             }
     
+    def apply_filter(self, df: pd.DataFrame, filter_expression: str) -> pd.DataFrame:
+        """
+        Apply a filter expression to a DataFrame that is already in memory
+        
+        Used when several widgets share one read of the same dataset; rows
+        match exactly as they would in execute_filter's scan.
+        Raises ValueError if the expression is invalid.
+        """
+        compiled = self.parse_filter(filter_expression)
+        if not compiled.is_valid:
+            raise ValueError(f"Invalid filter expression: {compiled.error}")
+        return self.reader.filter_frame(df, compiled, self.compiler)
+    
+    def read_dataset(
+        self,
+        dataset_path: Union[str, Path],
+        compiled: Optional[CompiledFilter] = None,
+        columns: Optional[List[str]] = None,
+        compiler: Optional[FilterCompiler] = None
+    ) -> DatasetRead:
+        """
+        Read a Parquet file with the filter applied during the scan
+        
+        Filter columns don't need to be part of the requested columns.
+        See DatasetReader for pruning and the DuckDB fallback.
+        """
+        return self.reader.read(dataset_path, columns, compiled, compiler=compiler or self.compiler)
+    
     def execute_filter_pyarrow(
         self,
         study_id: str,
@@ -151,42 +158,23 @@ class FilterExecutor:
         """
         Execute filter using PyArrow for better performance on large datasets
         
-        This method pushes filtering down to the Parquet reader level
-        for optimal performance.
+        Same pushdown as execute_filter, without metrics tracking.
         """
         start_time = time.time()
         
         try:
             # Parse the filter expression
-            parse_result = self.parser.parse(filter_expression)
-            if not parse_result["is_valid"]:
-                raise ValueError(f"Invalid filter expression: {parse_result['error']}")
+            compiled = self.parse_filter(filter_expression)
+            if not compiled.is_valid:
+                raise ValueError(f"Invalid filter expression: {compiled.error}")
             
             dataset_path = Path(dataset_path)
             if not dataset_path.exists():
                 raise FileNotFoundError(f"Dataset not found: {dataset_path}")
             
-            # Open Parquet file
-            parquet_file = pq.ParquetFile(dataset_path)
-            
-            # Get row count before filtering
-            original_count = parquet_file.metadata.num_rows
-            
-            # Convert AST to PyArrow filter expression
-            if parse_result["ast"]:
-                arrow_filter = self._ast_to_arrow_filter(parse_result["ast"])
-                
-                # Read with filter pushed down
-                table = pq.read_table(
-                    dataset_path,
-                    columns=columns,
-                    filters=arrow_filter if arrow_filter else None
-                )
-            else:
-                table = pq.read_table(dataset_path, columns=columns)
-            
-            # Convert to pandas DataFrame
-            df = table.to_pandas()
+            read = self.read_dataset(dataset_path, compiled, columns)
+            df = read.data
+            original_count = read.rows_total
             filtered_count = len(df)
             
             execution_time_ms = (time.time() - start_time) * 1000
@@ -197,7 +185,8 @@ class FilterExecutor:
                 "original_count": original_count,
                 "execution_time_ms": execution_time_ms,
                 "filter_applied": filter_expression,
-                "reduction_percentage": round((1 - filtered_count/original_count) * 100, 2) if original_count > 0 else 0
+                "reduction_percentage": round((1 - filtered_count/original_count) * 100, 2) if original_count > 0 else 0,
+                "io": read.io
             }
             
         except Exception as e:
@@ -213,205 +202,6 @@ class FilterExecutor:
                 "error": str(e)
             }
     
-    def _ast_to_pandas_query(self, node: ASTNode) -> str:
-        """Convert AST to pandas query string"""
-        if isinstance(node, ColumnNode):
-            # Escape column name if needed
-            if ' ' in node.name or '-' in node.name:
-                return f"`{node.name}`"
-            return node.name
-        
-        elif isinstance(node, LiteralNode):
-            if node.value is None:
-                return "None"
-            elif isinstance(node.value, str):
-                # Escape single quotes in string
-                escaped = node.value.replace("'", "\\'")
-                return f"'{escaped}'"
-            elif isinstance(node.value, bool):
-                return str(node.value)
-            elif isinstance(node.value, (int, float)):
-                return str(node.value)
-            else:
-                return str(node.value)
-        
-        elif isinstance(node, BinaryOpNode):
-            left = self._ast_to_pandas_query(node.left)
-            right = self._ast_to_pandas_query(node.right)
-            
-            if node.operator == TokenType.AND:
-                return f"({left}) & ({right})"
-            elif node.operator == TokenType.OR:
-                return f"({left}) | ({right})"
-            elif node.operator == TokenType.EQ:
-                return f"{left} == {right}"
-            elif node.operator == TokenType.NEQ:
-                return f"{left} != {right}"
-            elif node.operator == TokenType.LT:
-                return f"{left} < {right}"
-            elif node.operator == TokenType.LTE:
-                return f"{left} <= {right}"
-            elif node.operator == TokenType.GT:
-                return f"{left} > {right}"
-            elif node.operator == TokenType.GTE:
-                return f"{left} >= {right}"
-            else:
-                raise ValueError(f"Unsupported operator: {node.operator}")
-        
-        elif isinstance(node, UnaryOpNode):
-            operand = self._ast_to_pandas_query(node.operand)
-            if node.operator == TokenType.NOT:
-                return f"~({operand})"
-            else:
-                raise ValueError(f"Unsupported unary operator: {node.operator}")
-        
-        elif isinstance(node, InNode):
-            column = self._ast_to_pandas_query(node.column)
-            values = [self._ast_to_pandas_query(v) for v in node.values]
-            values_str = f"[{', '.join(values)}]"
-            
-            if node.negate:
-                return f"~({column}.isin({values_str}))"
-            else:
-                return f"{column}.isin({values_str})"
-        
-        elif isinstance(node, BetweenNode):
-            column = self._ast_to_pandas_query(node.column)
-            lower = self._ast_to_pandas_query(node.lower)
-            upper = self._ast_to_pandas_query(node.upper)
-            return f"({column} >= {lower}) & ({column} <= {upper})"
-        
-        elif isinstance(node, LikeNode):
-            column = self._ast_to_pandas_query(node.column)
-            # Convert SQL LIKE pattern to regex
-            pattern = node.pattern.replace("%", ".*").replace("_", ".")
-            
-            if node.negate:
-                return f"~({column}.str.contains('{pattern}', na=False, regex=True))"
-            else:
-                return f"{column}.str.contains('{pattern}', na=False, regex=True)"
-        
-        elif isinstance(node, IsNullNode):
-            column = self._ast_to_pandas_query(node.column)
-            if node.negate:
-                return f"{column}.notna()"
-            else:
-                return f"{column}.isna()"
-        
-        else:
-            raise ValueError(f"Unsupported node type: {type(node)}")
-    
-    def _evaluate_ast(self, node: ASTNode, df: pd.DataFrame) -> pd.Series:
-        """Manually evaluate AST on DataFrame (fallback method)"""
-        if isinstance(node, ColumnNode):
-            return df[node.name]
-        
-        elif isinstance(node, LiteralNode):
-            return pd.Series([node.value] * len(df), index=df.index)
-        
-        elif isinstance(node, BinaryOpNode):
-            left = self._evaluate_ast(node.left, df)
-            right = self._evaluate_ast(node.right, df)
-            
-            if node.operator == TokenType.AND:
-                return left & right
-            elif node.operator == TokenType.OR:
-                return left | right
-            elif node.operator == TokenType.EQ:
-                return left == right
-            elif node.operator == TokenType.NEQ:
-                return left != right
-            elif node.operator == TokenType.LT:
-                return left < right
-            elif node.operator == TokenType.LTE:
-                return left <= right
-            elif node.operator == TokenType.GT:
-                return left > right
-            elif node.operator == TokenType.GTE:
-                return left >= right
-            else:
-                raise ValueError(f"Unsupported operator: {node.operator}")
-        
-        elif isinstance(node, UnaryOpNode):
-            operand = self._evaluate_ast(node.operand, df)
-            if node.operator == TokenType.NOT:
-                return ~operand
-            else:
-                raise ValueError(f"Unsupported unary operator: {node.operator}")
-        
-        elif isinstance(node, InNode):
-            column = df[node.column.name]
-            values = [v.value for v in node.values]
-            result = column.isin(values)
-            return ~result if node.negate else result
-        
-        elif isinstance(node, BetweenNode):
-            column = df[node.column.name]
-            return (column >= node.lower.value) & (column <= node.upper.value)
-        
-        elif isinstance(node, LikeNode):
-            column = df[node.column.name]
-            # Convert SQL LIKE pattern to regex
-            pattern = node.pattern.replace("%", ".*").replace("_", ".")
-            result = column.str.contains(pattern, na=False, regex=True)
-            return ~result if node.negate else result
-        
-        elif isinstance(node, IsNullNode):
-            column = df[node.column.name]
-            result = column.isna()
-            return ~result if node.negate else result
-        
-        else:
-            raise ValueError(f"Unsupported node type: {type(node)}")
-    
-    def _ast_to_arrow_filter(self, node: ASTNode) -> Optional[List]:
-        """
-        Convert AST to PyArrow filter format for pushdown
-        
-        PyArrow filters are in DNF (Disjunctive Normal Form):
-        [[('col1', '=', val1), ('col2', '>', val2)], ...]
-        where inner lists are AND'd and outer lists are OR'd
-        """
-        try:
-            # For now, we'll convert simple cases
-            # Complex expressions will fall back to pandas filtering
-            if isinstance(node, BinaryOpNode):
-                if node.operator == TokenType.EQ:
-                    if isinstance(node.left, ColumnNode) and isinstance(node.right, LiteralNode):
-                        return [[(node.left.name, '==', node.right.value)]]
-                elif node.operator == TokenType.NEQ:
-                    if isinstance(node.left, ColumnNode) and isinstance(node.right, LiteralNode):
-                        return [[(node.left.name, '!=', node.right.value)]]
-                elif node.operator == TokenType.LT:
-                    if isinstance(node.left, ColumnNode) and isinstance(node.right, LiteralNode):
-                        return [[(node.left.name, '<', node.right.value)]]
-                elif node.operator == TokenType.LTE:
-                    if isinstance(node.left, ColumnNode) and isinstance(node.right, LiteralNode):
-                        return [[(node.left.name, '<=', node.right.value)]]
-                elif node.operator == TokenType.GT:
-                    if isinstance(node.left, ColumnNode) and isinstance(node.right, LiteralNode):
-                        return [[(node.left.name, '>', node.right.value)]]
-                elif node.operator == TokenType.GTE:
-                    if isinstance(node.left, ColumnNode) and isinstance(node.right, LiteralNode):
-                        return [[(node.left.name, '>=', node.right.value)]]
-            
-            elif isinstance(node, InNode):
-                if not node.negate:
-                    return [[(node.column.name, 'in', [v.value for v in node.values])]]
-            
-            elif isinstance(node, IsNullNode):
-                if not node.negate:
-                    return [[(node.column.name, 'is', None)]]
-                else:
-                    return [[(node.column.name, 'is not', None)]]
-            
-            # For complex expressions, return None to use pandas filtering
-            return None
-            
-        except Exception as e:
-            self.logger.warning(f"Could not convert to Arrow filter: {e}")
-            return None
-    
     def _track_execution_metrics(
         self,
         study_id: str,
@@ -421,39 +211,18 @@ class FilterExecutor:
         rows_before: int,
         rows_after: int
     ):
-        """Track filter execution metrics"""
-        # Temporarily disabled until filter_metrics table is created
-        # TODO: Create filter_metrics table in migrations
-        return
-        
-        # try:
-        #     from sqlalchemy import text
-        #     
-        #     reduction_pct = round((1 - rows_after/rows_before) * 100, 2) if rows_before > 0 else 0
-        #     
-        #     query = text("""
-        #         INSERT INTO filter_metrics 
-        #         (id, study_id, widget_id, filter_expression, execution_time_ms,
-        #          rows_before, rows_after, reduction_percentage, executed_at)
-        #         VALUES 
-        #         (gen_random_uuid(), :study_id, :widget_id, :filter_expression, :execution_time_ms,
-        #          :rows_before, :rows_after, :reduction_percentage, NOW())
-        #     """)
-        #     
-        #     self.db.execute(query, {
-        #         "study_id": study_id,
-        #         "widget_id": widget_id,
-        #         "filter_expression": filter_expression,
-        #         "execution_time_ms": execution_time_ms,
-        #         "rows_before": rows_before,
-        #         "rows_after": rows_after,
-        #         "reduction_percentage": reduction_pct
-        #     })
-        #     self.db.commit()
-        #     
-        # except Exception as e:
-        #     self.logger.error(f"Failed to track execution metrics: {str(e)}")
-        #     self.db.rollback()
+        """Queue filter execution metrics; they are written in bulk in the background"""
+        try:
+            self.metrics_writer.record(
+                study_id=study_id,
+                widget_id=widget_id,
+                filter_expression=filter_expression,
+                execution_time_ms=execution_time_ms,
+                rows_before=rows_before,
+                rows_after=rows_after
+            )
+        except Exception as e:
+            self.logger.error(f"Failed to track execution metrics: {str(e)}")
     
     def get_execution_metrics(
         self,
@@ -465,6 +234,9 @@ class FilterExecutor:
         try:
             from sqlalchemy import text
             
+            # Include metrics still waiting in the buffer
+            self.metrics_writer.flush()
+            
             if widget_id:
                 query = text("""
                     SELECT widget_id, filter_expression, execution_time_ms,
@@ -503,4 +275,8 @@ class FilterExecutor:
             
         except Exception as e:
             self.logger.error(f"Failed to get execution metrics: {str(e)}")
-            return []
\ No newline at end of file
+            return []
+    
+    def get_cache_metrics(self) -> Dict[str, Any]:
+        """Hit rate of the compiled filter cache"""
+        return self.filter_cache.get_stats()
\ No newline at end of file
@@ -0,0 +1,167 @@
+# ABOUTME: Buffers filter execution metrics in memory and writes them to filter_metrics in bulk
+# ABOUTME: Keeps metric recording off the request path; a background task flushes the ring buffer
+
+import asyncio
+import logging
+import threading
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlmodel import Session
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+INSERT_METRICS = text("""
+    INSERT INTO filter_metrics
+    (id, study_id, widget_id, filter_expression, execution_time_ms,
+     rows_before, rows_after, reduction_percentage, executed_at)
+    VALUES
+    (:id, :study_id, :widget_id, :filter_expression, :execution_time_ms,
+     :rows_before, :rows_after, :reduction_percentage, :executed_at)
+""")
+
+
+def _default_session_factory() -> Session:
+    # Imported lazily: app.core.db creates the engine at import time
+    from app.core.db import engine
+    return Session(engine)
+
+
+class FilterMetricsWriter:
+    """
+    Ring buffer of filter metrics flushed to the database in batches.
+
+    record() only appends to the buffer. When the buffer is full the oldest
+    rows are dropped, so a slow or unavailable database never blocks filter
+    execution. flush() drains the buffer with one executemany INSERT per batch.
+    """
+
+    def __init__(
+        self,
+        session_factory: Optional[Callable[[], Session]] = None,
+        capacity: int = settings.FILTER_METRICS_BUFFER_SIZE,
+        batch_size: int = settings.FILTER_METRICS_BATCH_SIZE
+    ):
+        self.session_factory = session_factory or _default_session_factory
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self._buffer: Deque[Dict[str, Any]] = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.is_running = False
+        self._stats = {"recorded": 0, "written": 0, "dropped": 0, "failed": 0, "flushes": 0}
+
+    def record(
+        self,
+        study_id: str,
+        widget_id: str,
+        filter_expression: str,
+        execution_time_ms: float,
+        rows_before: int,
+        rows_after: int
+    ):
+        """Queue one filter execution for the next flush"""
+        row = {
+            "id": str(uuid.uuid4()),
+            "study_id": str(study_id),
+            "widget_id": str(widget_id),
+            "filter_expression": filter_expression,
+            "execution_time_ms": int(round(execution_time_ms)),
+            "rows_before": rows_before,
+            "rows_after": rows_after,
+            "reduction_percentage": round((1 - rows_after / rows_before) * 100, 2) if rows_before > 0 else 0,
+            "executed_at": datetime.utcnow(),
+        }
+        with self._lock:
+            if len(self._buffer) == self.capacity:
+                self._stats["dropped"] += 1
+            self._buffer.append(row)
+            self._stats["recorded"] += 1
+
+    def flush(self) -> int:
+        """Write every buffered row; returns the number of rows written"""
+        written = 0
+        # One flusher at a time so batches are written in order
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+                if not batch:
+                    break
+                if not self._write(batch):
+                    break
+                written += len(batch)
+        return written
+
+    def _write(self, batch: List[Dict[str, Any]]) -> bool:
+        session = self.session_factory()
+        try:
+            session.execute(INSERT_METRICS, batch)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Failed to write {len(batch)} filter metrics: {e}")
+            with self._lock:
+                self._stats["failed"] += len(batch)
+            return False
+        finally:
+            session.close()
+        with self._lock:
+            self._stats["written"] += len(batch)
+            self._stats["flushes"] += 1
+        return True
+
+    async def start(self, interval: float = settings.FILTER_METRICS_FLUSH_INTERVAL):
+        """Start the background flush task"""
+        if self.is_running:
+            return
+        self.is_running = True
+        self._task = asyncio.create_task(self._flush_loop(interval))
+
+    async def stop(self):
+        """Stop the background task and write whatever is still buffered"""
+        self.is_running = False
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.to_thread(self.flush)
+
+    async def _flush_loop(self, interval: float):
+        while self.is_running:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception as e:
+                logger.error(f"Error flushing filter metrics: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Buffer and write counters"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["buffered"] = len(self._buffer)
+        stats["capacity"] = self.capacity
+        return stats
+
+
+_metrics_writer: Optional[FilterMetricsWriter] = None
+_metrics_writer_lock = threading.Lock()
+
+
+def get_filter_metrics_writer() -> FilterMetricsWriter:
+    """Get the process-wide filter metrics writer, creating it on first use"""
+    global _metrics_writer
+    if _metrics_writer is None:
+        with _metrics_writer_lock:
+            if _metrics_writer is None:
+                _metrics_writer = FilterMetricsWriter()
+    return _metrics_writer
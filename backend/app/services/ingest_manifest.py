@@ -0,0 +1,145 @@
+# ABOUTME: Per-study manifest of source file content hashes and the parquet datasets they produced
+# ABOUTME: Lets re-uploads reuse unchanged datasets instead of converting them again
+
+import hashlib
+import logging
+import os
+import shutil
+import stat
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Optional, Union
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from app.clinical_modules.utils.folder_structure import get_ingest_manifest_path
+from app.services.dataset_statistics import statistics_path
+from app.services.json_state import JsonStateFile
+
+logger = logging.getLogger(__name__)
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# Linux ioctl that makes dest share source's extents copy-on-write (btrfs, xfs, overlayfs on those)
+FICLONE = 0x40049409
+READ_ONLY = stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH
+
+
+def file_sha256(source: Union[str, Path, BinaryIO]) -> str:
+    """SHA-256 of a file path or an open binary stream"""
+    sha256_hash = hashlib.sha256()
+    if isinstance(source, (str, Path)):
+        with open(source, "rb") as f:
+            return file_sha256(f)
+    for block in iter(lambda: source.read(HASH_BLOCK_SIZE), b""):
+        sha256_hash.update(block)
+    return sha256_hash.hexdigest()
+
+
+def _link_file(source: Path, dest: Path):
+    if dest.exists() and os.path.samefile(source, dest):
+        return
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    dest.unlink(missing_ok=True)
+    try:
+        os.link(source, dest)
+    except OSError:
+        shutil.copy2(source, dest)
+
+
+def link_dataset(source: Union[str, Path], dest: Union[str, Path]) -> Path:
+    """
+    Hard-link an existing dataset into place, copying when the paths are on different filesystems.
+
+    The dataset's statistics sidecar, if it has one, comes along with it.
+    """
+    source, dest = Path(source), Path(dest)
+    _link_file(source, dest)
+    sidecar = statistics_path(source)
+    if sidecar.exists():
+        _link_file(sidecar, statistics_path(dest))
+    return dest
+
+
+def _clone_file(source: Path, dest: Path):
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    dest.unlink(missing_ok=True)
+    if fcntl is not None:
+        try:
+            with open(source, "rb") as src, open(dest, "wb") as dst:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            shutil.copystat(source, dest)
+            os.chmod(dest, READ_ONLY)
+            return
+        except OSError:
+            dest.unlink(missing_ok=True)
+    shutil.copy2(source, dest)
+    os.chmod(dest, READ_ONLY)
+
+
+def clone_dataset(source: Union[str, Path], dest: Union[str, Path]) -> Path:
+    """
+    Read-only private copy of a dataset, sharing storage copy-on-write where the filesystem can.
+
+    Unlike link_dataset, writing to the copy (after undoing its read-only
+    mode) never changes the source. The statistics sidecar comes along too.
+    """
+    source, dest = Path(source), Path(dest)
+    _clone_file(source, dest)
+    sidecar = statistics_path(source)
+    if sidecar.exists():
+        _clone_file(sidecar, statistics_path(dest))
+    return dest
+
+
+class IngestManifest(JsonStateFile):
+    """
+    Maps source file content to the parquet file converted from it.
+
+    Entries are keyed by content hash and a conversion profile, since the
+    upload and study pipelines clean column names differently. An entry
+    whose parquet file has been deleted is treated as missing.
+    """
+
+    section = "entries"
+    description = "ingest manifest"
+
+    @classmethod
+    def for_study(cls, org_id: uuid.UUID, study_id: uuid.UUID) -> "IngestManifest":
+        return cls(get_ingest_manifest_path(org_id, study_id))
+
+    @staticmethod
+    def _key(content_hash: str, profile: str) -> str:
+        return f"{profile}:{content_hash}"
+
+    def lookup(self, content_hash: str, profile: str) -> Optional[Dict[str, Any]]:
+        """Entry for this content, if its parquet file still exists"""
+        with self._lock:
+            entry = self._entries.get(self._key(content_hash, profile))
+        if entry is None or not Path(entry["parquet_path"]).exists():
+            return None
+        return entry
+
+    def known(self, profile: str) -> Dict[str, str]:
+        """Content hash -> parquet path for every live entry of a profile"""
+        prefix = f"{profile}:"
+        with self._lock:
+            entries = list(self._entries.items())
+        return {
+            key[len(prefix):]: entry["parquet_path"]
+            for key, entry in entries
+            if key.startswith(prefix) and Path(entry["parquet_path"]).exists()
+        }
+
+    def record(self, content_hash: str, profile: str, parquet_path: Union[str, Path], **info: Any):
+        """Remember that this content converted to parquet_path"""
+        with self._lock:
+            self._entries[self._key(content_hash, profile)] = {
+                "parquet_path": str(parquet_path),
+                "recorded_at": datetime.utcnow().isoformat(),
+                **info,
+            }
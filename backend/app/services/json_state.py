@@ -0,0 +1,63 @@
+# ABOUTME: Base for small per-study state files kept as one JSON document and replaced atomically
+# ABOUTME: Used by the ingest manifest and the pipeline run state to remember work they can skip
+
+import contextlib
+import json
+import logging
+import os
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Union
+
+logger = logging.getLogger(__name__)
+
+
+class JsonStateFile:
+    """
+    Entries kept in memory and saved as one JSON file.
+
+    The state only lets callers skip repeated work, so an unreadable file
+    loads as empty and a failed save is logged rather than raised. Saves
+    write a temporary file and rename it over the old one, so readers never
+    see a partial file. Subclasses name their section and description.
+    """
+
+    section = "entries"
+    description = "state file"
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = self._load()
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.path) as f:
+                return json.load(f).get(self.section, {})
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable {self.description} {self.path}: {e}")
+            return {}
+
+    def save(self) -> bool:
+        """Write the state atomically; returns False if it couldn't be written"""
+        with self._lock:
+            data = {"version": 1, self.section: dict(self._entries)}
+        # Unique per writer, so concurrent saves don't write into each other's file
+        tmp_path = self.path.with_name(f".{self.path.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, "w") as f:
+                json.dump(data, f, indent=2, default=str)
+            os.replace(tmp_path, self.path)
+            return True
+        except OSError as e:
+            logger.warning(f"Failed to save {self.description} {self.path}: {e}")
+            with contextlib.suppress(OSError):
+                tmp_path.unlink(missing_ok=True)
+            return False
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -13,6 +13,11 @@ import json
 from datetime import datetime, timedelta
 from sqlmodel import Session, select
 from app.models import Study
+from app.services.dataset_statistics import get_statistics
+from app.services.duckdb_catalog import StudyCatalog, get_duckdb_pool
+from app.services.widget_engines.base_widget import WidgetEngine
+from app.services.widget_engines.query_planner import ScanPlanner, duckdb_runner
+from app.services.widget_engines.result_cache import get_widget_result_cache
 
 logger = logging.getLogger(__name__)
 
@@ -22,50 +27,51 @@ class ParquetQueryEngine:
     
     def __init__(self, db: Session):
         self.db = db
-        self.conn = None
-        self._init_connection()
-    
-    def _init_connection(self):
-        """Initialize DuckDB connection with optimized settings"""
-        self.conn = duckdb.connect(':memory:')
-        # Configure DuckDB for better performance
-        self.conn.execute("SET memory_limit='4GB'")
-        self.conn.execute("SET threads=4")
-        self.conn.execute("SET enable_progress_bar=false")
-    
-    def __del__(self):
-        """Clean up DuckDB connection"""
-        if self.conn:
-            self.conn.close()
+        # Connections and registered views are shared process-wide
+        self.pool = get_duckdb_pool()
     
     def get_study_parquet_path(self, org_id: uuid.UUID, study_id: uuid.UUID) -> Path:
         """Get the path to study's Parquet files"""
         timestamp = datetime.now().strftime("%Y-%m-%d")
         return Path(f"/data/{org_id}/studies/{study_id}/processed_data/{timestamp}")
     
+    def get_study_catalog(self, org_id: uuid.UUID, study_id: uuid.UUID) -> Optional[StudyCatalog]:
+        """Get the study's shared catalog, registering its Parquet files on first use"""
+        parquet_dir = self.get_study_parquet_path(org_id, study_id)
+        return self.pool.get_catalog(study_id, parquet_dir)
+    
     def register_study_datasets(self, org_id: uuid.UUID, study_id: uuid.UUID) -> Dict[str, str]:
         """Register all Parquet files for a study in DuckDB"""
-        registered_tables = {}
-        parquet_dir = self.get_study_parquet_path(org_id, study_id)
+        catalog = self.get_study_catalog(org_id, study_id)
+        return dict(catalog.tables) if catalog else {}
+    
+    def execute_widget_engines(
+        self,
+        study: Study,
+        engines: List[WidgetEngine],
+        force_refresh: bool = False
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Run widget engines against the study's views, keyed by widget ID
         
-        if not parquet_dir.exists():
-            logger.warning(f"Parquet directory not found: {parquet_dir}")
-            return registered_tables
+        Widgets scanning the same dataset under the same filters share one
+        fused query (see ScanPlanner), and concurrent requests for the same
+        scan of the same data version share one execution unless
+        force_refresh is set. Raises ValueError if the study has no datasets.
+        """
+        catalog = self.get_study_catalog(study.org_id, study.id)
+        if not catalog or not catalog.tables:
+            raise ValueError("No datasets found")
         
-        for parquet_file in parquet_dir.glob("*.parquet"):
-            table_name = parquet_file.stem
-            try:
-                # Register the Parquet file as a DuckDB table
-                self.conn.execute(f"""
-                    CREATE OR REPLACE VIEW {table_name} AS 
-                    SELECT * FROM read_parquet('{parquet_file}')
-                """)
-                registered_tables[table_name] = str(parquet_file)
-                logger.info(f"Registered table {table_name} from {parquet_file}")
-            except Exception as e:
-                logger.error(f"Failed to register {parquet_file}: {str(e)}")
+        def run_query(query: str) -> List[Dict[str, Any]]:
+            # Checked out per scan, so requests waiting on another's scan don't hold a connection
+            with self.pool.connection(catalog.schema) as conn:
+                return duckdb_runner(conn)(query)
         
-        return registered_tables
+        # The fingerprint names the exact files read, and is the same in every process
+        scope = f"{study.id}:{hashlib.sha256(repr(catalog.fingerprint).encode()).hexdigest()[:16]}"
+        result_cache = None if force_refresh else get_widget_result_cache()
+        return ScanPlanner(engines, result_cache, scope).execute(run_query=run_query)
     
     def execute_widget_query(
         self,
@@ -80,23 +86,27 @@ class ParquetQueryEngine:
         if not study:
             raise ValueError(f"Study {study_id} not found")
         
-        # Register datasets
-        tables = self.register_study_datasets(study.org_id, study_id)
-        if not tables:
+        # Reuse the study's registered views
+        catalog = self.get_study_catalog(study.org_id, study_id)
+        if not catalog or not catalog.tables:
             return {"error": "No datasets found", "data": None}
         
         # Route to appropriate query builder based on widget type
         if widget_type == "kpi_card":
-            return self._query_kpi_metric(tables, query_params)
+            query_fn = self._query_kpi_metric
         elif widget_type == "time_series":
-            return self._query_time_series(tables, query_params)
+            query_fn = self._query_time_series
         elif widget_type == "distribution":
-            return self._query_distribution(tables, query_params)
+            query_fn = self._query_distribution
         else:
             raise ValueError(f"Unsupported widget type: {widget_type}")
+        
+        with self.pool.connection(catalog.schema) as conn:
+            return query_fn(conn, catalog.tables, query_params)
     
     def _query_kpi_metric(
         self,
+        conn: duckdb.DuckDBPyConnection,
         tables: Dict[str, str],
         params: Dict[str, Any]
     ) -> Dict[str, Any]:
@@ -125,7 +135,7 @@ class ParquetQueryEngine:
                 if filter_condition:
                     query += f" AND {filter_condition}"
                 
-                result = self.conn.execute(query).fetchone()
+                result = conn.execute(query).fetchone()
                 
                 # Calculate enrollment rate
                 if result and result[2] and result[3]:  # If we have dates
@@ -158,7 +168,7 @@ class ParquetQueryEngine:
                 if filter_condition:
                     query += f" AND {filter_condition}"
                 
-                result = self.conn.execute(query).fetchone()
+                result = conn.execute(query).fetchone()
                 
                 return {
                     "data": {
@@ -178,7 +188,7 @@ class ParquetQueryEngine:
                 if filter_condition:
                     query += f" WHERE {filter_condition}"
                 
-                result = self.conn.execute(query).scalar()
+                result = conn.execute(query).scalar()
                 
                 return {
                     "data": {
@@ -197,7 +207,7 @@ class ParquetQueryEngine:
                 if filter_condition:
                     query += f" WHERE {filter_condition}"
                 
-                result = self.conn.execute(query).scalar()
+                result = conn.execute(query).scalar()
                 
                 return {
                     "data": {
@@ -212,6 +222,7 @@ class ParquetQueryEngine:
     
     def _query_time_series(
         self,
+        conn: duckdb.DuckDBPyConnection,
         tables: Dict[str, str],
         params: Dict[str, Any]
     ) -> Dict[str, Any]:
@@ -257,7 +268,7 @@ class ParquetQueryEngine:
                     ORDER BY 1
                 """
             
-            result = self.conn.execute(query).fetchall()
+            result = conn.execute(query).fetchall()
             
             return {
                 "data": {
@@ -273,6 +284,7 @@ class ParquetQueryEngine:
     
     def _query_distribution(
         self,
+        conn: duckdb.DuckDBPyConnection,
         tables: Dict[str, str],
         params: Dict[str, Any]
     ) -> Dict[str, Any]:
@@ -312,7 +324,7 @@ class ParquetQueryEngine:
                     LIMIT 20
                 """
             
-            result = self.conn.execute(query).fetchall()
+            result = conn.execute(query).fetchall()
             
             return {
                 "data": {
@@ -334,14 +346,15 @@ class ParquetQueryEngine:
         limit: int = 100
     ) -> pd.DataFrame:
         """Get a preview of a dataset"""
-        tables = self.register_study_datasets(org_id, study_id)
+        catalog = self.get_study_catalog(org_id, study_id)
         
-        if dataset_name not in tables:
+        if not catalog or dataset_name not in catalog.tables:
             return pd.DataFrame()
         
         try:
             query = f"SELECT * FROM {dataset_name} LIMIT {limit}"
-            return self.conn.execute(query).df()
+            with self.pool.connection(catalog.schema) as conn:
+                return conn.execute(query).df()
         except Exception as e:
             logger.error(f"Failed to preview dataset: {str(e)}")
             return pd.DataFrame()
@@ -352,37 +365,26 @@ class ParquetQueryEngine:
         study_id: uuid.UUID,
         dataset_name: str
     ) -> Dict[str, Any]:
-        """Get statistics about a dataset"""
-        tables = self.register_study_datasets(org_id, study_id)
+        """Get statistics about a dataset, from the sidecar written when it was converted"""
+        catalog = self.get_study_catalog(org_id, study_id)
         
-        if dataset_name not in tables:
+        if not catalog or dataset_name not in catalog.tables:
             return {"error": "Dataset not found"}
         
         try:
-            # Get basic stats
-            stats_query = f"""
-                SELECT 
-                    COUNT(*) as row_count,
-                    COUNT(*) as column_count
-                FROM {dataset_name}
-            """
-            
-            result = self.conn.execute(stats_query).fetchone()
-            
-            # Get column information
-            columns_query = f"DESCRIBE {dataset_name}"
-            columns = self.conn.execute(columns_query).fetchall()
+            statistics = get_statistics(catalog.tables[dataset_name])
             
             return {
-                "row_count": result[0] if result else 0,
-                "column_count": len(columns),
+                "row_count": statistics["row_count"],
+                "column_count": statistics["column_count"],
                 "columns": [
                     {
-                        "name": col[0],
-                        "type": col[1],
-                        "nullable": col[2]
+                        "name": name,
+                        "type": info.get("arrow_type", info["type"]),
+                        "nullable": info["nullable"],
+                        **{key: value for key, value in info.items() if key not in ("type", "arrow_type", "nullable")}
                     }
-                    for col in columns
+                    for name, info in statistics["columns"].items()
                 ]
             }
             
@@ -390,11 +392,12 @@ class ParquetQueryEngine:
             logger.error(f"Failed to get dataset stats: {str(e)}")
             return {"error": str(e)}
     
-    def validate_query(self, query: str) -> tuple[bool, str]:
+    def validate_query(self, query: str, schema: Optional[str] = None) -> tuple[bool, str]:
         """Validate a DuckDB query without executing it"""
         try:
             # Use EXPLAIN to validate without executing
-            self.conn.execute(f"EXPLAIN {query}")
+            with self.pool.connection(schema) as conn:
+                conn.execute(f"EXPLAIN {query}")
             return True, "Query is valid"
         except Exception as e:
-            return False, str(e)
\ No newline at end of file
+            return False, str(e)
@@ -0,0 +1,196 @@
+# ABOUTME: Shared Parquet write profile for clinical datasets
+# ABOUTME: Sorts by per-domain keys and writes dictionary encoding, page statistics and bloom filters for pruning
+
+import inspect
+import logging
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+import duckdb
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Sort keys per dataset, most selective filter first. Keys a dataset doesn't
+# have are skipped, so the default suits BDS datasets and plain subject lists.
+DEFAULT_SORT_KEYS: Dict[str, List[str]] = {
+    "default": ["PARAMCD", "USUBJID", "AVISITN", "VISITNUM"],
+    "adsl": ["SITEID", "ARM", "USUBJID"],
+    "dm": ["SITEID", "ARM", "USUBJID"],
+    "adae": ["USUBJID", "ASTDT"],
+    "ae": ["USUBJID", "AESTDTC"],
+    "lb": ["LBTESTCD", "USUBJID", "VISITNUM"],
+    "vs": ["VSTESTCD", "USUBJID", "VISITNUM"],
+    "eg": ["EGTESTCD", "USUBJID", "VISITNUM"],
+}
+
+# Rows sampled when deciding which columns to dictionary encode
+DICTIONARY_SAMPLE_ROWS = 100000
+
+_WRITER_OPTIONS = set(inspect.signature(pq.ParquetWriter.__init__).parameters)
+
+
+def _writer_supports(option: str) -> bool:
+    return option in _WRITER_OPTIONS
+
+
+class ParquetWriteProfile:
+    """
+    How datasets are laid out on disk so readers can skip what they don't need.
+
+    Rows are sorted by the dataset's sort keys so row group and page statistics
+    are tight on the columns widgets filter by. Low-cardinality columns are
+    dictionary encoded, the page index is written, and bloom filters are added
+    for ID columns where the installed pyarrow supports them.
+    """
+
+    def __init__(
+        self,
+        row_group_size: int = settings.CONVERSION_ROW_GROUP_SIZE,
+        dictionary_max_ratio: float = settings.PARQUET_DICTIONARY_MAX_RATIO,
+        bloom_filter_columns: Iterable[str] = settings.PARQUET_BLOOM_FILTER_COLUMNS,
+        sort_keys: Optional[Dict[str, List[str]]] = None,
+        compression: str = "snappy"
+    ):
+        self.row_group_size = row_group_size
+        self.dictionary_max_ratio = dictionary_max_ratio
+        self.bloom_filter_columns = [c.upper() for c in bloom_filter_columns]
+        self.sort_keys = {**DEFAULT_SORT_KEYS, **settings.PARQUET_SORT_KEYS, **(sort_keys or {})}
+        self.compression = compression
+
+    def keys_for(self, dataset: Optional[str], schema: pa.Schema) -> List[str]:
+        """Sort keys for a dataset that are present in its schema, matched case-insensitively"""
+        wanted = self.sort_keys.get((dataset or "").lower(), self.sort_keys["default"])
+        columns = {name.upper(): name for name in schema.names}
+        keys = []
+        for key in wanted:
+            name = columns.get(key.upper())
+            if name is not None and name not in keys:
+                keys.append(name)
+        return keys
+
+    def dictionary_columns(self, table: pa.Table) -> List[str]:
+        """Columns whose distinct values are few relative to their rows"""
+        sample = table.slice(0, DICTIONARY_SAMPLE_ROWS)
+        columns = []
+        for name, column in zip(sample.column_names, sample.columns):
+            if pa.types.is_nested(column.type):
+                continue
+            values = sample.num_rows - column.null_count
+            if values == 0:
+                columns.append(name)
+                continue
+            distinct = pc.count_distinct(column).as_py()
+            if distinct <= max(values * self.dictionary_max_ratio, 1):
+                columns.append(name)
+        return columns
+
+    def writer_options(self, table: pa.Table, keys: List[str]) -> Dict[str, Any]:
+        """ParquetWriter keyword arguments for a table sorted by keys"""
+        options: Dict[str, Any] = {
+            "compression": self.compression,
+            "use_dictionary": self.dictionary_columns(table),
+            "write_statistics": True,
+        }
+        if _writer_supports("write_page_index"):
+            options["write_page_index"] = True
+        if keys and _writer_supports("sorting_columns"):
+            options["sorting_columns"] = pq.SortingColumn.from_ordering(
+                table.schema, [(key, "ascending") for key in keys], null_placement="at_end"
+            )
+        bloom = [name for name in table.column_names if name.upper() in self.bloom_filter_columns]
+        if bloom and _writer_supports("bloom_filter_options"):
+            options["bloom_filter_options"] = {name: True for name in bloom}
+        return options
+
+    @staticmethod
+    def sort(table: pa.Table, keys: List[str]) -> pa.Table:
+        if not keys or table.num_rows < 2:
+            return table
+        return table.sort_by([(key, "ascending") for key in keys])
+
+    def write_table(
+        self,
+        table: pa.Table,
+        path: Union[str, Path],
+        dataset: Optional[str] = None
+    ) -> pq.FileMetaData:
+        """Sort and write a table; dataset defaults to the file name"""
+        path = Path(path)
+        keys = self.keys_for(dataset or path.stem, table.schema)
+        table = self.sort(table, keys)
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        try:
+            with pq.ParquetWriter(str(tmp_path), table.schema, **self.writer_options(table, keys)) as writer:
+                writer.write_table(table, row_group_size=self.row_group_size)
+            # Replace rather than overwrite: the old file may be linked from another extract
+            os.replace(tmp_path, path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        return pq.read_metadata(str(path))
+
+    def sort_file(
+        self,
+        source: Union[str, Path],
+        dest: Union[str, Path],
+        keys: List[str],
+        options: Dict[str, Any],
+        memory_limit_mb: int
+    ) -> int:
+        """
+        Rewrite source into dest sorted by keys, for files too large to sort in memory.
+
+        DuckDB does the sort and spills to disk beyond memory_limit_mb; rows are
+        written back through pyarrow with the source schema. Returns the number
+        of row groups written.
+        """
+        schema = pq.read_schema(str(source))
+        order = ", ".join(f'"{key}" ASC NULLS LAST' for key in keys)
+        row_groups = 0
+        with tempfile.TemporaryDirectory(dir=Path(dest).parent) as spill_dir:
+            con = duckdb.connect(config={
+                "memory_limit": f"{memory_limit_mb}MB",
+                "temp_directory": spill_dir,
+                "preserve_insertion_order": False,
+            })
+            try:
+                reader = con.execute(
+                    f"SELECT * FROM read_parquet(?) ORDER BY {order}", [str(source)]
+                ).to_arrow_reader(self.row_group_size)
+                with pq.ParquetWriter(str(dest), schema, **options) as writer:
+                    pending: List[pa.RecordBatch] = []
+                    for batch in reader:
+                        pending.append(batch)
+                        if sum(b.num_rows for b in pending) >= self.row_group_size:
+                            writer.write_table(pa.Table.from_batches(pending).cast(schema), row_group_size=self.row_group_size)
+                            row_groups += 1
+                            pending = []
+                    if pending:
+                        writer.write_table(pa.Table.from_batches(pending).cast(schema), row_group_size=self.row_group_size)
+                        row_groups += 1
+            finally:
+                con.close()
+        return row_groups
+
+
+_default_profile: Optional[ParquetWriteProfile] = None
+
+
+def get_write_profile() -> ParquetWriteProfile:
+    """The profile built from settings"""
+    global _default_profile
+    if _default_profile is None:
+        _default_profile = ParquetWriteProfile()
+    return _default_profile
+
+
+def write_table(table: pa.Table, path: Union[str, Path], dataset: Optional[str] = None) -> pq.FileMetaData:
+    """Write a table with the default profile"""
+    return get_write_profile().write_table(table, path, dataset)
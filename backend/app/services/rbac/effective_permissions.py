@@ -0,0 +1,186 @@
+# ABOUTME: Effective permission sets per user and scope, resolved in one query and cached
+# ABOUTME: Cached sets are keyed by the user's principal version and the role permission version, so changes retire them
+
+import logging
+import threading
+import uuid
+from datetime import datetime, timezone
+from typing import Any, FrozenSet, Optional, Tuple, Union
+
+from sqlmodel import Session, and_, or_, select
+
+from app.core.config import settings
+from app.core.tiered_cache import TieredCache, shared_redis_cache
+from app.models.rbac import Permission, Role, RolePermission, UserRole
+
+logger = logging.getLogger(__name__)
+
+REDIS_NAMESPACE = "effective_permissions"
+
+# Granted through a wildcard permission or the system_admin role: every permission
+ALL_PERMISSIONS = "*"
+SYSTEM_ADMIN_ROLE = "system_admin"
+
+ScopeId = Optional[Union[str, uuid.UUID]]
+
+
+def _naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def resolve_effective_permissions(
+    db: Session,
+    user_id: uuid.UUID,
+    organization_id: ScopeId = None,
+    study_id: ScopeId = None
+) -> Tuple[FrozenSet[str], Optional[datetime]]:
+    """
+    Permission names a user holds in a scope, with one query.
+
+    Returns the set and when it next changes by itself (the earliest future
+    expiry of a role it came from). Scoping matches the per-role checks:
+    roles scoped to the organization or study, or unscoped, apply; an active
+    system_admin assignment grants everything whatever its scope or expiry.
+    """
+    query = (
+        select(Role.name, Permission.name, UserRole.expires_at)
+        .select_from(UserRole)
+        .join(Role, Role.id == UserRole.role_id)
+        .outerjoin(RolePermission, and_(
+            RolePermission.role_id == UserRole.role_id,
+            RolePermission.is_active == True  # noqa: E712
+        ))
+        .outerjoin(Permission, Permission.id == RolePermission.permission_id)
+        .where(UserRole.user_id == user_id, UserRole.is_active == True)  # noqa: E712
+    )
+    scope = []
+    if study_id:
+        scope.append(or_(UserRole.study_id == study_id, UserRole.study_id == None))  # noqa: E711
+    if organization_id:
+        scope.append(or_(UserRole.organization_id == organization_id, UserRole.organization_id == None))  # noqa: E711
+    if scope:
+        query = query.where(or_(Role.name == SYSTEM_ADMIN_ROLE, and_(*scope)))
+
+    now = datetime.utcnow()
+    names = set()
+    next_expiry = None
+    for role_name, permission_name, expires_at in db.exec(query).all():
+        if role_name == SYSTEM_ADMIN_ROLE:
+            return frozenset({ALL_PERMISSIONS}), None
+        expires_at = _naive_utc(expires_at)
+        if expires_at is not None:
+            if expires_at <= now:
+                continue
+            next_expiry = expires_at if next_expiry is None else min(next_expiry, expires_at)
+        if permission_name:
+            names.add(permission_name)
+    return frozenset(names), next_expiry
+
+
+class EffectivePermissionCache(TieredCache):
+    """
+    Effective permission sets cached for a few seconds per process and longer in Redis.
+
+    Redis entries are keyed by the scope, the user's principal version and
+    the role permission version. Role assignments bump the user's version,
+    permission grants bump the role permission version. No entry outlives
+    the expiry of a role assignment it was computed from.
+    """
+
+    def __init__(
+        self,
+        redis_cache: Optional[Any] = None,
+        max_entries: int = settings.PERMISSION_CACHE_MAX_ENTRIES,
+        local_ttl: float = settings.PERMISSION_CACHE_LOCAL_TTL,
+        ttl: int = settings.PERMISSION_CACHE_TTL
+    ):
+        super().__init__(REDIS_NAMESPACE, redis_cache, max_entries)
+        self.local_ttl = local_ttl
+        self.ttl = ttl
+
+    def get(
+        self,
+        db: Session,
+        user_id: Union[str, uuid.UUID],
+        organization_id: ScopeId = None,
+        study_id: ScopeId = None
+    ) -> FrozenSet[str]:
+        """Effective permissions of a user in a scope, resolved only on a cache miss"""
+        key = f"{user_id}:{organization_id or ''}:{study_id or ''}"
+        permissions = self.get_local(key)
+        if permissions is not None:
+            return permissions
+
+        # Versions are read before resolving, so a change committed meanwhile retires what gets stored
+        redis_key = self._redis_key(key, user_id)
+        if redis_key is not None:
+            entry = self.get_redis(redis_key)
+            if entry is not None:
+                permissions = frozenset(entry["permissions"])
+                self._store_local(key, permissions, self._seconds_left(entry.get("expires_at")))
+                return permissions
+
+        self.record("misses")
+        permissions, next_expiry = resolve_effective_permissions(
+            db, uuid.UUID(str(user_id)), organization_id, study_id
+        )
+        expires_at = next_expiry.isoformat() if next_expiry else None
+        self._store_local(key, permissions, self._seconds_left(expires_at))
+        if redis_key is not None:
+            ttl = min(self.ttl, self._seconds_left(expires_at) or self.ttl)
+            if ttl > 0:
+                self.set_redis(
+                    redis_key, {"permissions": sorted(permissions), "expires_at": expires_at}, max(1, int(ttl))
+                )
+        return permissions
+
+    def invalidate_user(self, user_id: Union[str, uuid.UUID]):
+        """Retire every cached permission set of a user, after their role assignments change"""
+        self.drop_local_prefix(f"{user_id}:")
+        self.record("invalidations")
+        self.bump_version(
+            f"user:{user_id}", lambda redis_cache: redis_cache.bump_user_generation(str(user_id))
+        )
+
+    def invalidate_all(self):
+        """Retire every cached permission set, after a role's permissions change"""
+        self.clear_local()
+        self.record("invalidations")
+        self.bump_version("rbac", lambda redis_cache: redis_cache.bump_rbac_generation())
+
+    def _redis_key(self, key: str, user_id: Union[str, uuid.UUID]) -> Optional[str]:
+        if self.redis_cache is None:
+            return None
+        user_version = self.read_version(
+            f"user:{user_id}", lambda redis_cache: redis_cache.get_user_generation(str(user_id))
+        )
+        rbac_version = self.read_version("rbac", lambda redis_cache: redis_cache.get_rbac_generation())
+        if user_version is None or rbac_version is None:
+            return None
+        return f"{key}:{user_version}:{rbac_version}"
+
+    @staticmethod
+    def _seconds_left(expires_at: Optional[str]) -> Optional[float]:
+        if not expires_at:
+            return None
+        return (datetime.fromisoformat(expires_at) - datetime.utcnow()).total_seconds()
+
+    def _store_local(self, key: str, permissions: FrozenSet[str], seconds_left: Optional[float]):
+        ttl = self.local_ttl if seconds_left is None else min(self.local_ttl, seconds_left)
+        self.set_local(key, permissions, ttl)
+
+
+_permission_cache: Optional[EffectivePermissionCache] = None
+_permission_cache_lock = threading.Lock()
+
+
+def get_permission_cache() -> EffectivePermissionCache:
+    """Get the process-wide effective permission cache, creating it on first use"""
+    global _permission_cache
+    if _permission_cache is None:
+        with _permission_cache_lock:
+            if _permission_cache is None:
+                _permission_cache = EffectivePermissionCache(shared_redis_cache())
+    return _permission_cache
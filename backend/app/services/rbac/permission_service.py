@@ -1,7 +1,7 @@
 # ABOUTME: RBAC permission service for managing permissions and role assignments
 # ABOUTME: Handles permission checking, granting, revoking, and audit logging
 
-from typing import List, Optional, Dict, Any, Set
+from typing import List, Optional, Dict, Any, Set, FrozenSet
 from uuid import UUID
 from datetime import datetime
 from sqlmodel import Session, select, and_, or_
@@ -14,6 +14,7 @@ from app.models.rbac import (
     DEFAULT_PERMISSIONS, DEFAULT_ROLE_PERMISSIONS
 )
 from app.models.user import User
+from app.services.rbac.effective_permissions import ALL_PERMISSIONS, get_permission_cache
 
 logger = logging.getLogger(__name__)
 
@@ -69,6 +70,7 @@ class PermissionService:
         
         # Assign default permissions to roles
         self._assign_default_role_permissions()
+        get_permission_cache().invalidate_all()
     
     def _assign_default_role_permissions(self):
         """Assign default permissions to roles"""
@@ -130,19 +132,22 @@ class PermissionService:
         Returns:
             True if user has permission, False otherwise
         """
-        # System admins have all permissions
-        if self.is_system_admin(user):
-            return True
-        
-        # Get user's roles
-        user_roles = self.get_user_roles(user.id, organization_id, study_id)
-        
-        # Check each role for the permission
-        for user_role in user_roles:
-            if self.role_has_permission(user_role.role_id, permission_name):
-                return True
+        permissions = self.get_effective_permissions(user.id, organization_id, study_id)
+        return ALL_PERMISSIONS in permissions or permission_name in permissions
+    
+    def get_effective_permissions(
+        self,
+        user_id: UUID,
+        organization_id: Optional[UUID] = None,
+        study_id: Optional[UUID] = None
+    ) -> FrozenSet[str]:
+        """
+        Permission names a user holds in a scope; "*" means all of them.
         
-        return False
+        Resolved with one query and cached until the user's roles or any
+        role's permissions change, so repeated checks are set lookups.
+        """
+        return get_permission_cache().get(self.db, user_id, organization_id, study_id)
     
     def is_system_admin(self, user: User) -> bool:
         """Check if user is a system admin"""
@@ -260,6 +265,7 @@ class PermissionService:
                 existing.granted_by = granted_by
                 existing.granted_at = datetime.utcnow()
                 self.db.commit()
+                get_permission_cache().invalidate_all()
                 self._log_permission_change("reactivate", role_id, permission.id, granted_by)
                 return existing
             else:
@@ -279,6 +285,7 @@ class PermissionService:
         
         self.db.add(role_permission)
         self.db.commit()
+        get_permission_cache().invalidate_all()
         
         self._log_permission_change("grant", role_id, permission.id, granted_by)
         
@@ -319,6 +326,7 @@ class PermissionService:
         # Deactivate permission
         role_permission.is_active = False
         self.db.commit()
+        get_permission_cache().invalidate_all()
         
         self._log_permission_change("revoke", role_id, permission.id, revoked_by)
         
@@ -405,6 +413,7 @@ class PermissionService:
         
         self.db.add(user_role)
         self.db.commit()
+        get_permission_cache().invalidate_user(user_id)
         
         self._log_role_assignment("assign", user_id, role.id, assigned_by)
         
@@ -446,6 +455,7 @@ class PermissionService:
         # Deactivate role
         user_role.is_active = False
         self.db.commit()
+        get_permission_cache().invalidate_user(user_id)
         
         self._log_role_assignment("remove", user_id, role.id, removed_by)
         
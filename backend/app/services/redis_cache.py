@@ -1,6 +1,7 @@
 # ABOUTME: Redis caching service for widget data with TTL support
 # ABOUTME: Provides async caching operations for dashboard performance optimization
 
+import asyncio
 import json
 import logging
 from typing import Any, Optional, Dict
@@ -9,6 +10,7 @@ from datetime import datetime, timedelta
 import redis.asyncio as redis
 from redis.exceptions import RedisError
 
+from app.core.cache import bump_study_generation
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
@@ -118,16 +120,23 @@ class RedisCache:
             return None
     
     async def invalidate_study_cache(self, study_id: str):
-        """Invalidate all cache entries for a study"""
-        pattern = f"widget_data:{study_id}:*"
-        deleted = await self.delete_pattern(pattern)
-        logger.info(f"Invalidated {deleted} cache entries for study {study_id}")
+        """
+        Invalidate all cache entries for a study.
+        
+        Bumps the study's cache generation, so widget results keyed on the
+        old generation are never read again and age out.
+        """
+        await asyncio.to_thread(bump_study_generation, study_id)
     
     async def invalidate_widget_cache(self, study_id: str, widget_id: str):
-        """Invalidate all cache entries for a specific widget"""
-        pattern = f"widget_data:{study_id}:{widget_id}:*"
-        deleted = await self.delete_pattern(pattern)
-        logger.info(f"Invalidated {deleted} cache entries for widget {widget_id} in study {study_id}")
+        """
+        Invalidate all cache entries for a specific widget.
+        
+        Widget results are keyed on the study generation, so this bumps it
+        rather than scanning for the widget's keys.
+        """
+        await asyncio.to_thread(bump_study_generation, study_id)
+        logger.info(f"Invalidated cache for widget {widget_id} in study {study_id}")
     
     async def get_cache_stats(self) -> Optional[Dict[str, Any]]:
         """Get cache statistics"""
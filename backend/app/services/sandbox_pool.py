@@ -0,0 +1,164 @@
+# ABOUTME: Pool of warm sandbox worker processes for Python transformation scripts
+# ABOUTME: Workers pre-import the data stack and take jobs over a pipe, replacing the process-per-step spawn
+
+import json
+import logging
+import os
+import queue
+import select
+import subprocess
+import sys
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+WORKER_SCRIPT = Path(__file__).with_name("sandbox_worker.py")
+
+# Extra seconds the pool waits for a worker beyond a job's wall time before killing it
+WORKER_GRACE_SECONDS = 10
+
+
+class SandboxWorker:
+    """One warm worker process; jobs and results are single JSON lines"""
+
+    def __init__(self):
+        self.process = subprocess.Popen(
+            [sys.executable, str(WORKER_SCRIPT)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            env={
+                **os.environ,
+                "PYTHONPATH": "",  # Clear PYTHONPATH
+                "OMP_NUM_THREADS": "1",  # Limit threads
+            }
+        )
+
+    @property
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def run(self, job: Dict[str, Any], timeout: Optional[float]) -> Dict[str, Any]:
+        """Send a job and wait for its result; a worker that doesn't answer in time is killed"""
+        self.process.stdin.write(json.dumps(job) + "\n")
+        self.process.stdin.flush()
+        ready, _, _ = select.select([self.process.stdout], [], [], timeout)
+        if not ready:
+            self.close()
+            raise TimeoutError(f"Sandbox worker did not answer within {timeout}s")
+        line = self.process.stdout.readline()
+        if not line:
+            raise RuntimeError(f"Sandbox worker exited with status {self.process.wait()}")
+        return json.loads(line)
+
+    def close(self):
+        if self.alive:
+            self.process.kill()
+        self.process.wait()
+        for pipe in (self.process.stdin, self.process.stdout):
+            try:
+                pipe.close()
+            except OSError:
+                pass
+
+
+class SandboxPool:
+    """
+    Fixed set of warm sandbox workers; at most `size` scripts run at once.
+
+    Each job runs in a child forked from a worker, so it starts with pandas,
+    numpy and pyarrow already imported but leaves nothing behind for the next
+    job. Heap and CPU limits apply to that child; the worker kills it at the
+    wall-time limit.
+    """
+
+    def __init__(self, size: int):
+        self.size = max(1, size)
+        self._idle: "queue.Queue[SandboxWorker]" = queue.Queue()
+        self._workers: List[SandboxWorker] = []
+        self._lock = threading.Lock()
+        self._closed = False
+        for _ in range(self.size):
+            self._add_worker()
+
+    def _add_worker(self):
+        worker = SandboxWorker()
+        with self._lock:
+            self._workers.append(worker)
+        self._idle.put(worker)
+
+    def _retire(self, worker: SandboxWorker):
+        worker.close()
+        with self._lock:
+            if worker in self._workers:
+                self._workers.remove(worker)
+
+    def run(
+        self,
+        script: str,
+        source_dir: Path,
+        output_dir: Path,
+        config: Dict[str, Any],
+        limits: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Run a script on the next free worker; outputs are Arrow IPC files in output_dir"""
+        job = {
+            "script": script,
+            "source_dir": str(source_dir),
+            "output_dir": str(output_dir),
+            "config": config,
+            "limits": limits,
+        }
+        wall_seconds = limits.get("max_wall_seconds")
+        timeout = wall_seconds + WORKER_GRACE_SECONDS if wall_seconds else None
+
+        worker = self._idle.get()
+        try:
+            return worker.run(job, timeout)
+        except (OSError, RuntimeError, TimeoutError, ValueError) as e:
+            logger.warning(f"Replacing sandbox worker: {e}")
+            worker.close()
+            return {"success": False, "error": f"Sandbox worker failed: {e}"}
+        finally:
+            # A worker that died or was killed is replaced, keeping the pool at full size
+            if worker.alive and not self._closed:
+                self._idle.put(worker)
+            else:
+                self._retire(worker)
+                if not self._closed:
+                    self._add_worker()
+
+    def shutdown(self):
+        """Stop every worker; jobs still running are killed"""
+        self._closed = True
+        with self._lock:
+            workers = list(self._workers)
+        for worker in workers:
+            self._retire(worker)
+
+
+_sandbox_pool: Optional[SandboxPool] = None
+_sandbox_pool_lock = threading.Lock()
+
+
+def get_sandbox_pool() -> SandboxPool:
+    """Get the process-wide sandbox pool, starting its workers on first use"""
+    global _sandbox_pool
+    if _sandbox_pool is None:
+        with _sandbox_pool_lock:
+            if _sandbox_pool is None:
+                _sandbox_pool = SandboxPool(settings.SANDBOX_POOL_SIZE)
+    return _sandbox_pool
+
+
+def shutdown_sandbox_pool():
+    """Stop the sandbox pool's worker processes"""
+    global _sandbox_pool
+    with _sandbox_pool_lock:
+        if _sandbox_pool is not None:
+            _sandbox_pool.shutdown()
+            _sandbox_pool = None
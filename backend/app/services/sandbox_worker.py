@@ -0,0 +1,199 @@
+# ABOUTME: Warm sandbox worker process for Python transformation scripts, run as a standalone script
+# ABOUTME: Imports the data stack once, then forks a resource-limited child per job read from stdin
+
+import functools
+import itertools
+import json
+import math
+import os
+import re
+import select
+import signal
+import statistics
+import sys
+import time
+import traceback
+from collections import Counter, defaultdict
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+MB = 1024 * 1024
+
+
+class SourceDatasets(dict):
+    """Source datasets that load on first access, read through a memory map"""
+
+    def __init__(self, directory):
+        super().__init__()
+        self.paths = {
+            file[:-len('.parquet')]: os.path.join(directory, file)
+            for file in os.listdir(directory) if file.endswith('.parquet')
+        }
+
+    def __missing__(self, name):
+        if name not in self.paths:
+            raise KeyError(name)
+        table = pq.read_table(self.paths[name], memory_map=True)
+        df = table.to_pandas(split_blocks=True, self_destruct=True)
+        del table
+        self[name] = df
+        return df
+
+    def __contains__(self, name):
+        return name in self.paths
+
+    def __iter__(self):
+        return iter(self.paths)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def get(self, name, default=None):
+        return self[name] if name in self.paths else default
+
+    def keys(self):
+        return self.paths.keys()
+
+    def values(self):
+        return (self[name] for name in self.paths)
+
+    def items(self):
+        return ((name, self[name]) for name in self.paths)
+
+
+def apply_limits(limits):
+    """Cap this process's heap and CPU time; wall time is enforced by the worker"""
+    if resource is None:
+        return
+    for name, key, scale in (("RLIMIT_DATA", "max_memory_mb", MB), ("RLIMIT_CPU", "max_cpu_seconds", 1)):
+        if not limits.get(key) or not hasattr(resource, name):
+            continue
+        limit = getattr(resource, name)
+        _, hard = resource.getrlimit(limit)
+        soft = int(limits[key] * scale)
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+        resource.setrlimit(limit, (soft, hard))
+
+
+def write_ipc(table, path):
+    with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+
+
+def run_job(job):
+    """Run a script; DataFrames it leaves behind are written to OUTPUT_DIR as Arrow IPC files"""
+    source_files = SourceDatasets(job["source_dir"])
+    namespace = {
+        "__name__": "__sandbox__",
+        "sys": sys, "os": os, "json": json, "pd": pd, "np": np, "pq": pq,
+        "datetime": datetime, "re": re, "math": math, "statistics": statistics,
+        "defaultdict": defaultdict, "Counter": Counter, "itertools": itertools, "functools": functools,
+        "SOURCE_DIR": job["source_dir"],
+        "OUTPUT_DIR": job["output_dir"],
+        "CONFIG": job["config"],
+        "source_files": source_files,
+    }
+    exec(compile(job["script"], "<transformation>", "exec"), namespace)
+
+    output_info = []
+    for name, df in list(namespace.items()):
+        if isinstance(df, pd.DataFrame) and name not in source_files:
+            output_path = os.path.join(job["output_dir"], f"{name}.arrow")
+            write_ipc(pa.Table.from_pandas(df), output_path)
+            output_info.append({"name": name, "path": output_path, "rows": len(df), "columns": len(df.columns)})
+
+    return {
+        "success": True,
+        "datasets_created": output_info,
+        "total_records": sum(info["rows"] for info in output_info)
+    }
+
+
+def run_safely(job):
+    try:
+        return run_job(job)
+    except BaseException as e:
+        return {"success": False, "error": f"{type(e).__name__}: {e}", "traceback": traceback.format_exc()}
+
+
+def describe_exit(status):
+    if os.WIFSIGNALED(status):
+        sig = os.WTERMSIG(status)
+        if sig == getattr(signal, "SIGXCPU", None):
+            return "CPU time limit exceeded"
+        return f"killed by {signal.Signals(sig).name}"
+    return f"exit status {os.WEXITSTATUS(status)}"
+
+
+def run_forked(job):
+    """Run a job in a forked child, so it starts warm but can't leave state behind"""
+    limits = job.get("limits", {})
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        # The child must never return into the worker loop, whatever happens
+        try:
+            os.close(read_fd)
+            apply_limits(limits)
+            data = json.dumps(run_safely(job), default=str).encode()
+            with os.fdopen(write_fd, 'wb') as result_pipe:
+                result_pipe.write(data)
+        finally:
+            os._exit(0)
+
+    os.close(write_fd)
+    wall_seconds = limits.get("max_wall_seconds")
+    deadline = time.monotonic() + wall_seconds if wall_seconds else None
+    chunks = []
+    timed_out = False
+    with os.fdopen(read_fd, 'rb') as result_pipe:
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            ready, _, _ = select.select([result_pipe], [], [], timeout)
+            if not ready:
+                timed_out = True
+                os.kill(pid, signal.SIGKILL)
+                break
+            chunk = os.read(result_pipe.fileno(), 1 << 16)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    _, status = os.waitpid(pid, 0)
+
+    if timed_out:
+        return {"success": False, "error": f"Script execution timeout ({wall_seconds}s exceeded)"}
+    if not chunks:
+        return {"success": False, "error": f"Script process ended without a result ({describe_exit(status)})"}
+    return json.loads(b"".join(chunks))
+
+
+def main():
+    # Replies go over the original stdout; anything a script prints is discarded
+    protocol = os.fdopen(os.dup(sys.stdout.fileno()), 'w', buffering=1)
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, sys.stdout.fileno())
+
+    for line in sys.stdin:
+        job = json.loads(line)
+        if hasattr(os, "fork"):
+            result = run_forked(job)
+        else:
+            result = run_safely(job)
+        protocol.write(json.dumps(result, default=str) + "\n")
+        if not hasattr(os, "fork"):
+            # Without fork a job runs in this process, so the worker is used once
+            break
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,449 @@
+# ABOUTME: Streaming CSV/SAS/XPT to Parquet conversion with a bounded memory footprint
+# ABOUTME: Reads sources in chunks, writes row groups incrementally and reports throughput and peak RSS
+
+import logging
+import os
+import re
+import time
+import zipfile
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+import pandas as pd
+import psutil
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+try:
+    import pyreadstat
+except ImportError:
+    pyreadstat = None
+
+from app.core.config import settings
+from app.services.dataset_statistics import write_statistics
+from app.services.parquet_writer import ParquetWriteProfile
+from app.services.type_normalizer import DatasetProfile, TypeConflict, TypeNormalizer
+
+logger = logging.getLogger(__name__)
+
+# Arrow's defaults plus the SAS-style missing markers the pandas reader was given
+CSV_NULL_VALUES = pa_csv.ConvertOptions().null_values + [".", " "]
+
+# Rough in-memory size of one decoded cell, used to size SAS/XPT chunks
+BYTES_PER_CELL = 32
+
+MB = 1024 * 1024
+
+
+@dataclass
+class ConversionStats:
+    """What one streaming conversion produced and what it cost"""
+    rows: int = 0
+    columns: int = 0
+    chunks: int = 0
+    row_groups: int = 0
+    elapsed_seconds: float = 0.0
+    peak_rss_mb: float = 0.0
+    schema: Optional[pa.Schema] = None
+    profile: Optional[DatasetProfile] = None
+    warnings: List[str] = field(default_factory=list)
+
+    @property
+    def rows_per_second(self) -> float:
+        if not self.elapsed_seconds:
+            return float(self.rows)
+        return round(self.rows / self.elapsed_seconds, 1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "rows": self.rows,
+            "columns": self.columns,
+            "chunks": self.chunks,
+            "row_groups": self.row_groups,
+            "elapsed_seconds": round(self.elapsed_seconds, 3),
+            "rows_per_second": self.rows_per_second,
+            "peak_rss_mb": self.peak_rss_mb,
+        }
+
+
+class RSSMonitor:
+    """Highest resident set size of this process seen while converting"""
+
+    def __init__(self):
+        self._process = psutil.Process()
+        self.baseline = self._process.memory_info().rss
+        self.peak = self.baseline
+
+    def sample(self) -> int:
+        rss = self._process.memory_info().rss
+        self.peak = max(self.peak, rss)
+        return rss
+
+    @property
+    def peak_mb(self) -> float:
+        return round(self.peak / MB, 1)
+
+    @property
+    def growth_mb(self) -> float:
+        return round((self.peak - self.baseline) / MB, 1)
+
+
+class _RowGroupWriter:
+    """
+    ParquetWriter fed one chunk at a time.
+
+    Chunks are buffered until a row group is full (by rows or bytes). The file
+    schema and write options are settled when the first row group is written:
+    a column that is all-null in one chunk takes its type from another, and
+    stays string if none has a value, and the normalizer plans its type
+    conversions from that row group. Each row group is normalized, profiled
+    and sorted by the dataset's sort keys; once there is more than one, the
+    file needs a final sort pass (needs_sort).
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        row_group_size: int,
+        buffer_bytes: int,
+        profile: ParquetWriteProfile,
+        dataset: str,
+        normalizer: TypeNormalizer
+    ):
+        self.path = path
+        self.row_group_size = row_group_size
+        self.buffer_bytes = buffer_bytes
+        self.profile = profile
+        self.dataset = dataset
+        self.normalizer = normalizer
+        self.dataset_profile = DatasetProfile()
+        self.schema: Optional[pa.Schema] = None
+        self._read_schema: Optional[pa.Schema] = None
+        self.sort_keys: List[str] = []
+        self.options: Dict[str, Any] = {}
+        self.row_groups = 0
+        self._writer: Optional[pq.ParquetWriter] = None
+        self._pending: List[pa.Table] = []
+        self._pending_rows = 0
+        self._pending_bytes = 0
+
+    def write(self, table: pa.Table):
+        self._pending.append(table)
+        self._pending_rows += table.num_rows
+        self._pending_bytes += table.nbytes
+        if self._pending_rows >= self.row_group_size or self._pending_bytes >= self.buffer_bytes:
+            self._flush()
+
+    def close(self):
+        self._flush()
+        if self._writer is not None:
+            self._writer.close()
+
+    def abort(self):
+        self._pending = []
+        if self._writer is not None:
+            self._writer.close()
+
+    @property
+    def needs_sort(self) -> bool:
+        return bool(self.sort_keys) and self.row_groups > 1
+
+    def _flush(self):
+        if not self._pending:
+            return
+        if self._writer is None:
+            self._read_schema = self._settle_schema(self._pending)
+        table = pa.concat_tables([t.cast(self._read_schema) for t in self._pending])
+        if self._writer is None:
+            self.normalizer.plan(table)
+        table = self.normalizer.apply(table)
+        if self._writer is None:
+            self.schema = table.schema
+            self.sort_keys = self.profile.keys_for(self.dataset, self.schema)
+            self.options = self.profile.writer_options(table, self.sort_keys)
+            self._writer = pq.ParquetWriter(str(self.path), self.schema, **self.options)
+        table = self.profile.sort(table, self.sort_keys)
+        self.dataset_profile.observe(table)
+        if table.num_rows:
+            self._writer.write_table(table, row_group_size=self.row_group_size)
+            self.row_groups += -(-table.num_rows // self.row_group_size)
+        self._pending = []
+        self._pending_rows = self._pending_bytes = 0
+
+    @staticmethod
+    def _settle_schema(tables: List[pa.Table]) -> pa.Schema:
+        fields = []
+        for i, first in enumerate(tables[0].schema):
+            types = [t.schema.field(i).type for t in tables if not pa.types.is_null(t.schema.field(i).type)]
+            fields.append(pa.field(first.name, types[0] if types else pa.string()))
+        return pa.schema(fields)
+
+
+class _CsvSource:
+    """
+    Arrow streaming CSV reader.
+
+    Types are inferred from the first block. When a later block doesn't fit
+    (an integer column with a decimal further down, say) the read restarts
+    with that column widened: integers to float64, anything else to string.
+    Invalid UTF-8 restarts the read as latin-1. The source may be a file
+    path or a zipfile.Path, which is read without extracting it.
+    """
+
+    def __init__(
+        self,
+        path: Union[Path, zipfile.Path],
+        block_size: int,
+        rename: Callable[[str], str],
+        null_values: List[str]
+    ):
+        self.path = path
+        self.block_size = block_size
+        self.rename = rename
+        self.null_values = null_values
+        self.encoding = "utf8"
+        self.column_types: Dict[str, pa.DataType] = {}
+        self.schema: Optional[pa.Schema] = None
+        self.warnings: List[str] = []
+        self._handle = None
+
+    def _open(self) -> pa_csv.CSVStreamingReader:
+        if isinstance(self.path, zipfile.Path):
+            self._handle = self.path.open("rb")
+        reader = pa_csv.open_csv(
+            self._handle or str(self.path),
+            read_options=pa_csv.ReadOptions(block_size=self.block_size, encoding=self.encoding),
+            convert_options=pa_csv.ConvertOptions(
+                null_values=self.null_values,
+                strings_can_be_null=True,
+                column_types=self.column_types,
+            ),
+        )
+        if self.encoding == "utf8" and any(pa.types.is_binary(f.type) for f in reader.schema):
+            # Arrow infers text that isn't UTF-8 as binary
+            self._close(reader)
+            self._use_latin1()
+            return self._open()
+        temporal = [f.name for f in reader.schema if pa.types.is_temporal(f.type)]
+        if temporal:
+            # Read dates as text; TypeNormalizer decides what they become
+            self._close(reader)
+            self.column_types.update({name: pa.string() for name in temporal})
+            return self._open()
+        return reader
+
+    def _close(self, reader: pa_csv.CSVStreamingReader):
+        reader.close()
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+    def tables(self) -> Iterator[pa.Table]:
+        reader = self._open()
+        try:
+            self.schema = reader.schema
+            names = [self.rename(name) for name in reader.schema.names]
+            empty = True
+            for batch in reader:
+                empty = False
+                yield pa.Table.from_batches([batch]).rename_columns(names)
+            if empty:
+                yield reader.schema.empty_table().rename_columns(names)
+        finally:
+            self._close(reader)
+
+    def _use_latin1(self):
+        self.encoding = "latin1"
+        self.warnings.append(f"File {self.path.name} read with latin-1 encoding")
+
+    def recover(self, error: pa.ArrowInvalid) -> bool:
+        """Adjust the read options after a failed read; False if retrying won't help"""
+        message = str(error)
+        if self.encoding == "utf8" and "utf8" in message.lower():
+            self._use_latin1()
+            return True
+
+        match = re.search(r"CSV column #(\d+)", message)
+        if not match or self.schema is None:
+            return False
+        column = self.schema.field(int(match.group(1)))
+        current = self.column_types.get(column.name, column.type)
+        if pa.types.is_string(current):
+            return False
+        widened = pa.float64() if pa.types.is_integer(current) else pa.string()
+        self.column_types[column.name] = widened
+        logger.info(f"Re-reading {self.path.name} with column {column.name} as {widened}: {message}")
+        return True
+
+
+class StreamingParquetConverter:
+    """
+    Converts CSV, SAS7BDAT and XPT files to Parquet without loading them whole.
+
+    memory_limit_mb bounds what a conversion holds at once: the CSV block
+    size, the SAS/XPT chunk size and the row group buffer are all derived
+    from it. Output is written to a temporary file and moved into place
+    once complete, laid out by the ParquetWriteProfile: files larger than
+    one row group get a final external sort that spills to disk rather than
+    exceeding the limit.
+    """
+
+    def __init__(
+        self,
+        memory_limit_mb: int = settings.CONVERSION_MEMORY_LIMIT_MB,
+        row_group_size: int = settings.CONVERSION_ROW_GROUP_SIZE,
+        compression: str = "snappy",
+        profile: Optional[ParquetWriteProfile] = None
+    ):
+        self.memory_limit_mb = memory_limit_mb
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self.profile = profile or ParquetWriteProfile(row_group_size=row_group_size, compression=compression)
+
+    @property
+    def buffer_bytes(self) -> int:
+        """Row group buffer; a quarter of the budget leaves room for decoding and encoding"""
+        return max(self.memory_limit_mb * MB // 4, MB)
+
+    @property
+    def csv_block_size(self) -> int:
+        return min(max(self.memory_limit_mb * MB // 16, MB), 64 * MB)
+
+    def chunk_rows(self, num_columns: int) -> int:
+        """Rows per SAS/XPT chunk for a file this wide"""
+        rows = self.buffer_bytes // (max(num_columns, 1) * BYTES_PER_CELL)
+        return int(min(max(rows, 1000), self.row_group_size))
+
+    def convert_csv(
+        self,
+        source: Union[str, Path, zipfile.Path],
+        dest: Union[str, Path],
+        rename: Callable[[str], str] = str,
+        infer_dates: bool = False,
+        null_values: List[str] = CSV_NULL_VALUES
+    ) -> ConversionStats:
+        """Convert a CSV file; date text is converted to dates only if infer_dates is set"""
+        path = source if isinstance(source, zipfile.Path) else Path(source)
+        csv = _CsvSource(path, self.csv_block_size, rename, null_values)
+        normalizer = TypeNormalizer(parse_dates=infer_dates)
+        while True:
+            try:
+                stats = self.write_tables(dest, csv.tables(), normalizer=normalizer)
+                stats.warnings.extend(csv.warnings)
+                return stats
+            except pa.ArrowInvalid as e:
+                if not csv.recover(e):
+                    raise
+            except TypeConflict as e:
+                normalizer.pin(e.column)
+                logger.info(f"Re-reading {path.name} with column {e.column} as read: {e}")
+
+    def convert_sas(
+        self,
+        source: Union[str, Path],
+        dest: Union[str, Path],
+        file_format: str = "sas7bdat",
+        rename: Callable[[str], str] = str
+    ) -> Tuple[ConversionStats, Any]:
+        """Convert a SAS7BDAT or XPT file; returns the stats and the pyreadstat metadata (None without pyreadstat)"""
+        normalizer = TypeNormalizer(sas_dates=True)
+        meta = None
+        if pyreadstat is not None:
+            read = pyreadstat.read_sas7bdat if file_format == "sas7bdat" else pyreadstat.read_xport
+            empty, meta = read(str(source), metadataonly=True)
+
+        while True:
+            if pyreadstat is None:
+                tables = self._pandas_sas_tables(Path(source), file_format, rename)
+            else:
+                chunks = pyreadstat.read_file_in_chunks(read, str(source), chunksize=self.chunk_rows(meta.number_columns))
+                tables = self._frames_to_tables((df for df, _ in chunks), rename, empty.copy())
+            try:
+                return self.write_tables(dest, tables, normalizer=normalizer), meta
+            except TypeConflict as e:
+                normalizer.pin(e.column)
+                logger.info(f"Re-reading {Path(source).name} with column {e.column} as read: {e}")
+
+    def _pandas_sas_tables(self, source: Path, file_format: str, rename: Callable[[str], str]) -> Iterator[pa.Table]:
+        sas_format = "sas7bdat" if file_format == "sas7bdat" else "xport"
+        # pandas needs a chunk size before it knows the width; assume a wide file
+        with pd.read_sas(str(source), format=sas_format, chunksize=self.chunk_rows(200), encoding="utf-8") as reader:
+            yield from self._frames_to_tables(reader, rename, None)
+
+    @staticmethod
+    def _frames_to_tables(
+        frames: Iterator[pd.DataFrame],
+        rename: Callable[[str], str],
+        empty: Optional[pd.DataFrame]
+    ) -> Iterator[pa.Table]:
+        yielded = False
+        for df in frames:
+            df.columns = [rename(col) for col in df.columns]
+            yielded = True
+            yield pa.Table.from_pandas(df, preserve_index=False)
+        if not yielded and empty is not None:
+            empty.columns = [rename(col) for col in empty.columns]
+            yield pa.Table.from_pandas(empty, preserve_index=False)
+
+    def write_tables(
+        self,
+        dest: Union[str, Path],
+        tables: Iterator[pa.Table],
+        dataset: Optional[str] = None,
+        normalizer: Optional[TypeNormalizer] = None
+    ) -> ConversionStats:
+        """
+        Write a stream of Arrow tables to dest as one laid-out, profiled dataset
+
+        dataset picks the sort keys and defaults to the file name. dest is
+        replaced atomically; on failure nothing is left behind. The stats carry the dataset's profile, so the schema needn't be read back.
+        """
+        dest = Path(dest)
+        tmp_path = dest.with_name(f".{dest.name}.tmp")
+        sorted_path = dest.with_name(f".{dest.name}.sorted.tmp")
+        monitor = RSSMonitor()
+        stats = ConversionStats()
+        start_time = time.perf_counter()
+        writer = _RowGroupWriter(
+            tmp_path, self.row_group_size, self.buffer_bytes, self.profile, dataset or dest.stem,
+            normalizer or TypeNormalizer()
+        )
+
+        try:
+            for table in tables:
+                writer.write(table)
+                stats.rows += table.num_rows
+                stats.chunks += 1
+                monitor.sample()
+            writer.close()
+            if writer.needs_sort:
+                writer.row_groups = self.profile.sort_file(
+                    tmp_path, sorted_path, writer.sort_keys, writer.options, self.memory_limit_mb
+                )
+                monitor.sample()
+                os.replace(sorted_path, tmp_path)
+            os.replace(tmp_path, dest)
+        except BaseException:
+            writer.abort()
+            tmp_path.unlink(missing_ok=True)
+            sorted_path.unlink(missing_ok=True)
+            raise
+
+        monitor.sample()
+        stats.elapsed_seconds = time.perf_counter() - start_time
+        stats.peak_rss_mb = monitor.peak_mb
+        stats.schema = writer.schema
+        stats.columns = len(writer.schema) if writer.schema is not None else 0
+        stats.row_groups = writer.row_groups
+        stats.profile = writer.dataset_profile
+        stats.profile.iso_formats = writer.normalizer.iso_formats()
+        if stats.profile.schema is not None:
+            write_statistics(dest, stats.profile)
+        if monitor.growth_mb > self.memory_limit_mb:
+            logger.warning(
+                f"Converting to {dest.name} grew RSS by {monitor.growth_mb} MB, "
+                f"over the {self.memory_limit_mb} MB limit"
+            )
+        return stats
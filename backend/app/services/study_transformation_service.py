@@ -1,19 +1,13 @@
 # ABOUTME: Service for executing data transformation pipelines in a sandboxed environment
 # ABOUTME: Handles batch pipeline execution, progress tracking, and derived dataset management
 
-import os
-import sys
-import json
-import hashlib
+import re
 import traceback
 import asyncio
 import uuid
-import subprocess
-# resource module not available on all platforms, skip for now
 import tempfile
-import shutil
 from pathlib import Path
-from typing import List, Dict, Any, Optional, Callable, Awaitable, Tuple
+from typing import List, Dict, Any, Optional, Callable, Awaitable
 from datetime import datetime
 import logging
 from dataclasses import dataclass
@@ -21,24 +15,23 @@ from dataclasses import dataclass
 try:
     import pandas as pd
     import pyarrow as pa
-    import pyarrow.parquet as pq
 except ImportError:
     pd = None
     pa = None
-    pq = None
 
+from app.core.config import settings
+from app.clinical_modules.pipeline.script_executor import TransformationScriptExecutor
+from app.services.dataset_statistics import write_statistics
+from app.services.ingest_manifest import clone_dataset, link_dataset
+from app.services.parquet_writer import get_write_profile
+from app.services.pipeline_scheduler import PipelineDAG, PipelineRunState, declared_inputs
+from app.services.sandbox_pool import get_sandbox_pool
+from app.services.type_normalizer import DatasetProfile
 from app.clinical_modules.utils.folder_structure import (
     get_timestamp_folder,
     ensure_folder_exists
 )
-from app.models.pipeline import (
-    PipelineConfig,
-    PipelineExecution,
-    PipelineExecutionStep,
-    TransformationScript,
-    PipelineStatus,
-    TransformationType
-)
+from app.models.pipeline import PipelineConfig, TransformationType
 
 logger = logging.getLogger(__name__)
 
@@ -83,6 +76,9 @@ class StudyTransformationService:
         'statistics', 'collections', 'itertools', 'functools'
     ]
     
+    # Output datasets are written to {output_dir}/{name}.parquet and exposed as SQL views
+    OUTPUT_NAME_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+    
     # Restricted functions/modules
     RESTRICTED_PATTERNS = [
         'eval', 'exec', '__import__', 'compile', 'open',
@@ -93,6 +89,7 @@ class StudyTransformationService:
     def __init__(self):
         self.warnings = []
         self.logs = []
+        self.script_executor = TransformationScriptExecutor()
     
     async def execute_pipelines(
         self,
@@ -147,69 +144,14 @@ class StudyTransformationService:
                 percent = int((current_step / total_steps) * 100)
                 await progress_callback(percent, message)
         
-        # Execute each pipeline
-        for config in pipeline_configs:
-            pipeline_name = config.name
-            try:
-                # Step 1: Validate pipeline
-                await update_progress(f"Validating pipeline: {pipeline_name}")
-                validation_result = await self._validate_pipeline(config)
-                
-                if not validation_result["is_valid"]:
-                    results["errors"].append({
-                        "pipeline": pipeline_name,
-                        "error": "Validation failed",
-                        "details": validation_result["errors"]
-                    })
-                    continue
-                
-                # Step 2: Execute pipeline
-                await update_progress(f"Executing pipeline: {pipeline_name}")
-                execution_result = await self._execute_pipeline(
-                    config=config,
-                    source_path=Path(source_data_path),
-                    output_path=derived_path / pipeline_name.lower().replace(" ", "_")
-                )
-                
-                if execution_result.success:
-                    # Step 3: Extract schemas from generated datasets
-                    await update_progress(f"Extracting schemas for: {pipeline_name}")
-                    
-                    for dataset_info in execution_result.datasets_created:
-                        dataset_path = Path(dataset_info["path"])
-                        if dataset_path.exists() and dataset_path.suffix == ".parquet":
-                            schema = await self._extract_parquet_schema(dataset_path)
-                            dataset_name = dataset_path.stem.lower()
-                            results["datasets"][dataset_name] = schema
-                    
-                    # Store pipeline results
-                    results["pipelines"][pipeline_name] = {
-                        "status": "success",
-                        "output_path": execution_result.output_path,
-                        "datasets_created": execution_result.datasets_created,
-                        "total_records": execution_result.total_records,
-                        "execution_time": execution_result.execution_time,
-                        "logs": execution_result.logs
-                    }
-                else:
-                    results["pipelines"][pipeline_name] = {
-                        "status": "failed",
-                        "error": execution_result.error_message,
-                        "warnings": execution_result.warnings,
-                        "logs": execution_result.logs
-                    }
-                    results["errors"].append({
-                        "pipeline": pipeline_name,
-                        "error": execution_result.error_message
-                    })
-                    
-            except Exception as e:
-                logger.error(f"Error executing pipeline {pipeline_name}: {str(e)}")
-                results["errors"].append({
-                    "pipeline": pipeline_name,
-                    "error": str(e),
-                    "traceback": traceback.format_exc()
-                })
+        await self._run_pipeline_graph(
+            pipeline_configs=pipeline_configs,
+            source_path=Path(source_data_path),
+            derived_path=derived_path,
+            state=PipelineRunState.for_study(org_id, study_id),
+            results=results,
+            update_progress=update_progress
+        )
         
         # Final progress update
         if progress_callback:
@@ -218,7 +160,10 @@ class StudyTransformationService:
         # Add summary
         results["summary"] = {
             "total_pipelines": len(pipeline_configs),
-            "successful_pipelines": sum(1 for p in results["pipelines"].values() if p.get("status") == "success"),
+            "successful_pipelines": sum(
+                1 for p in results["pipelines"].values() if p.get("status") in ("success", "unchanged")
+            ),
+            "unchanged_pipelines": sum(1 for p in results["pipelines"].values() if p.get("status") == "unchanged"),
             "failed_pipelines": sum(1 for p in results["pipelines"].values() if p.get("status") == "failed"),
             "total_datasets_created": len(results["datasets"]),
             "has_errors": len(results["errors"]) > 0
@@ -230,6 +175,141 @@ class StudyTransformationService:
         
         return results
     
+    async def _run_pipeline_graph(
+        self,
+        pipeline_configs: List[PipelineConfig],
+        source_path: Path,
+        derived_path: Path,
+        state: PipelineRunState,
+        results: Dict[str, Any],
+        update_progress: Callable[[str], Awaitable[None]]
+    ) -> None:
+        """
+        Run pipelines in dependency order, filling in results.
+        
+        Pipelines whose declared inputs come from no other pipeline run side by
+        side, up to PIPELINE_MAX_CONCURRENCY at a time; a pipeline whose
+        configuration and inputs match its last successful run reuses that
+        run's datasets instead of executing again.
+        """
+        # Order pipelines by the datasets they declare; independent ones run side by side
+        dag = PipelineDAG(pipeline_configs)
+        semaphore = asyncio.Semaphore(max(1, settings.PIPELINE_MAX_CONCURRENCY))
+        source_datasets = {p.stem.lower(): p for p in source_path.glob("*.parquet")}
+        produced: Dict[str, Dict[str, Path]] = {}  # pipeline -> datasets it wrote this run
+        
+        for pipeline_name in dag.cyclic:
+            results["errors"].append({
+                "pipeline": pipeline_name,
+                "error": "Circular dependency between pipeline inputs and outputs"
+            })
+        
+        async def run(config: PipelineConfig, upstream: List[asyncio.Task]) -> bool:
+            pipeline_name = config.name
+            if not all(await asyncio.gather(*upstream)):
+                results["pipelines"][pipeline_name] = {"status": "skipped", "error": "An upstream pipeline failed"}
+                results["errors"].append({"pipeline": pipeline_name, "error": "An upstream pipeline failed"})
+                return False
+            
+            async with semaphore:
+                try:
+                    # Step 1: Validate pipeline
+                    await update_progress(f"Validating pipeline: {pipeline_name}")
+                    validation_result = await self._validate_pipeline(config)
+                    
+                    if not validation_result["is_valid"]:
+                        results["errors"].append({
+                            "pipeline": pipeline_name,
+                            "error": "Validation failed",
+                            "details": validation_result["errors"]
+                        })
+                        return False
+                    
+                    # Datasets written upstream in this run shadow source datasets of the same name
+                    upstream_datasets = {
+                        name: path for u in dag.upstream[pipeline_name] for name, path in produced[u].items()
+                    }
+                    inputs = {**source_datasets, **upstream_datasets}
+                    declared = declared_inputs(config)
+                    if declared is not None:
+                        inputs = {name: inputs.get(name, source_path / f"{name}.parquet") for name in declared}
+                    fingerprint = PipelineRunState.fingerprint(config, inputs)
+                    output_path = derived_path / pipeline_name.lower().replace(" ", "_")
+                    
+                    # Step 2: Execute pipeline, unless its inputs are unchanged since its last success
+                    previous = state.lookup(pipeline_name, fingerprint)
+                    if previous:
+                        await update_progress(f"Reusing unchanged pipeline: {pipeline_name}")
+                        execution_result = self._reuse_pipeline_outputs(previous, output_path)
+                    else:
+                        await update_progress(f"Executing pipeline: {pipeline_name}")
+                        execution_result = await self._execute_pipeline(
+                            config=config,
+                            source_path=source_path,
+                            output_path=output_path,
+                            upstream_datasets=upstream_datasets,
+                            inputs=inputs
+                        )
+                    
+                    if execution_result.success:
+                        # Step 3: Collect the schemas profiled as the datasets were written
+                        produced[pipeline_name] = {}
+                        for dataset_info in execution_result.datasets_created:
+                            dataset_path = Path(dataset_info["path"])
+                            if dataset_path.exists() and dataset_path.suffix == ".parquet":
+                                dataset_name = dataset_path.stem.lower()
+                                produced[pipeline_name][dataset_name] = dataset_path
+                                if "schema" in dataset_info:
+                                    results["datasets"][dataset_name] = {
+                                        **dataset_info["schema"], "path": str(dataset_path)
+                                    }
+                        if not previous:
+                            state.record(
+                                pipeline_name, fingerprint,
+                                execution_result.datasets_created, execution_result.total_records
+                            )
+                        
+                        # Store pipeline results
+                        results["pipelines"][pipeline_name] = {
+                            "status": "unchanged" if previous else "success",
+                            "output_path": execution_result.output_path,
+                            "datasets_created": execution_result.datasets_created,
+                            "total_records": execution_result.total_records,
+                            "execution_time": execution_result.execution_time,
+                            "logs": execution_result.logs
+                        }
+                        return True
+                    
+                    results["pipelines"][pipeline_name] = {
+                        "status": "failed",
+                        "error": execution_result.error_message,
+                        "warnings": execution_result.warnings,
+                        "logs": execution_result.logs
+                    }
+                    results["errors"].append({
+                        "pipeline": pipeline_name,
+                        "error": execution_result.error_message
+                    })
+                    return False
+                    
+                except Exception as e:
+                    logger.error(f"Error executing pipeline {pipeline_name}: {str(e)}")
+                    results["errors"].append({
+                        "pipeline": pipeline_name,
+                        "error": str(e),
+                        "traceback": traceback.format_exc()
+                    })
+                    return False
+        
+        # Tasks are created in dependency order, so each can wait on its upstream tasks
+        tasks: Dict[str, asyncio.Task] = {}
+        for pipeline_name in dag.order:
+            tasks[pipeline_name] = asyncio.create_task(run(
+                dag.configs[pipeline_name], [tasks[u] for u in dag.upstream[pipeline_name]]
+            ))
+        await asyncio.gather(*tasks.values())
+        state.save()
+    
     async def _validate_pipeline(self, config: PipelineConfig) -> Dict[str, Any]:
         """Validate pipeline configuration and scripts"""
         errors = []
@@ -249,10 +329,21 @@ class StudyTransformationService:
                 if validation["warnings"]:
                     warnings.extend([f"Step {idx + 1}: {w}" for w in validation["warnings"]])
             
+            elif step_type == TransformationType.SQL_QUERY:
+                _, sql_errors = self.script_executor.sql_validator.validate(step.get("script", ""))
+                errors.extend([f"Step {idx + 1}: {e}" for e in sql_errors])
+                output_name = step.get("config", {}).get("output_name")
+                if not output_name:
+                    errors.append(f"Step {idx + 1}: Missing output_name")
+                elif not self._is_valid_output_name(output_name):
+                    errors.append(f"Step {idx + 1}: Invalid output_name '{output_name}'")
+            
             elif step_type in [TransformationType.FILTER, TransformationType.AGGREGATION]:
                 # Validate configuration
                 if not step.get("config"):
                     errors.append(f"Step {idx + 1}: Missing configuration")
+                elif "output_name" in step["config"] and not self._is_valid_output_name(step["config"]["output_name"]):
+                    errors.append(f"Step {idx + 1}: Invalid output_name '{step['config']['output_name']}'")
         
         return {
             "is_valid": len(errors) == 0,
@@ -260,6 +351,11 @@ class StudyTransformationService:
             "warnings": warnings
         }
     
+    @classmethod
+    def _is_valid_output_name(cls, name: Any) -> bool:
+        """Whether a step's output_name is a plain identifier, so it can't point outside the run"""
+        return isinstance(name, str) and bool(cls.OUTPUT_NAME_PATTERN.match(name))
+    
     def _validate_python_script(self, script: str) -> Dict[str, Any]:
         """Validate Python script for security and syntax"""
         errors = []
@@ -294,24 +390,34 @@ class StudyTransformationService:
         self,
         config: PipelineConfig,
         source_path: Path,
-        output_path: Path
+        output_path: Path,
+        upstream_datasets: Optional[Dict[str, Path]] = None,
+        inputs: Optional[Dict[str, Path]] = None
     ) -> TransformationResult:
-        """Execute a single pipeline with sandboxing"""
+        """
+        Execute a single pipeline with sandboxing
+        
+        inputs maps the dataset names the pipeline may read to their files;
+        by default every source dataset, with upstream_datasets replacing
+        source datasets of the same name.
+        """
         start_time = datetime.utcnow()
         datasets_created = []
         total_records = 0
+        if inputs is None:
+            inputs = {p.stem.lower(): p for p in source_path.glob("*.parquet")}
+            inputs.update(upstream_datasets or {})
         
         try:
             # Create output directory
             ensure_folder_exists(output_path)
             
-            # Create temporary execution directory
-            with tempfile.TemporaryDirectory() as temp_dir:
+            # Create temporary execution directory beside the output, so source files can be cloned into it
+            with tempfile.TemporaryDirectory(prefix=".sandbox_", dir=output_path.parent) as temp_dir:
                 temp_path = Path(temp_dir)
                 
-                # Copy source data to temp directory (read-only)
+                # Built for the first Python step only: SQL and filter steps open the inputs read-only in place
                 temp_source = temp_path / "source_data"
-                shutil.copytree(source_path, temp_source)
                 
                 # Create output directory in temp
                 temp_output = temp_path / "output"
@@ -324,6 +430,9 @@ class StudyTransformationService:
                     step_type = step.get("type")
                     
                     if step_type == TransformationType.PYTHON_SCRIPT:
+                        if not temp_source.exists():
+                            self._link_source_view(inputs, temp_source)
+                        
                         # Execute Python script in sandbox
                         result = await self._execute_python_script(
                             script=step.get("script", ""),
@@ -343,7 +452,7 @@ class StudyTransformationService:
                     elif step_type == TransformationType.FILTER:
                         # Apply filter transformation
                         result = await self._apply_filter(
-                            source_dir=temp_source,
+                            datasets=inputs,
                             output_dir=temp_output,
                             filter_config=step.get("config", {})
                         )
@@ -353,12 +462,28 @@ class StudyTransformationService:
                         
                         datasets_created.extend(result.get("datasets_created", []))
                         total_records += result.get("total_records", 0)
+                    
+                    elif step_type == TransformationType.SQL_QUERY:
+                        # Run SQL in DuckDB straight over the parquet files
+                        result = await self._execute_sql_step(
+                            script=step.get("script", ""),
+                            datasets=inputs,
+                            output_dir=temp_output,
+                            config=step.get("config", {}),
+                            resource_limits=config.output_config.get("resource_limits", {})
+                        )
+                        
+                        if not result["success"]:
+                            raise Exception(f"Step {idx + 1} failed: {result['error']}")
+                        
+                        datasets_created.extend(result["datasets_created"])
+                        total_records += result["total_records"]
                 
-                # Copy results to final output directory
+                # Link results into the final output directory
                 for item in temp_output.iterdir():
                     if item.is_file() and item.suffix == ".parquet":
                         final_path = output_path / item.name
-                        shutil.copy2(item, final_path)
+                        link_dataset(item, final_path)
                         
                         # Update dataset paths
                         for dataset in datasets_created:
@@ -392,6 +517,42 @@ class StudyTransformationService:
                 logs=self.logs
             )
     
+    @staticmethod
+    def _link_source_view(datasets: Dict[str, Path], view_dir: Path) -> int:
+        """
+        Give a Python step its own read-only directory of the pipeline's inputs.
+
+        Scripts can reach the view's paths, so its files are private clones
+        (copy-on-write where the filesystem supports it, plain copies
+        elsewhere) rather than hard links: nothing a run writes there can reach
+        the study's data. Declared inputs that don't exist are left out.
+        """
+        view_dir.mkdir()
+        linked = 0
+        for dataset in datasets.values():
+            if dataset.exists():
+                clone_dataset(dataset, view_dir / dataset.name)
+                linked += 1
+        return linked
+    
+    @staticmethod
+    def _reuse_pipeline_outputs(previous: Dict[str, Any], output_path: Path) -> TransformationResult:
+        """Link the datasets of a pipeline's last successful run into this run's output"""
+        ensure_folder_exists(output_path)
+        datasets_created = []
+        for dataset in previous["datasets_created"]:
+            final_path = output_path / Path(dataset["path"]).name
+            link_dataset(Path(dataset["path"]), final_path)
+            datasets_created.append({**dataset, "path": str(final_path)})
+        return TransformationResult(
+            success=True,
+            output_path=str(output_path),
+            datasets_created=datasets_created,
+            total_records=previous.get("total_records", 0),
+            execution_time=0.0,
+            logs=[f"Inputs unchanged since {previous.get('recorded_at')}; reused its datasets"]
+        )
+    
     async def _execute_python_script(
         self,
         script: str,
@@ -400,125 +561,110 @@ class StudyTransformationService:
         config: Dict[str, Any],
         resource_limits: Dict[str, Any]
     ) -> Dict[str, Any]:
-        """Execute Python script in sandboxed environment"""
-        
-        # Create execution script
-        exec_script = f"""
-import sys
-import os
-import json
-import pandas as pd
-import numpy as np
-from datetime import datetime
-import re
-import math
-import statistics
-from collections import defaultdict, Counter
-import itertools
-import functools
-
-# Setup paths
-SOURCE_DIR = r"{source_dir}"
-OUTPUT_DIR = r"{output_dir}"
-CONFIG = {json.dumps(config)}
-
-# Load source data
-source_files = {{}}
-for file in os.listdir(SOURCE_DIR):
-    if file.endswith('.parquet'):
-        name = file.replace('.parquet', '')
-        source_files[name] = pd.read_parquet(os.path.join(SOURCE_DIR, file))
-
-# User script
-{script}
-
-# Save output datasets
-output_info = []
-for name, df in globals().items():
-    if isinstance(df, pd.DataFrame) and name not in source_files:
-        output_path = os.path.join(OUTPUT_DIR, f"{{name}}.parquet")
-        df.to_parquet(output_path, engine='pyarrow', compression='snappy')
-        output_info.append({{
-            "name": name,
-            "path": output_path,
-            "rows": len(df),
-            "columns": len(df.columns)
-        }})
-
-# Write execution results
-with open(os.path.join(OUTPUT_DIR, '_execution_result.json'), 'w') as f:
-    json.dump({{
-        "success": True,
-        "datasets_created": output_info,
-        "total_records": sum(info["rows"] for info in output_info)
-    }}, f)
-"""
-        
-        # Write script to temporary file
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as f:
-            f.write(exec_script)
-            script_path = f.name
+        """Execute Python script on a warm sandbox worker"""
+        limits = {
+            "max_memory_mb": resource_limits.get("max_memory_mb", self.DEFAULT_MEMORY_LIMIT_MB),
+            "max_cpu_seconds": resource_limits.get("max_cpu_seconds", self.DEFAULT_CPU_TIME_SECONDS),
+            "max_wall_seconds": resource_limits.get("max_wall_seconds", self.DEFAULT_WALL_TIME_SECONDS),
+        }
         
         try:
-            # Set resource limits
-            memory_limit = resource_limits.get("max_memory_mb", self.DEFAULT_MEMORY_LIMIT_MB)
-            cpu_time = resource_limits.get("max_cpu_seconds", self.DEFAULT_CPU_TIME_SECONDS)
-            wall_time = resource_limits.get("max_wall_seconds", self.DEFAULT_WALL_TIME_SECONDS)
-            
-            # Execute script with timeout and resource limits
             loop = asyncio.get_event_loop()
-            
-            # Use subprocess with resource limits
-            process = await loop.run_in_executor(
+            result = await loop.run_in_executor(
                 None,
-                lambda: subprocess.run(
-                    [sys.executable, script_path],
-                    capture_output=True,
-                    text=True,
-                    timeout=wall_time,
-                    env={
-                        **os.environ,
-                        "PYTHONPATH": "",  # Clear PYTHONPATH
-                        "OMP_NUM_THREADS": "1",  # Limit threads
-                    }
-                )
+                lambda: get_sandbox_pool().run(script, source_dir, output_dir, config, limits)
             )
             
-            if process.returncode != 0:
+            if not result["success"]:
                 return {
                     "success": False,
-                    "error": process.stderr or "Script execution failed"
+                    "error": result.get("traceback") or result.get("error") or "Script execution failed"
                 }
             
-            # Read execution results
-            result_path = output_dir / "_execution_result.json"
-            if result_path.exists():
-                with open(result_path, 'r') as f:
-                    return json.load(f)
-            else:
-                return {
-                    "success": False,
-                    "error": "No execution result found"
-                }
+            # Outputs come back as Arrow IPC files; they're read through a memory map,
+            # then laid out and profiled here, since the sandbox can't import the app
+            for info in result.get("datasets_created", []):
+                ipc_path = Path(info["path"])
+                info["path"] = str(ipc_path.with_suffix(".parquet"))
+                info["schema"] = await loop.run_in_executor(
+                    None,
+                    lambda: self._write_ipc_dataset(ipc_path, Path(info["path"]), info["name"])
+                )
+            return result
                 
-        except subprocess.TimeoutExpired:
+        except Exception as e:
+            return {
+                "success": False,
+                "error": f"Script execution error: {str(e)}"
+            }
+    
+    def _write_ipc_dataset(self, ipc_path: Path, output_path: Path, name: str) -> Dict[str, Any]:
+        """Write an Arrow IPC file from the sandbox as a dataset, then remove it"""
+        with pa.memory_map(str(ipc_path)) as source:
+            schema = self._write_dataset(pa.ipc.open_file(source).read_all(), output_path, name)
+        ipc_path.unlink()
+        return schema
+    
+    async def _execute_sql_step(
+        self,
+        script: str,
+        datasets: Dict[str, Path],
+        output_dir: Path,
+        config: Dict[str, Any],
+        resource_limits: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        Execute a SQL step with DuckDB over the pipeline's inputs and earlier steps' outputs.
+        
+        Each dataset is a view over its file, which DuckDB only reads; the script's last statement
+        is the query written to config["output_name"]. The step's memory,
+        threads and wall time come from its config, falling back to the pipeline's.
+        """
+        output_name = config.get("output_name")
+        if not self._is_valid_output_name(output_name):
             return {
                 "success": False,
-                "error": f"Script execution timeout ({wall_time}s exceeded)"
+                "error": f"Invalid output_name '{output_name}'"
             }
+        datasets = {name: path for name, path in datasets.items() if path.exists()}
+        datasets.update({path.stem: path for path in output_dir.glob("*.parquet")})
+        limits = {**resource_limits, **config.get("resource_limits", {})}
+        output_path = output_dir / f"{output_name}.parquet"
+        
+        try:
+            loop = asyncio.get_event_loop()
+            stats, _ = await loop.run_in_executor(
+                None,
+                lambda: self.script_executor.execute_sql_to_parquet(
+                    script, datasets, output_path, dataset_name=output_name,
+                    resource_limits={
+                        "max_memory_mb": limits.get("max_memory_mb", self.DEFAULT_MEMORY_LIMIT_MB),
+                        "max_threads": limits.get("max_threads", settings.DUCKDB_THREADS),
+                        "max_execution_time_seconds": limits.get("max_wall_seconds", self.DEFAULT_WALL_TIME_SECONDS)
+                    }
+                )
+            )
         except Exception as e:
             return {
                 "success": False,
-                "error": f"Script execution error: {str(e)}"
+                "error": f"SQL transformation failed: {str(e)}"
             }
-        finally:
-            # Clean up script file
-            if os.path.exists(script_path):
-                os.unlink(script_path)
+        
+        return {
+            "success": True,
+            "datasets_created": [{
+                "name": output_name,
+                "path": str(output_path),
+                "rows": stats.rows,
+                "columns": stats.columns,
+                "schema": self._schema_from_profile(stats.profile, output_path)
+            }],
+            "total_records": stats.rows
+        }
     
     async def _apply_filter(
         self,
-        source_dir: Path,
+        datasets: Dict[str, Path],
         output_dir: Path,
         filter_config: Dict[str, Any]
     ) -> Dict[str, Any]:
@@ -531,10 +677,15 @@ with open(os.path.join(OUTPUT_DIR, '_execution_result.json'), 'w') as f:
             dataset_name = filter_config.get("dataset")
             conditions = filter_config.get("conditions", [])
             output_name = filter_config.get("output_name", f"{dataset_name}_filtered")
+            if not self._is_valid_output_name(output_name):
+                return {
+                    "success": False,
+                    "error": f"Invalid output_name '{output_name}'"
+                }
             
             # Load source dataset
-            source_file = source_dir / f"{dataset_name}.parquet"
-            if not source_file.exists():
+            source_file = datasets.get(str(dataset_name).lower())
+            if source_file is None or not source_file.exists():
                 return {
                     "success": False,
                     "error": f"Source dataset '{dataset_name}' not found"
@@ -544,7 +695,7 @@ with open(os.path.join(OUTPUT_DIR, '_execution_result.json'), 'w') as f:
             loop = asyncio.get_event_loop()
             df = await loop.run_in_executor(
                 None,
-                lambda: pd.read_parquet(source_file)
+                lambda: pd.read_parquet(source_file, memory_map=True)
             )
             
             # Apply filters
@@ -572,16 +723,17 @@ with open(os.path.join(OUTPUT_DIR, '_execution_result.json'), 'w') as f:
             
             # Save filtered dataset
             output_path = output_dir / f"{output_name}.parquet"
-            await loop.run_in_executor(
+            schema = await loop.run_in_executor(
                 None,
-                lambda: df.to_parquet(output_path, engine='pyarrow', compression='snappy')
+                lambda: self._write_dataset(pa.Table.from_pandas(df), output_path, output_name)
             )
             
             datasets_created.append({
                 "name": output_name,
                 "path": str(output_path),
                 "rows": len(df),
-                "columns": len(df.columns)
+                "columns": len(df.columns),
+                "schema": schema
             })
             total_records = len(df)
             
@@ -597,92 +749,35 @@ with open(os.path.join(OUTPUT_DIR, '_execution_result.json'), 'w') as f:
                 "error": f"Filter transformation failed: {str(e)}"
             }
     
-    async def _extract_parquet_schema(self, parquet_path: Path) -> Dict[str, Any]:
-        """Extract detailed schema information from parquet file"""
-        if pq is None or pd is None:
-            logger.error("pyarrow/pandas not available for schema extraction")
-            return {}
+    def _write_dataset(self, table: pa.Table, output_path: Path, name: str) -> Dict[str, Any]:
+        """Write a derived dataset and return its schema, profiled from the table being written"""
+        get_write_profile().write_table(table, output_path, name)
+        profile = DatasetProfile.of(table)
+        write_statistics(output_path, profile)
+        return self._schema_from_profile(profile, output_path)
+    
+    @staticmethod
+    def _schema_from_profile(profile: DatasetProfile, output_path: Path) -> Dict[str, Any]:
+        """Schema of a written dataset, from the profile taken while writing it"""
+        schema_info = {
+            "name": output_path.stem,
+            "path": str(output_path),
+            "row_count": profile.rows,
+            "column_count": len(profile.columns),
+            "file_size_mb": round(output_path.stat().st_size / (1024 * 1024), 2),
+            "columns": {},
+            "sample_data": profile.sample
+        }
         
-        try:
-            loop = asyncio.get_event_loop()
-            
-            # Read parquet metadata and sample data
-            def read_schema():
-                parquet_file = pq.ParquetFile(parquet_path)
-                metadata = parquet_file.metadata
-                schema = parquet_file.schema
-                
-                # Read sample data
-                table = parquet_file.read(columns=None, use_threads=True)
-                df = table.to_pandas()
-                
-                return metadata, schema, df
-            
-            metadata, schema, df = await loop.run_in_executor(None, read_schema)
-            
-            # Build schema information
-            schema_info = {
-                "name": parquet_path.stem,
-                "path": str(parquet_path),
-                "row_count": metadata.num_rows,
-                "column_count": len(schema),
-                "file_size_mb": round(parquet_path.stat().st_size / (1024 * 1024), 2),
-                "columns": {},
-                "sample_data": []
-            }
-            
-            # Extract column details
-            for field in schema:
-                col_name = field.name
-                pandas_dtype = str(df[col_name].dtype)
-                
-                # Determine data type
-                if 'int' in pandas_dtype or 'float' in pandas_dtype:
-                    data_type = 'numeric'
-                elif 'bool' in pandas_dtype:
-                    data_type = 'boolean'
-                elif 'datetime' in pandas_dtype:
-                    data_type = 'datetime'
-                else:
-                    data_type = 'string'
-                
-                col_info = {
-                    "type": data_type,
-                    "nullable": field.nullable,
-                    "null_count": int(df[col_name].isnull().sum()),
-                    "unique_count": int(df[col_name].nunique()),
-                    "pandas_dtype": pandas_dtype
-                }
-                
-                # Add statistics for numeric columns
-                if data_type == 'numeric' and not df[col_name].isnull().all():
-                    col_info["stats"] = {
-                        "min": float(df[col_name].min()) if not pd.isna(df[col_name].min()) else None,
-                        "max": float(df[col_name].max()) if not pd.isna(df[col_name].max()) else None,
-                        "mean": float(df[col_name].mean()) if not pd.isna(df[col_name].mean()) else None,
-                        "std": float(df[col_name].std()) if not pd.isna(df[col_name].std()) else None
-                    }
-                
-                # Sample values for categorical columns
-                if col_info["unique_count"] <= 20:
-                    unique_values = df[col_name].dropna().unique().tolist()
-                    col_info["unique_values"] = [str(v) for v in unique_values[:20]]
-                
-                schema_info["columns"][col_name] = col_info
-            
-            # Add sample rows
-            sample_df = df.head(5).fillna('')
-            schema_info["sample_data"] = sample_df.to_dict('records')
-            
-            return schema_info
-            
-        except Exception as e:
-            logger.error(f"Error extracting parquet schema: {str(e)}")
-            return {
-                "name": parquet_path.stem,
-                "path": str(parquet_path),
-                "error": str(e)
+        for col_name, details in profile.column_details().items():
+            field = profile.schema.field(col_name)
+            schema_info["columns"][col_name] = {
+                **details,
+                "type": 'numeric' if details["type"] == 'integer' else details["type"],
+                "pandas_dtype": str(pa.schema([field]).empty_table().to_pandas().dtypes.iloc[0])
             }
+        
+        return schema_info
     
     def get_derived_data_path(
         self,
@@ -0,0 +1,398 @@
+# ABOUTME: Arrow-native date/type normalization and schema profiling for datasets being ingested
+# ABOUTME: Converts SAS date epochs and date text column-at-a-time and builds the schema from the chunks as they are written
+
+import math
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# SAS counts dates in days and datetimes in seconds from 1960-01-01
+SAS_EPOCH_OFFSET_DAYS = 3653
+SAS_EPOCH_OFFSET_MS = SAS_EPOCH_OFFSET_DAYS * 86400 * 1000
+
+# 1900-01-01 to 2100-12-31 in SAS days; numbers outside this aren't dates
+SAS_DATE_RANGE = (-21914, 51498)
+
+ISO_DATE = r"^\d{4}-\d{2}-\d{2}$"
+ISO_DATETIME = r"^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}(:\d{2}(\.\d+)?)?$"
+# Right-truncated or with unknown components, e.g. 2024-03, 2024---15, 2024-03-15T10
+ISO_PARTIAL = r"^\d{4}(-(\d{2}|-)(-(\d{2}|-))?)?(T\d{2}(:\d{2}(:\d{2}(\.\d+)?)?)?)?$"
+
+# Other date layouts tried, in order, for text columns that aren't ISO 8601
+DATE_FORMATS = ['%d/%m/%Y', '%m/%d/%Y', '%Y%m%d']
+
+# Distinct values counted exactly per column; beyond this counts are approximate
+DISTINCT_LIMIT = 10000
+
+# Most frequent values reported per column, and counters kept for them once counts are approximate
+TOP_K = 10
+TOP_K_CAPACITY = 1000
+
+# k of the k-minimum-values sketch that estimates distinct counts past DISTINCT_LIMIT
+SKETCH_SIZE = 1024
+
+UNIQUE_VALUES_LIMIT = 20
+SAMPLE_ROWS = 5
+
+
+class TypeConflict(Exception):
+    """A chunk has values that the type planned for its column can't hold"""
+
+    def __init__(self, column: str, reason: str):
+        super().__init__(f"Column {column}: {reason}")
+        self.column = column
+
+
+def simple_type(data_type: pa.DataType) -> str:
+    """The integer/numeric/datetime/boolean/string type names used in column info"""
+    if pa.types.is_integer(data_type):
+        return 'integer'
+    if pa.types.is_floating(data_type) or pa.types.is_decimal(data_type):
+        return 'numeric'
+    if pa.types.is_temporal(data_type):
+        return 'datetime'
+    if pa.types.is_boolean(data_type):
+        return 'boolean'
+    return 'string'
+
+
+def iso_precision(column: pa.ChunkedArray) -> Optional[str]:
+    """date, datetime, mixed (both) or partial if every value is ISO 8601; text if not; None if all null"""
+    if column.null_count == len(column):
+        return None
+    if pc.all(pc.match_substring_regex(column, ISO_DATE)).as_py():
+        return "date"
+    if pc.all(pc.match_substring_regex(column, ISO_DATETIME)).as_py():
+        return "datetime"
+    complete = pc.or_(pc.match_substring_regex(column, ISO_DATE), pc.match_substring_regex(column, ISO_DATETIME))
+    if pc.all(complete).as_py():
+        return "mixed"
+    if pc.all(pc.match_substring_regex(column, ISO_PARTIAL)).as_py():
+        return "partial"
+    return "text"
+
+
+def _merge_precision(current: Optional[str], chunk: Optional[str]) -> Optional[str]:
+    if current is None or current == chunk:
+        return chunk or current
+    if chunk is None:
+        return current
+    if "text" in (current, chunk):
+        return "text"
+    if "partial" in (current, chunk):
+        return "partial"
+    return "mixed"
+
+
+class TypeNormalizer:
+    """
+    Decides column types once per file and converts each chunk to them.
+
+    The plan is made from the first row group. With sas_dates, numeric
+    columns named like ADaM dates (*DT, *DTM, *TM) whose values are valid SAS
+    epochs become date32/timestamp/time32. With parse_dates, text columns
+    where every value is an ISO 8601 date or datetime, or a date in one of
+    DATE_FORMATS, are converted. SDTM --DTC columns stay text, since partial
+    dates can't be typed without imputing them, but their ISO 8601 precision
+    is recorded in formats. A later chunk the plan doesn't fit raises
+    TypeConflict; pin() the column and convert again to keep it as read.
+    """
+
+    def __init__(self, parse_dates: bool = False, sas_dates: bool = False):
+        self.parse_dates = parse_dates
+        self.sas_dates = sas_dates
+        self.plans: Dict[str, Tuple[str, Optional[str]]] = {}
+        self.formats: Dict[str, Optional[str]] = {}
+        self.pinned: Set[str] = set()
+
+    def pin(self, column: str):
+        """Keep a column's type as read on the next conversion"""
+        self.pinned.add(column)
+
+    def plan(self, table: pa.Table):
+        self.plans = {}
+        self.formats = {}
+        for field, column in zip(table.schema, table.columns):
+            if field.name in self.pinned or column.null_count == len(column):
+                continue
+            plan = None
+            if self.sas_dates and (pa.types.is_integer(field.type) or pa.types.is_floating(field.type)):
+                plan = self._plan_sas(field.name, column)
+            elif pa.types.is_string(field.type) or pa.types.is_large_string(field.type):
+                if field.name.upper().endswith("DTC"):
+                    self.formats[field.name] = None
+                elif self.parse_dates:
+                    plan = self._plan_text(column)
+            if plan is not None:
+                self.plans[field.name] = plan
+
+    def apply(self, table: pa.Table) -> pa.Table:
+        """Convert one chunk to the planned types; raises TypeConflict if it doesn't fit"""
+        for name in self.formats:
+            self.formats[name] = _merge_precision(self.formats[name], iso_precision(table.column(name)))
+        for name, (kind, fmt) in self.plans.items():
+            index = table.schema.get_field_index(name)
+            column = table.column(index)
+            converted = self._convert(column, kind, fmt)
+            if converted.null_count != column.null_count:
+                raise TypeConflict(name, f"values that aren't {kind.replace('_', ' ')}s")
+            table = table.set_column(index, pa.field(name, converted.type), converted)
+        return table
+
+    def iso_formats(self) -> Dict[str, str]:
+        """ISO 8601 precision of the text date columns that held only ISO 8601 values"""
+        return {name: p for name, p in self.formats.items() if p not in (None, "text")}
+
+    def _plan_sas(self, name: str, column: pa.ChunkedArray) -> Optional[Tuple[str, None]]:
+        upper = name.upper()
+        if upper.endswith("DTM"):
+            low, high = SAS_DATE_RANGE
+            kind, valid = "sas_datetime", self._within(column, low * 86400, high * 86400)
+        elif upper.endswith("DT"):
+            kind, valid = "sas_date", self._within(column, *SAS_DATE_RANGE) and self._integral(column)
+        elif upper.endswith("TM"):
+            kind, valid = "sas_time", self._within(column, 0, 86399.999)
+        else:
+            return None
+        return (kind, None) if valid else None
+
+    def _plan_text(self, column: pa.ChunkedArray) -> Optional[Tuple[str, Optional[str]]]:
+        precision = iso_precision(column)
+        if precision == "date":
+            return ("iso_date", None)
+        if precision in ("datetime", "mixed"):
+            return ("iso_datetime", None)
+        if precision == "partial":
+            return None
+        for fmt in DATE_FORMATS:
+            parsed = pc.strptime(column, format=fmt, unit='s', error_is_null=True)
+            if parsed.null_count == column.null_count:
+                return ("date_format", fmt)
+        return None
+
+    @staticmethod
+    def _within(column: pa.ChunkedArray, low: float, high: float) -> bool:
+        bounds = pc.min_max(column).as_py()
+        return bounds["min"] is None or (bounds["min"] >= low and bounds["max"] <= high)
+
+    @staticmethod
+    def _integral(column: pa.ChunkedArray) -> bool:
+        if pa.types.is_integer(column.type):
+            return True
+        return pc.all(pc.equal(pc.floor(column), column)).as_py()
+
+    def _convert(self, column: pa.ChunkedArray, kind: str, fmt: Optional[str]) -> pa.ChunkedArray:
+        if kind == "sas_date":
+            valid = self._within(column, *SAS_DATE_RANGE) and self._integral(column)
+            days = pc.subtract(column.cast(pa.int32(), safe=False), SAS_EPOCH_OFFSET_DAYS).cast(pa.int32())
+            return self._or_nulls(days.cast(pa.date32()), valid)
+        if kind == "sas_datetime":
+            low, high = SAS_DATE_RANGE
+            valid = self._within(column, low * 86400, high * 86400)
+            ms = pc.subtract(pc.round(pc.multiply(column.cast(pa.float64()), 1000)).cast(pa.int64()), SAS_EPOCH_OFFSET_MS)
+            return self._or_nulls(ms.cast(pa.timestamp('ms')), valid)
+        if kind == "sas_time":
+            valid = self._within(column, 0, 86399.999)
+            ms = pc.round(pc.multiply(column.cast(pa.float64()), 1000)).cast(pa.int32(), safe=False)
+            return self._or_nulls(ms.cast(pa.time32('ms')), valid)
+        if kind == "iso_date":
+            return self._cast_or_nulls(column, pa.date32())
+        if kind == "iso_datetime":
+            return self._cast_or_nulls(column, pa.timestamp('ms'))
+        return pc.strptime(column, format=fmt, unit='s', error_is_null=True).cast(pa.date32())
+
+    @staticmethod
+    def _or_nulls(converted: pa.ChunkedArray, valid: bool) -> pa.ChunkedArray:
+        # An all-null result makes apply() report the conflict
+        return converted if valid else pa.nulls(len(converted), converted.type)
+
+    @staticmethod
+    def _cast_or_nulls(column: pa.ChunkedArray, target: pa.DataType) -> pa.ChunkedArray:
+        try:
+            return column.cast(target)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            return pa.chunked_array([pa.nulls(len(column), target)])
+
+
+class ColumnProfile:
+    """
+    Nulls, value counts and numeric moments of one column, merged chunk by chunk.
+
+    Values are counted exactly up to DISTINCT_LIMIT distinct values. Past that
+    the distinct count comes from a k-minimum-values sketch and only the
+    TOP_K_CAPACITY most frequent values keep counters, so top values are
+    heavy hitters with lower-bound counts.
+    """
+
+    def __init__(self, field: pa.Field):
+        self.field = field
+        self.null_count = 0
+        self.counts: Dict[Any, int] = {}
+        self.distinct_exceeded = False
+        self.sketch = np.empty(0, dtype=np.uint64)
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min: Any = None
+        self.max: Any = None
+
+    @property
+    def numeric(self) -> bool:
+        return simple_type(self.field.type) in ('integer', 'numeric')
+
+    @property
+    def countable(self) -> bool:
+        return not pa.types.is_nested(self.field.type)
+
+    @property
+    def distinct(self) -> Dict[Any, int]:
+        """Distinct values in first-seen order, while they are counted exactly"""
+        return {} if self.distinct_exceeded else self.counts
+
+    @property
+    def distinct_count(self) -> int:
+        if not self.distinct_exceeded:
+            return len(self.counts)
+        if len(self.sketch) < SKETCH_SIZE:
+            return len(self.sketch)
+        return round((SKETCH_SIZE - 1) * 2.0 ** 64 / float(self.sketch[SKETCH_SIZE - 1]))
+
+    def observe(self, column: pa.ChunkedArray):
+        self.null_count += column.null_count
+        if self.countable:
+            self._count_values(column)
+
+        if self.numeric:
+            count = pc.count(column).as_py()
+            if count:
+                self._merge_moments(count, pc.mean(column).as_py(), pc.variance(column, ddof=0).as_py() * count)
+        if self.numeric or pa.types.is_temporal(self.field.type):
+            bounds = pc.min_max(column).as_py()
+            if bounds["min"] is not None:
+                self.min = bounds["min"] if self.min is None else min(self.min, bounds["min"])
+                self.max = bounds["max"] if self.max is None else max(self.max, bounds["max"])
+
+    def _count_values(self, column: pa.ChunkedArray):
+        value_counts = pc.value_counts(column)
+        values, counts = value_counts.field("values"), value_counts.field("counts")
+        if pa.types.is_dictionary(values.type):
+            values = values.cast(values.type.value_type)
+        valid = pc.is_valid(values)
+        values, counts = values.filter(valid), counts.filter(valid)
+
+        if not self.distinct_exceeded and len(self.counts) + len(values) > DISTINCT_LIMIT:
+            new = pc.invert(pc.is_in(values, value_set=pa.array(list(self.counts), type=values.type)))
+            if len(self.counts) + pc.sum(new).as_py() > DISTINCT_LIMIT:
+                self.distinct_exceeded = True
+                self._sketch(pa.array(list(self.counts), type=values.type))
+        if self.distinct_exceeded:
+            self._sketch(values)
+            if len(values) > TOP_K_CAPACITY:
+                top = pc.select_k_unstable(
+                    pa.table({"counts": counts}), TOP_K_CAPACITY, sort_keys=[("counts", "descending")]
+                )
+                values, counts = values.take(top), counts.take(top)
+
+        for value, count in zip(values.to_pylist(), counts.to_pylist()):
+            self.counts[value] = self.counts.get(value, 0) + count
+        if self.distinct_exceeded and len(self.counts) > TOP_K_CAPACITY:
+            self.counts = dict(sorted(self.counts.items(), key=lambda item: -item[1])[:TOP_K_CAPACITY])
+
+    def _sketch(self, values: pa.Array):
+        hashes = pd.util.hash_array(values.to_numpy(zero_copy_only=False), categorize=False)
+        if len(hashes) > SKETCH_SIZE:
+            hashes = np.partition(hashes, SKETCH_SIZE)[:SKETCH_SIZE + 1]
+        self.sketch = np.unique(np.concatenate([self.sketch, hashes]))[:SKETCH_SIZE]
+
+    def top_values(self, k: int = TOP_K) -> List[Tuple[Any, int]]:
+        return sorted(self.counts.items(), key=lambda item: -item[1])[:k]
+
+    def _merge_moments(self, count: int, mean: float, m2: float):
+        # Chan et al. parallel variance
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+
+    def to_dict(self) -> Dict[str, Any]:
+        info: Dict[str, Any] = {
+            "type": simple_type(self.field.type),
+            "arrow_type": str(self.field.type),
+            "nullable": self.null_count > 0,
+            "null_count": self.null_count,
+            "unique_count": self.distinct_count,
+        }
+        if self.distinct_exceeded:
+            info["unique_count_exact"] = False
+        elif self.distinct_count <= UNIQUE_VALUES_LIMIT:
+            info["unique_values"] = [_json_value(v) for v in list(self.distinct)[:UNIQUE_VALUES_LIMIT]]
+        if self.counts:
+            info["top_values"] = [{"value": _json_value(v), "count": n} for v, n in self.top_values()]
+            if self.distinct_exceeded:
+                info["top_values_exact"] = False
+        if self.numeric and self.count:
+            info["stats"] = {
+                "min": float(self.min),
+                "max": float(self.max),
+                "mean": self.mean,
+                "std": math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else None
+            }
+        return info
+
+
+def _json_value(value: Any) -> Any:
+    return value.isoformat() if hasattr(value, 'isoformat') else str(value)
+
+
+class DatasetProfile:
+    """
+    Schema and column statistics of a dataset, built from the chunks written.
+
+    Conversion observes each row group as it goes out, so the schema comes
+    for free instead of from reading the finished file back.
+    """
+
+    def __init__(self):
+        self.schema: Optional[pa.Schema] = None
+        self.rows = 0
+        self.columns: Dict[str, ColumnProfile] = {}
+        self.sample: List[Dict[str, Any]] = []
+        self.iso_formats: Dict[str, str] = {}
+
+    @classmethod
+    def of(cls, table: pa.Table) -> "DatasetProfile":
+        profile = cls()
+        profile.observe(table)
+        return profile
+
+    def observe(self, table: pa.Table):
+        if self.schema is None:
+            self.schema = table.schema
+            self.columns = {field.name: ColumnProfile(field) for field in table.schema}
+        if len(self.sample) < SAMPLE_ROWS:
+            for row in table.slice(0, SAMPLE_ROWS - len(self.sample)).to_pylist():
+                self.sample.append({k: '' if v is None else (v if isinstance(v, (int, float, str, bool)) else str(v))
+                                    for k, v in row.items()})
+        self.rows += table.num_rows
+        for name, column in zip(table.column_names, table.columns):
+            self.columns[name].observe(column)
+
+    def column_details(self) -> Dict[str, Dict[str, Any]]:
+        details = {}
+        for name, column in self.columns.items():
+            info = column.to_dict()
+            if name in self.iso_formats:
+                info.update(format="iso8601", precision=self.iso_formats[name])
+            details[name] = info
+        return details
+
+    def column_info(self) -> List[Dict[str, Any]]:
+        """Name, type and nullability per column, as reported for uploads"""
+        return [
+            {"name": name, "type": simple_type(column.field.type), "nullable": column.null_count > 0}
+            for name, column in self.columns.items()
+        ]
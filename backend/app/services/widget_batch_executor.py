@@ -0,0 +1,221 @@
+# ABOUTME: Batched widget data execution for whole dashboards
+# ABOUTME: Groups widgets by dataset so each Parquet file is read once, runs groups concurrently
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Any, List, Optional, AsyncIterator
+
+import pyarrow.parquet as pq
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.models.study import Study
+from app.models.widget import WidgetDefinition
+from app.services.filter_executor import FilterExecutor
+from app.services.widget_data_executor_real import (
+    RealWidgetExecutor,
+    WidgetDataRequest,
+    WidgetDataResponse,
+    build_kpi_result,
+    compute_kpi_value,
+    get_study_data_path,
+    resolve_kpi_mapping,
+)
+
+logger = logging.getLogger(__name__)
+
+KPI_CATEGORIES = ["metrics", "kpi"]
+
+
+@dataclass
+class BatchWidget:
+    """One widget instance to execute as part of a batch"""
+    widget_id: str
+    widget_def: WidgetDefinition
+    config: Dict[str, Any]
+    mapping: Optional[Dict[str, Any]] = None
+
+
+class WidgetBatchExecutor:
+    """Executes all widgets of a dashboard as one batch.
+
+    KPI widgets reading the same dataset form one group: the Parquet file is
+    read once with only the columns the group needs, and each widget filters
+    and aggregates the shared frame. Groups run concurrently in worker threads
+    and results are yielded as each group finishes.
+
+    Sessions aren't thread-safe, so everything read from the database (the
+    study, widget definitions and mappings) is resolved on the event loop
+    before fanning out; worker threads only see plain values.
+    """
+
+    def __init__(
+        self,
+        db: Session,
+        study: Study,
+        max_concurrency: int = settings.WIDGET_BATCH_MAX_CONCURRENCY
+    ):
+        self.db = db
+        self.study = study
+        self.study_id = str(study.id)
+        self.max_concurrency = max_concurrency
+        self.data_path = get_study_data_path(study)
+        # Used from worker threads, so it gets no session
+        self.filter_executor = FilterExecutor(None)
+
+    def plan(self, widgets: List[BatchWidget]) -> Dict[Optional[str], List[BatchWidget]]:
+        """
+        Group widgets by the dataset they read.
+
+        Widgets that cannot be grouped (non-KPI widgets, unmapped widgets) are
+        placed under the None key and executed individually.
+        """
+        groups: Dict[Optional[str], List[BatchWidget]] = OrderedDict()
+        for widget in widgets:
+            category = (widget.widget_def.category or "metrics").lower()
+            if category in KPI_CATEGORIES:
+                widget.mapping = resolve_kpi_mapping(self.study, widget.config)
+            key = widget.mapping["dataset"] if widget.mapping else None
+            groups.setdefault(key, []).append(widget)
+        return groups
+
+    async def execute(self, widgets: List[BatchWidget]) -> List[WidgetDataResponse]:
+        """Execute the batch and return responses in request order"""
+        order = {widget.widget_id: i for i, widget in enumerate(widgets)}
+        responses = [response async for response in self.execute_as_completed(widgets)]
+        return sorted(responses, key=lambda r: order.get(r.widget_id, len(order)))
+
+    async def execute_as_completed(self, widgets: List[BatchWidget]) -> AsyncIterator[WidgetDataResponse]:
+        """Execute the batch, yielding each widget's response as soon as it is ready"""
+        groups = self.plan(widgets)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run_group(dataset: str, members: List[BatchWidget]) -> List[WidgetDataResponse]:
+            async with semaphore:
+                return await asyncio.to_thread(self._execute_dataset_group, dataset, members)
+
+        async def run_single(widget: BatchWidget) -> List[WidgetDataResponse]:
+            async with semaphore:
+                return [await self._execute_single(widget)]
+
+        tasks = []
+        for dataset, members in groups.items():
+            if dataset is None:
+                tasks.extend(asyncio.create_task(run_single(w)) for w in members)
+            else:
+                tasks.append(asyncio.create_task(run_group(dataset, members)))
+
+        try:
+            for finished in asyncio.as_completed(tasks):
+                for response in await finished:
+                    yield response
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _execute_single(self, widget: BatchWidget) -> WidgetDataResponse:
+        """Run a widget that does not share a dataset scan through the regular executor"""
+        executor = RealWidgetExecutor(self.db, self.study, widget.widget_def)
+        return await executor.execute(
+            WidgetDataRequest(widget_id=widget.widget_id, widget_config=widget.config)
+        )
+
+    def _execute_dataset_group(self, dataset: str, members: List[BatchWidget]) -> List[WidgetDataResponse]:
+        """Read one dataset once and compute every widget in the group from it"""
+        start_time = time.time()
+        dataset_path = Path(self.data_path) / f"{dataset}.parquet"
+
+        try:
+            if not dataset_path.exists():
+                raise FileNotFoundError(f"Dataset {dataset} not found")
+            read = self.filter_executor.read_dataset(dataset_path, columns=self._group_columns(dataset_path, members))
+            df = read.data
+        except Exception as e:
+            logger.error(f"Failed to read dataset {dataset} for widget batch: {str(e)}")
+            elapsed = int((time.time() - start_time) * 1000)
+            return [
+                WidgetDataResponse(
+                    widget_id=member.widget_id,
+                    status="error",
+                    data={"value": 0, "label": member.mapping["title"], "error": str(e)},
+                    error=str(e),
+                    execution_time_ms=elapsed
+                )
+                for member in members
+            ]
+
+        read_ms = int((time.time() - start_time) * 1000)
+        logger.info(
+            f"Batch read {dataset} once for {len(members)} widgets "
+            f"({len(df)} rows, {read.bytes_read} of {read.bytes_total} bytes, {read_ms}ms)"
+        )
+
+        responses = []
+        for member in members:
+            widget_start = time.time()
+            mapping = member.mapping
+            try:
+                widget_df = df
+                if mapping["filter_expression"]:
+                    try:
+                        widget_df = self.filter_executor.apply_filter(df, mapping["filter_expression"])
+                    except Exception as e:
+                        # Continue without filter rather than fail the widget
+                        logger.warning(f"Filter failed for widget {member.widget_id}, continuing without filter: {e}")
+
+                value = compute_kpi_value(widget_df, mapping["column"], mapping["aggregation"])
+                responses.append(
+                    WidgetDataResponse(
+                        widget_id=member.widget_id,
+                        status="success",
+                        data=build_kpi_result(mapping, value),
+                        metadata={
+                            "study_id": self.study_id,
+                            "widget_type": "metrics",
+                            "is_real_data": True,
+                            "data_source": "parquet",
+                            "batch_group": dataset,
+                            "batch_group_size": len(members),
+                            "io": read.io
+                        },
+                        execution_time_ms=read_ms + int((time.time() - widget_start) * 1000),
+                        cached=False
+                    )
+                )
+            except Exception as e:
+                logger.error(f"Error executing widget {member.widget_id}: {str(e)}")
+                responses.append(
+                    WidgetDataResponse(
+                        widget_id=member.widget_id,
+                        status="error",
+                        data=None,
+                        error=str(e),
+                        execution_time_ms=read_ms + int((time.time() - widget_start) * 1000)
+                    )
+                )
+        return responses
+
+    def _group_columns(self, dataset_path: Path, members: List[BatchWidget]) -> Optional[List[str]]:
+        """Columns the whole group needs, or None to read everything"""
+        columns = set()
+        for member in members:
+            if member.mapping["column"]:
+                columns.add(member.mapping["column"])
+            if member.mapping["filter_expression"]:
+                compiled = self.filter_executor.parse_filter(member.mapping["filter_expression"])
+                if not compiled.is_valid:
+                    # Let the filter fail per widget as the single-widget path does
+                    continue
+                columns.update(compiled.columns)
+
+        if not columns:
+            # Row counts only - read the narrowest possible projection
+            return []
+
+        # Only project onto columns that exist so a bad mapping doesn't fail the group
+        available = set(pq.read_schema(dataset_path).names)
+        return [c for c in columns if c in available]
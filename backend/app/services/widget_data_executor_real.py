@@ -6,13 +6,14 @@ import time
 import logging
 import pandas as pd
 from pathlib import Path
-from typing import Dict, Any, Optional, Tuple
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
 from sqlmodel import Session
 from pydantic import BaseModel, Field
 
 from app.models.widget import WidgetDefinition
 from app.models.study import Study
+from app.services.dataset_reader import required_columns
 from app.services.filter_executor import FilterExecutor
 from app.services.filter_validator import FilterValidator
 
@@ -40,6 +41,116 @@ class WidgetDataResponse(BaseModel):
     error: Optional[str] = None
 
 
+def get_study_data_path(study: Study) -> Path:
+    """Get the folder holding the study's current Parquet files"""
+    # Data is stored under org_id/studies/study_id/source_data/date/
+    # First, try the most recent date
+    base_path = Path(f"/data/{study.org_id}/studies/{study.id}/source_data")
+    if base_path.exists():
+        # Get the most recent date folder
+        date_folders = sorted([d for d in base_path.iterdir() if d.is_dir()], reverse=True)
+        if date_folders:
+            return date_folders[0]
+        return base_path
+    # Fallback to old path structure
+    return Path(f"/data/studies/{study.id}/parquet")
+
+
+def resolve_kpi_mapping(study: Study, config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Resolve which dataset, column, aggregation and filter a KPI widget uses
+    from the study's field mappings. Returns None if the widget is unmapped.
+    """
+    widget_id = config.get("id", "")
+    widget_title = config.get("title", "Unknown")
+    
+    # Get field mappings from the study
+    field_mappings = study.field_mappings or {}
+    
+    # Look for mapping for this widget
+    # Try different mapping key formats
+    mapping_keys = [
+        widget_id,  # Direct widget ID
+        f"{widget_id}_value",  # Widget ID with _value suffix
+        f"{widget_id}_value_field",  # Widget ID with _value_field suffix
+        widget_title.lower().replace(" ", "_"),  # Title-based key
+    ]
+    
+    mapping_value = None
+    for key in mapping_keys:
+        if key in field_mappings:
+            mapping_value = field_mappings[key]
+            logger.info(f"Found mapping for key '{key}': {mapping_value}")
+            break
+    
+    if not mapping_value:
+        return None
+    
+    # Parse the mapping (format: dataset.column)
+    if "." in mapping_value:
+        dataset_name, column_name = mapping_value.split(".", 1)
+    else:
+        # If no dot, assume it's just a dataset name
+        dataset_name = mapping_value
+        column_name = None
+    
+    # Check for filter configuration
+    filters = study.field_mapping_filters or {}
+    filter_config = filters.get(widget_id) or {}
+    
+    return {
+        "widget_id": widget_id,
+        "title": widget_title,
+        "dataset": dataset_name,
+        "column": column_name,
+        # Check for aggregation stored with widget_id_aggregation key
+        "aggregation": field_mappings.get(f"{widget_id}_aggregation", "count_distinct"),
+        "filter_expression": filter_config.get("expression"),
+    }
+
+
+def compute_kpi_value(df: pd.DataFrame, column: Optional[str], aggregation: str) -> Any:
+    """Aggregate a KPI value from a (filtered) DataFrame"""
+    if column and column in df.columns:
+        if aggregation == "count_distinct":
+            value = df[column].nunique()
+        elif aggregation == "count":
+            value = len(df)
+        elif aggregation == "sum":
+            value = df[column].sum()
+        elif aggregation in ["mean", "avg", "average"]:
+            value = df[column].mean()
+        elif aggregation == "max":
+            value = df[column].max()
+        elif aggregation == "min":
+            value = df[column].min()
+        else:
+            value = len(df)  # Default to count
+            
+        # Handle NaN and convert numpy types to Python types
+        if pd.isna(value):
+            value = 0
+        elif hasattr(value, 'item'):  # numpy scalar
+            value = value.item()
+        return value
+    
+    # No specific column, just count rows
+    return len(df)
+
+
+def build_kpi_result(mapping: Dict[str, Any], value: Any) -> Dict[str, Any]:
+    """Shape a computed KPI value into widget data"""
+    return {
+        "value": value,
+        "label": mapping["title"],
+        "dataset": mapping["dataset"],
+        "column": mapping["column"],
+        "aggregation": mapping["aggregation"],
+        "trend": "0%",  # Trend calculation would need historical data
+        "comparison": "current period"
+    }
+
+
 class RealWidgetExecutor:
     """Executor that reads real data from Parquet files"""
     
@@ -49,20 +160,8 @@ class RealWidgetExecutor:
         self.widget_def = widget_def
         self.filter_executor = FilterExecutor(db)
         self.filter_validator = FilterValidator(db)
-        
-        # Data is stored under org_id/studies/study_id/source_data/date/
-        # First, try the most recent date
-        base_path = Path(f"/data/{study.org_id}/studies/{study.id}/source_data")
-        if base_path.exists():
-            # Get the most recent date folder
-            date_folders = sorted([d for d in base_path.iterdir() if d.is_dir()], reverse=True)
-            if date_folders:
-                self.data_path = date_folders[0]
-            else:
-                self.data_path = base_path
-        else:
-            # Fallback to old path structure
-            self.data_path = Path(f"/data/studies/{study.id}/parquet")
+        self.data_path = get_study_data_path(study)
+        self.io_stats: Optional[Dict[str, int]] = None
     
     async def execute(self, request: WidgetDataRequest) -> WidgetDataResponse:
         """Execute widget data request - returns real data from Parquet files"""
@@ -92,7 +191,8 @@ class RealWidgetExecutor:
                     "study_id": str(self.study.id),
                     "widget_type": category,
                     "is_real_data": True,
-                    "data_source": "parquet"
+                    "data_source": "parquet",
+                    "io": self.io_stats
                 },
                 execution_time_ms=execution_time,
                 cached=False
@@ -114,41 +214,15 @@ class RealWidgetExecutor:
             widget_id = config.get("id", "")
             widget_title = config.get("title", "Unknown")
             
-            # Get field mappings from the study
-            field_mappings = self.study.field_mappings or {}
-            logger.info(f"Field mappings available: {list(field_mappings.keys())}")
-            
-            # Look for mapping for this widget
-            # Try different mapping key formats
-            mapping_keys = [
-                widget_id,  # Direct widget ID
-                f"{widget_id}_value",  # Widget ID with _value suffix
-                f"{widget_id}_value_field",  # Widget ID with _value_field suffix
-                widget_title.lower().replace(" ", "_"),  # Title-based key
-            ]
-            
-            mapping_value = None
-            for key in mapping_keys:
-                if key in field_mappings:
-                    mapping_value = field_mappings[key]
-                    logger.info(f"Found mapping for key '{key}': {mapping_value}")
-                    break
-            
-            if not mapping_value:
+            mapping = resolve_kpi_mapping(self.study, config)
+            if not mapping:
                 logger.warning(f"No field mapping found for widget {widget_id} ({widget_title})")
                 return {
                     "value": 0,
                     "label": widget_title,
                     "error": "No field mapping configured"
                 }
-            
-            # Parse the mapping (format: dataset.column)
-            if "." in mapping_value:
-                dataset_name, column_name = mapping_value.split(".", 1)
-            else:
-                # If no dot, assume it's just a dataset name
-                dataset_name = mapping_value
-                column_name = None
+            dataset_name = mapping["dataset"]
             
             # Load the dataset
             dataset_path = self.data_path / f"{dataset_name}.parquet"
@@ -160,71 +234,45 @@ class RealWidgetExecutor:
                     "error": f"Dataset {dataset_name} not found"
                 }
             
-            # Read the parquet file
-            df = pd.read_parquet(dataset_path)
-            logger.info(f"Loaded dataset {dataset_name} with {len(df)} rows")
+            # Only the aggregated column is read; counts need no columns at all
+            columns = required_columns([mapping["column"]])
             
-            # Check for filter configuration
-            filter_config = self._get_filter_config(widget_id)
-            if filter_config and filter_config.get('expression'):
-                logger.info(f"Applying filter for widget {widget_id}: {filter_config['expression']}")
+            # Apply the widget filter if one is configured
+            filtered_result = None
+            if mapping["filter_expression"]:
+                logger.info(f"Applying filter for widget {widget_id}: {mapping['filter_expression']}")
                 
                 # Apply the filter
                 filtered_result = await self._apply_widget_filter(
-                    df=df,
-                    expression=filter_config['expression'],
+                    expression=mapping["filter_expression"],
                     dataset_name=dataset_name,
-                    widget_id=widget_id
+                    widget_id=widget_id,
+                    columns=columns
                 )
                 
                 if filtered_result['success']:
-                    df = filtered_result['data']
-                    logger.info(f"Filter applied successfully. Rows after filtering: {len(df)}")
+                    logger.info(f"Filter applied successfully. Rows after filtering: {len(filtered_result['data'])}")
                 else:
                     logger.warning(f"Filter failed, continuing without filter: {filtered_result.get('error')}")
                     # Continue without filter rather than fail the widget
+                    filtered_result = None
             
-            # Calculate the value based on aggregation type
-            # Check for aggregation stored with widget_id_aggregation key
-            aggregation = field_mappings.get(f"{widget_id}_aggregation", "count_distinct")
-            logger.info(f"Using aggregation: {aggregation} for widget {widget_id}")
-            
-            if column_name and column_name in df.columns:
-                if aggregation == "count_distinct":
-                    value = df[column_name].nunique()
-                elif aggregation == "count":
-                    value = len(df)
-                elif aggregation == "sum":
-                    value = df[column_name].sum()
-                elif aggregation in ["mean", "avg", "average"]:
-                    value = df[column_name].mean()
-                elif aggregation == "max":
-                    value = df[column_name].max()
-                elif aggregation == "min":
-                    value = df[column_name].min()
-                else:
-                    value = len(df)  # Default to count
-                    
-                # Handle NaN and convert numpy types to Python types
-                if pd.isna(value):
-                    value = 0
-                elif hasattr(value, 'item'):  # numpy scalar
-                    value = value.item()
+            if filtered_result is not None:
+                df, io = filtered_result["data"], filtered_result["io"]
             else:
-                # No specific column, just count rows
-                value = len(df)
+                read = self.filter_executor.read_dataset(dataset_path, columns=columns)
+                df, io = read.data, read.io
+            logger.info(
+                f"Read {len(df)} rows of {dataset_name} "
+                f"({io['bytes_read']} of {io['bytes_total']} bytes)"
+            )
+            self.io_stats = io
             
-            logger.info(f"Calculated value: {value} using aggregation: {aggregation}")
+            # Calculate the value based on aggregation type
+            value = compute_kpi_value(df, mapping["column"], mapping["aggregation"])
+            logger.info(f"Calculated value: {value} using aggregation: {mapping['aggregation']}")
             
-            return {
-                "value": value,
-                "label": widget_title,
-                "dataset": dataset_name,
-                "column": column_name,
-                "aggregation": aggregation,
-                "trend": "0%",  # Trend calculation would need historical data
-                "comparison": "current period"
-            }
+            return build_kpi_result(mapping, value)
             
         except Exception as e:
             logger.error(f"Error reading Parquet data: {str(e)}")
@@ -234,24 +282,14 @@ class RealWidgetExecutor:
                 "error": str(e)
             }
     
-    def _get_filter_config(self, widget_id: str) -> Optional[Dict[str, Any]]:
-        """Get filter configuration for a widget from study settings"""
-        try:
-            # Check if study has filter configurations
-            filters = self.study.field_mapping_filters or {}
-            return filters.get(widget_id)
-        except Exception as e:
-            logger.error(f"Error getting filter config: {str(e)}")
-            return None
-    
     async def _apply_widget_filter(
         self,
-        df: pd.DataFrame,
         expression: str,
         dataset_name: str,
-        widget_id: str
+        widget_id: str,
+        columns: Optional[List[str]] = None
     ) -> Dict[str, Any]:
-        """Apply filter to dataframe with error handling"""
+        """Read the dataset with the filter applied, with error handling"""
         try:
             # Execute the filter
             result = self.filter_executor.execute_filter(
@@ -259,19 +297,20 @@ class RealWidgetExecutor:
                 widget_id=widget_id,
                 filter_expression=expression,
                 dataset_path=self.data_path / f"{dataset_name}.parquet",
+                columns=columns,
                 track_metrics=True
             )
             
             if "error" in result:
                 return {
                     "success": False,
-                    "error": result["error"],
-                    "data": df  # Return original data on error
+                    "error": result["error"]
                 }
             
             return {
                 "success": True,
                 "data": result["data"],
+                "io": result["io"],
                 "metrics": {
                     "original_count": result["original_count"],
                     "filtered_count": result["row_count"],
@@ -284,8 +323,7 @@ class RealWidgetExecutor:
             logger.error(f"Filter execution failed: {str(e)}")
             return {
                 "success": False,
-                "error": str(e),
-                "data": df  # Return original data on error
+                "error": str(e)
             }
 
 
@@ -2,6 +2,7 @@
 # ABOUTME: Provides common functionality for data fetching, aggregation, and caching
 
 from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
 from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime, timedelta
 import hashlib
@@ -9,7 +10,7 @@ import json
 from enum import Enum
 from uuid import UUID
 
-from sqlalchemy import text, create_engine
+from sqlalchemy import create_engine
 from sqlalchemy.pool import NullPool
 from sqlmodel import Session
 
@@ -18,6 +19,25 @@ from app.models.phase1_models import (
     AggregationType,
     JoinType
 )
+from app.services.widget_engines.result_cache import get_active_data_version, get_widget_result_cache
+
+
+@dataclass
+class AggregationSpec:
+    """
+    Declarative description of the single aggregation a widget runs.
+    
+    Widgets that expose a spec can be fused with other widgets scanning the
+    same dataset under the same filters (see query_planner.ScanPlanner).
+    group_by and measures are (sql_expression, result_alias) pairs; order_by
+    is (alias, descending) pairs applied to the rows after fan-out.
+    """
+    dataset: str
+    where_clause: str = ""
+    group_by: List[Tuple[str, str]] = field(default_factory=list)
+    measures: List[Tuple[str, str]] = field(default_factory=list)
+    order_by: List[Tuple[str, bool]] = field(default_factory=list)
+    limit: Optional[int] = None
 
 
 class WidgetEngine(ABC):
@@ -57,6 +77,16 @@ class WidgetEngine(ABC):
         """Transform raw query results into widget-specific format"""
         pass
     
+    def get_aggregation_spec(self) -> Optional[AggregationSpec]:
+        """
+        Describe this widget's query as a fusable aggregation.
+        
+        Returns None when the query cannot be expressed as a plain grouped
+        aggregate over one dataset (joins, window functions, sub-selects);
+        such widgets are executed on their own via build_query().
+        """
+        return None
+    
     def get_cache_key(self, extra_params: Optional[Dict] = None) -> str:
         """Generate cache key for this query"""
         cache_data = {
@@ -73,25 +103,16 @@ class WidgetEngine(ABC):
         
         return f"widget_{self.widget_id}_{cache_hash[:16]}"
     
+    def get_versioned_cache_key(self, session: Session) -> str:
+        """Cache key scoped to the study's active data version and cache generation"""
+        data_version, generation = get_widget_result_cache().get_study_version(
+            self.study_id, lambda: get_active_data_version(session, self.study_id)
+        )
+        return self.get_cache_key({"data_version": data_version, "generation": generation})
+    
     def check_cache(self, session: Session) -> Optional[Dict[str, Any]]:
         """Check if valid cached data exists"""
-        # TODO: Implement caching with QueryCache model
-        # cache_key = self.get_cache_key()
-        # 
-        # # Query cache table
-        # cached = session.query(QueryCache).filter(
-        #     QueryCache.cache_key == cache_key,
-        #     QueryCache.expires_at > datetime.utcnow()
-        # ).first()
-        # 
-        # if cached:
-        #     # Update hit count
-        #     cached.hit_count += 1
-        #     cached.last_accessed = datetime.utcnow()
-        #     session.commit()
-        #     return cached.result_data
-            
-        return None
+        return get_widget_result_cache().get(self.get_versioned_cache_key(session))
     
     def save_to_cache(
         self, 
@@ -100,38 +121,9 @@ class WidgetEngine(ABC):
         execution_time_ms: int
     ):
         """Save query results to cache"""
-        # TODO: Implement caching with QueryCache model
-        # cache_key = self.get_cache_key()
-        # expires_at = datetime.utcnow() + timedelta(seconds=self.cache_ttl)
-        # 
-        # # Check if cache entry exists
-        # existing = session.query(QueryCache).filter(
-        #     QueryCache.cache_key == cache_key
-        # ).first()
-        # 
-        # if existing:
-        #     # Update existing cache
-        #     existing.result_data = data
-        #     existing.expires_at = expires_at
-        #     existing.execution_time_ms = execution_time_ms
-        #     existing.created_at = datetime.utcnow()
-        # else:
-        #     # Create new cache entry
-        #     cache_entry = QueryCache(
-        #         cache_key=cache_key,
-        #         study_id=self.study_id,
-        #         widget_id=self.widget_id,
-        #         query_hash=hashlib.sha256(self.build_query().encode()).hexdigest()[:64],
-        #         query_text=self.build_query()[:5000],  # Truncate long queries
-        #         result_data=data,
-        #         result_count=len(data.get("data", [])) if isinstance(data.get("data"), list) else 1,
-        #         execution_time_ms=execution_time_ms,
-        #         expires_at=expires_at
-        #     )
-        #     session.add(cache_entry)
-        # 
-        # session.commit()
-        pass
+        get_widget_result_cache().set(
+            self.get_versioned_cache_key(session), data, self.cache_ttl, execution_time_ms
+        )
     
     def add_filter(self, field: str, operator: str, value: Any):
         """Add a filter to the query"""
@@ -207,32 +199,6 @@ class WidgetEngine(ABC):
         
         return " ".join(join_statements)
     
-    def execute_query(self, session: Session) -> Tuple[List[Dict], int]:
-        """Execute the query and return results with execution time"""
-        # Check cache first
-        cached_data = self.check_cache(session)
-        if cached_data:
-            return cached_data.get("data", []), 0
-        
-        # Build and execute query
-        query = self.build_query()
-        start_time = datetime.utcnow()
-        
-        # Execute query
-        result = session.exec(text(query))
-        rows = [dict(row) for row in result]
-        
-        # Calculate execution time
-        execution_time_ms = int((datetime.utcnow() - start_time).total_seconds() * 1000)
-        
-        # Transform results
-        transformed_data = self.transform_results(rows)
-        
-        # Save to cache
-        self.save_to_cache(session, transformed_data, execution_time_ms)
-        
-        return transformed_data, execution_time_ms
-    
     def get_aggregation_function(self, agg_type: AggregationType, field: str) -> str:
         """Get SQL aggregation function"""
         if agg_type == AggregationType.COUNT:
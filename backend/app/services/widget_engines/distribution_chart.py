@@ -4,7 +4,7 @@
 from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
 import math
-from app.services.widget_engines.base_widget import WidgetEngine
+from app.services.widget_engines.base_widget import AggregationSpec, WidgetEngine
 from app.models.phase1_models import AggregationType, DataGranularity
 
 
@@ -89,6 +89,32 @@ class DistributionChartEngine(WidgetEngine):
         else:
             return self.build_standard_query()
     
+    def get_aggregation_spec(self) -> Optional[AggregationSpec]:
+        """Describe standard bar/pie aggregations so they can share a scan"""
+        chart_subtype = self.mapping_config.get("chart_subtype", "bar")
+        if chart_subtype in ["histogram", "box_plot", "stacked_bar", "grouped_bar"] or self.joins:
+            return None
+        
+        mappings = self.mapping_config.get("field_mappings", {})
+        category_field = mappings.get("category_field", {}).get("source_field")
+        value_field = mappings.get("value_field", {}).get("source_field")
+        
+        agg_type = self.mapping_config.get("aggregation_type", "COUNT")
+        agg_enum = AggregationType[agg_type.upper()]
+        
+        measures = [(self.get_aggregation_function(agg_enum, value_field), "value")]
+        if self.mapping_config.get("show_percentage", False):
+            measures.append(("COUNT(*)", "count"))
+        
+        return AggregationSpec(
+            dataset=self.mapping_config.get("primary_dataset", "dataset"),
+            where_clause=self.build_where_clause(),
+            group_by=[(category_field, "category")],
+            measures=measures,
+            order_by=[("value", True)],
+            limit=self.mapping_config.get("top_n")
+        )
+    
     def build_standard_query(self) -> str:
         """Build query for standard bar/pie charts"""
         mappings = self.mapping_config.get("field_mappings", {})
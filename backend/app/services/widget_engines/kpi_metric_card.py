@@ -3,7 +3,7 @@
 
 from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime, timedelta
-from app.services.widget_engines.base_widget import WidgetEngine
+from app.services.widget_engines.base_widget import AggregationSpec, WidgetEngine
 from app.models.phase1_models import AggregationType, DataGranularity
 
 
@@ -121,6 +121,31 @@ class KPIMetricCardEngine(WidgetEngine):
         
         return query.strip()
     
+    def get_aggregation_spec(self) -> Optional[AggregationSpec]:
+        """Describe the KPI aggregation so it can share a scan with other widgets"""
+        mappings = self.mapping_config.get("field_mappings", {})
+        measure_field = mappings.get("measure_field", {}).get("source_field")
+        group_field = mappings.get("group_field", {}).get("source_field")
+        date_field = mappings.get("date_field", {}).get("source_field")
+        
+        agg_type = self.mapping_config.get("aggregation_type", "COUNT")
+        agg_enum = AggregationType[agg_type.upper()]
+        
+        group_by = []
+        if group_field:
+            group_by.append((group_field, "group_name"))
+        if date_field:
+            date_granularity = self.mapping_config.get("date_granularity", "month")
+            group_by.append((self.format_date_truncation(date_field, date_granularity), "period"))
+        
+        return AggregationSpec(
+            dataset=self.mapping_config.get("primary_dataset", "dataset"),
+            where_clause=self.build_where_clause(),
+            group_by=group_by,
+            measures=[(self.get_aggregation_function(agg_enum, measure_field or "*"), "value")],
+            order_by=[("period", False)] if date_field else []
+        )
+    
     def calculate_comparison(self, current_value: float, comparison_config: Dict) -> Dict[str, Any]:
         """Calculate comparison metrics"""
         comparison_type = comparison_config.get("type", "none")
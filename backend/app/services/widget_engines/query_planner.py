@@ -0,0 +1,270 @@
+# ABOUTME: Query planner that fuses widget aggregations over the same dataset into one scan
+# ABOUTME: Builds a GROUPING SETS query per dataset/filter context and fans rows back out to engines
+
+import hashlib
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlmodel import Session
+
+from app.services.widget_engines.base_widget import AggregationSpec, WidgetEngine
+from app.services.widget_engines.result_cache import WidgetResultCache
+
+logger = logging.getLogger(__name__)
+
+GROUPING_ID_ALIAS = "__grouping_id"
+
+QueryRunner = Callable[[str], List[Dict[str, Any]]]
+
+
+def session_runner(session: Session) -> QueryRunner:
+    """Run planner queries on a SQLAlchemy session"""
+    def run(query: str) -> List[Dict[str, Any]]:
+        return [dict(row._mapping) for row in session.exec(text(query))]
+    return run
+
+
+def duckdb_runner(conn: Any) -> QueryRunner:
+    """Run planner queries on a DuckDB connection (e.g. from the shared pool)"""
+    def run(query: str) -> List[Dict[str, Any]]:
+        cursor = conn.execute(query)
+        columns = [col[0] for col in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+    return run
+
+
+class ScanGroup:
+    """Widgets that aggregate the same dataset under the same filters"""
+
+    def __init__(self, dataset: str, where_clause: str):
+        self.dataset = dataset
+        self.where_clause = where_clause
+        self.members: List[Tuple[WidgetEngine, AggregationSpec]] = []
+
+    def add(self, engine: WidgetEngine, spec: AggregationSpec):
+        self.members.append((engine, spec))
+
+    def _layout(self) -> Tuple[List[str], List[str], List[Tuple[int, ...]]]:
+        """Unique group-by expressions, unique measures and the grouping sets used"""
+        keys: List[str] = []
+        measures: List[str] = []
+        sets: List[Tuple[int, ...]] = []
+
+        for _, spec in self.members:
+            key_set = []
+            for expr, _ in spec.group_by:
+                if expr not in keys:
+                    keys.append(expr)
+                key_set.append(keys.index(expr))
+            grouping_set = tuple(sorted(set(key_set)))
+            if grouping_set not in sets:
+                sets.append(grouping_set)
+            for expr, _ in spec.measures:
+                if expr not in measures:
+                    measures.append(expr)
+
+        return keys, measures, sets
+
+    def build_query(self) -> str:
+        """Build one query computing every member's aggregates in a single pass"""
+        keys, measures, sets = self._layout()
+
+        select_parts = [f"{expr} AS k{i}" for i, expr in enumerate(keys)]
+        if len(sets) > 1:
+            select_parts.append(f"GROUPING({', '.join(keys)}) AS {GROUPING_ID_ALIAS}")
+        select_parts.extend(f"{expr} AS m{i}" for i, expr in enumerate(measures))
+
+        if len(sets) > 1:
+            set_sql = ", ".join(
+                "(" + ", ".join(keys[i] for i in grouping_set) + ")" for grouping_set in sets
+            )
+            group_by_clause = f"GROUP BY GROUPING SETS ({set_sql})"
+        elif sets[0]:
+            group_by_clause = "GROUP BY " + ", ".join(keys[i] for i in sets[0])
+        else:
+            group_by_clause = ""
+
+        query = f"""
+            SELECT {', '.join(select_parts)}
+            FROM {self.dataset}
+            {self.where_clause}
+            {group_by_clause}
+        """
+        return query.strip()
+
+    def fan_out(self, rows: List[Dict[str, Any]]) -> List[Tuple[WidgetEngine, List[Dict[str, Any]]]]:
+        """Split the fused result back into each member's expected row shape"""
+        keys, measures, sets = self._layout()
+        results = []
+
+        for engine, spec in self.members:
+            key_indexes = {keys.index(expr) for expr, _ in spec.group_by}
+            if len(sets) > 1:
+                # GROUPING() sets a bit for every key rolled up in that row,
+                # with the first key as the most significant bit
+                expected_id = sum(
+                    1 << (len(keys) - 1 - i) for i in range(len(keys)) if i not in key_indexes
+                )
+                member_rows = [row for row in rows if row.get(GROUPING_ID_ALIAS) == expected_id]
+            else:
+                member_rows = rows
+
+            shaped = []
+            for row in member_rows:
+                item = {alias: row[f"k{keys.index(expr)}"] for expr, alias in spec.group_by}
+                item.update({alias: row[f"m{measures.index(expr)}"] for expr, alias in spec.measures})
+                shaped.append(item)
+
+            for alias, descending in reversed(spec.order_by):
+                shaped.sort(key=lambda item: (item.get(alias) is None, item.get(alias)), reverse=descending)
+            if spec.limit:
+                shaped = shaped[:spec.limit]
+
+            results.append((engine, shaped))
+
+        return results
+
+
+class ScanPlanner:
+    """
+    Collects widget engines and executes them with as few dataset scans as possible.
+
+    Engines whose get_aggregation_spec() returns a spec are grouped by
+    (dataset, WHERE clause); each group runs one fused query and the rows are
+    routed to each engine's transform_results(). Engines without a spec run
+    their own build_query() as before.
+
+    With a result_cache, every scan goes through its get_or_compute() under a
+    key made of scope (which must identify the data the scan reads) and the
+    query, so concurrent plans over the same data run each scan once.
+    """
+
+    def __init__(
+        self,
+        engines: Optional[List[WidgetEngine]] = None,
+        result_cache: Optional[WidgetResultCache] = None,
+        scope: str = ""
+    ):
+        self.engines: List[WidgetEngine] = []
+        self.result_cache = result_cache
+        self.scope = scope
+        for engine in engines or []:
+            self.add(engine)
+
+    def add(self, engine: WidgetEngine):
+        self.engines.append(engine)
+
+    def plan(self) -> Tuple[List[ScanGroup], List[WidgetEngine]]:
+        """Group fusable engines by dataset and filter context"""
+        groups: Dict[Tuple[str, str], ScanGroup] = OrderedDict()
+        standalone = []
+
+        for engine in self.engines:
+            try:
+                spec = engine.get_aggregation_spec()
+            except Exception as e:
+                logger.warning(f"Widget {engine.widget_id} cannot be fused, running alone: {e}")
+                spec = None
+
+            if spec is None:
+                standalone.append(engine)
+                continue
+
+            key = (spec.dataset, spec.where_clause.strip())
+            if key not in groups:
+                groups[key] = ScanGroup(spec.dataset, spec.where_clause.strip())
+            groups[key].add(engine, spec)
+
+        return list(groups.values()), standalone
+
+    def execute(
+        self,
+        session: Optional[Session] = None,
+        run_query: Optional[QueryRunner] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Execute all engines and return results keyed by widget ID.
+
+        Each result holds the engine's transformed data, the execution time of
+        the scan that produced it and how many widgets shared that scan.
+        """
+        if run_query is None:
+            if session is None:
+                raise ValueError("Either session or run_query is required")
+            run_query = session_runner(session)
+
+        groups, standalone = self.plan()
+        results: Dict[str, Dict[str, Any]] = {}
+
+        for group in groups:
+            try:
+                rows, execution_time_ms = self._scan(
+                    group.build_query(), [engine for engine, _ in group.members], run_query
+                )
+            except Exception as e:
+                logger.error(f"Fused query on {group.dataset} failed: {e}")
+                for engine, _ in group.members:
+                    results[str(engine.widget_id)] = {"data": None, "error": str(e), "execution_time_ms": 0, "shared_scan_size": len(group.members)}
+                continue
+
+            for engine, member_rows in group.fan_out(rows):
+                results[str(engine.widget_id)] = {
+                    "data": engine.transform_results(member_rows),
+                    "execution_time_ms": execution_time_ms,
+                    "shared_scan_size": len(group.members)
+                }
+
+        for engine in standalone:
+            execution_time_ms = 0
+            try:
+                rows, execution_time_ms = self._scan(engine.build_query(), [engine], run_query)
+                data = engine.transform_results(rows)
+                error = None
+            except Exception as e:
+                logger.error(f"Query for widget {engine.widget_id} failed: {e}")
+                data, error = None, str(e)
+            result = {
+                "data": data,
+                "execution_time_ms": execution_time_ms,
+                "shared_scan_size": 1
+            }
+            if error:
+                result["error"] = error
+            results[str(engine.widget_id)] = result
+
+        logger.info(
+            f"Executed {len(self.engines)} widgets with {len(groups) + len(standalone)} scans"
+        )
+        return results
+
+    def _scan(
+        self,
+        query: str,
+        engines: List[WidgetEngine],
+        run_query: QueryRunner
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """Rows of one scan and its execution time (0 when another plan ran it)"""
+        def compute() -> Tuple[List[Dict[str, Any]], int]:
+            start_time = datetime.utcnow()
+            rows = run_query(query)
+            return rows, int((datetime.utcnow() - start_time).total_seconds() * 1000)
+
+        if self.result_cache is None:
+            return compute()
+        key = "scan_" + hashlib.sha256(f"{self.scope}\n{query}".encode()).hexdigest()[:32]
+        ttl = min(engine.cache_ttl for engine in engines)
+        entry, from_cache = self.result_cache.get_or_compute(key, ttl, compute)
+        return entry["data"], 0 if from_cache else entry["execution_time_ms"]
+
+    def get_stats(self) -> Dict[str, int]:
+        """How many scans the plan needs compared to one per widget"""
+        groups, standalone = self.plan()
+        scans = len(groups) + len(standalone)
+        return {
+            "widgets": len(self.engines),
+            "scans": scans,
+            "scans_saved": len(self.engines) - scans
+        }
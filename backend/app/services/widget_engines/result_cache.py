@@ -0,0 +1,205 @@
+# ABOUTME: Two-tier result cache for widget engines (in-process LRU in front of Redis)
+# ABOUTME: Coalesces concurrent computations of the same key so each result is computed once
+
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.core.tiered_cache import TieredCache, shared_redis_cache
+from app.models.data_source_upload import DataSourceUpload
+
+logger = logging.getLogger(__name__)
+
+REDIS_NAMESPACE = "widget_result"
+
+
+def get_active_data_version(session: Session, study_id: Any) -> str:
+    """Identifier of the study's active data version, used to scope cache keys"""
+    upload = session.exec(
+        select(DataSourceUpload).where(
+            DataSourceUpload.study_id == study_id,
+            DataSourceUpload.is_active_version == True  # noqa: E712
+        )
+    ).first()
+    if upload is None:
+        return "none"
+    return f"{upload.id}:v{upload.version_number}"
+
+
+class _InFlight:
+    """A computation other callers can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[BaseException] = None
+
+
+class WidgetResultCache(TieredCache):
+    """
+    Widget results cached in a bounded in-process LRU backed by Redis.
+
+    Lookups try the local LRU first, then Redis (promoting hits into the
+    LRU). get_or_compute() makes sure concurrent requests for the same key
+    in this process share a single computation.
+
+    Each study's data version and cache generation are remembered for
+    version_ttl seconds, so building a key doesn't cost a database query
+    and a Redis read. Invalidations in this process are seen at once;
+    other processes see them within version_ttl. Without Redis the
+    generation is counted in this process.
+    """
+
+    def __init__(
+        self,
+        redis_cache: Optional[Any] = None,
+        max_entries: int = settings.WIDGET_RESULT_CACHE_MAX_ENTRIES,
+        version_ttl: float = settings.WIDGET_RESULT_CACHE_VERSION_TTL
+    ):
+        super().__init__(
+            REDIS_NAMESPACE, redis_cache, max_entries,
+            extra_stats=("computations", "coalesced", "version_hits", "version_lookups")
+        )
+        self.version_ttl = version_ttl
+        self._versions: Dict[str, Tuple[float, Tuple[str, int]]] = {}
+        self._inflight: Dict[str, _InFlight] = {}
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Cached entry for key, or None"""
+        entry = self.get_local(key)
+        if entry is not None:
+            return entry
+
+        entry = self.get_redis(key)
+        if entry is not None:
+            remaining = (datetime.fromisoformat(entry["expires_at"]) - datetime.utcnow()).total_seconds()
+            if remaining > 0:
+                self.set_local(key, entry, remaining)
+                return entry
+
+        self.record("misses")
+        return None
+
+    def set(self, key: str, data: Any, ttl: int, execution_time_ms: int = 0) -> Dict[str, Any]:
+        """Store a result in both tiers and return the cache entry"""
+        now = datetime.utcnow()
+        entry = {
+            "data": data,
+            "execution_time_ms": execution_time_ms,
+            "cached_at": now.isoformat(),
+            "expires_at": (now + timedelta(seconds=ttl)).isoformat(),
+        }
+        self.set_local(key, entry, ttl)
+        self.set_redis(key, entry, ttl)
+        return entry
+
+    def get_or_compute(
+        self,
+        key: str,
+        ttl: int,
+        compute: Callable[[], Tuple[Any, int]]
+    ) -> Tuple[Dict[str, Any], bool]:
+        """
+        Return (entry, from_cache), computing the result on a miss.
+
+        compute() returns (data, execution_time_ms). If another thread is
+        already computing the same key, wait for its result instead.
+        """
+        entry = self.get(key)
+        if entry is not None:
+            return entry, True
+
+        with self._lock:
+            # A computation may have finished between the lookup and here
+            entry = self._get_local_locked(key)
+            if entry is not None:
+                return entry, True
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _InFlight()
+            else:
+                self._stats["coalesced"] += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+
+        try:
+            self.record("computations")
+            data, execution_time_ms = compute()
+            flight.result = self.set(key, data, ttl, execution_time_ms)
+            return flight.result, False
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+
+    def get_study_generation(self, study_id: Any) -> int:
+        """Study cache generation, bumped whenever the study's data changes"""
+        key = str(study_id)
+        generation = self.read_version(key, lambda redis_cache: redis_cache.get_study_generation(key))
+        return 0 if generation is None else generation
+
+    def get_study_version(self, study_id: Any, resolve_data_version: Callable[[], str]) -> Tuple[str, int]:
+        """
+        (data version, cache generation) of a study, for scoping its keys.
+
+        resolve_data_version() is only called, and the generation only read,
+        when the remembered pair is older than version_ttl.
+        """
+        key = str(study_id)
+        with self._lock:
+            item = self._versions.get(key)
+            if item is not None and item[0] > time.monotonic():
+                self._stats["version_hits"] += 1
+                return item[1]
+            self._stats["version_lookups"] += 1
+
+        version = (resolve_data_version(), self.get_study_generation(study_id))
+        with self._lock:
+            self._versions[key] = (time.monotonic() + self.version_ttl, version)
+        return version
+
+    def invalidate_study(self, study_id: Any):
+        """
+        Resolve the study's version afresh on the next lookup
+
+        Called after the study's Redis generation was bumped; without Redis
+        the process-local generation is advanced here instead.
+        """
+        key = str(study_id)
+        with self._lock:
+            self._versions.pop(key, None)
+        if self.redis_cache is None:
+            self.bump_version(key, lambda redis_cache: redis_cache.bump_study_generation(key))
+
+    def clear_local(self):
+        """Drop every entry from the in-process tier"""
+        super().clear_local()
+        with self._lock:
+            self._versions.clear()
+
+
+_result_cache: Optional[WidgetResultCache] = None
+_result_cache_lock = threading.Lock()
+
+
+def get_widget_result_cache() -> WidgetResultCache:
+    """Get the process-wide widget result cache, creating it on first use"""
+    global _result_cache
+    if _result_cache is None:
+        with _result_cache_lock:
+            if _result_cache is None:
+                _result_cache = WidgetResultCache(shared_redis_cache())
+    return _result_cache
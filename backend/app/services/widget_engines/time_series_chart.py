@@ -3,7 +3,7 @@
 
 from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime, timedelta
-from app.services.widget_engines.base_widget import WidgetEngine
+from app.services.widget_engines.base_widget import AggregationSpec, WidgetEngine
 from app.models.phase1_models import AggregationType, DataGranularity, JoinType
 
 
@@ -66,6 +66,68 @@ class TimeSeriesChartEngine(WidgetEngine):
         
         return len(errors) == 0, errors
     
+    def build_time_where_clause(self, date_field: str) -> str:
+        """Build WHERE clause from filters plus the configured date range"""
+        where_clause = self.build_where_clause()
+        
+        # Add date range filter if specified
+        date_range = self.mapping_config.get("date_range", {})
+        if date_range:
+            start_date = date_range.get("start")
+            end_date = date_range.get("end")
+            if start_date and end_date:
+                date_filter = f"{date_field} BETWEEN '{start_date}' AND '{end_date}'"
+                if where_clause:
+                    where_clause += f" AND {date_filter}"
+                else:
+                    where_clause = f"WHERE {date_filter}"
+        
+        return where_clause
+    
+    def get_aggregation_spec(self) -> Optional[AggregationSpec]:
+        """Describe non-cumulative series so they can share a scan"""
+        if self.mapping_config.get("cumulative", False) or self.joins:
+            return None
+        
+        mappings = self.mapping_config.get("field_mappings", {})
+        date_field = mappings.get("date_field", {}).get("source_field")
+        value_field = mappings.get("value_field", {}).get("source_field")
+        series_field = mappings.get("series_field", {}).get("source_field")
+        error_field = mappings.get("error_field", {}).get("source_field")
+        
+        time_granularity = self.mapping_config.get("time_granularity", "day")
+        agg_type = self.mapping_config.get("aggregation_type", "AVG")
+        agg_enum = AggregationType[agg_type.upper()]
+        
+        group_by = [(self.format_date_truncation(date_field, time_granularity), "period")]
+        if series_field:
+            group_by.append((series_field, "series"))
+        
+        measures = [(self.get_aggregation_function(agg_enum, value_field), "value")]
+        if error_field:
+            measures.append((f"STDDEV({error_field})", "error_margin"))
+            measures.append((f"COUNT({error_field})", "sample_size"))
+        if self.mapping_config.get("include_statistics", False):
+            measures.extend([
+                (f"MIN({value_field})", "min_value"),
+                (f"MAX({value_field})", "max_value"),
+                (f"PERCENTILE_CONT(0.25) WITHIN GROUP (ORDER BY {value_field})", "q1"),
+                (f"PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY {value_field})", "median"),
+                (f"PERCENTILE_CONT(0.75) WITHIN GROUP (ORDER BY {value_field})", "q3"),
+            ])
+        
+        order_by = [("period", False)]
+        if series_field:
+            order_by.append(("series", False))
+        
+        return AggregationSpec(
+            dataset=self.mapping_config.get("primary_dataset", "dataset"),
+            where_clause=self.build_time_where_clause(date_field),
+            group_by=group_by,
+            measures=measures,
+            order_by=order_by
+        )
+    
     def build_query(self) -> str:
         """Build SQL query for time series data"""
         mappings = self.mapping_config.get("field_mappings", {})
@@ -118,19 +180,7 @@ class TimeSeriesChartEngine(WidgetEngine):
         join_clause = self.build_join_clause()
         
         # Build WHERE clause
-        where_clause = self.build_where_clause()
-        
-        # Add date range filter if specified
-        date_range = self.mapping_config.get("date_range", {})
-        if date_range:
-            start_date = date_range.get("start")
-            end_date = date_range.get("end")
-            if start_date and end_date:
-                date_filter = f"{date_field} BETWEEN '{start_date}' AND '{end_date}'"
-                if where_clause:
-                    where_clause += f" AND {date_filter}"
-                else:
-                    where_clause = f"WHERE {date_filter}"
+        where_clause = self.build_time_where_clause(date_field)
         
         # Build GROUP BY clause
         group_by_parts = ["period"]
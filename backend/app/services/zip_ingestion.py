@@ -0,0 +1,267 @@
+# ABOUTME: Parallel ZIP ingestion: converts each dataset in an archive to Parquet on a process pool
+# ABOUTME: Members are read straight out of the archive instead of extracting it to disk first
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from app.core.config import settings
+from app.services.ingest_manifest import file_sha256, link_dataset
+from app.services.streaming_converter import ConversionStats, RSSMonitor, StreamingParquetConverter
+from app.services.type_normalizer import TypeNormalizer
+
+logger = logging.getLogger(__name__)
+
+DATA_EXTENSIONS = {'.csv', '.sas7bdat', '.xpt', '.xlsx', '.xls', '.parquet'}
+
+# SAS readers seek around the file, so these members are copied out one at a time
+SPOOLED_EXTENSIONS = {'.sas7bdat', '.xpt'}
+
+
+@dataclass
+class MemberResult:
+    """Outcome of converting one archive member"""
+    member: str
+    dataset_name: str
+    parquet_path: Optional[str] = None
+    stats: Optional[ConversionStats] = None
+    metadata: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    seconds: float = 0.0
+    content_hash: Optional[str] = None
+    reused: bool = False
+
+    @property
+    def success(self) -> bool:
+        return self.error is None and self.stats is not None and self.stats.rows > 0
+
+    def timing(self) -> Dict[str, Any]:
+        """Per-dataset timing for upload records"""
+        timing = {"dataset": self.dataset_name, "member": self.member, "seconds": round(self.seconds, 3),
+                  "reused": self.reused}
+        if self.stats is not None:
+            timing.update(rows=self.stats.rows, rows_per_second=self.stats.rows_per_second,
+                          peak_rss_mb=self.stats.peak_rss_mb)
+        if self.error:
+            timing["error"] = self.error
+        return timing
+
+
+def _convert_member(
+    zip_path: str,
+    member: str,
+    parquet_path: str,
+    rename: Callable[[str], str],
+    infer_dates: bool,
+    memory_limit_mb: int,
+    row_group_size: int,
+    reuse: Optional[Dict[str, str]] = None
+) -> MemberResult:
+    """
+    Convert one member in a worker process; errors are returned, not raised
+
+    reuse maps content hashes to parquet files already converted from the
+    same bytes; a member found there is linked instead of converted.
+    """
+    start_time = time.perf_counter()
+    result = MemberResult(member=member, dataset_name=Path(member).stem)
+    converter = StreamingParquetConverter(memory_limit_mb=memory_limit_mb, row_group_size=row_group_size)
+    extension = Path(member).suffix.lower()
+
+    try:
+        with zipfile.ZipFile(zip_path) as archive:
+            with archive.open(member) as source:
+                result.content_hash = file_sha256(source)
+            existing = (reuse or {}).get(result.content_hash)
+
+            if existing and Path(existing).exists():
+                link_dataset(existing, parquet_path)
+                result.stats = _parquet_stats(parquet_path)
+                result.reused = True
+            elif extension == '.csv':
+                source = zipfile.Path(archive, member)
+                result.stats = converter.convert_csv(source, parquet_path, rename=rename, infer_dates=infer_dates)
+            elif extension in SPOOLED_EXTENSIONS:
+                with tempfile.TemporaryDirectory() as temp_dir:
+                    spooled = Path(temp_dir) / Path(member).name
+                    with archive.open(member) as source, open(spooled, 'wb') as target:
+                        shutil.copyfileobj(source, target)
+                    file_format = 'sas7bdat' if extension == '.sas7bdat' else 'xpt'
+                    result.stats, meta = converter.convert_sas(spooled, parquet_path, file_format=file_format, rename=rename)
+                    if meta is not None:
+                        result.metadata = {
+                            "column_labels": dict(zip(meta.column_names, meta.column_labels)) if meta.column_labels else {},
+                            "original_format": file_format
+                        }
+            elif extension == '.parquet':
+                # Replace rather than overwrite: the old file may be linked from another extract
+                Path(parquet_path).unlink(missing_ok=True)
+                with archive.open(member) as source, open(parquet_path, 'wb') as target:
+                    shutil.copyfileobj(source, target)
+                result.stats = _parquet_stats(parquet_path)
+            else:
+                df = pd.read_excel(BytesIO(archive.read(member)))
+                df.columns = [rename(col) for col in df.columns]
+                result.stats = converter.write_tables(
+                    parquet_path, iter([pa.Table.from_pandas(df, preserve_index=False)]),
+                    normalizer=TypeNormalizer(parse_dates=infer_dates)
+                )
+    except Exception as e:
+        Path(parquet_path).unlink(missing_ok=True)
+        result.error = str(e)
+
+    result.seconds = time.perf_counter() - start_time
+    if result.stats is not None:
+        result.stats.elapsed_seconds = result.seconds
+        result.parquet_path = parquet_path
+    return result
+
+
+def _parquet_stats(parquet_path: str) -> ConversionStats:
+    """Stats for a parquet file that was copied or linked rather than converted"""
+    monitor = RSSMonitor()
+    parquet = pq.ParquetFile(parquet_path)
+    return ConversionStats(
+        rows=parquet.metadata.num_rows,
+        columns=parquet.metadata.num_columns,
+        row_groups=parquet.metadata.num_row_groups,
+        schema=parquet.schema_arrow,
+        peak_rss_mb=monitor.peak_mb
+    )
+
+
+class ZipIngestor:
+    """
+    Converts the datasets in a ZIP archive concurrently.
+
+    Each member is handed to a worker process, which opens the archive
+    itself and streams the member into Parquet, so nothing is extracted up
+    front. The conversion memory limit is shared between the workers.
+    """
+
+    def __init__(self, pool: Optional[ProcessPoolExecutor] = None, max_workers: Optional[int] = None):
+        self.pool = pool or get_ingest_pool()
+        self.max_workers = max_workers or ingest_workers()
+
+    @staticmethod
+    def members(zip_path: Union[str, Path], extensions: Iterable[str] = DATA_EXTENSIONS) -> List[str]:
+        """Data files in the archive, skipping directories and hidden or OS metadata files"""
+        extensions = set(extensions)
+        with zipfile.ZipFile(zip_path) as archive:
+            return [
+                info.filename for info in archive.infolist()
+                if not info.is_dir()
+                and not any(part.startswith(('.', '__MACOSX')) for part in Path(info.filename).parts)
+                and Path(info.filename).suffix.lower() in extensions
+            ]
+
+    @staticmethod
+    def check_dataset_names(members: Iterable[str]):
+        """
+        Raise ValueError if two members would be written to the same dataset
+
+        Members convert in parallel into {stem}.parquet, so dm.xpt beside
+        dm.sas7bdat, or sdtm/dm.csv beside adam/dm.csv, would overwrite each
+        other. Names are compared case-insensitively, as datasets are looked
+        up that way.
+        """
+        by_name: Dict[str, List[str]] = {}
+        for member in members:
+            by_name.setdefault(Path(member).stem.lower(), []).append(member)
+        duplicates = {name: found for name, found in by_name.items() if len(found) > 1}
+        if duplicates:
+            details = "; ".join(f"{name}: {', '.join(found)}" for name, found in duplicates.items())
+            raise ValueError(f"Archive has several files for the same dataset ({details}); keep one file per dataset")
+
+    async def convert(
+        self,
+        zip_path: Union[str, Path],
+        output_dir: Union[str, Path],
+        rename: Callable[[str], str] = str,
+        infer_dates: bool = False,
+        extensions: Iterable[str] = DATA_EXTENSIONS,
+        reuse: Optional[Dict[str, str]] = None
+    ) -> List[MemberResult]:
+        """
+        Convert every data member to {output_dir}/{stem}.parquet; results are in archive order
+
+        Members whose content hash is in reuse are linked to the existing
+        parquet file instead (see IngestManifest.known). Raises ValueError,
+        before converting anything, if two members share a dataset name.
+        """
+        members = self.members(zip_path, extensions)
+        self.check_dataset_names(members)
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        memory_limit_mb = max(settings.CONVERSION_MEMORY_LIMIT_MB // self.max_workers, 64)
+
+        loop = asyncio.get_event_loop()
+        start_time = time.perf_counter()
+        results = await asyncio.gather(*[
+            loop.run_in_executor(
+                self.pool,
+                _convert_member,
+                str(zip_path),
+                member,
+                str(output_dir / f"{Path(member).stem}.parquet"),
+                rename,
+                infer_dates,
+                memory_limit_mb,
+                settings.CONVERSION_ROW_GROUP_SIZE,
+                reuse,
+            )
+            for member in members
+        ])
+
+        logger.info(
+            f"Ingested {sum(r.success for r in results)}/{len(members)} datasets "
+            f"({sum(r.reused for r in results)} reused) from "
+            f"{Path(zip_path).name} in {time.perf_counter() - start_time:.2f}s"
+        )
+        return list(results)
+
+
+def ingest_workers() -> int:
+    return settings.INGEST_MAX_WORKERS or os.cpu_count() or 1
+
+
+_ingest_pool: Optional[ProcessPoolExecutor] = None
+_ingest_pool_lock = threading.Lock()
+
+
+def get_ingest_pool() -> ProcessPoolExecutor:
+    """Get the process-wide ingestion pool, creating it on first use"""
+    global _ingest_pool
+    if _ingest_pool is None:
+        with _ingest_pool_lock:
+            if _ingest_pool is None:
+                # spawn: forking a process that holds DuckDB and server threads isn't safe
+                _ingest_pool = ProcessPoolExecutor(
+                    max_workers=ingest_workers(),
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+    return _ingest_pool
+
+
+def shutdown_ingest_pool():
+    """Stop the ingestion pool's worker processes"""
+    global _ingest_pool
+    with _ingest_pool_lock:
+        if _ingest_pool is not None:
+            _ingest_pool.shutdown(wait=True, cancel_futures=True)
+            _ingest_pool = None
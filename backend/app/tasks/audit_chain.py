@@ -0,0 +1,36 @@
+# ABOUTME: Celery tasks maintaining the audit trail: hash chain verification and activity log partitions
+# ABOUTME: Verification picks up from the last checkpoint, so each run only reads records written since the one before
+
+import logging
+from typing import Any, Dict, List
+
+from sqlmodel import Session
+
+from app.core.celery_app import celery_app
+from app.core.db import engine
+from app.services import activity_log_partitions
+from app.services.audit_chain import AuditChainVerifier
+
+logger = logging.getLogger(__name__)
+
+
+@celery_app.task(name="app.tasks.audit_chain.verify_audit_chain")
+def verify_audit_chain() -> Dict[str, Any]:
+    """
+    Periodic task to verify audit records written since the last run
+    """
+    result = AuditChainVerifier().verify()
+    logger.info(
+        f"Audit chain {result['status']} through sequence {result['verified_sequence']} "
+        f"({result['records_checked']} records checked)"
+    )
+    return result
+
+
+@celery_app.task(name="app.tasks.audit_chain.ensure_activity_log_partitions")
+def ensure_activity_log_partitions() -> List[str]:
+    """
+    Daily task to create the activity log partitions for the coming months
+    """
+    with Session(engine) as session:
+        return activity_log_partitions.ensure_activity_log_partitions(session)
@@ -0,0 +1,122 @@
+# ABOUTME: Benchmark of filtered scans on Parquet written with and without the clinical write profile
+# ABOUTME: Generates a synthetic ADLB, writes both layouts and times DuckDB and pyarrow queries against each
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import duckdb
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from app.services.parquet_writer import ParquetWriteProfile
+
+PARAMS = ["ALT", "AST", "BILI", "CREAT", "GLUC", "HGB", "K", "NA", "PLAT", "WBC"]
+
+QUERIES = {
+    "one parameter": ("PARAMCD = 'ALT'", ds.field("PARAMCD") == "ALT"),
+    "one subject": ("USUBJID = 'STUDY-0001-0042'", ds.field("USUBJID") == "STUDY-0001-0042"),
+    "one site": ("SITEID = '0007'", ds.field("SITEID") == "0007"),
+    "parameter and visit": (
+        "PARAMCD = 'HGB' AND AVISITN = 4", (ds.field("PARAMCD") == "HGB") & (ds.field("AVISITN") == 4)
+    ),
+}
+
+
+def make_adlb(subjects: int, visits: int, seed: int = 0) -> pd.DataFrame:
+    """ADLB-like data in collection order: subject, then visit, then parameter"""
+    rng = np.random.default_rng(seed)
+    rows = subjects * visits * len(PARAMS)
+    subject = np.repeat(np.arange(subjects), visits * len(PARAMS))
+    visit = np.tile(np.repeat(np.arange(1, visits + 1), len(PARAMS)), subjects)
+    site = subject % 20
+    return pd.DataFrame({
+        "STUDYID": "STUDY",
+        "USUBJID": [f"STUDY-{s % 20 + 1:04d}-{s:04d}" for s in subject],
+        "SITEID": [f"{s:04d}" for s in site],
+        "ARM": np.where(subject % 2, "Placebo", "Active"),
+        "PARAMCD": np.tile(PARAMS, subjects * visits),
+        "AVISITN": visit,
+        "AVISIT": [f"Week {v * 2}" for v in visit],
+        "ADT": pd.Timestamp("2024-01-01") + pd.to_timedelta(visit * 14 + subject % 7, unit="D"),
+        "AVAL": rng.normal(100, 15, rows).round(2),
+        "ANRIND": rng.choice(["NORMAL", "LOW", "HIGH"], rows, p=[0.8, 0.1, 0.1]),
+    })
+
+
+def timed(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def scan(path: Path, repeat: int) -> dict:
+    results = {}
+    con = duckdb.connect()
+    dataset = ds.dataset(str(path))
+    for name, (sql, expression) in QUERIES.items():
+        query = f"SELECT count(*), avg(AVAL) FROM read_parquet('{path}') WHERE {sql}"
+        results[name] = (
+            timed(lambda query=query: con.execute(query).fetchall(), repeat),
+            timed(lambda expression=expression: dataset.to_table(columns=["AVAL"], filter=expression), repeat),
+        )
+    con.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--subjects", type=int, default=5000)
+    parser.add_argument("--visits", type=int, default=12)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    df = make_adlb(args.subjects, args.visits)
+    print(f"ADLB: {len(df):,} rows x {len(df.columns)} columns")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        baseline = Path(temp_dir) / "baseline" / "adlb.parquet"
+        tuned = Path(temp_dir) / "tuned" / "adlb.parquet"
+        baseline.parent.mkdir()
+        tuned.parent.mkdir()
+
+        start = time.perf_counter()
+        df.to_parquet(baseline, engine="pyarrow", compression="snappy")
+        baseline_write = time.perf_counter() - start
+
+        start = time.perf_counter()
+        ParquetWriteProfile().write_table(pa.Table.from_pandas(df, preserve_index=False), tuned)
+        tuned_write = time.perf_counter() - start
+
+        for label, path, seconds in (("baseline", baseline, baseline_write), ("tuned", tuned, tuned_write)):
+            metadata = pq.read_metadata(path)
+            print(
+                f"{label:>8}: {path.stat().st_size / 1024 / 1024:.1f} MB, "
+                f"{metadata.num_row_groups} row groups, written in {seconds:.2f}s"
+            )
+
+        before, after = scan(baseline, args.repeat), scan(tuned, args.repeat)
+
+    print(f"\n{'query':<22}{'duckdb ms':>22}{'pyarrow ms':>22}")
+    for name in QUERIES:
+        (duck_before, arrow_before), (duck_after, arrow_after) = before[name], after[name]
+        print(
+            f"{name:<22}{duck_before:>9.1f} -> {duck_after:>6.1f} ({duck_before / duck_after:4.1f}x)"
+            f"{arrow_before:>9.1f} -> {arrow_after:>6.1f} ({arrow_before / arrow_after:4.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
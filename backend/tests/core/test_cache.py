@@ -0,0 +1,124 @@
+# ABOUTME: Unit tests for generation-based study cache invalidation
+# ABOUTME: Tests CacheManager generations, versioned widget keys and the Redis fallback
+
+import uuid
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.core.cache import CacheManager, WidgetCache, bump_study_generation
+from app.services.widget_engines.kpi_metric_card import KPIMetricCardEngine
+from app.services.widget_engines import result_cache as result_cache_module
+from app.services.widget_engines.result_cache import WidgetResultCache
+
+
+class FakeRedis:
+    """Minimal in-memory Redis client"""
+
+    def __init__(self):
+        self.store = {}
+
+    def ping(self):
+        return True
+
+    def get(self, key):
+        return self.store.get(key)
+
+    def set(self, key, value):
+        self.store[key] = value
+
+    def setex(self, key, ttl, value):
+        self.store[key] = value
+
+    def incr(self, key):
+        self.store[key] = int(self.store.get(key, 0)) + 1
+        return self.store[key]
+
+    def hincrby(self, key, field, amount):
+        pass
+
+    def expire(self, key, ttl):
+        pass
+
+
+@pytest.fixture
+def redis_client():
+    return FakeRedis()
+
+
+@pytest.fixture
+def manager(redis_client):
+    with patch("app.core.cache.redis.Redis", return_value=redis_client):
+        return CacheManager()
+
+
+class TestStudyGeneration:
+    def test_generation_starts_at_zero(self, manager):
+        """Test an untouched study is at generation 0"""
+        assert manager.get_study_generation("study-1") == 0
+
+    def test_invalidate_study_bumps_generation(self, manager, redis_client):
+        """Test invalidation is a single INCR rather than a key scan"""
+        assert manager.invalidate_study("study-1") == 1
+        assert manager.invalidate_study("study-1") == 2
+        assert manager.get_study_generation("study-1") == 2
+        assert manager.get_study_generation("study-2") == 0
+        assert len(redis_client.store) == 1
+
+    def test_widget_data_unreachable_after_bump(self, manager):
+        """Test entries written before invalidation are never read again"""
+        widget_cache = WidgetCache(manager)
+        widget_cache.set_widget_data("w1", "study-1", "hash", {"value": 1})
+        assert widget_cache.get_widget_data("w1", "study-1", "hash") == {"value": 1}
+
+        manager.invalidate_study("study-1")
+
+        assert widget_cache.get_widget_data("w1", "study-1", "hash") is None
+
+    def test_local_fallback_without_redis(self, manager):
+        """Test generations still advance in-process when Redis is down"""
+        manager.redis_client = None
+
+        assert manager.bump_study_generation("study-1") == 1
+        assert manager.get_study_generation("study-1") == 1
+
+
+class TestVersionedWidgetKeys:
+    def test_engine_key_changes_with_generation(self, manager):
+        """Test widget engine results are scoped to the study generation"""
+        study_id = uuid.uuid4()
+        engine = KPIMetricCardEngine(
+            widget_id=uuid.uuid4(),
+            study_id=study_id,
+            mapping_config={"aggregation_type": "COUNT"},
+        )
+        result_cache = WidgetResultCache(manager, version_ttl=0)
+
+        with patch("app.services.widget_engines.base_widget.get_widget_result_cache", return_value=result_cache), \
+             patch("app.services.widget_engines.base_widget.get_active_data_version", return_value="v1"):
+            before = engine.get_versioned_cache_key(MagicMock())
+            manager.invalidate_study(str(study_id))
+            after = engine.get_versioned_cache_key(MagicMock())
+
+        assert before != after
+
+    def test_reprocessing_invalidates_results_without_redis(self):
+        """Test a study's widget results are dropped when CACHE_ENABLED is false"""
+        study_id = uuid.uuid4()
+        engine = KPIMetricCardEngine(
+            widget_id=uuid.uuid4(),
+            study_id=study_id,
+            mapping_config={"aggregation_type": "COUNT"},
+        )
+
+        with patch.object(result_cache_module.settings, "CACHE_ENABLED", False), \
+             patch.object(result_cache_module, "_result_cache", None), \
+             patch("app.core.cache.cache_manager", MagicMock()), \
+             patch("app.services.widget_engines.base_widget.get_active_data_version", return_value="v1"):
+            engine.save_to_cache(MagicMock(), {"value": 7}, 12)
+            assert engine.check_cache(MagicMock()) is not None
+
+            # What the upload service does once an active upload is reprocessed
+            bump_study_generation(study_id)
+
+            assert engine.check_cache(MagicMock()) is None
@@ -0,0 +1,223 @@
+# ABOUTME: Unit tests for the cached authenticated principal
+# ABOUTME: Tests both cache tiers, invalidation on committed user and role changes, and the auth dependency
+
+import asyncio
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session
+from starlette.requests import Request
+
+from app.api.deps import get_current_active_user, get_current_user
+from app.core import principal_cache as principal_cache_module
+from app.core import security
+from app.core.cache import CacheManager
+from app.core.principal_cache import PrincipalCache, request_token_subject
+from app.models.rbac import UserRole
+from app.models.user import User
+from tests.core.test_cache import FakeRedis
+
+NOW = datetime.now(timezone.utc)
+USER_ID = uuid.uuid4()
+
+
+@pytest.fixture
+def engine():
+    """In-memory database with one user; counts the user lookups it serves"""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    for model in (User, UserRole):
+        model.__table__.create(engine)
+    with Session(engine) as session:
+        session.add(User(id=USER_ID, email="monitor@example.com", hashed_password="hash", role="viewer"))
+        session.commit()
+
+    engine.user_queries = 0
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count(conn, cursor, statement, *args):
+        if statement.lstrip().startswith("SELECT") and "FROM user" in statement:
+            engine.user_queries += 1
+
+    return engine
+
+
+@pytest.fixture
+def user_id(engine):
+    return USER_ID
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    """Principal cache over an in-memory Redis, installed as the process-wide cache"""
+    with patch("app.core.cache.redis.Redis", return_value=FakeRedis()):
+        manager = CacheManager()
+    cache = PrincipalCache(manager, max_entries=8)
+    monkeypatch.setattr(principal_cache_module, "_principal_cache", cache)
+    return cache
+
+
+def request(token=None):
+    headers = [(b"authorization", f"Bearer {token}".encode())] if token else []
+    return Request({"type": "http", "headers": headers, "state": {}})
+
+
+class TestPrincipalCache:
+    """Test the PrincipalCache and the session hooks that invalidate it"""
+
+    def test_repeat_lookups_skip_database(self, engine, cache, user_id):
+        """Test only the first lookup reads the user, and each caller gets its own attached instance"""
+        with Session(engine) as session:
+            first = cache.get_user(session, user_id)
+        with Session(engine) as session:
+            second = cache.get_user(session, user_id)
+            assert second is not first
+            assert second in session
+            assert second.email == "monitor@example.com"
+
+        assert engine.user_queries == 1
+        assert cache.get_stats()["local_hits"] == 1
+
+    def test_redis_tier_shared_between_processes(self, engine, cache, user_id):
+        """Test a process without a local copy is served from Redis"""
+        with Session(engine) as session:
+            cache.get_user(session, user_id)
+        other = PrincipalCache(cache.redis_cache)
+
+        with Session(engine) as session:
+            assert other.get_user(session, user_id).role == "viewer"
+
+        assert engine.user_queries == 1
+        assert other.get_stats()["redis_hits"] == 1
+
+    def test_committed_change_invalidates(self, engine, cache, user_id):
+        """Test deactivating a user is seen on the next lookup, in every process"""
+        other = PrincipalCache(cache.redis_cache)
+        with Session(engine) as session:
+            other.get_user(session, user_id)
+            user = cache.get_user(session, user_id)
+            user.is_active = False
+            session.add(user)
+            session.commit()
+        other.clear_local()
+
+        with Session(engine) as session:
+            assert cache.get_user(session, user_id).is_active is False
+            assert other.get_user(session, user_id).is_active is False
+
+    def test_role_assignment_invalidates(self, engine, cache, user_id):
+        """Test assigning a role retires the cached principal, and a rolled back one doesn't"""
+        with Session(engine) as session:
+            session.add(UserRole(user_id=user_id, role_id=uuid.uuid4(), assigned_by=user_id, assigned_at=NOW))
+            session.flush()
+            session.rollback()
+        assert cache.get_stats()["invalidations"] == 0
+
+        with Session(engine) as session:
+            session.add(UserRole(user_id=user_id, role_id=uuid.uuid4(), assigned_by=user_id, assigned_at=NOW))
+            session.commit()
+
+        assert cache.get_stats()["invalidations"] == 1
+        assert cache.redis_cache.get_user_generation(str(user_id)) == 1
+
+    def test_password_hash_not_cached(self, engine, cache, user_id):
+        """Test the password hash is left out of the cache and loaded when needed"""
+        with Session(engine) as session:
+            cache.get_user(session, user_id)
+        assert "hashed_password" not in cache.get_principal(None, user_id)
+
+        with Session(engine) as session:
+            assert cache.get_user(session, user_id).hashed_password == "hash"
+
+
+class TestCurrentUser:
+    """Test the get_current_user dependency on top of the principal cache"""
+
+    def test_resolves_once_per_request(self, engine, cache, user_id):
+        """Test the token is decoded once per request and the user is left on the request for middleware"""
+        token = security.create_access_token(user_id, timedelta(minutes=5))
+        req = request(token)
+        assert request_token_subject(req) == str(user_id)
+
+        with Session(engine) as session, patch(
+            "app.core.principal_cache.decode_token_subject"
+        ) as decode:
+            user = get_current_user(req, session, token)
+
+        decode.assert_not_called()
+        assert user.id == user_id
+        assert req.state.current_user.email == "monitor@example.com"
+
+    def test_cold_request_counts_one_miss(self, engine, cache, user_id):
+        """Test a request looks the principal up once, so a cold cache records a single miss"""
+        token = security.create_access_token(user_id, timedelta(minutes=5))
+
+        with Session(engine) as session:
+            get_current_user(request(token), session, token)
+
+        stats = cache.get_stats()
+        assert engine.user_queries == 1
+        assert stats["local_hits"] == 0
+        assert stats["hit_rate"] == 0.0
+
+    def test_rejects_bad_token_and_inactive_user(self, engine, cache, user_id):
+        """Test invalid tokens and deactivated users are refused"""
+        with Session(engine) as session:
+            with pytest.raises(HTTPException) as e:
+                get_current_user(request(), session, "not-a-token")
+            assert e.value.status_code == 403
+
+            user = cache.get_user(session, user_id)
+            user.is_active = False
+            session.commit()
+
+        token = security.create_access_token(user_id, timedelta(minutes=5))
+        with Session(engine) as session, pytest.raises(HTTPException) as e:
+            get_current_user(request(token), session, token)
+        assert e.value.status_code == 400
+
+
+class SyncSessionRunner:
+    """Stands in for AsyncSession.run_sync over a plain Session"""
+
+    def __init__(self, session):
+        self.session = session
+
+    async def run_sync(self, fn):
+        return fn(self.session)
+
+
+class TestCurrentActiveUser:
+    """Test the async get_current_active_user dependency"""
+
+    def test_redis_calls_run_off_the_event_loop(self, engine, cache, user_id):
+        """Test principal lookups reach Redis from worker threads, never the loop's thread"""
+        token = security.create_access_token(user_id, timedelta(minutes=5))
+        redis_threads = []
+        client = cache.redis_cache.redis_client
+        for name in ("get", "setex"):
+            method = getattr(client, name)
+
+            def record(*args, _method=method):
+                redis_threads.append(threading.current_thread())
+                return _method(*args)
+
+            setattr(client, name, record)
+
+        async def resolve():
+            with Session(engine) as session:
+                user = await get_current_active_user(SyncSessionRunner(session), token)
+                return threading.current_thread(), user.email, user in session
+
+        loop_thread, email, attached = asyncio.run(resolve())
+
+        assert email == "monitor@example.com"
+        assert attached
+        assert redis_threads
+        assert loop_thread not in redis_threads
+        assert cache.redis_cache.get("principal", f"{user_id}:0") is not None
@@ -0,0 +1,66 @@
+# ABOUTME: Unit tests for the shared two-tier cache base
+# ABOUTME: Tests local expiry and eviction, versions with and without Redis, and Redis failures
+
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.core.tiered_cache import TieredCache
+
+
+class TestTieredCache:
+    """Test the TieredCache base class"""
+
+    @pytest.fixture
+    def cache(self):
+        return TieredCache("test", None, max_entries=2)
+
+    def test_local_tier_is_bounded_and_expires(self, cache):
+        """Test the least recently used entry is evicted and expired entries are not served"""
+        cache.set_local("a", 1, 60)
+        cache.set_local("b", 2, 60)
+        cache.get_local("a")
+        cache.set_local("c", 3, 0.05)
+
+        assert cache.get_local("b") is None
+        assert cache.get_local("a") == 1
+        time.sleep(0.1)
+        assert cache.get_local("c") is None
+        assert cache.get_stats()["evictions"] == 1
+
+    def test_drop_local_prefix(self, cache):
+        """Test entries are dropped by key prefix"""
+        cache.max_entries = 8
+        for key in ("u1:a", "u1:b", "u2:a"):
+            cache.set_local(key, key, 60)
+
+        cache.drop_local_prefix("u1:")
+
+        assert list(cache._local) == ["u2:a"]
+
+    def test_versions_are_counted_locally_without_redis(self, cache):
+        """Test versions advance in-process when there is no Redis tier"""
+        read = MagicMock()
+
+        assert cache.read_version("s1", read) == 0
+        assert cache.bump_version("s1", read) == 1
+        assert cache.read_version("s1", read) == 1
+        assert cache.read_version("s2", read) == 0
+        read.assert_not_called()
+
+    def test_redis_failures_skip_the_redis_tier(self):
+        """Test a failed version read returns None and failed reads and writes count as misses"""
+        redis_cache = MagicMock()
+        redis_cache.get.side_effect = ConnectionError("down")
+        redis_cache.set.side_effect = ConnectionError("down")
+        cache = TieredCache("test", redis_cache, max_entries=2)
+
+        def fail(_redis_cache):
+            raise ConnectionError("down")
+
+        assert cache.read_version("s1", fail) is None
+        assert cache.bump_version("s1", fail) is None
+        assert cache.get_redis("k") is None
+        cache.set_redis("k", 1, 60)
+        assert cache.get_stats()["redis_hits"] == 0
@@ -0,0 +1,131 @@
+# ABOUTME: Unit tests for audit trail queries over the activity log
+# ABOUTME: Tests keyset pagination, streamed CSV export, compliance report counts and partition scheduling
+
+import asyncio
+import csv
+import io
+import uuid
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session
+
+from app.crud.activity_log import encode_cursor, get_activity_logs
+from app.models.activity_log import ActivityLog, AuditChainCheckpoint, AuditChainHead
+from app.models.user import User
+from app.services.activity_log_partitions import ensure_activity_log_partitions, partition_months, partition_name
+from app.services.audit.audit_service import AuditEventType, AuditService
+from app.services.audit_log_writer import AuditLogWriter
+
+ORG_ID = uuid.uuid4()
+OTHER_ORG_ID = uuid.uuid4()
+STUDY_ID = uuid.uuid4()
+START = datetime(2026, 1, 1)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """In-memory database holding 30 logs: 25 in ORG_ID's study, every 5th in another org, some sharing a timestamp"""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    for model in (User, ActivityLog, AuditChainHead, AuditChainCheckpoint):
+        model.__table__.create(engine)
+
+    user = User(email="monitor@example.com", hashed_password="x", org_id=ORG_ID)
+    with Session(engine) as session:
+        session.add(user)
+        session.commit()
+        session.refresh(user)
+
+    writer = AuditLogWriter(session_factory=lambda: Session(engine), spill_path=tmp_path / "spill.jsonl")
+    for i in range(30):
+        other = i % 5 == 4
+        writer.record(
+            user.id,
+            "DELETE" if i % 10 == 0 else "UPDATE",
+            "study",
+            resource_id=str(i),
+            details={"n": i},
+            org_id=OTHER_ORG_ID if other else ORG_ID,
+            study_id=None if other else STUDY_ID,
+            timestamp=START + timedelta(days=i // 2),
+        )
+    writer.flush()
+    return engine
+
+
+def pages(session, limit, **filters):
+    """Walk every page with the cursor of the last log"""
+    result, cursor = [], None
+    while True:
+        page = get_activity_logs(session, limit=limit, cursor=cursor, **filters)
+        result.append([log.resource_id for log in page])
+        if len(page) < limit:
+            return result
+        cursor = encode_cursor(page[-1].timestamp, page[-1].id)
+
+
+class TestActivityLogQueries:
+    """Test the activity log queries behind the audit trail endpoints"""
+
+    def test_keyset_pages_match_offset(self, engine):
+        """Test cursor pages cover the logs exactly once, in the same order as one offset query"""
+        with Session(engine) as session:
+            everything = [log.resource_id for log in get_activity_logs(session, limit=100, org_id=ORG_ID)]
+            walked = pages(session, 7, org_id=ORG_ID)
+
+        assert len(everything) == 24
+        assert [len(page) for page in walked] == [7, 7, 7, 3]
+        assert sum(walked, []) == everything
+
+    def test_invalid_cursor(self, engine):
+        """Test a malformed cursor is refused"""
+        with Session(engine) as session, pytest.raises(ValueError):
+            get_activity_logs(session, cursor="not-a-cursor")
+
+    def test_csv_export_streams_in_batches(self, engine):
+        """Test the export yields one chunk per batch, oldest first, with user emails filled in"""
+        with Session(engine) as session:
+            chunks = list(AuditService(session).iter_compliance_csv(
+                START, START + timedelta(days=5), org_id=ORG_ID, batch_size=4
+            ))
+
+        rows = list(csv.DictReader(io.StringIO("".join(chunks))))
+        assert len(chunks) == 3
+        assert sorted(int(row["resource_id"]) for row in rows) == [0, 1, 2, 3, 5, 6, 7, 8, 10, 11]
+        assert [row["timestamp"] for row in rows] == sorted(row["timestamp"] for row in rows)
+        assert {row["user_email"] for row in rows} == {"monitor@example.com"}
+        assert {row["details"] for row in rows[:2]} == {'{"n": 0}', '{"n": 1}'}
+
+    def test_csv_export_empty_period(self, engine):
+        """Test an export with no records is just the header"""
+        with Session(engine) as session:
+            text = "".join(AuditService(session).iter_compliance_csv(START - timedelta(days=10), START - timedelta(days=1)))
+        assert text.splitlines() == [text.splitlines()[0]]
+        assert text.startswith("sequence_number,timestamp")
+
+    def test_compliance_report_counts(self, engine):
+        """Test report counts come from the records of the study and period"""
+        with Session(engine) as session:
+            service = AuditService(session)
+            report = asyncio.run(service.generate_compliance_report(str(STUDY_ID), START, START + timedelta(days=30)))
+            logins = asyncio.run(service.get_audit_trail(event_type=AuditEventType.LOGIN))
+
+        assert report["summary"] == {
+            "total_events": 24, "data_changes": 24, "permission_changes": 0, "exports": 0, "unique_users": 1
+        }
+        assert [event["resource_id"] for event in report["critical_events"]] == ["20", "10", "0"]
+        assert logins == []
+
+    def test_partition_months(self):
+        """Test partitions run from the current month over the year end and are named by month"""
+        months = partition_months(date(2026, 11, 20), months_ahead=3)
+
+        assert months == [date(2026, 11, 1), date(2026, 12, 1), date(2027, 1, 1), date(2027, 2, 1)]
+        assert partition_name(months[2]) == "activity_log_2027_01"
+
+    def test_partitions_skipped_without_postgres(self, engine):
+        """Test partition maintenance leaves an unpartitioned table alone"""
+        with Session(engine) as session:
+            assert ensure_activity_log_partitions(session) == []
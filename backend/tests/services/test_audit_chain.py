@@ -0,0 +1,121 @@
+# ABOUTME: Unit tests for the audit trail hash chain
+# ABOUTME: Tests gap-free numbering, chained checksums and checkpointed verification catching tampering
+
+import uuid
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session
+
+from app.models.activity_log import ActivityLog, AuditChainCheckpoint, AuditChainHead
+from app.services.audit_chain import GENESIS_CHECKSUM, AuditChainVerifier, record_checksum
+from app.services.audit_log_writer import AuditLogWriter
+
+USER_ID = uuid.uuid4()
+
+
+@pytest.fixture
+def engine():
+    """In-memory database with the activity_log and audit chain tables"""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    for model in (ActivityLog, AuditChainHead, AuditChainCheckpoint):
+        model.__table__.create(engine)
+    return engine
+
+
+@pytest.fixture
+def writer(engine, tmp_path):
+    return AuditLogWriter(session_factory=lambda: Session(engine), batch_size=3, spill_path=tmp_path / "spill.jsonl")
+
+
+@pytest.fixture
+def verifier(engine):
+    return AuditChainVerifier(session_factory=lambda: Session(engine), batch_size=4)
+
+
+def write(writer, count):
+    for i in range(count):
+        writer.record(USER_ID, "UPDATE", "study", resource_id=str(i), details={"n": i}, old_value={"n": i - 1})
+    writer.flush()
+
+
+def execute(engine, sql):
+    with engine.begin() as conn:
+        conn.execute(text(sql))
+
+
+class TestAuditChain:
+    """Test the audit chain written by the AuditLogWriter and checked by the AuditChainVerifier"""
+
+    def test_records_are_chained(self, engine, writer):
+        """Test each checksum covers the record and the checksum before it, and the head tracks the end"""
+        write(writer, 5)
+
+        with Session(engine) as session:
+            rows = session.execute(
+                ActivityLog.__table__.select().order_by(ActivityLog.sequence_number)
+            ).mappings().all()
+            head = session.get(AuditChainHead, 1)
+
+        assert [row["sequence_number"] for row in rows] == [1, 2, 3, 4, 5]
+        assert rows[0]["checksum"] == record_checksum(rows[0], GENESIS_CHECKSUM)
+        assert all(row["checksum"] == record_checksum(row, prev["checksum"]) for prev, row in zip(rows, rows[1:]))
+        assert (head.last_sequence, head.last_checksum) == (5, rows[-1]["checksum"])
+
+    def test_rejected_record_leaves_no_gap(self, engine, writer):
+        """Test numbers taken by a batch that rolled back are given back"""
+        write(writer, 1)
+        duplicate = writer.record(USER_ID, "UPDATE", "study")["id"]
+        writer.flush()
+        writer.record(USER_ID, "UPDATE", "study")
+        writer.record(USER_ID, "UPDATE", "study")
+        writer._queue[0]["id"] = duplicate
+
+        writer.flush()
+
+        with engine.connect() as conn:
+            numbers = conn.execute(text("SELECT sequence_number FROM activity_log ORDER BY 1")).scalars().all()
+        assert numbers == [1, 2, 3]
+
+    def test_verification_resumes_from_checkpoint(self, writer, verifier):
+        """Test each run only reads records written since the last one"""
+        write(writer, 6)
+
+        first = verifier.verify(max_rows=5)
+        write(writer, 4)
+        second = verifier.verify()
+
+        assert (first["status"], first["verified_sequence"], first["records_checked"]) == ("verified", 5, 5)
+        assert (second["status"], second["verified_sequence"], second["records_checked"]) == ("verified", 10, 5)
+        assert verifier.verify()["records_checked"] == 0
+
+    @pytest.mark.parametrize("tamper, broken_sequence, reason", [
+        ("UPDATE activity_log SET details = '{\"n\": 99}' WHERE sequence_number = 7", 7, "checksum"),
+        ("DELETE FROM activity_log WHERE sequence_number = 6", 7, "expected sequence 6"),
+        ("DELETE FROM activity_log WHERE sequence_number = 8", 8, "missing"),
+        ("UPDATE activity_log SET sequence_number = 3 WHERE sequence_number = 6", 3, "found 3"),
+    ])
+    def test_tampering_is_detected(self, engine, writer, verifier, tamper, broken_sequence, reason):
+        """Test changed, removed, truncated and renumbered records break the chain where they are"""
+        write(writer, 8)
+        verifier.verify(max_rows=3)
+
+        execute(engine, tamper)
+        result = verifier.verify()
+
+        assert result["status"] == "broken"
+        assert result["broken_sequence"] == broken_sequence
+        assert reason in result["broken_reason"]
+        assert verifier.verify()["status"] == "broken"
+
+    def test_changed_verified_record_detected(self, engine, writer, verifier):
+        """Test a checkpointed record whose checksum was rewritten stops the next run"""
+        write(writer, 4)
+        verifier.verify()
+
+        execute(engine, f"UPDATE activity_log SET checksum = '{'f' * 64}' WHERE sequence_number = 4")
+        write(writer, 1)
+
+        result = verifier.verify()
+        assert (result["status"], result["broken_sequence"]) == ("broken", 4)
@@ -0,0 +1,223 @@
+# ABOUTME: Unit tests for the batched audit log writer
+# ABOUTME: Tests sequence numbering, batched inserts, spilling to disk and replay when the database is unavailable
+
+import asyncio
+import json
+import threading
+import uuid
+from unittest.mock import MagicMock
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session
+
+from app.models.activity_log import ActivityLog, AuditChainCheckpoint, AuditChainHead
+from app.services.audit_log_writer import AuditLogWriter, _file_lock
+
+USER_ID = uuid.uuid4()
+
+
+@pytest.fixture
+def engine():
+    """In-memory database with the activity_log and audit chain tables"""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    for model in (ActivityLog, AuditChainHead, AuditChainCheckpoint):
+        model.__table__.create(engine)
+    return engine
+
+
+@pytest.fixture
+def spill_path(tmp_path):
+    return tmp_path / "audit" / "spill.jsonl"
+
+
+def written(engine):
+    """(sequence_number, resource_id) of every row, in sequence order"""
+    with engine.connect() as conn:
+        return [
+            tuple(row) for row in
+            conn.execute(text("SELECT sequence_number, resource_id FROM activity_log ORDER BY sequence_number"))
+        ]
+
+
+def record(writer, *names):
+    for name in names:
+        writer.record(USER_ID, "UPDATE", "study", resource_id=name, details={"at": uuid.uuid4()})
+
+
+def down():
+    session = MagicMock()
+    session.execute.side_effect = RuntimeError("db down")
+    return session
+
+
+class TestAuditLogWriter:
+    """Test the AuditLogWriter service"""
+
+    def test_record_does_not_touch_database(self, spill_path):
+        """Test recording only queues, and records the table can't hold are refused up front"""
+        factory = MagicMock()
+        writer = AuditLogWriter(session_factory=factory, capacity=10, spill_path=spill_path)
+
+        record(writer, "a", "b")
+        with pytest.raises(ValueError):
+            writer.record(USER_ID, "update_study", "study")
+        with pytest.raises(ValueError):
+            writer.record(None, "UPDATE", "study")
+
+        factory.assert_not_called()
+        assert writer.get_stats()["queued"] == 2
+
+    def test_flush_numbers_records_in_order(self, engine, spill_path):
+        """Test records are inserted in batches and numbered in the order they were recorded"""
+        sessions = []
+
+        def factory():
+            sessions.append(Session(engine))
+            return sessions[-1]
+
+        writer = AuditLogWriter(session_factory=factory, capacity=100, batch_size=4, spill_path=spill_path)
+        record(writer, *"abcdefghij")
+
+        assert writer.flush() == 10
+        assert written(engine) == [(i + 1, name) for i, name in enumerate("abcdefghij")]
+        assert len(sessions) == 3
+
+        record(writer, "k")
+        writer.flush()
+        assert written(engine)[-1] == (11, "k")
+
+    def test_full_queue_spills_to_disk(self, engine, spill_path):
+        """Test a full queue moves to the spill file instead of dropping records, keeping their order"""
+        writer = AuditLogWriter(session_factory=lambda: Session(engine), capacity=2, spill_path=spill_path)
+
+        record(writer, "a", "b", "c", "d")
+
+        stats = writer.get_stats()
+        assert stats["queued"] == 0
+        assert stats["awaiting_spill"] == 4
+        assert stats["spilling"]
+        assert not spill_path.exists()
+
+        writer._spill_overflow()
+        assert writer.get_stats()["spilled"] == 4
+        assert [json.loads(line)["resource_id"] for line in spill_path.read_text().splitlines()] == list("abcd")
+
+        assert writer.flush() == 4
+        record(writer, "e")
+        writer.flush()
+
+        assert written(engine) == [(1, "a"), (2, "b"), (3, "c"), (4, "d"), (5, "e")]
+        assert not spill_path.exists()
+        assert not writer.get_stats()["spilling"]
+
+    def test_database_outage_loses_nothing(self, engine, spill_path):
+        """Test records that can't be written wait on disk and are written first once the database is back"""
+        writer = AuditLogWriter(session_factory=down, capacity=100, batch_size=2, spill_path=spill_path)
+        record(writer, "a", "b", "c")
+
+        assert writer.flush() == 0
+        record(writer, "d")
+        assert writer.get_stats()["queued"] == 0
+        assert writer.get_stats()["failed_batches"] == 1
+
+        writer.session_factory = lambda: Session(engine)
+        record(writer, "e")
+
+        assert writer.flush() == 5
+        assert [name for _, name in written(engine)] == list("abcde")
+        assert writer.get_stats()["spill_bytes"] == 0
+
+    def test_replay_skips_written_records(self, engine, spill_path):
+        """Test a replay interrupted after a commit doesn't insert records twice"""
+        writer = AuditLogWriter(session_factory=lambda: Session(engine), capacity=100, spill_path=spill_path)
+        record(writer, "a")
+        already_written = writer._queue[0]
+        writer.flush()
+        record(writer, "b")
+        writer._append(writer.replay_path, [already_written, writer._queue.popleft()])
+
+        assert writer.flush() == 1
+        assert written(engine) == [(1, "a"), (2, "b")]
+
+    def test_rejected_record_set_aside(self, engine, spill_path):
+        """Test a record the database rejects is kept in the rejected file without holding up the rest"""
+        writer = AuditLogWriter(session_factory=lambda: Session(engine), capacity=100, spill_path=spill_path)
+        record(writer, "a")
+        duplicate = writer._queue[0]["id"]
+        writer.flush()
+        record(writer, "b", "c")
+        writer._queue[0]["id"] = duplicate
+
+        writer.flush()
+
+        assert [name for _, name in written(engine)] == ["a", "c"]
+        rejected = [json.loads(line) for line in writer.rejected_path.read_text().splitlines()]
+        assert [row["resource_id"] for row in rejected] == ["b"]
+        assert writer.get_stats()["rejected"] == 1
+
+    def test_spill_survives_restart(self, engine, spill_path):
+        """Test a new writer writes records a previous process left on disk before its own"""
+        previous = AuditLogWriter(session_factory=down, capacity=100, spill_path=spill_path)
+        previous.record(USER_ID, "LOGIN", "authentication")
+        previous.flush()
+
+        writer = AuditLogWriter(session_factory=lambda: Session(engine), capacity=100, spill_path=spill_path)
+        record(writer, "a")
+
+        assert writer.flush() == 2
+        assert [name for _, name in written(engine)] == [None, "a"]
+
+    def test_replay_waits_for_other_process(self, engine, spill_path):
+        """Test a writer sharing the spill files doesn't replay while another process holds the replay lock"""
+        previous = AuditLogWriter(session_factory=down, capacity=100, spill_path=spill_path)
+        record(previous, "a", "b")
+        previous.flush()
+        writer = AuditLogWriter(session_factory=lambda: Session(engine), capacity=100, spill_path=spill_path)
+        counts = []
+
+        with _file_lock(writer.replay_lock_path):
+            flusher = threading.Thread(target=lambda: counts.append(writer.flush()))
+            flusher.start()
+            flusher.join(timeout=0.2)
+            assert flusher.is_alive()
+            assert written(engine) == []
+        flusher.join()
+
+        assert counts == [2]
+        assert written(engine) == [(1, "a"), (2, "b")]
+        assert not writer.replay_path.exists()
+
+    def test_background_spill_thread(self, engine, spill_path):
+        """Test overflowing records reach the spill file from the spill thread, not from record()"""
+        writer = AuditLogWriter(session_factory=down, capacity=1, spill_path=spill_path)
+
+        async def run():
+            await writer.start(interval=60)
+            record(writer, "a", "b")
+            for _ in range(100):
+                await asyncio.sleep(0.01)
+                if spill_path.exists() and len(spill_path.read_text().splitlines()) == 2:
+                    break
+            spilled = [json.loads(line)["resource_id"] for line in spill_path.read_text().splitlines()]
+            await writer.stop()
+            return spilled
+
+        assert asyncio.run(run()) == ["a", "b"]
+
+    def test_background_task_flushes(self, engine, spill_path):
+        """Test the background task writes records and stop() flushes the rest"""
+        writer = AuditLogWriter(session_factory=lambda: Session(engine), capacity=100, spill_path=spill_path)
+
+        async def run():
+            await writer.start(interval=0.01)
+            record(writer, "a", "b")
+            await asyncio.sleep(0.1)
+            flushed = len(written(engine))
+            record(writer, "c")
+            await writer.stop()
+            return flushed
+
+        assert asyncio.run(run()) == 2
+        assert len(written(engine)) == 3
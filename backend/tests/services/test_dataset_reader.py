@@ -0,0 +1,129 @@
+# ABOUTME: Unit tests for the central dataset reader
+# ABOUTME: Tests column projection, row-group pruning, byte accounting and the KPI widget read path
+
+import asyncio
+import uuid
+from unittest.mock import MagicMock
+
+import pandas as pd
+import pytest
+
+from app.services.dataset_reader import DatasetReader, required_columns
+from app.services.filter_cache import CompiledFilterCache
+from app.services.filter_parser import FilterParser
+from app.services.widget_data_executor_real import RealWidgetExecutor
+
+
+class TestDatasetReader:
+    """Test the DatasetReader service"""
+
+    @pytest.fixture
+    def parquet_file(self, tmp_path):
+        """Sorted AGE column over four row groups so statistics can prune"""
+        path = tmp_path / "adsl.parquet"
+        pd.DataFrame({
+            "USUBJID": [f"{i:03d}" for i in range(8)],
+            "AGE": [20, 25, 30, 35, 40, 45, 60, 70],
+            "SEX": ["M", "F"] * 4,
+            "RACE": ["WHITE"] * 8,
+        }).to_parquet(path, row_group_size=2)
+        return path
+
+    @pytest.fixture
+    def reader(self):
+        return DatasetReader()
+
+    def compile(self, expression):
+        return CompiledFilterCache().get(FilterParser(), expression)
+
+    def test_projection_reads_only_requested_columns(self, reader, parquet_file):
+        """Test only the requested columns are returned and counted"""
+        read = reader.read(parquet_file, columns=["USUBJID"])
+
+        assert list(read.data.columns) == ["USUBJID"]
+        assert len(read.data) == 8
+        assert 0 < read.bytes_read < read.bytes_total / 2
+
+    def test_filter_prunes_row_groups(self, reader, parquet_file):
+        """Test row groups outside the filter's range aren't scanned"""
+        read = reader.read(parquet_file, columns=["USUBJID"], compiled=self.compile("AGE >= 60"))
+
+        assert list(read.data["USUBJID"]) == ["006", "007"]
+        assert read.row_groups_read == 1
+        assert read.row_groups_total == 4
+
+    def test_filter_columns_are_counted_but_not_returned(self, reader, parquet_file):
+        """Test the filter column is scanned without being projected"""
+        unfiltered = reader.read(parquet_file, columns=["USUBJID"])
+        filtered = reader.read(parquet_file, columns=["USUBJID"], compiled=self.compile("SEX = 'F'"))
+
+        assert list(filtered.data.columns) == ["USUBJID"]
+        assert filtered.bytes_read > unfiltered.bytes_read
+
+    def test_no_columns_counts_rows(self, reader, parquet_file):
+        """Test an empty projection still returns the row count"""
+        read = reader.read(parquet_file, columns=[], compiled=self.compile("AGE > 30"))
+
+        assert len(read.data) == 5
+        assert read.data.columns.empty
+
+    def test_missing_projection_columns_are_skipped(self, reader, parquet_file):
+        """Test unknown projected columns don't fail the read"""
+        read = reader.read(parquet_file, columns=["USUBJID", "MISSING"])
+
+        assert list(read.data.columns) == ["USUBJID"]
+
+    def test_duckdb_fallback(self, reader, parquet_file):
+        """Test filters Arrow can't evaluate are read through DuckDB"""
+        read = reader.read(parquet_file, columns=[], compiled=self.compile("AGE >= 44.5"))
+
+        assert read.engine == "duckdb"
+        assert len(read.data) == 3
+
+    def test_unknown_filter_column_is_rejected(self, reader, parquet_file):
+        """Test a filter on a missing column fails validation instead of reaching DuckDB"""
+        with pytest.raises(ValueError, match="Invalid filter expression: unknown column\\(s\\) MISSING"):
+            reader.read(parquet_file, columns=["USUBJID"], compiled=self.compile("MISSING = 1"))
+
+        frame = pd.read_parquet(parquet_file)
+        with pytest.raises(ValueError, match="MISSING"):
+            reader.filter_frame(frame, self.compile("AGE > 30 AND MISSING = 1"))
+
+    def test_required_columns(self):
+        """Test column sets are merged without duplicates or blanks"""
+        assert required_columns(["AGE"], None, ["SEX", "AGE", None]) == ["AGE", "SEX"]
+
+
+class TestKPIWidgetRead:
+    """Test RealWidgetExecutor reads only what a KPI needs"""
+
+    @pytest.fixture
+    def executor(self, tmp_path):
+        pd.DataFrame({
+            "USUBJID": ["001", "002", "003", "003"],
+            "AGE": [25, 45, 65, 65],
+            "AETERM": ["Headache"] * 4,
+        }).to_parquet(tmp_path / "ADSL.parquet")
+        study = MagicMock()
+        study.id = uuid.uuid4()
+        study.field_mappings = {"enrolled": "ADSL.USUBJID"}
+        study.field_mapping_filters = {"enrolled": {"expression": "AGE > 30"}}
+        executor = RealWidgetExecutor(MagicMock(), study, MagicMock())
+        executor.data_path = tmp_path
+        executor.filter_executor.metrics_writer = MagicMock()
+        return executor
+
+    def test_kpi_reads_value_and_filter_columns(self, executor):
+        """Test the KPI value is computed from a projected, filtered read"""
+        data = asyncio.run(executor._get_real_kpi_data({"id": "enrolled", "title": "Enrolled"}))
+
+        assert data["value"] == 2
+        assert 0 < executor.io_stats["bytes_read"] < executor.io_stats["bytes_total"]
+
+    def test_invalid_filter_falls_back_to_unfiltered_read(self, executor):
+        """Test a broken filter still yields a value, as before"""
+        executor.study.field_mapping_filters = {"enrolled": {"expression": "AGE >"}}
+
+        data = asyncio.run(executor._get_real_kpi_data({"id": "enrolled", "title": "Enrolled"}))
+
+        assert data["value"] == 3
@@ -0,0 +1,82 @@
+# ABOUTME: Unit tests for per-dataset statistics sidecars
+# ABOUTME: Tests sidecars written at conversion, data version checks, backfill, linking and approximate counts
+
+import os
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from app.services.dataset_statistics import (
+    get_statistics,
+    read_statistics,
+    statistics_path,
+    write_statistics,
+)
+from app.services.ingest_manifest import link_dataset
+from app.services.streaming_converter import StreamingParquetConverter
+from app.services.type_normalizer import TOP_K_CAPACITY, DatasetProfile
+
+
+class TestDatasetStatistics:
+    """Test the dataset statistics sidecar"""
+
+    def test_written_by_conversion(self, tmp_path):
+        """Test converting a file leaves its statistics beside the parquet output"""
+        csv = tmp_path / "dm.csv"
+        csv.write_text("USUBJID,ARM,AGE\n001,A,30\n002,B,70\n003,A,\n")
+        dest = tmp_path / "dm.parquet"
+
+        StreamingParquetConverter().convert_csv(csv, dest)
+
+        statistics = read_statistics(dest)
+        assert statistics["row_count"] == 3
+        assert statistics["columns"]["AGE"]["null_count"] == 1
+        assert statistics["columns"]["AGE"]["stats"]["max"] == 70
+        assert statistics["columns"]["ARM"]["top_values"][0] == {"value": "A", "count": 2}
+
+    def test_stale_statistics_ignored(self, tmp_path):
+        """Test a sidecar describing an older version of the data is not returned"""
+        dest = tmp_path / "dm.parquet"
+        pq.write_table(pa.table({"AGE": [1, 2]}), dest)
+        write_statistics(dest, DatasetProfile.of(pa.table({"AGE": [1, 2]})))
+
+        pq.write_table(pa.table({"AGE": [1, 2, 3]}), dest)
+
+        assert read_statistics(dest) is None
+        assert get_statistics(dest)["row_count"] == 3
+
+    def test_backfill(self, tmp_path):
+        """Test a dataset without a sidecar is profiled once and the sidecar saved"""
+        dest = tmp_path / "ae.parquet"
+        pq.write_table(pa.table({"AETERM": ["RASH", None, "RASH"]}), dest, row_group_size=1)
+
+        statistics = get_statistics(dest)
+
+        assert statistics_path(dest).exists()
+        assert statistics["columns"]["AETERM"]["unique_count"] == 1
+        assert read_statistics(dest) == statistics
+
+    def test_link_carries_sidecar(self, tmp_path):
+        """Test hard-linking a dataset brings its still-valid statistics with it"""
+        source = tmp_path / "dm.parquet"
+        pq.write_table(pa.table({"AGE": [1, 2]}), source)
+        get_statistics(source)
+
+        dest = link_dataset(source, tmp_path / "v2" / "dm.parquet")
+
+        assert os.path.samefile(statistics_path(source), statistics_path(dest))
+        assert read_statistics(dest)["row_count"] == 2
+
+    def test_approximate_distinct_and_top_values(self, tmp_path):
+        """Test high-cardinality columns get an estimated distinct count and approximate top values"""
+        n = TOP_K_CAPACITY * 20
+        values = [f"S{i}" for i in range(n)] + ["COMMON"] * 50
+        dest = tmp_path / "lb.parquet"
+        pq.write_table(pa.table({"ID": values}), dest)
+
+        column = get_statistics(dest)["columns"]["ID"]
+
+        assert column["unique_count_exact"] is False
+        assert abs(column["unique_count"] - (n + 1)) < n * 0.15
+        assert column["top_values_exact"] is False
+        assert column["top_values"][0] == {"value": "COMMON", "count": 50}
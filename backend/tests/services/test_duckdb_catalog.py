@@ -0,0 +1,166 @@
+# ABOUTME: Unit tests for the shared DuckDB connection pool and study catalog
+# ABOUTME: Tests view reuse across queries, rebuilds on new data and hit/miss metrics
+
+import os
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from app.services.duckdb_catalog import DuckDBConnectionPool
+
+
+class TestDuckDBConnectionPool:
+    """Test the DuckDBConnectionPool service"""
+
+    @pytest.fixture
+    def pool(self):
+        """Create a small pool"""
+        return DuckDBConnectionPool(pool_size=2, memory_limit="256MB", threads=1)
+
+    @pytest.fixture
+    def study_dir(self, tmp_path):
+        """Create a study directory with two datasets"""
+        pd.DataFrame({
+            'USUBJID': ['001', '002', '003'],
+            'AGE': [25, 45, 65],
+        }).to_parquet(tmp_path / "dm.parquet")
+        pd.DataFrame({
+            'USUBJID': ['001', '001', '003'],
+            'AESER': ['Y', 'N', 'Y'],
+        }).to_parquet(tmp_path / "ae.parquet")
+        return tmp_path
+
+    def test_catalog_registered_once(self, pool, study_dir):
+        """Test views are built on first use and reused afterwards"""
+        first = pool.get_catalog("study-1", study_dir)
+        second = pool.get_catalog("study-1", study_dir)
+
+        assert first is second
+        assert set(first.tables) == {"dm", "ae"}
+
+        stats = pool.get_stats()
+        assert stats["catalog_misses"] == 1
+        assert stats["catalog_hits"] == 1
+        assert stats["views_registered"] == 2
+
+    def test_query_through_study_schema(self, pool, study_dir):
+        """Test unqualified dataset names resolve inside the study schema"""
+        catalog = pool.get_catalog("study-1", study_dir)
+
+        with pool.connection(catalog.schema) as conn:
+            count = conn.execute("SELECT COUNT(*) FROM ae WHERE AESER = 'Y'").fetchone()[0]
+
+        assert count == 2
+
+    def test_studies_do_not_collide(self, pool, study_dir, tmp_path_factory):
+        """Test same dataset names in two studies stay separate"""
+        other_dir = tmp_path_factory.mktemp("other")
+        pd.DataFrame({'USUBJID': ['101'], 'AGE': [50]}).to_parquet(other_dir / "dm.parquet")
+
+        first = pool.get_catalog("study-1", study_dir)
+        second = pool.get_catalog("study-2", other_dir)
+
+        with pool.connection(first.schema) as conn:
+            assert conn.execute("SELECT COUNT(*) FROM dm").fetchone()[0] == 3
+        with pool.connection(second.schema) as conn:
+            assert conn.execute("SELECT COUNT(*) FROM dm").fetchone()[0] == 1
+
+    def test_rebuild_on_new_data(self, pool, study_dir):
+        """Test a changed directory triggers a rebuild"""
+        first = pool.get_catalog("study-1", study_dir)
+
+        pd.DataFrame({'USUBJID': ['001'], 'LBTEST': ['ALT']}).to_parquet(study_dir / "lb.parquet")
+        second = pool.get_catalog("study-1", study_dir)
+
+        assert second is not first
+        assert "lb" in second.tables
+        assert pool.get_stats()["catalog_rebuilds"] == 1
+
+    def test_rebuild_on_overwritten_file(self, pool, study_dir):
+        """Test an overwritten dataset is picked up"""
+        pool.get_catalog("study-1", study_dir)
+
+        dm_path = study_dir / "dm.parquet"
+        pd.DataFrame({'USUBJID': ['001'], 'AGE': [25]}).to_parquet(dm_path)
+        stat = dm_path.stat()
+        os.utime(dm_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+        catalog = pool.get_catalog("study-1", study_dir)
+        with pool.connection(catalog.schema) as conn:
+            assert conn.execute("SELECT COUNT(*) FROM dm").fetchone()[0] == 1
+
+    def test_rebuild_keeps_schema_in_use(self, study_dir):
+        """Test a rebuild while a connection on the old catalog is open leaves it queryable until closed"""
+        pool = DuckDBConnectionPool(pool_size=2, memory_limit="256MB", threads=1, drop_grace_seconds=0)
+        old = pool.get_catalog("study-1", study_dir)
+
+        with pool.connection(old.schema) as conn:
+            pd.DataFrame({'USUBJID': ['001'], 'LBTEST': ['ALT']}).to_parquet(study_dir / "lb.parquet")
+            new = pool.get_catalog("study-1", study_dir)
+            assert new.schema != old.schema
+            assert conn.execute("SELECT COUNT(*) FROM dm").fetchone()[0] == 3
+            assert pool.get_stats()["schemas_retired"] == 1
+
+        stats = pool.get_stats()
+        assert stats["schemas_retired"] == 0
+        assert stats["schemas_dropped"] == 1
+        with pool.connection() as conn:
+            schemas = {row[0] for row in conn.execute("SELECT schema_name FROM information_schema.schemata").fetchall()}
+        assert old.schema not in schemas and new.schema in schemas
+
+    def test_replaced_catalog_usable_during_grace(self, pool, study_dir):
+        """Test a caller holding the previous catalog can still open it after a rebuild"""
+        old = pool.get_catalog("study-1", study_dir)
+        pd.DataFrame({'USUBJID': ['001'], 'LBTEST': ['ALT']}).to_parquet(study_dir / "lb.parquet")
+        pool.get_catalog("study-1", study_dir)
+
+        with pool.connection(old.schema) as conn:
+            assert conn.execute("SELECT COUNT(*) FROM dm").fetchone()[0] == 3
+        assert pool.get_stats()["schemas_dropped"] == 0
+
+    def test_invalidate_study(self, pool, study_dir):
+        """Test explicit invalidation forces a rebuild"""
+        pool.get_catalog("study-1", study_dir)
+
+        assert pool.invalidate_study("study-1") is True
+        assert pool.invalidate_study("study-1") is False
+
+        pool.get_catalog("study-1", study_dir)
+        stats = pool.get_stats()
+        assert stats["catalog_misses"] == 2
+        assert stats["catalog_invalidations"] == 1
+
+    def test_missing_directory(self, pool, tmp_path):
+        """Test a missing directory returns no catalog"""
+        assert pool.get_catalog("study-1", tmp_path / "missing") is None
+
+    def test_pool_is_bounded(self, pool):
+        """Test connections are reused and callers wait when the pool is exhausted"""
+        release = threading.Event()
+        acquired = []
+
+        def hold():
+            with pool.connection() as conn:
+                acquired.append(conn)
+                release.wait(5)
+
+        holders = [threading.Thread(target=hold) for _ in range(2)]
+        for t in holders:
+            t.start()
+        while len(acquired) < 2:
+            time.sleep(0.01)
+
+        waiter = threading.Thread(target=hold)
+        waiter.start()
+        time.sleep(0.05)
+        assert len(acquired) == 2
+
+        release.set()
+        for t in holders + [waiter]:
+            t.join(5)
+
+        stats = pool.get_stats()
+        assert stats["connections_created"] == 2
+        assert stats["connection_waits"] == 1
@@ -0,0 +1,166 @@
+# ABOUTME: Unit tests for effective permission sets
+# ABOUTME: Tests scoped resolution in one query, cached permission checks and version-stamped invalidation
+
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import create_engine, event, update
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session
+
+from app.core.cache import CacheManager
+from app.models.rbac import Permission, Role, RolePermission, UserRole
+from app.models.user import User
+from app.services.rbac import effective_permissions
+from app.services.rbac.effective_permissions import (
+    ALL_PERMISSIONS,
+    EffectivePermissionCache,
+    resolve_effective_permissions,
+)
+from app.services.rbac.permission_service import PermissionService
+from tests.core.test_cache import FakeRedis
+
+NOW = datetime.now(timezone.utc)
+USER_ID = uuid.uuid4()
+ORG_ID = uuid.uuid4()
+STUDY_ID = uuid.uuid4()
+OTHER_STUDY_ID = uuid.uuid4()
+
+
+@pytest.fixture
+def engine():
+    """In-memory RBAC tables; counts the statements run against them"""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    for model in (User, Permission, Role, RolePermission, UserRole):
+        model.__table__.create(engine)
+    engine.queries = 0
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count(conn, cursor, statement, *args):
+        engine.queries += 1
+
+    return engine
+
+
+@pytest.fixture
+def roles(engine):
+    """viewer (dashboard.view), manager (team.manage) and system_admin roles"""
+    with Session(engine) as session:
+        ids, permissions = {}, {}
+        for role_name, permission_names in {
+            "viewer": ["dashboard.view"],
+            "manager": ["team.manage", "dashboard.view"],
+            "system_admin": [],
+        }.items():
+            role = Role(name=role_name, display_name=role_name, created_at=NOW, updated_at=NOW)
+            session.add(role)
+            for name in permission_names:
+                if name not in permissions:
+                    permissions[name] = Permission(name=name, resource=name.split(".")[0], action="x", created_at=NOW)
+                    session.add(permissions[name])
+                permission = permissions[name]
+                session.add(RolePermission(role_id=role.id, permission_id=permission.id, granted_at=NOW))
+            ids[role_name] = role.id
+        session.commit()
+    return ids
+
+
+def assign(engine, role_id, **scope):
+    with Session(engine) as session:
+        session.add(UserRole(user_id=USER_ID, role_id=role_id, assigned_by=USER_ID, assigned_at=NOW, **scope))
+        session.commit()
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    """Permission cache over an in-memory Redis, installed as the process-wide cache"""
+    with patch("app.core.cache.redis.Redis", return_value=FakeRedis()):
+        manager = CacheManager()
+    cache = EffectivePermissionCache(manager)
+    monkeypatch.setattr(effective_permissions, "_permission_cache", cache)
+    return cache
+
+
+class TestEffectivePermissions:
+    """Test resolve_effective_permissions and the EffectivePermissionCache"""
+
+    def test_scoped_resolution(self, engine, roles):
+        """Test roles apply in their own scope or unscoped, and expired ones not at all"""
+        assign(engine, roles["viewer"])
+        assign(engine, roles["manager"], study_id=STUDY_ID)
+        assign(engine, roles["manager"], study_id=OTHER_STUDY_ID, expires_at=NOW - timedelta(days=1))
+
+        with Session(engine) as session:
+            engine.queries = 0
+            in_study, expiry = resolve_effective_permissions(session, USER_ID, ORG_ID, STUDY_ID)
+            assert engine.queries == 1
+            elsewhere, _ = resolve_effective_permissions(session, USER_ID, ORG_ID, OTHER_STUDY_ID)
+
+        assert in_study == {"dashboard.view", "team.manage"}
+        assert expiry is None
+        assert elsewhere == {"dashboard.view"}
+
+    def test_system_admin_has_everything(self, engine, roles, cache):
+        """Test an active system_admin assignment grants all permissions in any scope"""
+        assign(engine, roles["system_admin"], study_id=OTHER_STUDY_ID)
+        user = User(id=USER_ID, email="a@example.com", hashed_password="x")
+
+        with Session(engine) as session:
+            permissions, _ = resolve_effective_permissions(session, USER_ID, ORG_ID, STUDY_ID)
+            allowed = PermissionService(session).check_permission(user, "study.delete", study_id=STUDY_ID)
+
+        assert permissions == {ALL_PERMISSIONS}
+        assert allowed is True
+
+    def test_checks_are_set_lookups(self, engine, roles, cache):
+        """Test after the first check, further checks in the scope run no queries"""
+        assign(engine, roles["manager"], study_id=STUDY_ID)
+        user = User(id=USER_ID, email="a@example.com", hashed_password="x")
+
+        with Session(engine) as session:
+            service = PermissionService(session)
+            engine.queries = 0
+            results = [
+                service.check_permission(user, name, study_id=STUDY_ID)
+                for name in ("team.manage", "dashboard.view", "study.delete", "team.manage")
+            ]
+
+        assert results == [True, True, False, True]
+        assert engine.queries == 1
+        assert cache.get_stats()["local_hits"] == 3
+
+    def test_role_change_retires_sets_everywhere(self, engine, roles, cache):
+        """Test invalidating a user or all roles is seen by other processes without waiting for a TTL"""
+        assign(engine, roles["viewer"])
+        other = EffectivePermissionCache(cache.redis_cache)
+
+        with Session(engine) as session:
+            assert other.get(session, USER_ID) == {"dashboard.view"}
+            assign(engine, roles["manager"])
+            cache.invalidate_user(USER_ID)
+            other._local.clear()
+            assert other.get(session, USER_ID) == {"dashboard.view", "team.manage"}
+
+            session.exec(update(RolePermission).where(RolePermission.role_id == roles["manager"]).values(is_active=False))
+            session.commit()
+            cache.invalidate_all()
+            other._local.clear()
+            assert other.get(session, USER_ID) == {"dashboard.view"}
+
+        assert other.get_stats()["misses"] == 3
+
+    def test_cached_set_expires_with_role(self, engine, roles, cache):
+        """Test a set from a role about to expire is not cached past the expiry"""
+        assign(engine, roles["manager"], expires_at=datetime.now(timezone.utc) + timedelta(seconds=5))
+
+        with Session(engine) as session:
+            permissions, expiry = resolve_effective_permissions(session, USER_ID)
+            cache.get(session, USER_ID)
+
+        assert permissions == {"team.manage", "dashboard.view"}
+        assert expiry is not None
+        expires, _ = cache._local[f"{USER_ID}::"]
+        assert expires - time.monotonic() <= 5.0 < cache.local_ttl
@@ -0,0 +1,125 @@
+# ABOUTME: Unit tests for the compiled filter cache
+# ABOUTME: Tests LRU bounds, per-schema Arrow compilation and sharing across executors
+
+from unittest.mock import MagicMock, patch
+
+import pandas as pd
+import pyarrow.dataset as ds
+import pytest
+
+from app.services.advanced_filter_executor import AdvancedFilterExecutor
+from app.services.filter_cache import CompiledFilterCache
+from app.services.filter_compiler import FilterCompileError
+from app.services.filter_executor import FilterExecutor
+from app.services.filter_parser import FilterParser
+
+
+class TestCompiledFilterCache:
+    """Test the CompiledFilterCache service"""
+
+    @pytest.fixture
+    def cache(self):
+        """Create a small cache"""
+        return CompiledFilterCache(max_entries=2)
+
+    def test_expression_parsed_once(self, cache):
+        """Test repeated lookups reuse the parsed filter"""
+        parser = FilterParser()
+
+        with patch.object(parser, "parse", wraps=parser.parse) as parse:
+            first = cache.get(parser, "AGE >= 18")
+            second = cache.get(parser, "AGE >= 18")
+
+        assert first is second
+        assert parse.call_count == 1
+        assert first.columns == ["AGE"]
+        stats = cache.get_stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["hit_rate"] == 50.0
+
+    def test_lru_is_bounded(self, cache):
+        """Test the least recently used filter is evicted"""
+        parser = FilterParser()
+        cache.get(parser, "A = 1")
+        cache.get(parser, "B = 1")
+        cache.get(parser, "A = 1")
+        cache.get(parser, "C = 1")
+
+        assert [expr for _, expr in cache._entries] == ["A = 1", "C = 1"]
+        assert cache.get_stats()["evictions"] == 1
+
+    def test_invalid_expressions_are_cached(self, cache):
+        """Test parse errors are remembered rather than re-parsed"""
+        entry = cache.get(FilterParser(), "AGE >=")
+
+        assert not entry.is_valid
+        assert entry.error
+        assert cache.get(FilterParser(), "AGE >=") is entry
+
+    def test_arrow_expression_cached_per_schema(self, cache, tmp_path):
+        """Test the Arrow expression is compiled once per dataset schema"""
+        int_path, float_path = tmp_path / "int.parquet", tmp_path / "float.parquet"
+        pd.DataFrame({"AGE": [10, 20]}).to_parquet(int_path)
+        pd.DataFrame({"AGE": [10.5, 20.5]}).to_parquet(float_path)
+        int_schema = ds.dataset(str(int_path)).schema
+        float_schema = ds.dataset(str(float_path)).schema
+        compiler = MagicMock()
+        entry = cache.get(FilterParser(), "AGE >= 15")
+
+        entry.to_arrow(compiler, int_schema)
+        entry.to_arrow(compiler, int_schema)
+        entry.to_arrow(compiler, float_schema)
+
+        assert compiler.to_arrow.call_count == 2
+
+    def test_compile_errors_are_cached(self, cache, tmp_path):
+        """Test a filter Arrow can't evaluate isn't recompiled every scan"""
+        path = tmp_path / "int.parquet"
+        pd.DataFrame({"AGE": [10, 20]}).to_parquet(path)
+        schema = ds.dataset(str(path)).schema
+        compiler = MagicMock()
+        compiler.to_arrow.side_effect = FilterCompileError("cannot cast")
+        entry = cache.get(FilterParser(), "AGE >= 15.5")
+
+        for _ in range(2):
+            with pytest.raises(FilterCompileError):
+                entry.to_arrow(compiler, schema)
+
+        assert compiler.to_arrow.call_count == 1
+
+
+class TestExecutorsShareCache:
+    """Test the executors use one process-wide cache"""
+
+    @pytest.fixture
+    def cache(self):
+        """Patch in a fresh cache"""
+        cache = CompiledFilterCache(max_entries=16)
+        with patch("app.services.filter_executor.get_filter_cache", return_value=cache):
+            yield cache
+
+    @pytest.fixture
+    def parquet_file(self, tmp_path):
+        path = tmp_path / "dm.parquet"
+        pd.DataFrame({"USUBJID": ["001", "002", "003"], "AGE": [25, 45, 65]}).to_parquet(path)
+        return path
+
+    def test_repeat_executions_hit_cache(self, cache, parquet_file):
+        """Test every refresh after the first skips parsing"""
+        executor = FilterExecutor(MagicMock())
+
+        for _ in range(3):
+            result = executor.execute_filter("s", "w", "AGE > 30", parquet_file, track_metrics=False)
+
+        assert result["row_count"] == 2
+        assert executor.get_cache_metrics()["hits"] == 2
+
+    def test_parsers_do_not_share_entries(self, cache, parquet_file):
+        """Test the advanced executor doesn't reuse the base parser's AST"""
+        FilterExecutor(MagicMock()).execute_filter("s", "w", "AGE > 30", parquet_file, track_metrics=False)
+        AdvancedFilterExecutor(MagicMock()).execute_filter("s", "w", "AGE > 30", parquet_file, track_metrics=False)
+
+        stats = cache.get_stats()
+        assert stats["entries"] == 2
+        assert stats["misses"] == 2
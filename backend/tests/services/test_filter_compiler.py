@@ -0,0 +1,157 @@
+# ABOUTME: Unit tests for the filter compiler
+# ABOUTME: Tests Arrow and DuckDB compilation agree and filters run inside the Parquet scan
+
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+import duckdb
+import pandas as pd
+import pyarrow.dataset as ds
+import pytest
+
+from app.services.advanced_filter_executor import AdvancedFilterExecutor
+from app.services.filter_compiler import FilterCompiler, FilterCompileError
+from app.services.filter_executor import FilterExecutor
+from app.services.filter_parser import FilterParser
+
+
+EXPRESSIONS = [
+    ("AGE >= 45", {"002", "003", "005"}),
+    ("18 < AGE", {"001", "002", "003", "004", "005"}),
+    ("AESER != 'Y'", {"002", "004"}),
+    ("(AESER = 'Y' AND AGE >= 65) OR COUNTRY = 'CANADA'", {"003", "004", "005"}),
+    ("COUNTRY IN ('USA', 'UK')", {"001", "002", "003", "005"}),
+    ("AETERM NOT IN ('Headache')", {"003", "004"}),
+    ("AGE BETWEEN 30 AND 65", {"002", "003", "004"}),
+    ("AETERM LIKE '%ache%'", {"001", "005"}),
+    ("AETERM NOT LIKE 'H%'", {"003", "004"}),
+    ("AETERM IS NULL", {"002"}),
+    ("AETERM IS NOT NULL", {"001", "003", "004", "005"}),
+    ("NOT (AESER = 'Y' OR COUNTRY = 'UK')", {"004"}),
+    ("AGE = 45.0", {"002"}),
+]
+
+
+class TestFilterCompiler:
+    """Test the FilterCompiler service"""
+
+    @pytest.fixture
+    def parquet_file(self, tmp_path):
+        """Create a Parquet file with nulls and several row groups"""
+        path = tmp_path / "ae.parquet"
+        pd.DataFrame({
+            'USUBJID': ['001', '002', '003', '004', '005'],
+            'AGE': [25, 45, 65, 30, 70],
+            'AESER': ['Y', 'N', 'Y', 'N', 'Y'],
+            'AETERM': ['Headache', None, 'Nausea', 'Dizziness', 'Headache'],
+            'COUNTRY': ['USA', 'UK', 'USA', 'CANADA', 'UK'],
+        }).to_parquet(path, row_group_size=2)
+        return path
+
+    @pytest.fixture
+    def compiler(self):
+        return FilterCompiler()
+
+    @pytest.mark.parametrize("expression,expected", EXPRESSIONS)
+    def test_arrow_matches_sql_semantics(self, compiler, parquet_file, expression, expected):
+        """Test the Arrow expression selects the rows a SQL engine would"""
+        ast = FilterParser().parse(expression)["ast"]
+        dataset = ds.dataset(str(parquet_file), format="parquet")
+
+        table = dataset.to_table(filter=compiler.to_arrow(ast, dataset.schema))
+
+        assert set(table.column("USUBJID").to_pylist()) == expected
+
+    @pytest.mark.parametrize("expression,expected", EXPRESSIONS)
+    def test_sql_matches_duckdb(self, compiler, parquet_file, expression, expected):
+        """Test the compiled SQL runs in DuckDB with the same result"""
+        ast = FilterParser().parse(expression)["ast"]
+
+        rows = duckdb.connect().execute(
+            f"SELECT USUBJID FROM read_parquet('{parquet_file}') WHERE {compiler.to_sql(ast)}"
+        ).fetchall()
+
+        assert {r[0] for r in rows} == expected
+
+    def test_literal_cast_to_column_type(self, compiler, parquet_file):
+        """Test literals are cast to the column type for statistics pruning"""
+        ast = FilterParser().parse("AGE >= 45.5")["ast"]
+        schema = ds.dataset(str(parquet_file), format="parquet").schema
+
+        with pytest.raises(FilterCompileError):
+            compiler.to_arrow(ast, schema)
+
+    def test_unknown_column(self, compiler, parquet_file):
+        """Test unknown columns are reported at compile time"""
+        ast = FilterParser().parse("MISSING = 1")["ast"]
+        schema = ds.dataset(str(parquet_file), format="parquet").schema
+
+        with pytest.raises(FilterCompileError, match="MISSING"):
+            compiler.to_arrow(ast, schema)
+
+    def test_sql_literal_escaping(self, compiler):
+        """Test quotes in literals and identifiers are escaped"""
+        assert compiler.sql_literal("O'Brien") == "'O''Brien'"
+        assert compiler.sql_literal(None) == "NULL"
+        assert compiler.quote_identifier('A"B') == '"A""B"'
+
+
+class TestFilterPushdown:
+    """Test FilterExecutor filters inside the scan"""
+
+    @pytest.fixture
+    def parquet_file(self, tmp_path):
+        path = tmp_path / "dm.parquet"
+        pd.DataFrame({
+            'USUBJID': ['001', '002', '003', '004'],
+            'AGE': [25, 45, 65, 70],
+            'RFSTDTC': pd.to_datetime([
+                datetime.now() - timedelta(days=3),
+                datetime.now() - timedelta(days=40),
+                datetime.now() - timedelta(days=1),
+                datetime.now() - timedelta(days=400),
+            ]),
+            'RFSTDT_TEXT': [
+                (datetime.now() - timedelta(days=d)).strftime("%Y-%m-%d") for d in (3, 40, 1, 400)
+            ],
+        }).to_parquet(path)
+        return path
+
+    def test_never_reads_full_dataframe(self, parquet_file):
+        """Test execute_filter doesn't materialize unfiltered rows in pandas"""
+        executor = FilterExecutor(MagicMock())
+
+        with patch("app.services.filter_executor.pd.read_parquet") as reader:
+            result = executor.execute_filter("s", "w", "AGE >= 45", parquet_file, track_metrics=False)
+
+        reader.assert_not_called()
+        assert result["row_count"] == 3
+        assert result["original_count"] == 4
+
+    def test_uncastable_literal_falls_back_to_duckdb(self, parquet_file):
+        """Test filters Arrow can't evaluate still run inside a scan"""
+        executor = FilterExecutor(MagicMock())
+
+        result = executor.execute_filter("s", "w", "AGE >= 45.5", parquet_file, track_metrics=False)
+
+        assert result["row_count"] == 2
+
+    def test_filter_columns_not_required_in_projection(self, parquet_file):
+        """Test only the requested columns are returned"""
+        executor = FilterExecutor(MagicMock())
+
+        result = executor.execute_filter("s", "w", "AGE >= 45", parquet_file, columns=["USUBJID"], track_metrics=False)
+
+        assert list(result["data"].columns) == ["USUBJID"]
+        assert result["row_count"] == 3
+
+    @pytest.mark.parametrize("column", ["RFSTDTC", "RFSTDT_TEXT"])
+    def test_advanced_date_range_pushdown(self, parquet_file, column):
+        """Test relative date ranges run in the scan for timestamp and text dates"""
+        executor = AdvancedFilterExecutor(MagicMock())
+
+        result = executor.execute_filter(
+            "s", "w", f"{column} = 'last 30 days' AND AGE > 20", parquet_file, track_metrics=False
+        )
+
+        assert set(result["data"]["USUBJID"]) == {"001", "003"}
@@ -0,0 +1,106 @@
+# ABOUTME: Unit tests for the buffered filter metrics writer
+# ABOUTME: Tests ring buffer bounds, batched inserts and the background flush task
+
+import asyncio
+from unittest.mock import MagicMock
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session
+
+from app.services.filter_metrics_writer import FilterMetricsWriter
+
+
+@pytest.fixture
+def engine():
+    """In-memory database with the filter_metrics table"""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE filter_metrics (
+                id TEXT PRIMARY KEY, study_id TEXT, widget_id TEXT, filter_expression TEXT,
+                execution_time_ms INTEGER, rows_before INTEGER, rows_after INTEGER,
+                reduction_percentage FLOAT, executed_at DATETIME
+            )
+        """))
+    return engine
+
+
+def count_rows(engine):
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT COUNT(*) FROM filter_metrics")).scalar()
+
+
+def record(writer, n=1):
+    for i in range(n):
+        writer.record("study", f"w{i}", "AGE > 30", 12.6, rows_before=100, rows_after=25)
+
+
+class TestFilterMetricsWriter:
+    """Test the FilterMetricsWriter service"""
+
+    def test_record_does_not_touch_database(self):
+        """Test recording only appends to the buffer"""
+        factory = MagicMock()
+        writer = FilterMetricsWriter(session_factory=factory, capacity=10)
+
+        record(writer, 3)
+
+        factory.assert_not_called()
+        assert writer.get_stats()["buffered"] == 3
+
+    def test_flush_writes_in_batches(self, engine):
+        """Test buffered rows are inserted one batch per statement"""
+        sessions = []
+
+        def factory():
+            sessions.append(Session(engine))
+            return sessions[-1]
+
+        writer = FilterMetricsWriter(session_factory=factory, capacity=100, batch_size=4)
+        record(writer, 10)
+
+        assert writer.flush() == 10
+        assert count_rows(engine) == 10
+        assert len(sessions) == 3
+        with engine.connect() as conn:
+            row = conn.execute(text("SELECT execution_time_ms, reduction_percentage FROM filter_metrics LIMIT 1")).one()
+        assert tuple(row) == (13, 75.0)
+        assert writer.get_stats()["buffered"] == 0
+
+    def test_ring_buffer_drops_oldest(self):
+        """Test a full buffer keeps the newest rows instead of blocking"""
+        writer = FilterMetricsWriter(session_factory=MagicMock(), capacity=3)
+
+        record(writer, 5)
+
+        assert [row["widget_id"] for row in writer._buffer] == ["w2", "w3", "w4"]
+        assert writer.get_stats()["dropped"] == 2
+
+    def test_failed_write_is_counted(self):
+        """Test database errors are logged and don't propagate"""
+        session = MagicMock()
+        session.execute.side_effect = RuntimeError("db down")
+        writer = FilterMetricsWriter(session_factory=lambda: session, capacity=10)
+        record(writer, 2)
+
+        assert writer.flush() == 0
+        session.rollback.assert_called_once()
+        assert writer.get_stats()["failed"] == 2
+
+    def test_background_task_flushes(self, engine):
+        """Test the background task writes rows and stop() flushes the rest"""
+        writer = FilterMetricsWriter(session_factory=lambda: Session(engine), capacity=100)
+
+        async def run():
+            await writer.start(interval=0.01)
+            record(writer, 2)
+            await asyncio.sleep(0.1)
+            flushed = count_rows(engine)
+            record(writer, 1)
+            await writer.stop()
+            return flushed
+
+        assert asyncio.run(run()) == 2
+        assert count_rows(engine) == 3
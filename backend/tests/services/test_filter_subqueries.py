@@ -0,0 +1,100 @@
+# ABOUTME: Unit tests for subquery filters in AdvancedFilterExecutor
+# ABOUTME: Tests semi/anti-joins run in the scan and the versioned subquery cache
+
+import os
+from unittest.mock import MagicMock, patch
+
+import duckdb
+import pandas as pd
+import pytest
+
+from app.services.advanced_filter_executor import (
+    AdvancedFilterCompiler, AdvancedFilterExecutor, SubqueryResolver, SubqueryResultCache
+)
+
+
+class TestSubqueryFilters:
+    """Test subqueries are evaluated as joins inside the scan"""
+
+    @pytest.fixture
+    def datasets(self, tmp_path):
+        """ADSL and ADAE side by side, as they are stored for a study"""
+        pd.DataFrame({
+            "USUBJID": ["001", "002", "003", "004", None],
+            "AGE": [25, 45, 65, 70, 50],
+        }).to_parquet(tmp_path / "adsl.parquet")
+        pd.DataFrame({
+            "USUBJID": ["001", "001", "003", None],
+            "AESER": ["Y", "N", "Y", "Y"],
+            "AETERM": ["Headache", "Nausea", "Rash", "Fever"],
+        }).to_parquet(tmp_path / "adae.parquet")
+        return tmp_path
+
+    @pytest.fixture
+    def executor(self):
+        """Executor with a fresh subquery cache"""
+        executor = AdvancedFilterExecutor(MagicMock())
+        executor.subquery_cache = SubqueryResultCache(max_entries=8)
+        return executor
+
+    def run(self, executor, datasets, expression):
+        result = executor.execute_filter("s", "w", expression, datasets / "adsl.parquet", track_metrics=False)
+        return set(result["data"]["USUBJID"].dropna())
+
+    def test_in_subquery(self, executor, datasets):
+        """Test IN keeps rows with a match in the other dataset"""
+        with patch("pandas.read_parquet") as reader:
+            subjects = self.run(executor, datasets, "USUBJID IN (SELECT USUBJID FROM ADAE WHERE AESER = 'Y') AND AGE > 20")
+
+        reader.assert_not_called()
+        assert subjects == {"001", "003"}
+
+    def test_not_in_subquery_with_null_matches_nothing(self, executor, datasets):
+        """Test NOT IN follows SQL semantics when the subquery returns NULL"""
+        assert self.run(executor, datasets, "USUBJID NOT IN (SELECT USUBJID FROM ADAE WHERE AESER = 'Y')") == set()
+
+    def test_not_in_subquery(self, executor, datasets):
+        """Test NOT IN is an anti-join"""
+        subjects = self.run(executor, datasets, "USUBJID NOT IN (SELECT USUBJID FROM ADAE WHERE AETERM = 'Nausea')")
+
+        assert subjects == {"002", "003", "004"}
+
+    def test_sql_fallback_matches_arrow(self, executor, datasets):
+        """Test the DuckDB semi-join selects the same rows"""
+        expression = "USUBJID IN (SELECT USUBJID FROM ADAE WHERE AESER = 'Y') AND AGE > 20"
+        ast = executor.parse_filter(expression).ast
+        compiler = AdvancedFilterCompiler(SubqueryResolver(executor, datasets))
+
+        rows = duckdb.connect().execute(
+            f"SELECT USUBJID FROM read_parquet('{datasets / 'adsl.parquet'}') WHERE {compiler.to_sql(ast)}"
+        ).fetchall()
+
+        assert {r[0] for r in rows} == {"001", "003"}
+
+    def test_results_cached_until_dataset_changes(self, executor, datasets):
+        """Test repeated filters reuse the key set and a new file version misses"""
+        expression = "USUBJID IN (SELECT USUBJID FROM ADAE WHERE AESER = 'Y')"
+        self.run(executor, datasets, expression)
+        self.run(executor, datasets, expression)
+        assert executor.subquery_cache.get_stats()["hits"] == 1
+
+        path = datasets / "adae.parquet"
+        pd.DataFrame({"USUBJID": ["004"], "AESER": ["Y"], "AETERM": ["Rash"]}).to_parquet(path)
+        stat = path.stat()
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+        assert self.run(executor, datasets, expression) == {"004"}
+        assert executor.subquery_cache.get_stats()["misses"] == 2
+
+    def test_missing_dataset_selects_nothing(self, executor, datasets):
+        """Test a subquery over a missing dataset matches no rows"""
+        assert self.run(executor, datasets, "USUBJID IN (SELECT USUBJID FROM ADCM)") == set()
+
+    def test_cache_is_bounded(self):
+        """Test the least recently used key set is evicted"""
+        cache = SubqueryResultCache(max_entries=1)
+        cache.get_or_load(("a",), lambda: [1])
+        cache.get_or_load(("b",), lambda: [2])
+
+        assert cache.get_stats()["entries"] == 1
+        assert cache.get_stats()["evictions"] == 1
@@ -0,0 +1,143 @@
+# ABOUTME: Unit tests for content-hash incremental ingestion
+# ABOUTME: Tests the per-study manifest and that unchanged datasets are linked instead of converted
+
+import asyncio
+import multiprocessing
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from unittest.mock import patch
+
+import pytest
+
+from app.services import zip_ingestion
+from app.services.file_conversion_service import FileConversionService
+from app.services.ingest_manifest import IngestManifest, file_sha256, link_dataset
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    return IngestManifest(tmp_path / "study" / "ingest_manifest.json")
+
+
+def same_file(a, b):
+    return os.stat(a).st_ino == os.stat(b).st_ino
+
+
+class TestIngestManifest:
+    """Test the IngestManifest service"""
+
+    def test_entries_survive_reload(self, manifest, tmp_path):
+        """Test saved entries are found by a new manifest for the same study"""
+        parquet = tmp_path / "dm.parquet"
+        parquet.write_bytes(b"data")
+        manifest.record("abc", "upload", parquet, rows=2)
+
+        assert manifest.save()
+        entry = IngestManifest(manifest.path).lookup("abc", "upload")
+
+        assert entry["rows"] == 2
+        assert IngestManifest(manifest.path).lookup("abc", "study") is None
+
+    def test_deleted_parquet_is_a_miss(self, manifest, tmp_path):
+        """Test an entry whose output was removed isn't reused"""
+        manifest.record("abc", "upload", tmp_path / "gone.parquet")
+
+        assert manifest.lookup("abc", "upload") is None
+        assert manifest.known("upload") == {}
+
+    def test_corrupt_manifest_starts_empty(self, tmp_path):
+        """Test an unreadable manifest is ignored rather than failing the upload"""
+        path = tmp_path / "ingest_manifest.json"
+        path.write_text("{not json")
+
+        assert len(IngestManifest(path)) == 0
+
+    def test_link_dataset_hard_links(self, tmp_path):
+        """Test reused datasets share the original file"""
+        source = tmp_path / "v1" / "dm.parquet"
+        source.parent.mkdir()
+        source.write_bytes(b"data")
+
+        dest = link_dataset(source, tmp_path / "v2" / "dm.parquet")
+
+        assert same_file(source, dest)
+        assert file_sha256(dest) == file_sha256(source)
+
+
+class TestIncrementalUpload:
+    """Test FileConversionService reuses unchanged datasets"""
+
+    def upload(self, tmp_path, manifest, name, source, file_format):
+        output = tmp_path / name
+        output.mkdir()
+        return asyncio.run(FileConversionService().process_upload(name, str(source), str(output), file_format, manifest))
+
+    def test_unchanged_file_is_linked(self, manifest, tmp_path):
+        """Test a re-uploaded file is not converted a second time"""
+        source = tmp_path / "dm.csv"
+        source.write_text("usubjid,age\n001,30\n")
+
+        first = self.upload(tmp_path, manifest, "v1", source, "csv")
+        with patch.object(FileConversionService, "_convert_file") as convert:
+            second = self.upload(tmp_path, manifest, "v2", source, "csv")
+
+        convert.assert_not_called()
+        assert (first.datasets_converted, first.datasets_reused) == (1, 0)
+        assert (second.datasets_converted, second.datasets_reused) == (0, 1)
+        assert second.files_extracted[0]["column_info"] == first.files_extracted[0]["column_info"]
+        assert same_file(tmp_path / "v1" / "dm.parquet", tmp_path / "v2" / "dm.parquet")
+
+    def test_changed_file_is_converted(self, manifest, tmp_path):
+        """Test new content gets its own parquet file"""
+        source = tmp_path / "dm.csv"
+        source.write_text("usubjid,age\n001,30\n")
+        self.upload(tmp_path, manifest, "v1", source, "csv")
+        source.write_text("usubjid,age\n001,30\n002,41\n")
+
+        second = self.upload(tmp_path, manifest, "v2", source, "csv")
+
+        assert second.datasets_converted == 1
+        assert second.total_rows == 2
+        assert not same_file(tmp_path / "v1" / "dm.parquet", tmp_path / "v2" / "dm.parquet")
+
+    def test_zip_reuses_unchanged_members(self, manifest, tmp_path, monkeypatch):
+        """Test only the changed domain in a new transfer is converted"""
+        pool = ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context("spawn"))
+        monkeypatch.setattr(zip_ingestion, "_ingest_pool", pool)
+
+        def transfer(name, ae_rows):
+            path = tmp_path / f"{name}.zip"
+            with zipfile.ZipFile(path, "w") as archive:
+                archive.writestr("dm.csv", "usubjid,age\n001,30\n")
+                archive.writestr("ae.csv", "usubjid,aeterm\n" + "001,Rash\n" * ae_rows)
+            return path
+
+        try:
+            self.upload(tmp_path, manifest, "m1", transfer("m1", 1), "zip")
+            second = self.upload(tmp_path, manifest, "m2", transfer("m2", 2), "zip")
+        finally:
+            pool.shutdown()
+
+        assert (second.datasets_converted, second.datasets_reused) == (1, 1)
+        assert {f["dataset_name"]: f["reused"] for f in second.files_extracted} == {"dm": True, "ae": False}
+        assert same_file(tmp_path / "m1" / "dm.parquet", tmp_path / "m2" / "dm.parquet")
+
+    def test_study_conversion_reuses_parquet_and_schema(self, manifest, tmp_path):
+        """Test convert_study_files links unchanged files and skips schema extraction"""
+        def extract(name):
+            folder = tmp_path / name
+            folder.mkdir()
+            (folder / "dm.csv").write_text("usubjid,age\n001,30\n")
+            return [{"name": "dm.csv", "path": str(folder / "dm.csv")}]
+
+        service = FileConversionService()
+        first = asyncio.run(service.convert_study_files("org", "study", extract("t1"), manifest=manifest))
+        with patch.object(FileConversionService, "_schema_info_v2") as schema:
+            second = asyncio.run(service.convert_study_files("org", "study", extract("t2"), manifest=manifest))
+
+        schema.assert_not_called()
+        assert second["summary"]["datasets_reused"] == 1
+        assert second["datasets"]["dm"]["columns"] == first["datasets"]["dm"]["columns"]
+        assert second["datasets"]["dm"]["file_path"] == str(tmp_path / "t2" / "dm.parquet")
+        assert IngestManifest(manifest.path).lookup(file_sha256(tmp_path / "t1" / "dm.csv"), "study")
@@ -0,0 +1,33 @@
+# ABOUTME: Unit tests for the shared JSON state file base
+# ABOUTME: Tests round trips per section and that failed saves are reported without leaving temp files
+
+import json
+
+from app.services.json_state import JsonStateFile
+from app.services.pipeline_scheduler import PipelineRunState
+
+
+class TestJsonStateFile:
+    """Test the JsonStateFile base class"""
+
+    def test_entries_saved_under_section(self, tmp_path):
+        """Test a subclass's entries are saved under its own section and reload"""
+        path = tmp_path / "study" / "pipeline_state.json"
+        state = PipelineRunState(path)
+        state.record("adsl", "fp", [], 3)
+
+        assert state.save()
+        assert list(json.loads(path.read_text())["pipelines"]) == ["adsl"]
+        assert len(PipelineRunState(path)) == 1
+        assert [p.name for p in path.parent.iterdir()] == ["pipeline_state.json"]
+
+    def test_failed_save_returns_false(self, tmp_path):
+        """Test an unwritable location is reported and leaves no temporary file behind"""
+        blocker = tmp_path / "blocker"
+        blocker.write_text("")
+        state = JsonStateFile(tmp_path / "state.json")
+        state._entries["k"] = {"v": 1}
+        state.path = blocker / "state.json"
+
+        assert state.save() is False
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["blocker"]
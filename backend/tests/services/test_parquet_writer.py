@@ -0,0 +1,97 @@
+# ABOUTME: Unit tests for the shared Parquet write profile
+# ABOUTME: Tests per-domain sort keys, dictionary selection, index/bloom metadata and the streaming converter's sort pass
+
+import os
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from app.services.parquet_writer import ParquetWriteProfile
+from app.services.streaming_converter import StreamingParquetConverter
+
+
+@pytest.fixture
+def profile():
+    return ParquetWriteProfile(row_group_size=1000)
+
+
+@pytest.fixture
+def adlb():
+    """BDS rows in collection order: subject, then parameter"""
+    rows = [(f"S{s:03d}", param, float(s)) for s in range(300) for param in ("HGB", "ALT", "AST")]
+    usubjid, paramcd, aval = zip(*rows)
+    return pa.table({"USUBJID": list(usubjid), "PARAMCD": list(paramcd), "AVAL": list(aval)})
+
+
+class TestParquetWriteProfile:
+    """Test the ParquetWriteProfile service"""
+
+    def test_keys_follow_dataset_and_schema(self, profile):
+        """Test keys are matched case-insensitively and missing ones skipped"""
+        schema = pa.schema([("usubjid", pa.string()), ("paramcd", pa.string()), ("aval", pa.float64())])
+
+        assert profile.keys_for("ADLB", schema) == ["paramcd", "usubjid"]
+        assert profile.keys_for("dm", pa.schema([("SITEID", pa.string()), ("USUBJID", pa.string())])) == [
+            "SITEID", "USUBJID"
+        ]
+
+    def test_configured_keys_override_defaults(self):
+        """Test per-dataset keys passed in replace the built-in ones"""
+        profile = ParquetWriteProfile(sort_keys={"adlb": ["AVAL"]})
+
+        assert profile.keys_for("adlb", pa.schema([("PARAMCD", pa.string()), ("AVAL", pa.float64())])) == ["AVAL"]
+
+    def test_dictionary_only_for_low_cardinality(self, profile, adlb):
+        """Test repeated codes are dictionary encoded and unique values aren't"""
+        table = adlb.append_column("SEQ", pa.array(range(adlb.num_rows)))
+
+        assert profile.dictionary_columns(table) == ["PARAMCD"]
+
+    def test_write_table_sorts_and_indexes(self, adlb, tmp_path):
+        """Test rows are sorted by the domain keys and pruning metadata is written"""
+        path = tmp_path / "adlb.parquet"
+
+        ParquetWriteProfile(row_group_size=300).write_table(adlb, path)
+
+        written = pq.read_table(path)
+        assert written["PARAMCD"].to_pylist()[:300] == ["ALT"] * 300
+        assert written["USUBJID"].to_pylist()[:2] == ["S000", "S001"]
+        row_group = pq.read_metadata(path).row_group(0)
+        assert [c.column_index for c in row_group.sorting_columns] == [1, 0]
+        assert row_group.column(1).statistics.min == row_group.column(1).statistics.max == "ALT"
+        assert row_group.column(1).has_column_index
+        assert row_group.column(0).bloom_filter_length > 0
+        assert list(tmp_path.glob(".*.tmp")) == []
+
+    def test_write_replaces_linked_file(self, profile, adlb, tmp_path):
+        """Test writing over a hard-linked dataset leaves the other link untouched"""
+        original = tmp_path / "v1.parquet"
+        linked = tmp_path / "adlb.parquet"
+        profile.write_table(adlb, original)
+        os.link(original, linked)
+
+        profile.write_table(adlb.slice(0, 10), linked)
+
+        assert pq.read_metadata(original).num_rows == adlb.num_rows
+        assert pq.read_metadata(linked).num_rows == 10
+
+
+class TestStreamingSortPass:
+    """Test the streaming converter lays out multi-row-group files with the profile"""
+
+    def test_csv_sorted_across_row_groups(self, tmp_path):
+        """Test rows are sorted over the whole file, not just within each row group"""
+        lines = ["usubjid,paramcd,aval"] + [f"S{s:04d},{p},{s}" for s in range(1500) for p in ("HGB", "ALT")]
+        source = tmp_path / "adlb.csv"
+        source.write_text("\n".join(lines))
+        converter = StreamingParquetConverter(memory_limit_mb=16, row_group_size=1000)
+
+        stats = converter.convert_csv(source, tmp_path / "adlb.parquet", rename=str.upper)
+
+        parquet = pq.ParquetFile(tmp_path / "adlb.parquet")
+        assert stats.row_groups == parquet.metadata.num_row_groups == 3
+        assert parquet.read()["PARAMCD"].to_pylist() == ["ALT"] * 1500 + ["HGB"] * 1500
+        assert parquet.metadata.row_group(0).column(0).statistics.max == "S0999"
+        assert parquet.schema_arrow.field("AVAL").type == pa.int64()
+        assert list(tmp_path.glob(".*")) == []
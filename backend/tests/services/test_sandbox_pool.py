@@ -0,0 +1,93 @@
+# ABOUTME: Unit tests for the warm sandbox worker pool
+# ABOUTME: Tests Arrow IPC outputs, isolation between jobs, wall-time and memory limits and worker replacement
+
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from app.services.sandbox_pool import SandboxPool
+
+LIMITS = {"max_memory_mb": 1024, "max_cpu_seconds": 60, "max_wall_seconds": 30}
+
+
+@pytest.fixture
+def pool():
+    pool = SandboxPool(1)
+    yield pool
+    pool.shutdown()
+
+
+@pytest.fixture
+def dirs(tmp_path):
+    source, output = tmp_path / "source", tmp_path / "output"
+    source.mkdir()
+    output.mkdir()
+    pd.DataFrame({"USUBJID": ["001", "002", "003"], "AGE": [30, 70, 80]}).to_parquet(source / "dm.parquet")
+    return source, output
+
+
+class TestSandboxPool:
+    """Test the SandboxPool service"""
+
+    def test_outputs_are_arrow_ipc(self, pool, dirs):
+        """Test DataFrames a script leaves behind come back as Arrow IPC files"""
+        source, output = dirs
+
+        result = pool.run("adsl = source_files['dm'][source_files['dm']['AGE'] > 65]", source, output, {}, LIMITS)
+
+        assert result["success"], result
+        assert result["datasets_created"] == [
+            {"name": "adsl", "path": str(output / "adsl.arrow"), "rows": 2, "columns": 2}
+        ]
+        with pa.memory_map(str(output / "adsl.arrow")) as ipc:
+            assert pa.ipc.open_file(ipc).read_all()["USUBJID"].to_pylist() == ["002", "003"]
+
+    def test_jobs_share_worker_but_not_state(self, pool, dirs):
+        """Test a warm worker serves consecutive jobs without leaking state between them"""
+        source, output = dirs
+        worker = pool._workers[0]
+
+        pool.run("pd.leaked = True", source, output, {}, LIMITS)
+        result = pool.run("assert not hasattr(pd, 'leaked')", source, output, {}, LIMITS)
+
+        assert result["success"], result
+        assert pool._workers == [worker]
+
+    def test_script_error(self, pool, dirs):
+        """Test a failing script reports its traceback"""
+        source, output = dirs
+
+        result = pool.run("source_files['missing']", source, output, {}, LIMITS)
+
+        assert not result["success"]
+        assert "KeyError" in result["error"]
+        assert "<transformation>" in result["traceback"]
+
+    def test_wall_time_limit(self, pool, dirs):
+        """Test a script past its wall time is killed and the worker keeps serving"""
+        source, output = dirs
+
+        result = pool.run("while True: pass", source, output, {}, {**LIMITS, "max_wall_seconds": 1})
+
+        assert result == {"success": False, "error": "Script execution timeout (1s exceeded)"}
+        assert pool.run("x = 1", source, output, {}, LIMITS)["success"]
+
+    def test_memory_limit(self, pool, dirs):
+        """Test a script allocating past its memory limit fails"""
+        source, output = dirs
+
+        result = pool.run("big = np.ones(10 ** 9)", source, output, {}, {**LIMITS, "max_memory_mb": 512})
+
+        assert not result["success"]
+        assert "MemoryError" in result["error"]
+
+    def test_dead_worker_replaced(self, pool, dirs):
+        """Test a worker that died is replaced so the pool stays at its size"""
+        source, output = dirs
+        pool._workers[0].process.kill()
+
+        result = pool.run("x = 1", source, output, {}, LIMITS)
+
+        assert not result["success"]
+        assert len(pool._workers) == 1
+        assert pool.run("x = 1", source, output, {}, LIMITS)["success"]
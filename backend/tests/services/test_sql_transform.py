@@ -0,0 +1,154 @@
+# ABOUTME: Unit tests for DuckDB-backed SQL transformation steps
+# ABOUTME: Tests multi-statement scripts, direct parquet output, the locked-down session and pipeline integration
+
+import asyncio
+from types import SimpleNamespace
+
+import duckdb
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+from app.clinical_modules.pipeline.script_executor import (
+    SecurityError,
+    SQLValidator,
+    TransformationScriptExecutor,
+)
+from app.services.study_transformation_service import StudyTransformationService
+
+DERIVE_ADSL = """
+CREATE TEMP TABLE ages AS SELECT USUBJID, AGE FROM dm;
+WITH elderly AS (SELECT * FROM ages WHERE AGE >= 65),
+     events AS (SELECT USUBJID, count(*) AS N_AE FROM ae GROUP BY USUBJID)
+SELECT e.USUBJID, e.AGE, coalesce(v.N_AE, 0) AS N_AE
+FROM elderly e LEFT JOIN events v USING (USUBJID)
+ORDER BY e.USUBJID
+"""
+
+
+@pytest.fixture
+def datasets(tmp_path):
+    source = tmp_path / "source"
+    source.mkdir()
+    pd.DataFrame({"USUBJID": ["001", "002", "003"], "AGE": [30, 70, 80]}).to_parquet(source / "dm.parquet")
+    pd.DataFrame({"USUBJID": ["002", "002", "001"], "AETERM": ["HEADACHE", "NAUSEA", "RASH"]}).to_parquet(
+        source / "ae.parquet"
+    )
+    return {"dm": source / "dm.parquet", "ae": source / "ae.parquet"}
+
+
+class TestSQLValidator:
+    """Test the SQLValidator"""
+
+    def test_accepts_statements_ending_in_query(self):
+        """Test temp tables and CTEs followed by a query are valid"""
+        assert SQLValidator().validate(DERIVE_ADSL) == (True, [])
+
+    @pytest.mark.parametrize("script", [
+        "COPY dm TO '/tmp/dm.csv'",
+        "SET memory_limit = '64GB'; SELECT 1",
+        "ATTACH '/tmp/other.db'; SELECT 1",
+        "CREATE TABLE t AS SELECT 1",
+        "SELEC 1",
+    ])
+    def test_rejects_scripts(self, script):
+        """Test file access, settings, scripts without a final query and bad syntax are rejected"""
+        is_valid, errors = SQLValidator().validate(script)
+
+        assert not is_valid
+        assert errors
+
+
+class TestSQLTransform:
+    """Test SQL transformations in the TransformationScriptExecutor"""
+
+    @pytest.fixture
+    def executor(self):
+        return TransformationScriptExecutor()
+
+    def test_writes_result_to_parquet(self, executor, datasets, tmp_path):
+        """Test a multi-statement script's final query is written and profiled"""
+        output = tmp_path / "adsl.parquet"
+
+        stats, metadata = executor.execute_sql_to_parquet(DERIVE_ADSL, datasets, output)
+
+        assert metadata["success"]
+        assert stats.rows == 2
+        assert stats.profile.column_details()["N_AE"]["stats"]["max"] == 2
+        assert pq.read_table(output).to_pydict() == {"USUBJID": ["002", "003"], "AGE": [70, 80], "N_AE": [2, 0]}
+        assert list(tmp_path.glob(".*")) == []
+
+    def test_session_limits(self, executor, datasets):
+        """Test each step runs with its own memory and thread limits"""
+        limits = {"max_memory_mb": 256, "max_threads": 2}
+
+        with executor.sql_session(datasets, limits) as con:
+            memory, threads = con.execute(
+                "SELECT current_setting('memory_limit'), current_setting('threads')"
+            ).fetchone()
+            with pytest.raises(duckdb.Error):
+                con.execute("SET threads = 8")
+
+        assert memory == duckdb.connect(config={"memory_limit": "256MB"}).execute(
+            "SELECT current_setting('memory_limit')"
+        ).fetchone()[0]
+        assert threads == 2
+
+    def test_only_step_datasets_are_readable(self, executor, datasets, tmp_path):
+        """Test the script can't read files other than its datasets"""
+        pd.DataFrame({"SECRET": [1]}).to_parquet(tmp_path / "other.parquet")
+        script = f"SELECT * FROM read_parquet('{tmp_path / 'other.parquet'}')"
+
+        with pytest.raises(duckdb.PermissionException):
+            executor.execute_sql_to_parquet(script, datasets, tmp_path / "out.parquet")
+        assert not (tmp_path / "out.parquet").exists()
+
+    def test_invalid_script_raises(self, executor, datasets, tmp_path):
+        """Test rejected statements raise SecurityError before anything runs"""
+        with pytest.raises(SecurityError):
+            executor.execute_sql_to_parquet("INSTALL httpfs; SELECT 1", datasets, tmp_path / "out.parquet")
+
+    def test_dataframe_transform(self, executor):
+        """Test execute_sql_transform runs over DataFrames"""
+        df = pd.DataFrame({"ARM": ["A", "B", "A"], "AVAL": [1.0, 2.0, 3.0]})
+
+        result = executor.execute_sql_transform(
+            "SELECT ARM, sum(AVAL) AS TOTAL FROM df GROUP BY ARM ORDER BY ARM", {"df": df}
+        )
+
+        assert result.to_dict("list") == {"ARM": ["A", "B"], "TOTAL": [4.0, 2.0]}
+
+
+class TestSQLPipelineStep:
+    """Test sql_query steps in study transformation pipelines"""
+
+    def test_sql_step_in_pipeline(self, datasets, tmp_path):
+        """Test a SQL step reads the linked source view and reports the dataset's schema"""
+        config = SimpleNamespace(
+            output_config={},
+            transformation_steps=[{"type": "sql_query", "script": DERIVE_ADSL, "config": {"output_name": "adsl"}}]
+        )
+        output = tmp_path / "derived" / "adsl"
+
+        result = asyncio.run(StudyTransformationService()._execute_pipeline(
+            config, datasets["dm"].parent, output
+        ))
+
+        assert result.success, result.error_message
+        assert result.total_records == 2
+        assert result.datasets_created[0]["schema"]["columns"]["N_AE"]["type"] == "numeric"
+        assert pq.read_table(output / "adsl.parquet").num_rows == 2
+
+    @pytest.mark.parametrize("output_name", ["../../escaped", "/tmp/escaped", "adsl.v2", ""])
+    def test_output_name_must_be_identifier(self, datasets, tmp_path, output_name):
+        """Test an output_name that isn't a plain identifier is refused before anything is written"""
+        step = {"type": "sql_query", "script": "SELECT * FROM dm", "config": {"output_name": output_name}}
+        config = SimpleNamespace(output_config={}, transformation_steps=[step])
+        service = StudyTransformationService()
+
+        validation = asyncio.run(service._validate_pipeline(config))
+        result = asyncio.run(service._execute_pipeline(config, datasets["dm"].parent, tmp_path / "derived" / "out"))
+
+        assert not validation["is_valid"]
+        assert not result.success
+        assert sorted(p.name for p in tmp_path.rglob("*.parquet")) == ["ae.parquet", "dm.parquet"]
@@ -0,0 +1,188 @@
+# ABOUTME: Unit tests for streaming CSV/SAS/XPT to Parquet conversion
+# ABOUTME: Tests chunked writes, type widening, encoding fallback and the stats reported by FileConversionService
+
+import asyncio
+import json
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pyreadstat
+import pytest
+
+from app.services.file_conversion_service import FileConversionService
+from app.services.ingest_manifest import IngestManifest
+from app.services.streaming_converter import StreamingParquetConverter
+
+
+@pytest.fixture
+def converter():
+    """Small row groups so a few thousand rows span several"""
+    return StreamingParquetConverter(memory_limit_mb=16, row_group_size=1000)
+
+
+def write_csv(path, lines, encoding="utf-8"):
+    path.write_bytes("\n".join(lines).encode(encoding))
+    return path
+
+
+class TestStreamingParquetConverter:
+    """Test the StreamingParquetConverter service"""
+
+    def test_csv_written_in_row_groups(self, converter, tmp_path):
+        """Test a CSV is written incrementally and stats are reported"""
+        source = write_csv(tmp_path / "adsl.csv", ["usubjid,age"] + [f"{i},{i % 80}" for i in range(3500)])
+        dest = tmp_path / "adsl.parquet"
+
+        stats = converter.convert_csv(source, dest, rename=str.upper)
+
+        parquet = pq.ParquetFile(dest)
+        assert parquet.metadata.num_rows == 3500
+        assert parquet.metadata.num_row_groups == 4
+        assert parquet.schema_arrow.names == ["USUBJID", "AGE"]
+        assert stats.rows == 3500
+        assert stats.row_groups == 4
+        assert stats.rows_per_second > 0
+        assert stats.peak_rss_mb > 0
+        assert not (tmp_path / ".adsl.parquet.tmp").exists()
+
+    def test_csv_column_widened_when_later_block_disagrees(self, tmp_path):
+        """Test an integer column with a decimal past the first block becomes float"""
+        converter = StreamingParquetConverter(memory_limit_mb=1)
+        source = write_csv(tmp_path / "adlb.csv", ["aval,avalc"] + ["1,1"] * 200000 + ["1.5,HIGH"])
+
+        stats = converter.convert_csv(source, tmp_path / "adlb.parquet")
+
+        assert stats.schema.field("aval").type == pa.float64()
+        assert stats.schema.field("avalc").type == pa.string()
+        assert pq.read_table(tmp_path / "adlb.parquet").num_rows == 200001
+
+    def test_csv_nulls_and_dates(self, converter, tmp_path):
+        """Test SAS missing markers are null and dates stay text unless asked for"""
+        source = write_csv(tmp_path / "adae.csv", ["aeterm,astdt", "Headache,2024-01-01", ".,NA"])
+
+        as_text = converter.convert_csv(source, tmp_path / "text.parquet")
+        as_dates = converter.convert_csv(source, tmp_path / "dates.parquet", infer_dates=True)
+
+        assert as_text.schema.field("astdt").type == pa.string()
+        assert pa.types.is_temporal(as_dates.schema.field("astdt").type)
+        assert pq.read_table(tmp_path / "text.parquet").to_pylist()[1] == {"aeterm": None, "astdt": None}
+
+    def test_csv_latin1_fallback(self, converter, tmp_path):
+        """Test invalid UTF-8 is re-read as latin-1 with a warning"""
+        source = write_csv(tmp_path / "dm.csv", ["site,name", "1,Zoë"], encoding="latin-1")
+
+        stats = converter.convert_csv(source, tmp_path / "dm.parquet")
+
+        assert pq.read_table(tmp_path / "dm.parquet")["name"].to_pylist() == ["Zoë"]
+        assert "latin-1" in stats.warnings[0]
+
+    def test_xpt_read_in_chunks(self, converter, tmp_path):
+        """Test an XPT file is read chunk by chunk into row groups"""
+        source = tmp_path / "adsl.xpt"
+        pyreadstat.write_xport(pd.DataFrame({
+            "usubjid": [str(i) for i in range(2500)],
+            "age": [float(i % 80) for i in range(2500)],
+        }), str(source))
+        converter.chunk_rows = lambda num_columns: 500
+
+        stats, meta = converter.convert_sas(source, tmp_path / "adsl.parquet", file_format="xpt", rename=str.upper)
+
+        assert stats.chunks == 5
+        assert stats.row_groups == 3
+        assert meta.column_names == ["usubjid", "age"]
+        assert pq.read_table(tmp_path / "adsl.parquet").column_names == ["USUBJID", "AGE"]
+
+    def test_all_null_chunk_takes_type_from_later_chunk(self, converter, tmp_path):
+        """Test a column empty in the first chunk keeps its real type"""
+        chunks = [
+            pa.table({"ASTDT": pa.nulls(2)}),
+            pa.table({"ASTDT": pa.array([19000, None], pa.date32())}),
+        ]
+
+        stats = converter.write_tables(tmp_path / "adae.parquet", iter(chunks))
+
+        assert stats.schema.field("ASTDT").type == pa.date32()
+        assert pq.read_table(tmp_path / "adae.parquet")["ASTDT"].null_count == 3
+
+    def test_failed_conversion_leaves_no_output(self, converter, tmp_path):
+        """Test a conversion error removes the partial file"""
+        source = write_csv(tmp_path / "bad.csv", ["a,b", "1,2,3"])
+        dest = tmp_path / "bad.parquet"
+
+        with pytest.raises(pa.ArrowInvalid):
+            converter.convert_csv(source, dest)
+
+        assert list(tmp_path.glob("*.parquet*")) == []
+        assert list(tmp_path.glob(".*.tmp")) == []
+
+    def test_chunk_rows_follow_memory_limit(self):
+        """Test wider files and smaller budgets read fewer rows per chunk"""
+        converter = StreamingParquetConverter(memory_limit_mb=64, row_group_size=1_000_000)
+
+        assert converter.chunk_rows(100) < converter.chunk_rows(10)
+        assert StreamingParquetConverter(memory_limit_mb=8).chunk_rows(100) < converter.chunk_rows(100)
+
+
+class TestFileConversionStreaming:
+    """Test FileConversionService converts through the streaming converter"""
+
+    @pytest.fixture
+    def service(self):
+        return FileConversionService()
+
+    def test_v2_csv_reports_throughput(self, service, tmp_path):
+        """Test convert_study_files reports rows/sec and peak RSS per file"""
+        source = write_csv(tmp_path / "adsl.csv", [" usubjid ,age", "001,30", "002,40"])
+
+        files = [{"name": "adsl.csv", "path": str(source)}]
+        manifest = IngestManifest(tmp_path / "manifest.json")
+
+        results = asyncio.run(service.convert_study_files("org", "study", files, manifest=manifest))
+
+        converted = results["converted_files"][0]
+        assert converted["rows"] == 2
+        assert converted["rows_per_second"] > 0
+        assert converted["peak_rss_mb"] > 0
+        assert list(results["datasets"]["adsl"]["columns"]) == ["USUBJID", "AGE"]
+
+    def test_v2_xpt_writes_metadata(self, service, tmp_path):
+        """Test XPT conversion still writes the column labels sidecar"""
+        source = tmp_path / "adae.xpt"
+        pyreadstat.write_xport(
+            pd.DataFrame({"aeterm": ["Headache"]}), str(source), column_labels=["Reported Term"]
+        )
+
+        parquet_path = asyncio.run(service._convert_xpt_to_parquet_v2(source, tmp_path))
+
+        assert pq.read_table(parquet_path).column_names == ["AETERM"]
+        metadata = json.loads((tmp_path / "adae_metadata.json").read_text())
+        assert metadata["column_labels"] == {"aeterm": "Reported Term"}
+
+    def test_process_upload_result_has_stats(self, service, tmp_path):
+        """Test ConversionResult carries rows/sec, peak RSS and column info"""
+        source = write_csv(tmp_path / "vs.csv", ["vs test,aval", "SYSBP,120", "DIABP,"])
+        output = tmp_path / "out"
+        output.mkdir()
+
+        result = asyncio.run(service.process_upload("u1", str(source), str(output), "csv"))
+
+        assert result.success
+        assert result.total_rows == 2
+        assert result.rows_per_second > 0
+        assert result.peak_rss_mb > 0
+        assert result.files_extracted[0]["column_info"] == [
+            {"name": "vs_test", "type": "string", "nullable": False},
+            {"name": "aval", "type": "integer", "nullable": True},
+        ]
+
+    def test_process_upload_empty_file_fails(self, service, tmp_path):
+        """Test a header-only file is reported as empty"""
+        source = write_csv(tmp_path / "empty.csv", ["a,b"])
+        output = tmp_path / "out"
+        output.mkdir()
+
+        result = asyncio.run(service.process_upload("u1", str(source), str(output), "csv"))
+
+        assert not result.success
+        assert not (output / "empty.parquet").exists()
@@ -0,0 +1,205 @@
+# ABOUTME: Unit tests for study transformation pipeline execution
+# ABOUTME: Tests the read-only source view, lazy loading in the sandbox, dependency ordering and incremental reruns
+
+import asyncio
+import os
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+from app.services.ingest_manifest import clone_dataset
+from app.services.pipeline_scheduler import PipelineDAG, PipelineRunState
+from app.services.study_transformation_service import StudyTransformationService
+
+
+@pytest.fixture
+def source(tmp_path):
+    """Study data with one readable dataset and one that fails if anything loads it"""
+    source = tmp_path / "source"
+    source.mkdir()
+    pd.DataFrame({"USUBJID": ["001", "002", "003"], "AGE": [30, 70, 80]}).to_parquet(source / "dm.parquet")
+    (source / "lb.parquet").write_bytes(b"not parquet")
+    return source
+
+
+def pipeline(*steps):
+    return SimpleNamespace(transformation_steps=list(steps), output_config={})
+
+
+def declared(name, inputs, output, min_age=0):
+    """A filter pipeline that declares what it reads and writes"""
+    return SimpleNamespace(
+        name=name,
+        source_config={"inputs": inputs},
+        output_config={"dataset_name": output},
+        transformation_steps=[{"type": "filter", "config": {
+            "dataset": inputs[0], "output_name": output,
+            "conditions": [{"column": "AGE", "operator": "greater_than", "value": min_age}]
+        }}]
+    )
+
+
+class TestStudyTransformationService:
+    """Test the StudyTransformationService pipeline runner"""
+
+    @pytest.fixture
+    def service(self):
+        return StudyTransformationService()
+
+    def test_source_view_is_read_only_copy(self, service, source, tmp_path):
+        """Test the view's files are read-only and writing them never reaches the source"""
+        view = tmp_path / "view"
+
+        linked = service._link_source_view(
+            {"dm": source / "dm.parquet", "lb": source / "lb.parquet", "ae": source / "ae.parquet"}, view
+        )
+
+        assert linked == 2
+        assert not os.path.samefile(view / "dm.parquet", source / "dm.parquet")
+        assert not os.stat(view / "dm.parquet").st_mode & 0o222
+        os.chmod(view / "dm.parquet", 0o644)
+        pd.DataFrame({"USUBJID": ["999"]}).to_parquet(view / "dm.parquet")
+        assert pq.read_table(source / "dm.parquet").num_rows == 3
+
+    def test_script_cannot_overwrite_source(self, service, source, tmp_path):
+        """Test a script writing into SOURCE_DIR leaves the study's data unchanged"""
+        script = "pd.DataFrame({'USUBJID': ['999']}).to_parquet(os.path.join(SOURCE_DIR, 'dm.parquet'))"
+
+        asyncio.run(service._execute_pipeline(
+            pipeline({"type": "python_script", "script": script}), source, tmp_path / "derived" / "out"
+        ))
+
+        assert pq.read_table(source / "dm.parquet").num_rows == 3
+
+    def test_script_loads_only_datasets_it_uses(self, service, source, tmp_path):
+        """Test an unreadable dataset the script never touches doesn't fail the run"""
+        output = tmp_path / "derived" / "adsl"
+        script = "adsl = source_files['dm'][source_files['dm']['AGE'] > 65]\nassert 'lb' in source_files"
+
+        result = asyncio.run(service._execute_pipeline(
+            pipeline({"type": "python_script", "script": script}), source, output
+        ))
+
+        assert result.success, result.error_message
+        assert [d["name"] for d in result.datasets_created] == ["adsl"]
+        assert pq.read_table(output / "adsl.parquet").num_rows == 2
+        assert result.datasets_created[0]["schema"]["row_count"] == 2
+        assert [p.name for p in output.parent.iterdir()] == ["adsl"]
+
+    def test_filter_step_reads_source_in_place(self, service, source, tmp_path):
+        """Test filter steps read the source directly, without building a view"""
+        output = tmp_path / "derived" / "elderly"
+        step = {"type": "filter", "config": {
+            "dataset": "dm", "output_name": "elderly",
+            "conditions": [{"column": "AGE", "operator": "greater_than", "value": 75}]
+        }}
+
+        with patch("app.services.study_transformation_service.clone_dataset") as clone:
+            result = asyncio.run(service._execute_pipeline(pipeline(step), source, output))
+
+        assert result.success, result.error_message
+        assert pq.read_table(output / "elderly.parquet")["USUBJID"].to_pylist() == ["003"]
+        clone.assert_not_called()
+
+    def test_view_holds_only_declared_inputs(self, service, source, tmp_path):
+        """Test a Python step's view clones just the pipeline's inputs, once per run"""
+        script = "seen = pd.DataFrame({'FILE': sorted(os.listdir(SOURCE_DIR))})"
+        steps = [{"type": "python_script", "script": script}, {"type": "python_script", "script": "pass"}]
+
+        with patch("app.services.study_transformation_service.clone_dataset", wraps=clone_dataset) as clone:
+            result = asyncio.run(service._execute_pipeline(
+                pipeline(*steps), source, tmp_path / "derived" / "out", inputs={"dm": source / "dm.parquet"}
+            ))
+
+        assert result.success, result.error_message
+        assert clone.call_count == 1
+        assert pq.read_table(tmp_path / "derived" / "out" / "seen.parquet")["FILE"].to_pylist() == ["dm.parquet"]
+
+
+class TestPipelineScheduling:
+    """Test pipelines run in dependency order and are skipped when nothing changed"""
+
+    @pytest.fixture
+    def service(self):
+        return StudyTransformationService()
+
+    def run(self, service, configs, source, derived, state):
+        results = {"pipelines": {}, "datasets": {}, "errors": []}
+
+        async def progress(message):
+            pass
+
+        asyncio.run(service._run_pipeline_graph(configs, source, derived, state, results, progress))
+        return results
+
+    def test_dag_orders_by_declared_datasets(self):
+        """Test consumers follow producers and cycles are reported"""
+        adsl = declared("ADSL", ["dm"], "adsl")
+        elderly = declared("Elderly", ["adsl"], "elderly")
+        loop_a = declared("A", ["b"], "a")
+        loop_b = declared("B", ["a"], "b")
+
+        dag = PipelineDAG([elderly, loop_a, adsl, loop_b])
+
+        assert dag.order == ["ADSL", "Elderly"]
+        assert dag.upstream["Elderly"] == {"ADSL"}
+        assert dag.cyclic == ["A", "B"]
+
+    def test_downstream_reads_upstream_output(self, service, source, tmp_path):
+        """Test a pipeline sees the dataset an upstream pipeline wrote in the same run"""
+        (source / "lb.parquet").unlink()
+        configs = [declared("Elderly", ["adsl"], "elderly", 75), declared("ADSL", ["dm"], "adsl", 65)]
+        state = PipelineRunState(tmp_path / "state.json")
+
+        results = self.run(service, configs, source, tmp_path / "run1", state)
+
+        assert results["errors"] == []
+        assert results["datasets"]["adsl"]["row_count"] == 2
+        assert results["datasets"]["elderly"]["row_count"] == 1
+
+    def test_unchanged_pipelines_reuse_outputs(self, service, source, tmp_path, monkeypatch):
+        """Test a rerun with the same inputs links the previous datasets instead of executing"""
+        configs = [declared("ADSL", ["dm"], "adsl", 65), declared("Elderly", ["adsl"], "elderly", 75)]
+        state_path = tmp_path / "state.json"
+        self.run(service, configs, source, tmp_path / "run1", PipelineRunState(state_path))
+
+        async def fail(*args, **kwargs):
+            pytest.fail("pipeline executed again")
+
+        monkeypatch.setattr(service, "_execute_pipeline", fail)
+        results = self.run(service, configs, source, tmp_path / "run2", PipelineRunState(state_path))
+
+        assert {p["status"] for p in results["pipelines"].values()} == {"unchanged"}
+        assert os.path.samefile(tmp_path / "run2" / "elderly" / "elderly.parquet",
+                                tmp_path / "run1" / "elderly" / "elderly.parquet")
+        assert results["datasets"]["elderly"]["path"] == str(tmp_path / "run2" / "elderly" / "elderly.parquet")
+
+    def test_changed_input_reruns_dependents(self, service, source, tmp_path):
+        """Test replacing a source dataset reruns its consumers and their downstream pipelines"""
+        configs = [
+            declared("ADSL", ["dm"], "adsl", 65),
+            declared("Elderly", ["adsl"], "elderly", 75),
+            declared("Labs", ["lb"], "labs"),
+        ]
+        state_path = tmp_path / "state.json"
+        self.run(service, configs, source, tmp_path / "run1", PipelineRunState(state_path))
+        pd.DataFrame({"USUBJID": ["004"], "AGE": [90]}).to_parquet(source / "dm.parquet")
+
+        results = self.run(service, configs, source, tmp_path / "run2", PipelineRunState(state_path))
+
+        assert results["pipelines"]["ADSL"]["status"] == "success"
+        assert results["pipelines"]["Elderly"]["status"] == "success"
+        assert results["datasets"]["elderly"]["row_count"] == 1
+        assert results["pipelines"]["Labs"]["status"] == "failed"
+
+    def test_failed_upstream_skips_dependents(self, service, source, tmp_path):
+        """Test pipelines downstream of a failure are skipped, not run on stale data"""
+        configs = [declared("Labs", ["lb"], "labs"), declared("Abnormal", ["labs"], "abnormal")]
+
+        results = self.run(service, configs, source, tmp_path / "run1", PipelineRunState(tmp_path / "s.json"))
+
+        assert results["pipelines"]["Labs"]["status"] == "failed"
+        assert results["pipelines"]["Abnormal"]["status"] == "skipped"
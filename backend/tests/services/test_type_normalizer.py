@@ -0,0 +1,158 @@
+# ABOUTME: Unit tests for Arrow-native type normalization and schema profiling
+# ABOUTME: Tests SAS epochs, ISO 8601 and partial --DTC dates, chunk conflicts and schemas emitted during conversion
+
+import asyncio
+import datetime
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from app.services.file_conversion_service import FileConversionService
+from app.services.ingest_manifest import IngestManifest
+from app.services.streaming_converter import StreamingParquetConverter
+from app.services.study_transformation_service import StudyTransformationService
+from app.services.type_normalizer import DatasetProfile, TypeConflict, TypeNormalizer
+
+
+def normalize(table, **options):
+    normalizer = TypeNormalizer(**options)
+    normalizer.plan(table)
+    return normalizer.apply(table), normalizer
+
+
+class TestTypeNormalizer:
+    """Test the TypeNormalizer service"""
+
+    def test_sas_epochs(self):
+        """Test numeric ADaM date, datetime and time columns become temporal types"""
+        table = pa.table({
+            "ADT": [0.0, 23376.0, None],
+            "ADTM": [0.0, 86400.5, None],
+            "ATM": [3600.0, 0.0, None],
+            "AVAL": [1.0, 2.0, 3.0],
+        })
+
+        result, _ = normalize(table, sas_dates=True)
+
+        assert result["ADT"].to_pylist() == [datetime.date(1960, 1, 1), datetime.date(2024, 1, 1), None]
+        assert result["ADTM"].to_pylist()[1] == datetime.datetime(1960, 1, 2, 0, 0, 0, 500000)
+        assert result["ATM"].to_pylist()[0] == datetime.time(1, 0)
+        assert result["AVAL"].type == pa.float64()
+
+    def test_implausible_epochs_stay_numeric(self):
+        """Test *DT columns that aren't whole days in range are left alone"""
+        table = pa.table({"ADT": [1.5, 2.0], "TRTDT": [10 ** 9, 1]})
+
+        result, _ = normalize(table, sas_dates=True)
+
+        assert result.schema == table.schema
+
+    def test_date_text(self):
+        """Test ISO 8601 and other complete date text is converted when parsing dates"""
+        table = pa.table({
+            "VISDAT": ["2024-01-05", None],
+            "COLLDT": ["2024-01-05T10:30", "2024-01-06"],
+            "BRTHDAT": ["05/01/2024", "31/12/1980"],
+            "SITE": ["001", "002"],
+        })
+
+        result, _ = normalize(table, parse_dates=True)
+
+        assert result["VISDAT"].type == pa.date32()
+        assert result["COLLDT"].to_pylist()[0] == datetime.datetime(2024, 1, 5, 10, 30)
+        assert result["BRTHDAT"].to_pylist() == [datetime.date(2024, 1, 5), datetime.date(1980, 12, 31)]
+        assert result["SITE"].type == pa.string()
+
+    def test_dtc_columns_stay_text_with_precision(self):
+        """Test SDTM --DTC columns keep their text and record their ISO 8601 precision"""
+        table = pa.table({
+            "AESTDTC": ["2024-01-05", "2024-01-05T10:30"],
+            "AEENDTC": ["2024-01", "2024---15"],
+            "CMDTC": ["unknown", "2024-01-05"],
+        })
+
+        result, normalizer = normalize(table, parse_dates=True)
+
+        assert result.schema == table.schema
+        assert normalizer.iso_formats() == {"AESTDTC": "mixed", "AEENDTC": "partial"}
+
+    def test_later_chunk_conflict(self):
+        """Test a chunk that doesn't fit the planned type raises TypeConflict"""
+        normalizer = TypeNormalizer(parse_dates=True)
+        normalizer.plan(pa.table({"VISDAT": ["2024-01-05"]}))
+
+        with pytest.raises(TypeConflict) as error:
+            normalizer.apply(pa.table({"VISDAT": ["2024-01"]}))
+
+        assert error.value.column == "VISDAT"
+
+    def test_csv_retried_with_conflicting_column_as_text(self, tmp_path):
+        """Test a CSV whose dates turn partial after the first row group keeps the column as text"""
+        source = tmp_path / "mh.csv"
+        source.write_text("\n".join(["mhstdat"] + ["2024-01-05"] * 150000 + ["2024-01"]))
+        converter = StreamingParquetConverter(memory_limit_mb=1)
+
+        stats = converter.convert_csv(source, tmp_path / "mh.parquet", infer_dates=True)
+
+        assert stats.schema.field("mhstdat").type == pa.string()
+        assert pq.read_table(tmp_path / "mh.parquet").num_rows == 150001
+
+
+class TestDatasetProfile:
+    """Test the DatasetProfile built from written chunks"""
+
+    def test_profile_merges_chunks(self):
+        """Test nulls, distinct values and moments are merged across chunks"""
+        profile = DatasetProfile()
+        profile.observe(pa.table({"AGE": [20, 30, None], "SEX": ["M", "F", "M"]}))
+        profile.observe(pa.table({"AGE": [40, 50, 60], "SEX": ["F", None, "M"]}))
+
+        details = profile.column_details()
+        ages = pd.Series([20, 30, 40, 50, 60])
+        assert details["AGE"]["null_count"] == 1
+        assert details["AGE"]["stats"]["mean"] == pytest.approx(ages.mean())
+        assert details["AGE"]["stats"]["std"] == pytest.approx(ages.std())
+        assert details["SEX"]["unique_values"] == ["M", "F"]
+        assert profile.rows == 6
+        assert profile.sample[2] == {"AGE": "", "SEX": "M"}
+        assert profile.column_info() == [
+            {"name": "AGE", "type": "integer", "nullable": True},
+            {"name": "SEX", "type": "string", "nullable": True},
+        ]
+
+
+class TestSchemaFromConversion:
+    """Test services take schemas from the conversion instead of reading datasets back"""
+
+    def test_study_files_schema(self, tmp_path, monkeypatch):
+        """Test convert_study_files reports the schema without reading the parquet data"""
+        source = tmp_path / "ae.csv"
+        source.write_text("usubjid,aestdtc,aeser\n001,2024-01-05,Y\n002,2024-02,N\n")
+        monkeypatch.setattr(pq.ParquetFile, "read", lambda *args, **kwargs: pytest.fail("parquet read back"))
+
+        results = asyncio.run(FileConversionService().convert_study_files(
+            "org", "study", [{"name": "ae.csv", "path": str(source)}], manifest=IngestManifest(tmp_path / "m.json")
+        ))
+
+        schema = results["datasets"]["ae"]
+        assert schema["row_count"] == 2
+        assert schema["columns"]["AESTDTC"]["precision"] == "partial"
+        assert schema["columns"]["AESER"]["unique_values"] == ["Y", "N"]
+        assert schema["sample_data"][0]["USUBJID"] == 1
+
+    def test_filter_step_schema(self, tmp_path):
+        """Test a filter step returns the schema of the dataset it wrote"""
+        pd.DataFrame({"USUBJID": ["001", "002"], "AGE": [30, 70]}).to_parquet(tmp_path / "adsl.parquet")
+
+        result = asyncio.run(StudyTransformationService()._apply_filter(
+            {"adsl": tmp_path / "adsl.parquet"}, tmp_path, {"dataset": "adsl", "output_name": "elderly", "conditions": [
+                {"column": "AGE", "operator": "greater_than", "value": 65}
+            ]}
+        ))
+
+        schema = result["datasets_created"][0]["schema"]
+        assert schema["row_count"] == 1
+        assert schema["columns"]["AGE"]["type"] == "numeric"
+        assert schema["columns"]["AGE"]["stats"]["max"] == 70.0
@@ -0,0 +1,138 @@
+# ABOUTME: Unit tests for batched widget data execution
+# ABOUTME: Tests dataset grouping, single reads per dataset, filters and streaming order
+
+import asyncio
+import threading
+import uuid
+from unittest.mock import MagicMock, patch
+
+import pandas as pd
+import pytest
+
+from app.services.widget_batch_executor import BatchWidget, WidgetBatchExecutor
+
+
+def make_widget(widget_id: str, category: str = "metrics") -> BatchWidget:
+    widget_def = MagicMock()
+    widget_def.category = category
+    return BatchWidget(widget_id=widget_id, widget_def=widget_def, config={"id": widget_id, "title": widget_id})
+
+
+class TestWidgetBatchExecutor:
+    """Test the WidgetBatchExecutor service"""
+
+    @pytest.fixture
+    def study(self):
+        """Create a study with field mappings for four KPI widgets"""
+        study = MagicMock()
+        study.id = uuid.uuid4()
+        study.org_id = uuid.uuid4()
+        study.field_mappings = {
+            "enrolled": "ADSL.USUBJID",
+            "elderly": "ADSL.USUBJID",
+            "mean_age": "ADSL.AGE",
+            "mean_age_aggregation": "mean",
+            "serious_aes": "ADAE.USUBJID",
+        }
+        study.field_mapping_filters = {
+            "elderly": {"expression": "AGE >= 65"},
+            "serious_aes": {"expression": "AESER = 'Y'"},
+        }
+        return study
+
+    @pytest.fixture
+    def executor(self, study, tmp_path):
+        """Create executor reading from a temporary data folder"""
+        pd.DataFrame({
+            'USUBJID': ['001', '002', '003', '004'],
+            'AGE': [25, 45, 65, 70],
+            'SEX': ['M', 'F', 'F', 'M'],
+        }).to_parquet(tmp_path / "ADSL.parquet")
+        pd.DataFrame({
+            'USUBJID': ['001', '001', '003'],
+            'AESER': ['Y', 'N', 'Y'],
+        }).to_parquet(tmp_path / "ADAE.parquet")
+
+        executor = WidgetBatchExecutor(MagicMock(), study, max_concurrency=2)
+        executor.data_path = tmp_path
+        return executor
+
+    def test_plan_groups_by_dataset(self, executor):
+        """Test widgets on the same dataset share a group"""
+        widgets = [make_widget(w) for w in ["enrolled", "elderly", "mean_age", "serious_aes", "unmapped"]]
+
+        groups = executor.plan(widgets)
+
+        assert [w.widget_id for w in groups["ADSL"]] == ["enrolled", "elderly", "mean_age"]
+        assert [w.widget_id for w in groups["ADAE"]] == ["serious_aes"]
+        assert [w.widget_id for w in groups[None]] == ["unmapped"]
+
+    def test_execute_reads_each_dataset_once(self, executor):
+        """Test each Parquet file is read once for the whole batch"""
+        widgets = [make_widget(w) for w in ["enrolled", "elderly", "mean_age", "serious_aes"]]
+
+        with patch.object(executor.filter_executor, "read_dataset", wraps=executor.filter_executor.read_dataset) as reader:
+            responses = asyncio.run(executor.execute(widgets))
+
+        assert reader.call_count == 2
+        values = {r.widget_id: r.data["value"] for r in responses}
+        assert values == {"enrolled": 4, "elderly": 2, "mean_age": 51.25, "serious_aes": 2}
+
+    def test_worker_threads_do_not_touch_session_objects(self, executor, study):
+        """Test the study and session are only used on the event loop thread"""
+        threads = set()
+
+        class Watched:
+            def __init__(self, target):
+                self.target = target
+
+            def __getattr__(self, name):
+                threads.add(threading.get_ident())
+                return getattr(self.target, name)
+
+        executor.study = Watched(study)
+        executor.db = Watched(executor.db)
+        widgets = [make_widget(w) for w in ["enrolled", "elderly", "mean_age", "serious_aes", "unmapped"]]
+
+        responses = asyncio.run(executor.execute(widgets))
+
+        assert threads == {threading.get_ident()}
+        assert executor.filter_executor.db is None
+        assert all(r.metadata.get("study_id") == str(study.id) for r in responses if r.status == "success")
+
+    def test_execute_projects_needed_columns(self, executor):
+        """Test only mapped and filter columns are read"""
+        widgets = [make_widget(w) for w in ["enrolled", "elderly"]]
+
+        with patch.object(executor.filter_executor, "read_dataset", wraps=executor.filter_executor.read_dataset) as reader:
+            responses = asyncio.run(executor.execute(widgets))
+
+        assert set(reader.call_args.kwargs["columns"]) == {"USUBJID", "AGE"}
+        io = responses[0].metadata["io"]
+        assert 0 < io["bytes_read"] < io["bytes_total"]
+
+    def test_execute_preserves_request_order(self, executor):
+        """Test responses come back in request order"""
+        ids = ["serious_aes", "enrolled", "mean_age"]
+        responses = asyncio.run(executor.execute([make_widget(w) for w in ids]))
+
+        assert [r.widget_id for r in responses] == ids
+
+    def test_missing_dataset_reports_error_per_widget(self, executor, study):
+        """Test a missing dataset fails only its own group"""
+        study.field_mappings["vitals"] = "ADVS.AVAL"
+
+        responses = asyncio.run(executor.execute([make_widget("vitals"), make_widget("enrolled")]))
+
+        by_id = {r.widget_id: r for r in responses}
+        assert by_id["vitals"].status == "error"
+        assert by_id["enrolled"].status == "success"
+
+    def test_execute_as_completed_streams_all_results(self, executor):
+        """Test streaming yields one result per widget"""
+        widgets = [make_widget(w) for w in ["enrolled", "serious_aes", "mean_age"]]
+
+        async def collect():
+            return [r.widget_id async for r in executor.execute_as_completed(widgets)]
+
+        assert sorted(asyncio.run(collect())) == ["enrolled", "mean_age", "serious_aes"]
@@ -0,0 +1,227 @@
+# ABOUTME: Unit tests for the widget scan planner
+# ABOUTME: Tests fused GROUPING SETS queries match per-widget queries while scanning once, over study views too
+
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import duckdb
+import pandas as pd
+import pytest
+
+from app.services.duckdb_catalog import DuckDBConnectionPool
+from app.services.parquet_query_engine import ParquetQueryEngine
+from app.services.widget_engines.kpi_metric_card import KPIMetricCardEngine
+from app.services.widget_engines.distribution_chart import DistributionChartEngine
+from app.services.widget_engines.query_planner import ScanPlanner, duckdb_runner
+from app.services.widget_engines.result_cache import WidgetResultCache
+
+
+def make_kpi(aggregation: str, measure: str, group: str = None) -> KPIMetricCardEngine:
+    field_mappings = {"measure_field": {"source_field": measure}}
+    if group:
+        field_mappings["group_field"] = {"source_field": group}
+    return KPIMetricCardEngine(
+        widget_id=uuid.uuid4(),
+        study_id=uuid.uuid4(),
+        mapping_config={
+            "primary_dataset": "adsl",
+            "aggregation_type": aggregation,
+            "field_mappings": field_mappings,
+            "display_config": {"decimals": 2},
+        },
+    )
+
+
+class TestScanPlanner:
+    """Test the ScanPlanner service"""
+
+    @pytest.fixture
+    def conn(self, tmp_path):
+        """Create a DuckDB connection with an ADSL view over Parquet"""
+        pd.DataFrame({
+            'USUBJID': ['001', '002', '003', '004', '005', '006'],
+            'AGE': [25, 45, 65, 70, 33, 58],
+            'SEX': ['M', 'F', 'F', 'M', 'F', 'M'],
+            'ARM': ['A', 'A', 'B', 'B', 'B', 'C'],
+            'SAFFL': ['Y', 'Y', 'Y', 'N', 'Y', 'Y'],
+        }).to_parquet(tmp_path / "adsl.parquet")
+        conn = duckdb.connect(':memory:')
+        conn.execute(f"CREATE VIEW adsl AS SELECT * FROM read_parquet('{tmp_path / 'adsl.parquet'}')")
+        yield conn
+        conn.close()
+
+    @pytest.fixture
+    def engines(self):
+        """Create eight KPI cards over ADSL with mixed groupings"""
+        return [
+            make_kpi("COUNT", "USUBJID"),
+            make_kpi("COUNT_DISTINCT", "USUBJID"),
+            make_kpi("AVG", "AGE"),
+            make_kpi("MIN", "AGE"),
+            make_kpi("MAX", "AGE"),
+            make_kpi("MEDIAN", "AGE"),
+            make_kpi("COUNT", "USUBJID", group="SEX"),
+            make_kpi("AVG", "AGE", group="ARM"),
+        ]
+
+    def test_same_dataset_fuses_into_one_scan(self, engines):
+        """Test eight cards on one dataset plan as a single scan"""
+        planner = ScanPlanner(engines)
+
+        groups, standalone = planner.plan()
+
+        assert len(groups) == 1
+        assert standalone == []
+        assert planner.get_stats() == {"widgets": 8, "scans": 1, "scans_saved": 7}
+        assert "GROUPING SETS" in groups[0].build_query()
+
+    def test_fused_results_match_individual_queries(self, conn, engines):
+        """Test fan-out gives each widget the same result as its own query"""
+        run_query = duckdb_runner(conn)
+        executed = []
+
+        def counting_runner(query):
+            executed.append(query)
+            return run_query(query)
+
+        results = ScanPlanner(engines).execute(run_query=counting_runner)
+
+        assert len(executed) == 1
+        for engine in engines:
+            expected = engine.transform_results(run_query(engine.build_query()))
+            actual = results[str(engine.widget_id)]["data"]
+            assert actual["value"] == pytest.approx(expected["value"])
+            assert actual.get("groups") == expected.get("groups")
+            assert results[str(engine.widget_id)]["shared_scan_size"] == 8
+
+    def test_ungrouped_widgets_skip_grouping_sets(self, conn):
+        """Test widgets with identical grouping use a plain aggregate query"""
+        engines = [make_kpi("COUNT", "USUBJID"), make_kpi("AVG", "AGE")]
+        planner = ScanPlanner(engines)
+
+        query = planner.plan()[0][0].build_query()
+        results = planner.execute(run_query=duckdb_runner(conn))
+
+        assert "GROUP BY" not in query
+        assert results[str(engines[0].widget_id)]["data"]["value"] == 6
+        assert results[str(engines[1].widget_id)]["data"]["value"] == pytest.approx(49.33, abs=0.01)
+
+    def test_different_filters_scan_separately(self, conn):
+        """Test widgets with different WHERE clauses are not fused"""
+        all_subjects = make_kpi("COUNT", "USUBJID")
+        safety = make_kpi("COUNT", "USUBJID")
+        safety.add_filter("SAFFL", "equals", "Y")
+
+        planner = ScanPlanner([all_subjects, safety])
+        results = planner.execute(run_query=duckdb_runner(conn))
+
+        assert planner.get_stats()["scans"] == 2
+        assert results[str(all_subjects.widget_id)]["data"]["value"] == 6
+        assert results[str(safety.widget_id)]["data"]["value"] == 5
+
+    def test_distribution_top_n_applied_after_fan_out(self, conn):
+        """Test ordering and limits are applied per widget on the shared rows"""
+        chart = DistributionChartEngine(
+            widget_id=uuid.uuid4(),
+            study_id=uuid.uuid4(),
+            mapping_config={
+                "primary_dataset": "adsl",
+                "aggregation_type": "COUNT",
+                "field_mappings": {
+                    "category_field": {"source_field": "ARM"},
+                    "value_field": {"source_field": "USUBJID"},
+                },
+                "top_n": 1,
+            },
+        )
+        planner = ScanPlanner([chart, make_kpi("COUNT", "USUBJID")])
+
+        results = planner.execute(run_query=duckdb_runner(conn))
+
+        assert planner.get_stats()["scans"] == 1
+        expected = chart.transform_results(duckdb_runner(conn)(chart.build_query()))
+        assert results[str(chart.widget_id)]["data"]["data"] == expected["data"]
+
+    def test_unfusable_widget_runs_alone(self, conn):
+        """Test widgets without an aggregation spec fall back to build_query"""
+        card = make_kpi("COUNT", "USUBJID")
+        card.get_aggregation_spec = lambda: None
+
+        planner = ScanPlanner([card])
+        results = planner.execute(run_query=duckdb_runner(conn))
+
+        assert planner.plan()[1] == [card]
+        assert results[str(card.widget_id)]["data"]["value"] == 6
+
+
+class TestStudyWidgetExecution:
+    """Test ParquetQueryEngine runs widget engines through the scan planner"""
+
+    def test_widgets_share_one_scan_of_study_views(self, tmp_path):
+        """Test widgets over one study dataset are answered by a single fused query"""
+        pd.DataFrame({
+            'USUBJID': ['001', '002', '003'],
+            'AGE': [25, 45, 65],
+        }).to_parquet(tmp_path / "adsl.parquet")
+        pool = DuckDBConnectionPool(pool_size=1, memory_limit="256MB", threads=1)
+        engine = ParquetQueryEngine(db=None)
+        engine.pool = pool
+        study = SimpleNamespace(id=uuid.uuid4(), org_id=uuid.uuid4())
+        widgets = [make_kpi("COUNT", "USUBJID"), make_kpi("MAX", "AGE")]
+
+        with patch.object(engine, "get_study_parquet_path", return_value=tmp_path):
+            results = engine.execute_widget_engines(study, widgets)
+
+        assert [results[str(w.widget_id)]["data"]["value"] for w in widgets] == [3, 65]
+        assert all(result["shared_scan_size"] == 2 for result in results.values())
+
+    def test_concurrent_requests_share_scans(self, tmp_path):
+        """Test concurrent requests for the same widgets run each scan once, and force_refresh runs it again"""
+        pd.DataFrame({'USUBJID': ['001', '002', '003'], 'AGE': [25, 45, 65]}).to_parquet(tmp_path / "adsl.parquet")
+        pool = DuckDBConnectionPool(pool_size=4, memory_limit="256MB", threads=1)
+        engine = ParquetQueryEngine(db=None)
+        engine.pool = pool
+        study = SimpleNamespace(id=uuid.uuid4(), org_id=uuid.uuid4())
+        cache = WidgetResultCache(None, max_entries=16)
+        scans = []
+        run = duckdb_runner
+
+        def slow_runner(conn):
+            def run_query(query):
+                scans.append(query)
+                time.sleep(0.1)
+                return run(conn)(query)
+            return run_query
+
+        results = []
+
+        def request():
+            widgets = [make_kpi("COUNT", "USUBJID"), make_kpi("MAX", "AGE")]
+            results.append(engine.execute_widget_engines(study, widgets))
+
+        with patch.object(engine, "get_study_parquet_path", return_value=tmp_path), \
+             patch("app.services.parquet_query_engine.get_widget_result_cache", return_value=cache), \
+             patch("app.services.parquet_query_engine.duckdb_runner", side_effect=slow_runner):
+            requests = [threading.Thread(target=request) for _ in range(4)]
+            for t in requests:
+                t.start()
+            for t in requests:
+                t.join(5)
+            assert len(scans) == 1
+            engine.execute_widget_engines(study, [make_kpi("COUNT", "USUBJID"), make_kpi("MAX", "AGE")], force_refresh=True)
+
+        assert len(scans) == 2
+        assert cache.get_stats()["computations"] == 1
+        assert [sorted(r["data"]["value"] for r in result.values()) for result in results] == [[3, 65]] * 4
+
+    def test_study_without_data(self, tmp_path):
+        """Test a study with no datasets is reported rather than queried"""
+        engine = ParquetQueryEngine(db=None)
+        study = SimpleNamespace(id=uuid.uuid4(), org_id=uuid.uuid4())
+
+        with patch.object(engine, "get_study_parquet_path", return_value=tmp_path / "missing"):
+            with pytest.raises(ValueError):
+                engine.execute_widget_engines(study, [make_kpi("COUNT", "USUBJID")])
@@ -0,0 +1,193 @@
+# ABOUTME: Unit tests for the two-tier widget result cache
+# ABOUTME: Tests LRU bounds, TTLs, Redis promotion, single-flight and engine integration
+
+import threading
+import time
+import uuid
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.services.widget_engines.kpi_metric_card import KPIMetricCardEngine
+from app.services.widget_engines.result_cache import WidgetResultCache
+
+
+class FakeRedisCache:
+    """In-memory stand-in for CacheManager's get/set"""
+
+    def __init__(self):
+        self.store = {}
+
+    def get(self, namespace, identifier):
+        return self.store.get((namespace, identifier))
+
+    def set(self, namespace, identifier, value, ttl=None):
+        self.store[(namespace, identifier)] = value
+        return True
+
+
+class TestWidgetResultCache:
+    """Test the WidgetResultCache service"""
+
+    @pytest.fixture
+    def redis_cache(self):
+        """Create a fake Redis tier"""
+        return FakeRedisCache()
+
+    @pytest.fixture
+    def cache(self, redis_cache):
+        """Create a small cache"""
+        return WidgetResultCache(redis_cache, max_entries=2)
+
+    def test_set_and_get(self, cache):
+        """Test a stored result is returned from the local tier"""
+        cache.set("k1", {"value": 1}, ttl=60, execution_time_ms=12)
+
+        entry = cache.get("k1")
+
+        assert entry["data"] == {"value": 1}
+        assert entry["execution_time_ms"] == 12
+        assert cache.get_stats()["local_hits"] == 1
+
+    def test_lru_is_bounded(self, cache):
+        """Test the least recently used entry is evicted"""
+        cache.set("k1", 1, ttl=60)
+        cache.set("k2", 2, ttl=60)
+        cache.get("k1")
+        cache.set("k3", 3, ttl=60)
+
+        assert set(cache._local) == {"k1", "k3"}
+        assert cache.get_stats()["evictions"] == 1
+
+    def test_local_entry_expires(self, cache):
+        """Test entries are not served past their TTL"""
+        cache.redis_cache = None
+        cache.set("k1", 1, ttl=0.05)
+        time.sleep(0.1)
+
+        assert cache.get("k1") is None
+        assert cache.get_stats()["misses"] == 1
+
+    def test_redis_hit_is_promoted(self, cache):
+        """Test a Redis hit fills the local tier"""
+        cache.set("k1", {"value": 1}, ttl=60)
+        cache.clear_local()
+
+        assert cache.get("k1")["data"] == {"value": 1}
+        assert cache.get("k1")["data"] == {"value": 1}
+
+        stats = cache.get_stats()
+        assert stats["redis_hits"] == 1
+        assert stats["local_hits"] == 1
+
+    def test_single_flight(self, cache):
+        """Test concurrent misses on one key run a single computation"""
+        calls = []
+        started = threading.Event()
+        release = threading.Event()
+
+        def compute():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return {"value": 42}, 5
+
+        results = []
+
+        def request():
+            results.append(cache.get_or_compute("k1", 60, compute))
+
+        leader = threading.Thread(target=request)
+        leader.start()
+        started.wait(5)
+        followers = [threading.Thread(target=request) for _ in range(10)]
+        for t in followers:
+            t.start()
+        while cache.get_stats()["coalesced"] < 10:
+            time.sleep(0.01)
+        release.set()
+        for t in [leader] + followers:
+            t.join(5)
+
+        assert len(calls) == 1
+        assert len(results) == 11
+        assert all(entry["data"] == {"value": 42} for entry, _ in results)
+        assert sorted(from_cache for _, from_cache in results) == [False] + [True] * 10
+
+    def test_single_flight_propagates_errors(self, cache):
+        """Test a failed computation is not cached"""
+        def fail():
+            raise RuntimeError("boom")
+
+        with pytest.raises(RuntimeError):
+            cache.get_or_compute("k1", 60, fail)
+
+        entry, from_cache = cache.get_or_compute("k1", 60, lambda: ({"value": 1}, 3))
+        assert from_cache is False
+        assert entry["data"] == {"value": 1}
+
+
+class TestWidgetEngineCaching:
+    """Test WidgetEngine.check_cache and save_to_cache use the result cache"""
+
+    @pytest.fixture
+    def cache(self):
+        """Patch in a fresh local-only cache"""
+        cache = WidgetResultCache(None, max_entries=16)
+        with patch("app.services.widget_engines.base_widget.get_widget_result_cache", return_value=cache):
+            yield cache
+
+    @pytest.fixture
+    def engine(self):
+        """Create a KPI engine"""
+        return KPIMetricCardEngine(
+            widget_id=uuid.uuid4(),
+            study_id=uuid.uuid4(),
+            mapping_config={
+                "primary_dataset": "adsl",
+                "aggregation_type": "COUNT",
+                "field_mappings": {"measure_field": {"source_field": "USUBJID"}},
+            },
+            cache_ttl=60,
+        )
+
+    @pytest.fixture
+    def session(self):
+        return MagicMock()
+
+    def test_saved_result_is_served_from_cache(self, cache, engine, session):
+        """Test a saved result is returned for the same data version"""
+        with patch("app.services.widget_engines.base_widget.get_active_data_version", return_value="v1"):
+            assert engine.check_cache(session) is None
+            engine.save_to_cache(session, {"value": 7}, 12)
+            entry = engine.check_cache(session)
+
+        assert entry["data"] == {"value": 7}
+        assert entry["execution_time_ms"] == 12
+
+    def test_new_data_version_misses(self, cache, engine, session):
+        """Test activating a new data version bypasses old results"""
+        with patch("app.services.widget_engines.base_widget.get_active_data_version", side_effect=["v1", "v2"]):
+            engine.save_to_cache(session, {"value": 7}, 12)
+            cache.invalidate_study(engine.study_id)
+            assert engine.check_cache(session) is None
+
+    def test_study_version_is_remembered(self, cache, engine, session):
+        """Test repeated lookups resolve the data version and generation once within the TTL"""
+        cache.get_study_generation = MagicMock(return_value=3)
+        with patch("app.services.widget_engines.base_widget.get_active_data_version", return_value="v1") as version:
+            engine.check_cache(session)
+            engine.save_to_cache(session, {"value": 7}, 12)
+            engine.check_cache(session)
+
+        assert version.call_count == 1
+        assert cache.get_study_generation.call_count == 1
+        assert cache.get_stats()["version_hits"] == 2
+
+    def test_study_version_expires(self, cache, engine, session):
+        """Test the remembered version is resolved again after the TTL"""
+        cache.version_ttl = 0.05
+        with patch("app.services.widget_engines.base_widget.get_active_data_version", side_effect=["v1", "v2"]):
+            engine.save_to_cache(session, {"value": 7}, 12)
+            time.sleep(0.1)
+            assert engine.check_cache(session) is None
@@ -0,0 +1,109 @@
+# ABOUTME: Unit tests for parallel ZIP ingestion
+# ABOUTME: Tests members are converted on the process pool without extracting the archive
+
+import asyncio
+import multiprocessing
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+import pandas as pd
+import pyarrow.parquet as pq
+import pyreadstat
+import pytest
+
+from app.services import zip_ingestion
+from app.services.file_conversion_service import FileConversionService
+from app.services.zip_ingestion import ZipIngestor
+
+
+@pytest.fixture(scope="module")
+def pool():
+    """Small spawn pool shared by the tests in this module"""
+    pool = ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context("spawn"))
+    yield pool
+    pool.shutdown()
+
+
+@pytest.fixture
+def archive(tmp_path):
+    """A study drop with CSV, XPT and Parquet datasets plus files to skip"""
+    xpt_path = tmp_path / "ae.xpt"
+    pyreadstat.write_xport(pd.DataFrame({"aeterm": ["Headache", "Rash"]}), str(xpt_path), column_labels=["Term"])
+    parquet = BytesIO()
+    pd.DataFrame({"LBTEST": ["ALT"], "LBSTRESN": [31.0]}).to_parquet(parquet)
+
+    zip_path = tmp_path / "sdtm.zip"
+    with zipfile.ZipFile(zip_path, "w") as archive:
+        archive.writestr("sdtm/dm.csv", "usubjid,age\n001,30\n002,45\n")
+        archive.write(xpt_path, "sdtm/ae.xpt")
+        archive.writestr("sdtm/lb.parquet", parquet.getvalue())
+        archive.writestr("sdtm/define.xml", "<xml/>")
+        archive.writestr("__MACOSX/sdtm/._dm.csv", "junk")
+        archive.writestr("sdtm/bad.csv", "a,b\n1,2,3\n")
+    return zip_path
+
+
+class TestZipIngestor:
+    """Test the ZipIngestor service"""
+
+    def test_members_converted_in_archive_order(self, pool, archive, tmp_path):
+        """Test each data member becomes a parquet file with its timing"""
+        output = tmp_path / "out"
+
+        results = asyncio.run(ZipIngestor(pool, max_workers=2).convert(archive, output, rename=str.upper))
+
+        assert [r.member for r in results] == ["sdtm/dm.csv", "sdtm/ae.xpt", "sdtm/lb.parquet", "sdtm/bad.csv"]
+        assert [r.success for r in results] == [True, True, True, False]
+        assert pq.read_table(output / "dm.parquet").column_names == ["USUBJID", "AGE"]
+        assert pq.read_table(output / "ae.parquet")["AETERM"].to_pylist() == ["Headache", "Rash"]
+        assert results[1].metadata["column_labels"] == {"aeterm": "Term"}
+        assert results[2].stats.rows == 1
+        assert results[0].timing()["rows"] == 2
+        assert results[0].timing()["seconds"] > 0
+
+    def test_archive_is_not_extracted(self, pool, archive, tmp_path):
+        """Test only the parquet outputs and their statistics are written and failures leave nothing behind"""
+        output = tmp_path / "out"
+
+        results = asyncio.run(ZipIngestor(pool, max_workers=2).convert(archive, output))
+
+        assert sorted(p.name for p in output.rglob("*")) == [
+            "ae.parquet", "ae.stats.json", "dm.parquet", "dm.stats.json", "lb.parquet"
+        ]
+        assert "bad.csv" in results[3].timing()["member"]
+        assert results[3].timing()["error"]
+
+    def test_duplicate_dataset_names_rejected(self, pool, tmp_path):
+        """Test members that would write the same dataset fail the archive before anything is converted"""
+        zip_path = tmp_path / "drop.zip"
+        with zipfile.ZipFile(zip_path, "w") as archive:
+            archive.writestr("sdtm/dm.csv", "usubjid\n001\n")
+            archive.writestr("adam/DM.csv", "usubjid\n002\n")
+            archive.writestr("sdtm/ae.csv", "usubjid\n001\n")
+        output = tmp_path / "out"
+
+        with pytest.raises(ValueError, match="sdtm/dm.csv, adam/DM.csv"):
+            asyncio.run(ZipIngestor(pool, max_workers=2).convert(zip_path, output))
+
+        assert not output.exists()
+
+
+class TestFileConversionZipUpload:
+    """Test FileConversionService converts ZIP uploads through the ingestion pool"""
+
+    def test_process_upload_zip(self, pool, archive, tmp_path, monkeypatch):
+        """Test a ZIP upload reports every dataset, warnings and throughput"""
+        monkeypatch.setattr(zip_ingestion, "_ingest_pool", pool)
+        output = tmp_path / "out"
+        output.mkdir()
+
+        result = asyncio.run(FileConversionService().process_upload("u1", str(archive), str(output), "zip"))
+
+        assert result.success
+        assert [f["dataset_name"] for f in result.files_extracted] == ["dm", "ae"]
+        assert result.total_rows == 4
+        assert result.rows_per_second > 0
+        assert any("define.xml" in w for w in result.warnings)
+        assert any("bad.csv" in w for w in result.warnings)
+        assert not (tmp_path / "extracted").exists()